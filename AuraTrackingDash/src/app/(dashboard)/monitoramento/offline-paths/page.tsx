@@ -81,6 +81,8 @@ export default function MonitoramentoOfflinePathsPage() {
         start: startIso,
         end: endIso,
         limit: 20000,
+        // Trajetória simplificada no servidor (paradas e curvas preservadas)
+        maxPoints: 2000,
       })
     } catch {
       // handled in hook
@@ -0,0 +1,64 @@
+import { NextResponse } from "next/server"
+
+const BACKEND_URL =
+  process.env.INGEST_API_URL?.trim() ||
+  process.env.NEXT_PUBLIC_API_BASE_URL?.trim() ||
+  "http://localhost:8080"
+
+// Células agregadas no servidor (/api/history/bins): só as células trafegam, não os pontos
+export async function POST(req: Request) {
+  try {
+    const body = await req.json()
+    const { equipmentId, equipmentIds, start, end, cell = "hex", sizeMeters = 40, format = "json" } = body || {}
+
+    if (!start || !end) {
+      return NextResponse.json({ error: "start and end are required" }, { status: 400 })
+    }
+
+    const url = new URL("/api/history/bins", BACKEND_URL)
+    const ids: string[] = Array.isArray(equipmentIds)
+      ? equipmentIds.map(String)
+      : equipmentId && equipmentId !== "all"
+        ? [String(equipmentId)]
+        : []
+    if (ids.length > 0) {
+      url.searchParams.set("device_id", ids.join(","))
+    }
+    url.searchParams.set("start", start)
+    url.searchParams.set("end", end)
+    url.searchParams.set("cell", cell === "grid" ? "grid" : "hex")
+    url.searchParams.set("size_m", String(sizeMeters))
+    if (format === "columnar") {
+      url.searchParams.set("format", format)
+    }
+
+    const res = await fetch(url.toString(), {
+      method: "GET",
+      headers: {
+        "Content-Type": "application/json",
+      },
+      cache: "no-store",
+    })
+
+    if (!res.ok) {
+      const errText = await res.text()
+      return NextResponse.json({ error: errText || "Failed to fetch bins" }, { status: res.status })
+    }
+
+    // Colunar: typed arrays binários, repassados sem conversão
+    if (format === "columnar" && res.body) {
+      return new Response(res.body, {
+        status: 200,
+        headers: {
+          "Content-Type": res.headers.get("Content-Type") || "application/octet-stream",
+          "Cache-Control": "no-store",
+        },
+      })
+    }
+
+    const data = await res.json()
+    return NextResponse.json(data)
+  } catch (err: any) {
+    return NextResponse.json({ error: err?.message || "Unexpected error" }, { status: 500 })
+  }
+}
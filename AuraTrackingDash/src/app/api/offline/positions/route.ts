@@ -8,7 +8,7 @@ const BACKEND_URL =
 export async function POST(req: Request) {
   try {
     const body = await req.json()
-    const { equipmentId, start, end, limit = 20000 } = body || {}
+    const { equipmentId, start, end, limit = 20000, maxPoints, format = "json" } = body || {}
 
     if (!start || !end) {
       return NextResponse.json({ error: "start and end are required" }, { status: 400 })
@@ -21,6 +21,12 @@ export async function POST(req: Request) {
     url.searchParams.set("start", start)
     url.searchParams.set("end", end)
     url.searchParams.set("limit", String(limit))
+    if (maxPoints) {
+      url.searchParams.set("max_points", String(maxPoints))
+    }
+    if (format === "ndjson" || format === "columnar") {
+      url.searchParams.set("format", format)
+    }
 
     const res = await fetch(url.toString(), {
       method: "GET",
@@ -35,6 +41,28 @@ export async function POST(req: Request) {
       return NextResponse.json({ error: errText || "Failed to fetch history" }, { status: res.status })
     }
 
+    // NDJSON: repassa o corpo em streaming, sem bufferizar no servidor Next.js
+    if (format === "ndjson" && res.body) {
+      return new Response(res.body, {
+        status: 200,
+        headers: {
+          "Content-Type": "application/x-ndjson",
+          "Cache-Control": "no-store",
+        },
+      })
+    }
+
+    // Colunar: typed arrays binários, repassados sem conversão
+    if (format === "columnar" && res.body) {
+      return new Response(res.body, {
+        status: 200,
+        headers: {
+          "Content-Type": res.headers.get("Content-Type") || "application/octet-stream",
+          "Cache-Control": "no-store",
+        },
+      })
+    }
+
     const data = await res.json()
     return NextResponse.json(data)
   } catch (err: any) {
@@ -0,0 +1,54 @@
+const BACKEND_URL =
+  process.env.INGEST_API_URL?.trim() ||
+  process.env.NEXT_PUBLIC_API_BASE_URL?.trim() ||
+  "http://localhost:8080"
+
+// Vector tiles do histórico (/tiles/{z}/{x}/{y}): bytes MVT repassados sem conversão,
+// com ETag/If-None-Match para o cache do navegador
+export async function GET(req: Request, { params }: { params: Promise<{ z: string; x: string; y: string }> }) {
+  try {
+    const { z, x, y } = await params
+    const incoming = new URL(req.url)
+    const url = new URL(`/tiles/${encodeURIComponent(z)}/${encodeURIComponent(x)}/${encodeURIComponent(y)}`, BACKEND_URL)
+    for (const key of ["start", "end", "device_id"]) {
+      const value = incoming.searchParams.get(key)
+      if (value) {
+        url.searchParams.set(key, value)
+      }
+    }
+
+    const headers: Record<string, string> = {}
+    const ifNoneMatch = req.headers.get("If-None-Match")
+    if (ifNoneMatch) {
+      headers["If-None-Match"] = ifNoneMatch
+    }
+
+    const res = await fetch(url.toString(), { method: "GET", headers, cache: "no-store" })
+
+    const passthrough: Record<string, string> = {}
+    for (const key of ["ETag", "Cache-Control", "X-Tile-Resolution", "X-Tile-Truncated"]) {
+      const value = res.headers.get(key)
+      if (value) {
+        passthrough[key] = value
+      }
+    }
+
+    if (res.status === 304) {
+      return new Response(null, { status: 304, headers: passthrough })
+    }
+    if (!res.ok) {
+      const errText = await res.text()
+      return Response.json({ error: errText || "Failed to fetch tile" }, { status: res.status })
+    }
+
+    return new Response(res.body, {
+      status: 200,
+      headers: {
+        ...passthrough,
+        "Content-Type": res.headers.get("Content-Type") || "application/vnd.mapbox-vector-tile",
+      },
+    })
+  } catch (err: any) {
+    return Response.json({ error: err?.message || "Unexpected error" }, { status: 500 })
+  }
+}
@@ -0,0 +1,88 @@
+// Decodificador do formato colunar de /api/history e /api/telemetry (format=columnar).
+// Layout documentado em AuraTrackingServer/ingest/src/columnar.py: os buffers ficam
+// alinhados em 8 bytes, então cada coluna vira uma view tipada sem cópia, pronta para
+// atributos binários do deck.gl (ex.: getPosition via data.attributes).
+
+export type ColumnType = "float32" | "int32" | "uint16" | "uint32"
+
+type ColumnMeta = {
+  name: string
+  type: ColumnType
+  offset: number
+  length: number
+  validity: number | null
+  dictionary?: string[]
+}
+
+type ColumnarHeader = {
+  rows: number
+  base_time: string | null
+  time_unit: "ms" | "s"
+  columns: ColumnMeta[]
+}
+
+export type ColumnarColumn = {
+  values: Float32Array | Int32Array | Uint16Array | Uint32Array
+  // bitmap estilo Arrow (bit i, LSB primeiro, 1 = presente); null = sem nulos
+  validity: Uint8Array | null
+  dictionary?: string[]
+}
+
+export type ColumnarTable = {
+  rows: number
+  baseTimeMs: number | null
+  timeUnitMs: number
+  columns: Record<string, ColumnarColumn>
+}
+
+export const COLUMNAR_MEDIA_TYPE = "application/vnd.auratracking.columnar"
+
+const VIEWS = {
+  float32: Float32Array,
+  int32: Int32Array,
+  uint16: Uint16Array,
+  uint32: Uint32Array,
+}
+
+export function decodeColumnar(buffer: ArrayBuffer): ColumnarTable {
+  const head = new DataView(buffer, 0, 8)
+  const magic = String.fromCharCode(head.getUint8(0), head.getUint8(1), head.getUint8(2), head.getUint8(3))
+  if (magic !== "ATC1") throw new Error("Resposta colunar inválida")
+  const headLen = head.getUint32(4, true)
+  const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 8, headLen))) as ColumnarHeader
+  const bodyStart = 8 + headLen
+
+  const columns: Record<string, ColumnarColumn> = {}
+  for (const meta of header.columns) {
+    const View = VIEWS[meta.type]
+    columns[meta.name] = {
+      values: new View(buffer, bodyStart + meta.offset, meta.length / View.BYTES_PER_ELEMENT),
+      validity:
+        meta.validity == null ? null : new Uint8Array(buffer, bodyStart + meta.validity, (header.rows + 7) >> 3),
+      dictionary: meta.dictionary,
+    }
+  }
+
+  return {
+    rows: header.rows,
+    baseTimeMs: header.base_time ? Date.parse(header.base_time) : null,
+    timeUnitMs: header.time_unit === "s" ? 1000 : 1,
+    columns,
+  }
+}
+
+export function isPresent(column: ColumnarColumn, i: number): boolean {
+  return column.validity == null || ((column.validity[i >> 3] >> (i & 7)) & 1) === 1
+}
+
+// Posições intercaladas [lon, lat, lon, lat...] para getPosition binário do deck.gl
+export function interleavePositions(table: ColumnarTable): Float32Array {
+  const lat = table.columns.lat.values
+  const lon = table.columns.lon.values
+  const out = new Float32Array(table.rows * 2)
+  for (let i = 0; i < table.rows; i++) {
+    out[2 * i] = lon[i]
+    out[2 * i + 1] = lat[i]
+  }
+  return out
+}
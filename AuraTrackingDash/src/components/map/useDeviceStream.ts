@@ -58,6 +58,8 @@ export function useDeviceStream(): UseDeviceStreamResult {
 
   const devicesMapRef = useRef<Map<string, DeviceSummary>>(new Map())
   const updateBufferRef = useRef<Map<string, DeviceUpdate>>(new Map())
+  // Presença informada pelo servidor (snapshot/device-status); vale enquanto o stream está conectado
+  const serverStatusRef = useRef<Map<string, "online" | "offline">>(new Map())
   const eventSourceRef = useRef<EventSource | null>(null)
   const flushTimerRef = useRef<NodeJS.Timeout | null>(null)
   const pollingTimerRef = useRef<NodeJS.Timeout | null>(null)
@@ -153,7 +155,7 @@ export function useDeviceStream(): UseDeviceStreamResult {
       if (computedStatus !== "hidden") {
         visibleDevices.push({
           ...device,
-          status: computedStatus as "online" | "offline",
+          status: serverStatusRef.current.get(device.deviceId) ?? (computedStatus as "online" | "offline"),
         })
       }
     })
@@ -232,14 +234,77 @@ export function useDeviceStream(): UseDeviceStreamResult {
         }
       }
 
+      // Lote de um tick do servidor: última atualização de cada device alterado
+      const handleFleetUpdate = (event: MessageEvent) => {
+        try {
+          const payload = JSON.parse(event.data) as DeviceUpdate[]
+          payload.forEach((update) => {
+            updateBufferRef.current.set(update.id, update)
+            serverStatusRef.current.set(update.id, "online")
+          })
+          lastEventTsRef.current = Date.now()
+        } catch (err) {
+          console.error("[Stream] Invalid SSE fleet update:", err)
+        }
+      }
+
+      // Transições online/offline detectadas pelo servidor (sem inferir por ausência de dados)
+      const handleDeviceStatus = (event: MessageEvent) => {
+        try {
+          const payload = JSON.parse(event.data) as { id: string; st: "online" | "offline"; ts: number }[]
+          payload.forEach((change) => {
+            serverStatusRef.current.set(change.id, change.st)
+          })
+          lastEventTsRef.current = Date.now()
+        } catch (err) {
+          console.error("[Stream] Invalid SSE device status:", err)
+        }
+      }
+
+      // Estado completo da frota enviado pelo servidor na conexão; depois só deltas
+      // (lastSeen vem do ts do servidor, para não marcar como online quem está parado há horas)
+      const handleSnapshot = (event: MessageEvent) => {
+        try {
+          const payload = JSON.parse(event.data) as DeviceUpdate[]
+          payload.forEach((update) => {
+            const lonVal = update.lon ?? update.lng
+            const lat = typeof update.lat === "number" ? update.lat : parseFloat(update.lat)
+            const lon = typeof lonVal === "number" ? lonVal : lonVal !== undefined ? parseFloat(lonVal) : NaN
+            if (!Number.isFinite(lat) || !Number.isFinite(lon)) return
+            const current = devicesMapRef.current.get(update.id)
+            const incomingTs = normalizeTimestamp(update.ts)
+            if (current?.lastSeen && new Date(current.lastSeen).getTime() > incomingTs) return
+            const speed = typeof update.sp === "number" ? update.sp : parseFloat(String(update.sp))
+            serverStatusRef.current.set(update.id, update.st === "offline" ? "offline" : "online")
+            devicesMapRef.current.set(update.id, {
+              deviceId: update.id,
+              operatorId: update.op || current?.operatorId || null,
+              latitude: lat,
+              longitude: lon,
+              lastSeen: new Date(incomingTs).toISOString(),
+              status: "online",
+              speedKmh: Number.isFinite(speed) ? speed : current?.speedKmh || null,
+              totalPoints24h: current?.totalPoints24h || 0,
+            })
+          })
+          lastEventTsRef.current = Date.now()
+        } catch (err) {
+          console.error("[Stream] Invalid SSE snapshot:", err)
+        }
+      }
+
       es.onmessage = handleUpdate
+      es.addEventListener("snapshot", handleSnapshot)
       es.addEventListener("device-update", handleUpdate)
+      es.addEventListener("fleet-update", handleFleetUpdate)
+      es.addEventListener("device-status", handleDeviceStatus)
       es.addEventListener("heartbeat", () => {
         lastEventTsRef.current = Date.now()
       })
 
       es.onerror = (err) => {
         console.error("[Stream] SSE Error:", err)
+        serverStatusRef.current.clear()
         setStatus("reconnecting")
         statusRef.current = "reconnecting"
         es.close()
@@ -8,6 +8,8 @@ export type OfflinePositionsParams = {
   start: string
   end: string
   limit?: number
+  // Orçamento de pontos: o servidor simplifica cada trajetória (Douglas–Peucker)
+  maxPoints?: number
 }
 
 export type OfflinePositionsResult = {
@@ -55,6 +57,55 @@ type ApiResponsePoint = {
   transmission_mode?: "online" | "queued"
 }
 
+function toDeviceSummary(p: ApiResponsePoint): DeviceSummary {
+  const rawSpeed =
+    typeof p.speed_kmh === "number" ? p.speed_kmh : typeof p.speed === "number" ? p.speed : null
+  // normaliza para km/h: se vier em m/s, converte; se já vier em km/h (speed_kmh), mantém
+  const speedKmh =
+    rawSpeed == null
+      ? null
+      : typeof p.speed_kmh === "number"
+        ? rawSpeed
+        : rawSpeed * 3.6
+  return {
+    deviceId: p.device_id || "unknown",
+    operatorId: p.operator_id || null,
+    latitude: p.lat ?? null,
+    longitude: p.lon ?? null,
+    lastSeen: p.ts || null,
+    status: "offline",
+    speedKmh,
+    totalPoints24h: null,
+    // GPS detalhado
+    satellites: p.satellites ?? null,
+    hAcc: p.h_acc ?? null,
+    vAcc: p.v_acc ?? null,
+    sAcc: p.s_acc ?? null,
+    // IMU expandido
+    accelMagnitude: p.accel_magnitude ?? null,
+    gyroMagnitude: p.gyro_magnitude ?? null,
+    magX: p.mag_x ?? null,
+    magY: p.mag_y ?? null,
+    magZ: p.mag_z ?? null,
+    magMagnitude: p.mag_magnitude ?? null,
+    linearAccelMagnitude: p.linear_accel_magnitude ?? null,
+    // Orientação
+    azimuth: p.azimuth ?? null,
+    pitch: p.pitch ?? null,
+    roll: p.roll ?? null,
+    // Sistema
+    batteryLevel: p.battery_level ?? null,
+    batteryStatus: p.battery_status ?? null,
+    batteryTemperature: p.battery_temperature ?? null,
+    wifiRssi: p.wifi_rssi ?? null,
+    cellularNetworkType: p.cellular_network_type ?? null,
+    cellularOperator: p.cellular_operator ?? null,
+    cellularRsrp: p.cellular_rsrp ?? null,
+    // Flag de transmissão
+    transmissionMode: p.transmission_mode || "online",
+  }
+}
+
 export function useOfflinePositions(): OfflinePositionsResult {
   const [data, setData] = useState<DeviceSummary[]>([])
   const [isLoading, setIsLoading] = useState(false)
@@ -73,62 +124,36 @@ export function useOfflinePositions(): OfflinePositionsResult {
           start: params.start,
           end: params.end,
           limit: params.limit ?? 20000,
+          maxPoints: params.maxPoints,
+          format: "ndjson",
         }),
       })
       if (!res.ok) {
         const err = await res.json().catch(() => ({}))
         throw new Error(err?.error || "Falha ao carregar histórico")
       }
-      const json = await res.json()
-      const points: ApiResponsePoint[] = Array.isArray(json.points) ? json.points : []
-      const mapped: DeviceSummary[] = points.map((p) => {
-        const rawSpeed =
-          typeof p.speed_kmh === "number" ? p.speed_kmh : typeof p.speed === "number" ? p.speed : null
-        // normaliza para km/h: se vier em m/s, converte; se já vier em km/h (speed_kmh), mantém
-        const speedKmh =
-          rawSpeed == null
-            ? null
-            : typeof p.speed_kmh === "number"
-              ? rawSpeed
-              : rawSpeed * 3.6
-        return {
-          deviceId: p.device_id || "unknown",
-          operatorId: p.operator_id || null,
-          latitude: p.lat ?? null,
-          longitude: p.lon ?? null,
-          lastSeen: p.ts || null,
-          status: "offline",
-          speedKmh,
-          totalPoints24h: null,
-          // GPS detalhado
-          satellites: p.satellites ?? null,
-          hAcc: p.h_acc ?? null,
-          vAcc: p.v_acc ?? null,
-          sAcc: p.s_acc ?? null,
-          // IMU expandido
-          accelMagnitude: p.accel_magnitude ?? null,
-          gyroMagnitude: p.gyro_magnitude ?? null,
-          magX: p.mag_x ?? null,
-          magY: p.mag_y ?? null,
-          magZ: p.mag_z ?? null,
-          magMagnitude: p.mag_magnitude ?? null,
-          linearAccelMagnitude: p.linear_accel_magnitude ?? null,
-          // Orientação
-          azimuth: p.azimuth ?? null,
-          pitch: p.pitch ?? null,
-          roll: p.roll ?? null,
-          // Sistema
-          batteryLevel: p.battery_level ?? null,
-          batteryStatus: p.battery_status ?? null,
-          batteryTemperature: p.battery_temperature ?? null,
-          wifiRssi: p.wifi_rssi ?? null,
-          cellularNetworkType: p.cellular_network_type ?? null,
-          cellularOperator: p.cellular_operator ?? null,
-          cellularRsrp: p.cellular_rsrp ?? null,
-          // Flag de transmissão
-          transmissionMode: p.transmission_mode || "online",
+      // NDJSON em streaming: pontos são convertidos conforme as linhas chegam
+      const mapped: DeviceSummary[] = []
+      const reader = res.body?.getReader()
+      if (reader) {
+        const decoder = new TextDecoder()
+        let pending = ""
+        const consume = (line: string) => {
+          if (!line.trim()) return
+          const point = JSON.parse(line) as ApiResponsePoint & { error?: string }
+          if (point.error) throw new Error(point.error)
+          mapped.push(toDeviceSummary(point))
         }
-      })
+        for (;;) {
+          const { done, value } = await reader.read()
+          if (done) break
+          pending += decoder.decode(value, { stream: true })
+          const lines = pending.split("\n")
+          pending = lines.pop() ?? ""
+          lines.forEach(consume)
+        }
+        consume(pending + decoder.decode())
+      }
       setData(mapped)
     } catch (err: any) {
       setErrorMessage(err?.message || "Erro ao carregar histórico")
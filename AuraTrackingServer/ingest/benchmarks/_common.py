@@ -0,0 +1,75 @@
+"""
+Utilitários compartilhados pelos benchmarks do ingest worker.
+
+Os benchmarks que tocam o banco usam as mesmas variáveis de ambiente do
+worker (DB_HOST, DB_PORT, ...) e devem rodar contra um TimescaleDB local
+de desenvolvimento (docker compose up timescaledb), nunca em produção:
+eles inserem dispositivos "bench_*" na hypertable telemetry.
+
+Execução (a partir de AuraTrackingServer/ingest):
+    python -m benchmarks.<nome_do_benchmark>
+"""
+
+import json
+import random
+import re
+import statistics
+from datetime import datetime, timedelta, timezone
+
+from src.main import TELEMETRY_VALUES_TEMPLATE
+
+# Chaves esperadas pelo template de insert de telemetria
+RECORD_KEYS = re.findall(r"%\((\w+)\)s", TELEMETRY_VALUES_TEMPLATE)
+
+# Centro aproximado da mina (mesma região de test.sh)
+BASE_LAT = -11.5636
+BASE_LON = -47.1706
+
+
+def make_record(device_id: str, ts: datetime, mode: str = "online", rng: random.Random = random) -> dict:
+    """Gera um registro sintético no formato de IngestWorker._convert_packet_to_record."""
+    record = dict.fromkeys(RECORD_KEYS)
+    record.update({
+        "time": ts,
+        "device_id": device_id,
+        "operator_id": "bench_operator",
+        "latitude": BASE_LAT + rng.uniform(-0.02, 0.02),
+        "longitude": BASE_LON + rng.uniform(-0.02, 0.02),
+        "speed": rng.uniform(0, 15),
+        "accel_x": rng.uniform(-1, 1),
+        "accel_y": rng.uniform(-1, 1),
+        "accel_z": 9.8 + rng.uniform(-0.1, 0.1),
+        "accel_magnitude": 9.8 + rng.uniform(-0.5, 0.5),
+        "battery_level": rng.randint(20, 100),
+        "transmission_mode": mode,
+        "topic": f"aura/tracking/{device_id}/telemetry",
+        "received_at": datetime.now(timezone.utc),
+        "raw_payload": json.dumps({"deviceId": device_id, "bench": True}),
+    })
+    return record
+
+
+def fleet_stream(devices: int, start: datetime, seconds: int, mode: str = "online",
+                 prefix: str = "bench", seed: int = 42):
+    """Registros em ordem de chegada: todos os dispositivos intercalados a 1 Hz."""
+    rng = random.Random(seed)
+    for s in range(seconds):
+        ts = start + timedelta(seconds=s)
+        for d in range(devices):
+            yield make_record(f"{prefix}_{d:03d}", ts, mode, rng)
+
+
+def percentiles(samples: list[float]) -> dict:
+    """p50/p95/p99/max em milissegundos."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        "n": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 2),
+        "p50_ms": round(pick(0.50) * 1000, 2),
+        "p95_ms": round(pick(0.95) * 1000, 2),
+        "p99_ms": round(pick(0.99) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
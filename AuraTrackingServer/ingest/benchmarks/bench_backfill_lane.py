@@ -0,0 +1,105 @@
+"""
+Benchmark: latência do flush online com e sem a lane de backfill.
+
+Cenário: uma frota de dispositivos envia tráfego online a 1 Hz enquanto
+outros dispositivos descarregam dias de dados queued (mais antigos que o
+horizonte de compressão) em chunks comprimidos.
+
+- inline: registros queued entram no mesmo batch_buffer do tráfego online
+  (comportamento anterior) e cada batch de 100 descomprime chunks.
+- lane:   registros queued vão para BackfillLane (conexão/thread próprias,
+  um INSERT por chunk) e o batch online só contém tráfego recente.
+
+Mede-se a latência de cada flush online (p50/p95/p99).
+
+Uso:
+    python -m benchmarks.bench_backfill_lane [--seconds 120] [--devices 50] [--queued-days 10]
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+from src.backfill import BackfillLane
+from src.main import Config, DatabasePool
+
+from ._common import fleet_stream, make_record, percentiles
+
+
+class _NullQueue:
+    def enqueue(self, topic, payload, timestamp):
+        pass
+
+
+def _queued_records(device_id: str, days: int, per_day: int):
+    """Dados queued espalhados por `days` dias anteriores ao horizonte."""
+    now = datetime.now(timezone.utc)
+    for day in range(days):
+        base = now - timedelta(days=4 + day)
+        for i in range(per_day):
+            yield make_record(device_id, base + timedelta(seconds=i), mode="queued")
+
+
+def _compress_old_chunks(db: DatabasePool):
+    conn = db.get_connection()
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT compress_chunk(c, if_not_compressed => TRUE) "
+            "FROM show_chunks('telemetry', older_than => INTERVAL '3 days') c"
+        )
+    conn.commit()
+
+
+def run(mode: str, args, config: Config) -> dict:
+    live_db = DatabasePool(config)
+    live_db.connect()
+    _compress_old_chunks(live_db)
+
+    queued = list(_queued_records(f"bench_queued_{mode}", args.queued_days, args.queued_per_day))
+    lane = None
+    if mode == "lane":
+        lane = BackfillLane(DatabasePool(config), _NullQueue(),
+                            batch_size=config.backfill_batch_size, timeout_ms=1000)
+        lane.start()
+
+    latencies = []
+    start = datetime.now(timezone.utc) + timedelta(hours=1)  # evita colisão entre execuções
+    buffer = []
+    for i, record in enumerate(fleet_stream(args.devices, start, args.seconds, prefix=f"bench_{mode}")):
+        buffer.append(record)
+        # Intercala registros queued na mesma proporção do tráfego online
+        if queued and i % 2 == 0:
+            late = queued.pop()
+            if lane is not None:
+                lane.add(late)
+            else:
+                buffer.append(late)
+        if len(buffer) >= config.batch_size:
+            t0 = time.perf_counter()
+            live_db.insert_telemetry_batch(buffer)
+            latencies.append(time.perf_counter() - t0)
+            buffer = []
+
+    if lane is not None:
+        lane.stop()
+        lane.db.close()
+    live_db.close()
+    return {"mode": mode, "live_flush": percentiles(latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=int, default=120)
+    parser.add_argument("--devices", type=int, default=50)
+    parser.add_argument("--queued-days", type=int, default=10)
+    parser.add_argument("--queued-per-day", type=int, default=600)
+    args = parser.parse_args()
+
+    config = Config()
+    results = [run("inline", args, config), run("lane", args, config)]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark: páginas de índice tocadas e tempo de insert com e sem ordenação do batch.
+
+Gera batches em ordem de chegada (dispositivos intercalados, com uma fração
+de registros queued fora de ordem) e executa cada um como um único INSERT
+dentro de EXPLAIN (ANALYZE, BUFFERS), com ROLLBACK ao final. Compara:
+
+- arrival: batch como chega no batch_buffer
+- sorted:  batch após sort_and_merge (device_id, time) + fusão de duplicatas
+
+Reporta blocos compartilhados tocados (hit + read + dirtied) e tempo de execução.
+
+Uso:
+    python -m benchmarks.bench_batch_sorting [--batches 50] [--batch-size 500] [--devices 100]
+"""
+
+import argparse
+import json
+import random
+import statistics
+from datetime import datetime, timedelta, timezone
+
+from src.batching import sort_and_merge
+from src.main import (
+    Config, DatabasePool,
+    TELEMETRY_INSERT_HEAD, TELEMETRY_ON_CONFLICT, TELEMETRY_VALUES_TEMPLATE,
+)
+
+from ._common import make_record
+
+
+def _arrival_batch(rng: random.Random, size: int, devices: int, base: datetime) -> list[dict]:
+    """Batch em ordem de chegada com ~10% de registros queued fora de ordem e algumas duplicatas."""
+    batch = []
+    for i in range(size):
+        device = f"bench_sort_{rng.randrange(devices):03d}"
+        if rng.random() < 0.10:
+            ts = base - timedelta(seconds=rng.randrange(1, 6 * 3600))
+            batch.append(make_record(device, ts, "queued", rng))
+        else:
+            batch.append(make_record(device, base + timedelta(milliseconds=10 * i), "online", rng))
+        if rng.random() < 0.02:
+            batch.append(dict(batch[-1]))  # retransmissão QoS1
+    return batch
+
+
+def _explain_insert(conn, records: list[dict]) -> dict:
+    with conn.cursor() as cur:
+        values = b",".join(cur.mogrify(TELEMETRY_VALUES_TEMPLATE, r) for r in records).decode()
+        cur.execute(
+            "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) "
+            + TELEMETRY_INSERT_HEAD + values + TELEMETRY_ON_CONFLICT
+        )
+        plan = cur.fetchone()[0][0]
+    conn.rollback()
+    root = plan["Plan"]
+    return {
+        "blocks": root.get("Shared Hit Blocks", 0) + root.get("Shared Read Blocks", 0)
+                  + root.get("Shared Dirtied Blocks", 0),
+        "ms": plan["Execution Time"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batches", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--devices", type=int, default=100)
+    args = parser.parse_args()
+
+    db = DatabasePool(Config())
+    db.connect()
+    conn = db.get_connection()
+
+    rng = random.Random(7)
+    results = {"arrival": [], "sorted": []}
+    base = datetime.now(timezone.utc) - timedelta(hours=1)
+    for n in range(args.batches):
+        batch = _arrival_batch(rng, args.batch_size, args.devices, base + timedelta(minutes=n))
+        ordered, _ = sort_and_merge(batch)
+        # O batch em ordem de chegada também precisa ser único (senão o INSERT conflita consigo)
+        unique_arrival = list({(r["device_id"], r["time"]): r for r in batch}.values())
+        results["arrival"].append(_explain_insert(conn, unique_arrival))
+        results["sorted"].append(_explain_insert(conn, ordered))
+
+    summary = {
+        mode: {
+            "mean_blocks": round(statistics.fmean(r["blocks"] for r in rows), 1),
+            "mean_exec_ms": round(statistics.fmean(r["ms"] for r in rows), 2),
+        }
+        for mode, rows in results.items()
+    }
+    print(json.dumps(summary, indent=2))
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Benchmark: /api/history/bins (agregação por célula no servidor).
+
+Gera trajetórias sintéticas a 1 Hz (as mesmas de bench_simplify: ciclos
+de parada e estrada, vários caminhões) e mede:
+- CPU do kernel vetorizado (numpy) contra um laço Python equivalente
+- conferência: mesmas células e contagens nos dois; cada ponto hex cai na
+  célula de centro mais próximo (nenhum vizinho está mais perto)
+- bytes enviados: pontos (json de /api/history) contra células (json e
+  columnar)
+
+Não precisa de banco.
+
+Uso:
+    python -m benchmarks.bench_bins [--devices 10] [--points 86400] [--size 40]
+"""
+
+import argparse
+import json
+import math
+import random
+import time
+
+import numpy as np
+
+from benchmarks.bench_simplify import make_track
+from src.binning import BIN_SCHEMA, BinPoints, bin_cells, bin_points, bin_rows, dwell_seconds
+from src.columnar import encode_columnar
+from src.simplify import COL_LAT, COL_LON, COL_SPEED, M_PER_DEG_LAT, M_PER_DEG_LON
+
+HEX_NEIGHBORS = [(1, 0), (1, -1), (0, -1), (-1, 0), (-1, 1), (0, 1)]
+
+
+def to_points(tracks):
+    """Linhas das trajetórias em BinPoints (ordenadas por device, time)."""
+    ids = sorted(tracks)
+    rows = [(r[0].timestamp(), code, r[COL_LAT], r[COL_LON], r[COL_SPEED])
+            for code, d in enumerate(ids) for r in tracks[d]]
+    t, dev, lat, lon, speed = (np.array(c, dtype=np.float64) for c in zip(*rows))
+    return BinPoints(t, dev.astype(np.int32), lat, lon, speed, ids)
+
+
+def python_cell(x, y, cell, size_m):
+    """Célula de um ponto projetado, em Python puro (referência do kernel)."""
+    if cell == "grid":
+        return math.floor(x / size_m), math.floor(y / size_m)
+    qf = (math.sqrt(3) / 3 * x - y / 3) / size_m
+    rf = (2 / 3 * y) / size_m
+    sf = -qf - rf
+    q, r, s = round(qf), round(rf), round(sf)
+    dq, dr, ds = abs(q - qf), abs(r - rf), abs(s - sf)
+    if dq > dr and dq > ds:
+        q = -r - s
+    elif dr > ds:
+        r = -q - s
+    return q, r
+
+
+def hex_center(q, r, size_m):
+    return size_m * math.sqrt(3) * (q + r / 2), size_m * 1.5 * r
+
+
+def python_bins(points, cell, size_m, max_gap_s):
+    """Referência em Python puro (mesma projeção e arredondamento)."""
+    ref_lat = round(float(np.median(points.lat)), 2)
+    kx = M_PER_DEG_LON * math.cos(math.radians(ref_lat))
+    dwell = dwell_seconds(points.t, points.device, max_gap_s).tolist()
+    out = {}
+    for k, (lat, lon) in enumerate(zip(points.lat.tolist(), points.lon.tolist())):
+        c = out.setdefault(python_cell(lon * kx, lat * M_PER_DEG_LAT, cell, size_m), [0, 0.0])
+        c[0] += 1
+        c[1] += dwell[k]
+    return out
+
+
+def check_nearest_hex(points, binned, size_m, sample=20000):
+    """
+    Cada ponto amostrado está no hexágono de centro mais próximo: nenhum
+    dos seis vizinhos está mais perto. Devolve a maior distância ao centro
+    em raios (<= 1 num hexágono de raio size_m).
+    """
+    kx = M_PER_DEG_LON * math.cos(math.radians(binned["ref_lat"]))
+    cols = binned["columns"]
+    cells = set(zip(cols["i"].tolist(), cols["j"].tolist()))
+    rng = random.Random(1)
+    worst = 0.0
+    for k in rng.sample(range(len(points.t)), min(sample, len(points.t))):
+        x, y = points.lon[k] * kx, points.lat[k] * M_PER_DEG_LAT
+        q, r = python_cell(x, y, "hex", size_m)
+        assert (q, r) in cells, "célula do ponto ausente na resposta"
+        cx, cy = hex_center(q, r, size_m)
+        d = math.hypot(x - cx, y - cy)
+        worst = max(worst, d / size_m)
+        for dq, dr in HEX_NEIGHBORS:
+            nx, ny = hex_center(q + dq, r + dr, size_m)
+            assert math.hypot(x - nx, y - ny) >= d - 1e-6, "ponto fora do hexágono mais próximo"
+    return worst
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=10)
+    parser.add_argument("--points", type=int, default=86400, help="pontos por device (86400 = 1 dia a 1 Hz)")
+    parser.add_argument("--size", type=float, default=40.0)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    tracks = {f"truck_{d:02d}": make_track(f"truck_{d:02d}", args.points, rng) for d in range(args.devices)}
+    points = to_points(tracks)
+    n = len(points.t)
+    points_json = len(json.dumps([
+        {"ts": t, "device_id": d, "lat": la, "lon": lo, "speed_kmh": s}
+        for t, d, la, lo, s in zip(points.t.tolist(), points.device.tolist(), points.lat.tolist(),
+                                   points.lon.tolist(), points.speed.tolist())
+    ]).encode())
+
+    report = {"devices": args.devices, "points": n, "points_json_bytes": points_json, "runs": []}
+    for cell in ("hex", "grid"):
+        c0 = time.process_time()
+        binned = bin_points(points, cell, args.size, 30.0)
+        numpy_cpu = time.process_time() - c0
+
+        c0 = time.process_time()
+        reference = python_bins(points, cell, args.size, 30.0)
+        python_cpu = time.process_time() - c0
+
+        cols = binned["columns"]
+        ours = {(i, j): (c, d) for i, j, c, d in zip(cols["i"].tolist(), cols["j"].tolist(),
+                                                    cols["count"].tolist(), cols["dwell_s"].tolist())}
+        assert ours.keys() == reference.keys(), "células diferentes da referência"
+        assert all(ours[k][0] == reference[k][0] and abs(ours[k][1] - reference[k][1]) < 1e-6 for k in ours)
+        assert int(cols["count"].sum()) == n
+
+        run = {
+            "cell": cell,
+            "cells": len(ours),
+            "numpy_ms": round(numpy_cpu * 1000, 1),
+            "python_ms": round(python_cpu * 1000, 1),
+            "speedup": round(python_cpu / max(numpy_cpu, 1e-9), 1),
+            "cells_json_bytes": len(json.dumps(bin_cells(cols)).encode()),
+            "cells_columnar_bytes": len(encode_columnar(BIN_SCHEMA, bin_rows(cols))),
+            "dwell_hours": round(float(cols["dwell_s"].sum()) / 3600, 1),
+        }
+        if cell == "hex":
+            run["max_dist_to_center_over_radius"] = round(check_nearest_hex(points, binned, args.size), 3)
+        report["runs"].append(run)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark: handoff por pacote (call_soon_threadsafe) vs broadcast por tick.
+
+Uma thread simula o MQTT publicando a frota em alta frequência enquanto N
+subscribers SSE consomem pelo intervalo próprio. Compara:
+- per_packet: um call_soon_threadsafe por pacote (modelo anterior, sem throttle)
+- tick: publish() só grava o pendente; o loop distribui a cada tick_ms
+
+Mede os handoffs entre threads (acordadas do event loop), os frames
+entregues e a CPU do processo. Não precisa de banco nem MQTT.
+
+Uso:
+    python -m benchmarks.bench_broadcast_tick [--devices 200] [--hz 10] \\
+        [--seconds 5] [--clients 100] [--tick-ms 250]
+"""
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime, timezone
+
+from src.broadcaster import TelemetryBroadcaster, format_fleet_frame
+
+from ._common import make_record
+
+
+def _publisher(loop, broadcaster, mode: str, devices: int, hz: float, seconds: float, counters: dict):
+    records = [make_record(f"bench_{d:03d}", datetime.now(timezone.utc)) for d in range(devices)]
+    period = 1.0 / hz
+    deadline = time.monotonic() + seconds
+    next_round = time.monotonic()
+    while time.monotonic() < deadline:
+        for record in records:
+            if mode == "tick":
+                broadcaster.publish(record["device_id"], record)
+            else:
+                loop.call_soon_threadsafe(broadcaster._broadcast_to_subscribers, record)
+                counters["handoffs"] += 1
+            counters["packets"] += 1
+        next_round += period
+        time.sleep(max(0.0, next_round - time.monotonic()))
+
+
+async def _client(mailbox, counters: dict):
+    while True:
+        frame = format_fleet_frame(await mailbox.next_batch())
+        counters["frames"] += 1
+        counters["bytes"] += len(frame)
+
+
+async def _run(mode: str, args) -> dict:
+    loop = asyncio.get_running_loop()
+    broadcaster = TelemetryBroadcaster(tick_ms=args.tick_ms, subscriber_interval_seconds=1.0)
+    if mode == "tick":
+        broadcaster.set_loop(loop)
+    counters = {"packets": 0, "handoffs": 0, "frames": 0, "bytes": 0}
+    mailboxes = [await broadcaster.subscribe() for _ in range(args.clients)]
+    tasks = [asyncio.create_task(_client(m, counters)) for m in mailboxes]
+
+    cpu0 = time.process_time()
+    thread = threading.Thread(
+        target=_publisher,
+        args=(loop, broadcaster, mode, args.devices, args.hz, args.seconds, counters),
+    )
+    thread.start()
+    while thread.is_alive():
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(0.5)  # Drena o último tick
+    cpu = time.process_time() - cpu0
+
+    for t in tasks:
+        t.cancel()
+    stats = broadcaster.get_stats()
+    await broadcaster.close()
+    return {
+        "mode": mode,
+        "packets": counters["packets"],
+        "loop_handoffs": counters["handoffs"] if mode != "tick" else stats["ticks"],
+        "frames_delivered": counters["frames"],
+        "bytes": counters["bytes"],
+        "cpu_s": round(cpu, 3),
+        "cpu_us_per_packet": round(cpu / max(counters["packets"], 1) * 1e6, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--hz", type=float, default=10)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--tick-ms", type=int, default=250)
+    args = parser.parse_args()
+
+    results = [asyncio.run(_run(mode, args)) for mode in ("per_packet", "tick")]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Benchmark: views device_last_position / device_status sobre device_state
+contra as definições antigas (DISTINCT ON sobre 24 h de telemetry e
+COUNT(*) correlacionado por device).
+
+Semeia no TimescaleDB local --devices dispositivos "bench_state_*" a 1 Hz
+por --minutes minutos (o insert já atualiza device_state a cada batch),
+mede o custo do upsert por batch e a latência (p50/p95) das consultas do
+Grafana nos dois formatos, e confere que as contagens da última hora e as
+últimas posições batem. Os dados "bench_state_*" são removidos ao final.
+
+Requer a migration 06_device_state.sql aplicada.
+
+Uso:
+    python -m benchmarks.bench_device_state [--devices 100] [--minutes 60] [--repeat 20]
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+from src.main import Config, DatabasePool
+
+from ._common import fleet_stream, percentiles
+
+PREFIX = "bench_state"
+
+OLD_LAST_POSITION = """
+    SELECT DISTINCT ON (device_id) device_id, time, latitude, longitude
+    FROM telemetry
+    WHERE time > NOW() - INTERVAL '24 hours' AND device_id LIKE %s
+    ORDER BY device_id, time DESC
+"""
+
+OLD_STATUS = """
+    SELECT d.device_id,
+           (SELECT COUNT(*) FROM telemetry t
+            WHERE t.device_id = d.device_id
+            AND t.time > NOW() - INTERVAL '1 hour') AS samples_last_hour
+    FROM devices d
+    WHERE d.device_id LIKE %s
+"""
+
+NEW_LAST_POSITION = """
+    SELECT device_id, time, latitude, longitude
+    FROM device_last_position
+    WHERE device_id LIKE %s
+"""
+
+NEW_STATUS = """
+    SELECT device_id, samples_last_hour
+    FROM device_status
+    WHERE device_id LIKE %s
+"""
+
+
+def seed(db: DatabasePool, devices: int, minutes: int, batch_size: int) -> list:
+    """Insere em batches como o worker; devolve o tempo de upsert de device_state por batch."""
+    start = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(minutes=minutes)
+    upsert_samples, batch = [], []
+    original_upsert = db.upsert_device_state
+
+    def timed_upsert(records):
+        t0 = time.perf_counter()
+        original_upsert(records)
+        upsert_samples.append(time.perf_counter() - t0)
+
+    db.upsert_device_state = timed_upsert
+    try:
+        for record in fleet_stream(devices, start, minutes * 60, prefix=PREFIX):
+            batch.append(record)
+            if len(batch) >= batch_size:
+                db.insert_telemetry_batch(batch)
+                batch = []
+        if batch:
+            db.insert_telemetry_batch(batch)
+    finally:
+        db.upsert_device_state = original_upsert
+    conn = db.get_connection()
+    with conn.cursor() as cur:
+        cur.execute("ANALYZE telemetry")
+    conn.commit()
+    return upsert_samples
+
+
+def cleanup(db: DatabasePool):
+    conn = db.get_connection()
+    with conn.cursor() as cur:
+        for table in ("telemetry", "device_state", "devices"):
+            cur.execute(f"DELETE FROM {table} WHERE device_id LIKE %s", [f"{PREFIX}_%"])
+    conn.commit()
+
+
+def measure(db: DatabasePool, query: str, repeat: int):
+    conn = db.get_connection()
+    samples, rows = [], []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        with conn.cursor() as cur:
+            cur.execute(query, [f"{PREFIX}_%"])
+            rows = cur.fetchall()
+        conn.commit()
+        samples.append(time.perf_counter() - t0)
+    return sorted(rows), percentiles(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--minutes", type=int, default=60)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    db = DatabasePool(Config())
+    db.connect()
+    try:
+        upsert = seed(db, args.devices, args.minutes, args.batch_size)
+        old_pos, old_pos_t = measure(db, OLD_LAST_POSITION, args.repeat)
+        new_pos, new_pos_t = measure(db, NEW_LAST_POSITION, args.repeat)
+        old_status, old_status_t = measure(db, OLD_STATUS, args.repeat)
+        new_status, new_status_t = measure(db, NEW_STATUS, args.repeat)
+    finally:
+        cleanup(db)
+        db.close()
+
+    # Contagem por minuto: a borda da hora pode diferir em até um minuto de amostras
+    max_count_diff = max(
+        (abs(a[1] - b[1]) for a, b in zip(old_status, new_status)), default=0
+    )
+    print(json.dumps({
+        "devices": args.devices,
+        "rows": args.devices * args.minutes * 60,
+        "upsert_per_batch": percentiles(upsert),
+        "last_position": {"old": old_pos_t, "new": new_pos_t, "match": old_pos == new_pos},
+        "status": {"old": old_status_t, "new": new_status_t, "max_count_diff": max_count_diff},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Benchmark: expiração de presença por timing wheel vs varredura do dict.
+
+Frota de N devices a 1 Hz em que uma fração para de transmitir. Compara o
+custo por tick (1 s) de detectar quem ficou offline:
+- scan: percorre {device_id: last_seen} inteiro a cada tick (modelo do
+  antigo cleanup_stale_devices)
+- wheel: DeviceTracker.advance() processa só o slot vencido
+
+Confere também a latência da transição offline no tick real do
+broadcaster (--tick, padrão 0.25 s como BROADCAST_TICK_MS): devices com
+fase aleatória param de transmitir e o offline tem de sair até
+offline_after + resolução + tick depois da chegada da última amostra,
+mesmo com o relógio do device adiantado/atrasado até --skew segundos.
+Falha (código de saída 1) se algum passar disso.
+
+Não precisa de banco nem MQTT.
+
+Uso:
+    python -m benchmarks.bench_device_tracker [--devices 20000] [--seconds 120] [--tick 0.25] [--skew 20]
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+
+from src.device_tracker import DeviceTracker
+
+
+def offline_latency(offline_after: float, tick: float, runs: int, skew: float, rng: random.Random) -> list:
+    """Atraso (s) entre a chegada da última amostra e a transição offline, um device por run, advance() a cada tick."""
+    tracker = DeviceTracker(offline_after)
+    t0 = 1_700_000_000.0
+    # Fase aleatória de 1 Hz e parada aleatória dentro de 30 s
+    phases = {f"lat_{r:03d}": rng.random() for r in range(runs)}
+    stops = {device_id: t0 + rng.uniform(5, 30) for device_id in phases}
+    skews = {device_id: rng.uniform(-skew, skew) for device_id in phases}
+    last = {}
+    latencies = {}
+    now, next_sample = t0, {d: t0 + p for d, p in phases.items()}
+    end = t0 + 30 + offline_after * 3
+    while now < end and len(latencies) < runs:
+        for device_id, at in next_sample.items():
+            while at <= now and at <= stops[device_id]:
+                tracker.touch(device_id, at + skews[device_id], now=now, received_at=now)
+                last[device_id] = now
+                at += 1.0
+            next_sample[device_id] = at
+        for change in tracker.advance(now):
+            if not change.online and change.device_id not in latencies:
+                latencies[change.device_id] = now - last[change.device_id]
+        now += tick
+    return [latencies.get(d, float("inf")) for d in phases]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=20000)
+    parser.add_argument("--seconds", type=int, default=120)
+    parser.add_argument("--offline-after", type=float, default=60)
+    parser.add_argument("--drop-fraction", type=float, default=0.05)
+    parser.add_argument("--tick", type=float, default=0.25)
+    parser.add_argument("--latency-runs", type=int, default=20)
+    parser.add_argument("--skew", type=float, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    ids = [f"bench_{i:05d}" for i in range(args.devices)]
+    # Devices que param de transmitir na metade do período
+    dropped = set(rng.sample(ids, int(args.devices * args.drop_fraction)))
+
+    tracker = DeviceTracker(args.offline_after)
+    last_seen = {}
+    t0 = 1_700_000_000.0
+    touch_cpu = wheel_cpu = scan_cpu = 0.0
+    wheel_offline = scan_offline = 0
+    scan_online = set()
+
+    for s in range(args.seconds):
+        now = t0 + s
+        active = ids if s < args.seconds // 2 else [i for i in ids if i not in dropped]
+
+        c0 = time.process_time()
+        for device_id in active:
+            tracker.touch(device_id, now, now=now, received_at=now)
+        touch_cpu += time.process_time() - c0
+        for device_id in active:
+            last_seen[device_id] = now
+            scan_online.add(device_id)
+
+        c0 = time.process_time()
+        wheel_offline += sum(1 for c in tracker.advance(now) if not c.online)
+        wheel_cpu += time.process_time() - c0
+
+        c0 = time.process_time()
+        for device_id, seen in last_seen.items():
+            if device_id in scan_online and now - seen >= args.offline_after:
+                scan_online.discard(device_id)
+                scan_offline += 1
+        scan_cpu += time.process_time() - c0
+
+    latencies = offline_latency(args.offline_after, args.tick, args.latency_runs, args.skew, rng)
+    bound = args.offline_after + tracker.resolution + args.tick
+    late = sum(1 for lat in latencies if lat > bound)
+
+    ticks = args.seconds
+    print(json.dumps({
+        "devices": args.devices,
+        "ticks": ticks,
+        "went_offline": {"wheel": wheel_offline, "scan": scan_offline},
+        "touch_us_per_packet": round(touch_cpu / (args.devices * ticks) * 1e6, 3),
+        "expiry_us_per_tick": {
+            "wheel": round(wheel_cpu / ticks * 1e6, 1),
+            "scan": round(scan_cpu / ticks * 1e6, 1),
+        },
+        "offline_latency_s": {
+            "tick": args.tick,
+            "skew": args.skew,
+            "bound": bound,
+            "min": round(min(latencies), 2),
+            "max": round(max(latencies), 2),
+            "late": late,
+        },
+    }, indent=2))
+    if late:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Benchmark: fan-out local (Unix domain socket) do ingest para N processos de API.
+
+Um FanoutPublisher no processo principal recebe a frota a --hz (thread
+simulando o MQTT); cada processo filho roda um FanoutSubscriber com
+FleetState e TelemetryBroadcaster próprios, como src/api.py. Mede a
+latência publish -> réplica e confere que cada réplica termina com o
+mesmo estado e contagem de pontos do publisher.
+
+Com --stalled, essa quantidade de assinantes conecta e nunca lê: a
+latência das réplicas não deve mudar e os parados devem ser desconectados
+quando o buffer passa de --max-buffer-kb.
+
+Roda inteiro numa máquina, sem banco nem MQTT.
+
+Uso:
+    python -m benchmarks.bench_fanout [--workers 4] [--devices 200] [--hz 10] [--seconds 5] [--stalled 0]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import socket
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+from src.broadcaster import TelemetryBroadcaster
+from src.fanout import FanoutPublisher, FanoutSubscriber
+from src.fleet_state import FleetState
+
+from ._common import make_record, percentiles
+
+
+class _LatencyProbe(TelemetryBroadcaster):
+    """Broadcaster que registra o atraso entre o publish no ingest e a chegada."""
+
+    def __init__(self):
+        super().__init__()
+        self.samples = []
+
+    def publish(self, device_id, payload):
+        self.samples.append(time.time() - payload["time"].timestamp())
+        super().publish(device_id, payload)
+
+
+def _subscriber_process(path: str, seconds: float, out: mp.Queue):
+    async def run():
+        fleet_state = FleetState()
+        probe = _LatencyProbe()
+        subscriber = FanoutSubscriber(path, fleet_state, probe, reconnect_seconds=0.05)
+        subscriber.start()
+        await asyncio.sleep(seconds)
+        await subscriber.stop()
+        now_hour = int(time.time()) // 3600
+        points = sum(fleet_state.get(d["device_id"]).points_24h(now_hour)
+                     for d in fleet_state.devices(max_age_seconds=3600))
+        out.put({
+            "pid": os.getpid(),
+            "devices": len(fleet_state),
+            "points_24h": points,
+            **subscriber.get_stats(),
+            **percentiles(probe.samples),
+        })
+
+    asyncio.run(run())
+
+
+def _publish(publisher: FanoutPublisher, fleet_state: FleetState, devices: int, hz: float, seconds: float):
+    period = 1.0 / hz
+    deadline = time.monotonic() + seconds
+    next_round = time.monotonic()
+    while time.monotonic() < deadline:
+        now = datetime.now(timezone.utc)
+        for d in range(devices):
+            record = make_record(f"bench_{d:03d}", now)
+            fleet_state.update(record)
+            publisher.publish(record)
+        next_round += period
+        time.sleep(max(0.0, next_round - time.monotonic()))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--hz", type=float, default=10)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--tick-ms", type=int, default=100)
+    parser.add_argument("--stalled", type=int, default=0)
+    parser.add_argument("--max-buffer-kb", type=int, default=1024)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "fanout.sock")
+    fleet_state = FleetState()
+    publisher = FanoutPublisher(path, fleet_state, tick_ms=args.tick_ms,
+                                max_buffer_bytes=args.max_buffer_kb * 1024)
+    publisher.start()
+
+    # Assinantes que nunca leem (processo de API travado)
+    stalled = []
+    for _ in range(args.stalled):
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.connect(path)
+        stalled.append(conn)
+
+    out = mp.Queue()
+    # Réplicas vivem um pouco mais que a publicação para drenar o último tick
+    procs = [mp.Process(target=_subscriber_process, args=(path, args.seconds + 1.5, out))
+             for _ in range(args.workers)]
+    for p in procs:
+        p.start()
+    time.sleep(0.5)  # Assinantes conectam antes do tráfego
+
+    cpu0 = time.process_time()
+    thread = threading.Thread(target=_publish, args=(publisher, fleet_state, args.devices, args.hz, args.seconds))
+    thread.start()
+    thread.join()
+    publisher_cpu = time.process_time() - cpu0
+
+    replicas = [out.get(timeout=30) for _ in procs]
+    for p in procs:
+        p.join()
+    publisher_stats = publisher.get_stats()
+    publisher.stop()
+    for conn in stalled:
+        conn.close()
+
+    now_hour = int(time.time()) // 3600
+    expected_points = sum(fleet_state.get(d["device_id"]).points_24h(now_hour)
+                          for d in fleet_state.devices(max_age_seconds=3600))
+    print(json.dumps({
+        "publisher": {
+            **publisher_stats,
+            "points_24h": expected_points,
+            "cpu_s": round(publisher_cpu, 3),
+        },
+        "replicas": replicas,
+        "replicas_consistent": all(r["points_24h"] == expected_points for r in replicas),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
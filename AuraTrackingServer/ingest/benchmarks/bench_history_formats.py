@@ -0,0 +1,137 @@
+"""
+Benchmark: formatos de resposta de /api/history (json, ndjson, columnar).
+
+Gera N linhas sintéticas no formato do cursor (HISTORY_COLUMNS) e mede,
+para cada formato:
+- bytes da resposta (crua e em cada codificação disponível do middleware
+  de src/compression.py: gzip e, se instalados, br/zstd)
+- CPU do servidor para serializar e para comprimir
+- CPU do cliente para chegar aos dados (json.loads / leitura dos typed arrays)
+- latência fim a fim estimada = servidor + transferência (--mbps) + cliente,
+  crua, comprimida na hora e vinda do cache de respostas (já em gzip: sem
+  serializar nem comprimir)
+
+Não precisa de banco.
+
+Uso:
+    python -m benchmarks.bench_history_formats [--rows 20000] [--devices 30] [--mbps 20]
+"""
+
+import argparse
+import json
+import random
+import struct
+import time
+from array import array
+from datetime import datetime, timedelta, timezone
+
+from src.columnar import HISTORY_SCHEMA, decode_columnar, encode_columnar
+from src.compression import GZIP, available_encodings, compress, decompress
+from src.history import history_point
+
+
+def make_rows(n, devices, seed=42):
+    rng = random.Random(seed)
+    t0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    ids = [f"device_{i:03d}" for i in range(devices)]
+    rows = []
+    for i in range(n):
+        rows.append((
+            t0 + timedelta(seconds=i / devices), ids[i % devices], f"op_{i % devices}",
+            -11.56 + rng.uniform(-0.05, 0.05), -47.17 + rng.uniform(-0.05, 0.05),
+            rng.uniform(0, 60),
+            rng.randint(6, 20), rng.uniform(1, 10), rng.uniform(1, 10), rng.uniform(0, 2),
+            rng.uniform(9, 11), rng.uniform(0, 1),
+            rng.uniform(-50, 50), rng.uniform(-50, 50), rng.uniform(-50, 50), rng.uniform(20, 60),
+            rng.uniform(0, 3),
+            rng.uniform(0, 360), rng.uniform(-90, 90), rng.uniform(-180, 180),
+            rng.randint(5, 100), "discharging", rng.uniform(25, 40),
+            rng.randint(-90, -40), "LTE", "Vivo", rng.randint(-120, -80),
+            "online" if i % 10 else "queued",
+        ))
+    return rows
+
+
+def client_typed_arrays(payload):
+    """Equivalente ao cliente JS: cabeçalho JSON + views tipadas sobre o corpo."""
+    (head_len,) = struct.unpack_from("<I", payload, 4)
+    header = json.loads(payload[8:8 + head_len])
+    body = memoryview(payload)[8 + head_len:]
+    codes = {"float32": "f", "int32": "i", "uint16": "H", "uint32": "I"}
+    views = {}
+    for meta in header["columns"]:
+        arr = array(codes[meta["type"]])
+        arr.frombytes(body[meta["offset"]:meta["offset"] + meta["length"]])
+        views[meta["name"]] = arr
+    return views
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        c0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - c0)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--devices", type=int, default=30)
+    parser.add_argument("--mbps", type=float, default=20.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows, args.devices)
+
+    def encode_json():
+        points = [history_point(row) for row in rows]
+        return json.dumps({"count": len(points), "points": points}).encode("utf-8")
+
+    def encode_ndjson():
+        return "".join(
+            json.dumps(history_point(row), separators=(",", ":")) + "\n" for row in rows
+        ).encode("utf-8")
+
+    formats = {
+        "json": (encode_json, lambda p: json.loads(p)["points"]),
+        "ndjson": (encode_ndjson, lambda p: [json.loads(line) for line in p.splitlines()]),
+        "columnar": (lambda: encode_columnar(HISTORY_SCHEMA, rows), client_typed_arrays),
+    }
+
+    report = {"rows": args.rows, "devices": args.devices, "mbps": args.mbps, "formats": {}}
+    for name, (encode, decode) in formats.items():
+        payload, server_s = timed(encode, args.repeat)
+        _, client_s = timed(lambda: decode(payload), args.repeat)
+        transfer_s = len(payload) * 8 / (args.mbps * 1e6)
+        result = {
+            "bytes": len(payload),
+            "bytes_per_row": round(len(payload) / args.rows, 1),
+            "server_ms": round(server_s * 1000, 1),
+            "client_ms": round(client_s * 1000, 1),
+            "end_to_end_ms": round((server_s + transfer_s + client_s) * 1000, 1),
+        }
+        for encoding in available_encodings():
+            compressed, compress_s = timed(lambda: compress(payload, encoding), args.repeat)
+            _, inflate_s = timed(lambda: decompress(compressed, encoding), args.repeat)
+            wire_s = len(compressed) * 8 / (args.mbps * 1e6)
+            result[f"bytes_{encoding}"] = len(compressed)
+            result[f"compress_{encoding}_ms"] = round(compress_s * 1000, 1)
+            result[f"end_to_end_{encoding}_ms"] = round(
+                (server_s + compress_s + wire_s + inflate_s + client_s) * 1000, 1)
+            if encoding == GZIP:
+                result["end_to_end_cached_gzip_ms"] = round((wire_s + inflate_s + client_s) * 1000, 1)
+        report["formats"][name] = result
+
+    # Sanidade: o pacote colunar reconstrói as mesmas posições (float32)
+    decoded = decode_columnar(encode_columnar(HISTORY_SCHEMA, rows))["columns"]
+    max_err = max(abs(a - r[3]) for a, r in zip(decoded["lat"], rows))
+    report["columnar_max_lat_error_deg"] = max_err
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark: /api/history sem device_id (consulta global) contra o modo
+multi-device (devices=..., orçamento por device, scans em paralelo).
+
+Semeia uma janela no TimescaleDB local: --devices caminhões a 1 Hz e um
+device "falante" a 10 Hz, todos "bench_multi_*" (removidos ao final). Para
+cada modo, executa as mesmas consultas do endpoint pelo ReadPool e mede:
+- latência (p50/p95) de --repeat execuções
+- pontos devolvidos por device: na consulta global o device falante ocupa
+  boa parte do LIMIT e a janela termina cedo para todos
+
+Uso:
+    python -m benchmarks.bench_multi_history [--devices 20] [--minutes 60] [--repeat 10]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from src.history import build_history_query, fetch_device_histories, merge_histories, split_devices
+from src.main import Config, DatabasePool
+from src.read_pool import ReadPool
+
+from ._common import make_record, percentiles
+
+PREFIX = "bench_multi"
+
+
+def seed(db: DatabasePool, devices: int, start: datetime, seconds: int) -> list[str]:
+    ids = [f"{PREFIX}_{d:03d}" for d in range(devices)] + [f"{PREFIX}_chatty"]
+    batch = []
+    for s in range(seconds):
+        ts = start + timedelta(seconds=s)
+        for device in ids[:-1]:
+            batch.append(make_record(device, ts))
+        for k in range(10):
+            batch.append(make_record(ids[-1], ts + timedelta(milliseconds=100 * k)))
+        if len(batch) >= 5000:
+            db.insert_telemetry_batch(batch)
+            batch = []
+    if batch:
+        db.insert_telemetry_batch(batch)
+    conn = db.get_connection()
+    with conn.cursor() as cur:
+        cur.execute("ANALYZE telemetry")
+    conn.commit()
+    return ids
+
+
+def cleanup(db: DatabasePool):
+    conn = db.get_connection()
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM telemetry WHERE device_id LIKE %s", [f"{PREFIX}_%"])
+    conn.commit()
+
+
+async def global_query(pool: ReadPool, start, end, ids, limit):
+    # Mesma consulta do endpoint sem device_id, restrita aos devices do benchmark
+    query, params = build_history_query(start, end, None, limit)
+    query = query.replace("ORDER BY", "AND device_id LIKE %s ORDER BY")
+    params.insert(2, f"{PREFIX}_%")
+
+    def fetch(cursor):
+        cursor.execute(query, params)
+        return cursor.fetchall()
+
+    return await pool.run(fetch)
+
+
+async def multi_query(pool: ReadPool, start, end, ids, per_device_limit, scans):
+    groups = split_devices(ids, min(scans, pool.size))
+    parts = await asyncio.gather(*(
+        pool.run(fetch_device_histories, start, end, group, per_device_limit) for group in groups
+    ))
+    return list(merge_histories(rows for part in parts for rows in part.values()))
+
+
+async def measure(label, fn, repeat):
+    samples, rows = [], []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        rows = await fn()
+        samples.append(time.perf_counter() - t0)
+    per_device = Counter(r[1] for r in rows)
+    last = max((r[0] for r in rows), default=None)
+    return {
+        "mode": label,
+        "rows": len(rows),
+        "chatty_rows": per_device.get(f"{PREFIX}_chatty", 0),
+        "min_rows_per_device": min(per_device.values(), default=0),
+        "last_point": last.isoformat() if last else None,
+        **percentiles(samples),
+    }
+
+
+async def run(args):
+    config = Config()
+    db = DatabasePool(config)
+    db.connect()
+    end = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(hours=2)
+    start = end - timedelta(minutes=args.minutes)
+    ids = seed(db, args.devices, start, args.minutes * 60)
+    pool = ReadPool(config, size=config.read_pool_size, statement_timeout_ms=60000)
+    try:
+        results = [
+            await measure("global", lambda: global_query(pool, start, end, ids, args.limit), args.repeat),
+            await measure(
+                "multi",
+                lambda: multi_query(pool, start, end, ids, args.per_device_limit, config.history_parallel_scans),
+                args.repeat,
+            ),
+        ]
+    finally:
+        pool.close()
+        cleanup(db)
+        db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=20)
+    parser.add_argument("--minutes", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--limit", type=int, default=20000)
+    parser.add_argument("--per-device-limit", type=int, default=1000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Benchmark: /api/playback (replay em fatias com compactação por device).
+
+Emula um turno (padrão 2 h, 100 caminhões a 1 Hz; --hours 12 leva
+minutos) com um cursor nomeado falso que gera as linhas sob demanda, na
+ordem da consulta (time), e percorre o replay inteiro como o endpoint faz
+(rodadas de fetch_slices, sem ritmo). Mede:
+- tempo até o primeiro frame (primeira rodada curta) e do replay inteiro
+  (com tracemalloc ligado, que domina o custo do cursor falso)
+- pico de memória Python (tracemalloc) do replay inteiro, contra o de
+  carregar a janela inteira como /api/history faz hoje
+- bytes do stream contra o JSON de pontos da janela inteira
+
+Não precisa de banco.
+
+Uso:
+    python -m benchmarks.bench_playback [--devices 100] [--hours 2] [--slice 10]
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from src.playback import FIRST_ROUND_SLICES, ROUND_SLICES, fetch_slices, format_playback_frame
+
+
+class FakeCursor:
+    """Cursor nomeado falso: gera (time, device, operator, lat, lon, speed) a 1 Hz sob demanda."""
+
+    itersize = 0
+
+    def __init__(self, devices):
+        self.devices = devices
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, query, params):
+        start, end = params[0], params[1]
+        self._rows = self._generate(start, end)
+
+    def _generate(self, start, end):
+        t = start
+        while t < end:
+            s = t.timestamp()
+            for d in range(self.devices):
+                yield (t, f"truck_{d:03d}", f"op_{d:03d}", -11.56 + (s % 3600) * 1e-5 + d * 1e-3,
+                       -47.17 + d * 1e-3, 20.0 + (s + d) % 40)
+            t += timedelta(seconds=1)
+
+    def fetchmany(self, n):
+        out = []
+        for row in self._rows:
+            out.append(row)
+            if len(out) == n:
+                break
+        return out
+
+
+def fake_connection(devices):
+    class Conn:
+        def cursor(self, name=None):
+            return FakeCursor(devices)
+
+    @contextmanager
+    def connection():
+        yield Conn()
+
+    return connection
+
+
+def point_json(row):
+    t, device, op, lat, lon, speed = row
+    return json.dumps({"ts": t.isoformat(), "device_id": device, "operator_id": op,
+                       "lat": lat, "lon": lon, "speed_kmh": speed})
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--hours", type=float, default=2)
+    parser.add_argument("--slice", type=int, default=10)
+    args = parser.parse_args()
+
+    start = datetime(2025, 1, 1, 6, tzinfo=timezone.utc)
+    end = start + timedelta(hours=args.hours)
+    connection = fake_connection(args.devices)
+
+    tracemalloc.start()
+    c0 = time.perf_counter()
+    first = fetch_slices(connection, start, args.slice, FIRST_ROUND_SLICES, end, None)
+    first_frame_ms = (time.perf_counter() - c0) * 1000
+    frames, stream_bytes, t = 0, 0, start
+    batch = first
+    while batch:
+        for item in batch:
+            stream_bytes += len(format_playback_frame(item))
+            frames += 1
+        t = batch[-1].end
+        batch = fetch_slices(connection, t, args.slice, ROUND_SLICES, end, None) if t < end else []
+    playback_s = time.perf_counter() - c0
+    _, playback_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Referência: janela inteira em memória e serializada de uma vez
+    tracemalloc.start()
+    cur = FakeCursor(args.devices)
+    cur.execute(None, [start, end])
+    rows = list(cur._rows)
+    window_json = sum(len(point_json(r)) + 1 for r in rows)
+    _, window_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(json.dumps({
+        "devices": args.devices,
+        "hours": args.hours,
+        "slice_seconds": args.slice,
+        "rows": len(rows),
+        "frames": frames,
+        "first_frame_ms": round(first_frame_ms, 1),
+        "full_replay_s": round(playback_s, 1),
+        "playback_peak_mb": round(playback_peak / 1e6, 1),
+        "whole_window_peak_mb": round(window_peak / 1e6, 1),
+        "stream_mb": round(stream_bytes / 1e6, 1),
+        "whole_window_json_mb": round(window_json / 1e6, 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Benchmark: simplificação de trajetórias de /api/history (max_points / zoom).
+
+Gera trajetórias sintéticas a 1 Hz no formato de HISTORY_COLUMNS
+(caminhões em ciclo: estrada com curvas, paradas de carga/descarga,
+ruído de GPS ~0,7 m em movimento e ~2 m parado) e mede, para cada orçamento:
+- redução de pontos (raw / simplificado)
+- desvio máximo e p99 dos pontos brutos em movimento para a polilinha
+  simplificada (metros e pixels no zoom 16); a oscilação parada é
+  descartada de propósito
+- paradas preservadas (duração do maior intervalo parado)
+- CPU da simplificação
+
+Não precisa de banco.
+
+Uso:
+    python -m benchmarks.bench_simplify [--devices 4] [--points 20000]
+"""
+
+import argparse
+import json
+import math
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from src.simplify import (
+    COL_LAT, COL_LON, M_PER_DEG_LAT, M_PER_DEG_LON, simplify_rows, zoom_tolerance_m,
+)
+
+ORIGIN = (-11.56, -47.17)
+
+
+def make_track(device_id, n, rng):
+    """Ciclo carga -> estrada com curvas -> descarga -> volta, a 1 Hz."""
+    t0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    lat, lon = ORIGIN[0] + rng.uniform(-0.01, 0.01), ORIGIN[1] + rng.uniform(-0.01, 0.01)
+    heading = rng.uniform(0, 2 * math.pi)
+    rows, i = [], 0
+    while i < n:
+        # Parada (carga/descarga): 2-6 minutos com oscilação do GPS
+        for _ in range(rng.randint(120, 360)):
+            if i >= n:
+                break
+            jitter_lat = rng.gauss(0, 2) / M_PER_DEG_LAT
+            jitter_lon = rng.gauss(0, 2) / M_PER_DEG_LON
+            rows.append((t0 + timedelta(seconds=i), device_id, None,
+                         lat + jitter_lat, lon + jitter_lon, rng.uniform(0, 0.8)))
+            i += 1
+        # Trecho em movimento: retas e curvas suaves a 20-40 km/h
+        for _ in range(rng.randint(600, 1500)):
+            if i >= n:
+                break
+            if rng.random() < 0.01:
+                turn_rate = rng.uniform(-0.05, 0.05)
+            else:
+                turn_rate = 0.0 if rng.random() < 0.7 else rng.uniform(-0.01, 0.01)
+            heading += turn_rate
+            speed_kmh = rng.uniform(20, 40)
+            step = speed_kmh / 3.6
+            lat += step * math.cos(heading) / M_PER_DEG_LAT
+            lon += step * math.sin(heading) / (M_PER_DEG_LON * math.cos(math.radians(lat)))
+            rows.append((t0 + timedelta(seconds=i), device_id, None,
+                         lat + rng.gauss(0, 0.7) / M_PER_DEG_LAT,
+                         lon + rng.gauss(0, 0.7) / M_PER_DEG_LON, speed_kmh))
+            i += 1
+    return rows
+
+
+def deviations_m(raw, simplified):
+    """Distância de cada ponto bruto ao segmento simplificado que cobre seu instante."""
+    kx = M_PER_DEG_LON * math.cos(math.radians(raw[0][COL_LAT]))
+    proj = lambda r: (r[COL_LON] * kx, r[COL_LAT] * M_PER_DEG_LAT)
+    out, s = [], 0
+    for r in raw:
+        while s + 1 < len(simplified) - 1 and simplified[s + 1][0] <= r[0]:
+            s += 1
+        (x0, y0), (x1, y1), (px, py) = proj(simplified[s]), proj(simplified[s + 1]), proj(r)
+        dx, dy = x1 - x0, y1 - y0
+        norm2 = dx * dx + dy * dy
+        t = 0.0 if norm2 == 0 else max(0.0, min(1.0, ((px - x0) * dx + (py - y0) * dy) / norm2))
+        if r[5] is None or r[5] > 1.0:
+            out.append(math.hypot(px - x0 - t * dx, py - y0 - t * dy))
+    return out
+
+
+def longest_stop_seconds(rows):
+    best = run_start = None
+    for r in rows:
+        if r[5] is not None and r[5] <= 1.0:
+            run_start = run_start or r[0]
+            span = (r[0] - run_start).total_seconds()
+            best = span if best is None else max(best, span)
+        else:
+            run_start = None
+    return best or 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=4)
+    parser.add_argument("--points", type=int, default=20000, help="pontos brutos por device")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    tracks = {f"truck_{d:02d}": make_track(f"truck_{d:02d}", args.points, rng) for d in range(args.devices)}
+    raw = sorted((r for t in tracks.values() for r in t), key=lambda r: r[0])
+    px16 = zoom_tolerance_m(16, ORIGIN[0], pixels=1.0)
+
+    report = {"devices": args.devices, "raw_points": len(raw), "meters_per_px_z16": round(px16, 2), "runs": []}
+    for label, kwargs in [
+        ("zoom=17", {"zoom": 17}),
+        ("zoom=16", {"zoom": 16}),
+        ("zoom=15", {"zoom": 15}),
+        ("max_points=2000", {"max_points": 2000}),
+        ("max_points=800", {"max_points": 800}),
+    ]:
+        c0 = time.process_time()
+        simplified = simplify_rows(raw, **kwargs)
+        cpu = time.process_time() - c0
+
+        devs, stop_raw, stop_simplified = [], [], []
+        for device_id, track in tracks.items():
+            mine = [r for r in simplified if r[1] == device_id]
+            devs.extend(deviations_m(track, mine))
+            stop_raw.append(longest_stop_seconds(track))
+            stop_simplified.append(longest_stop_seconds(mine))
+        devs.sort()
+        report["runs"].append({
+            "params": label,
+            "points": len(simplified),
+            "reduction": round(len(raw) / len(simplified), 1),
+            "max_dev_m": round(devs[-1], 2),
+            "p99_dev_m": round(devs[int(len(devs) * 0.99)], 2),
+            "max_dev_px_z16": round(devs[-1] / px16, 2),
+            "longest_stop_s": {"raw": max(stop_raw), "simplified": max(stop_simplified)},
+            "cpu_ms": round(cpu * 1000, 1),
+        })
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
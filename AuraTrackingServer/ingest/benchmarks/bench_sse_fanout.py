@@ -0,0 +1,106 @@
+"""
+Benchmark: custo do fan-out SSE com N clientes simulados.
+
+Compara, no mesmo event loop:
+- legacy: cada cliente recebe o dict completo e faz json.dumps do próprio
+  sse_data (N serializações por evento, heartbeat via wait_for por cliente)
+- shared: TelemetryBroadcaster serializa o payload uma vez e distribui os
+  mesmos bytes (um tick por evento, mailbox sem intervalo); heartbeat vem
+  do ticker compartilhado
+
+Não precisa de banco nem MQTT.
+
+Uso:
+    python -m benchmarks.bench_sse_fanout [--clients 500] [--events 2000]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+
+from src.broadcaster import TelemetryBroadcaster, format_fleet_frame
+
+from ._common import make_record
+
+
+async def _legacy_client(queue: asyncio.Queue, counters: dict):
+    while True:
+        try:
+            payload = await asyncio.wait_for(queue.get(), timeout=15.0)
+            sse_data = {
+                "id": payload.get("device_id"),
+                "ts": payload.get("time").timestamp() if payload.get("time") else time.time(),
+                "lat": payload.get("latitude"),
+                "lon": payload.get("longitude"),
+                "st": "online"
+            }
+            chunk = f"event: device-update\ndata: {json.dumps(sse_data)}\n\n".encode()
+        except asyncio.TimeoutError:
+            chunk = f"event: heartbeat\ndata: {time.time()}\n\n".encode()
+        counters["bytes"] += len(chunk)
+        counters["frames"] += 1
+
+
+async def _shared_client(mailbox, counters: dict):
+    while True:
+        items = await mailbox.next_batch()
+        counters["bytes"] += len(format_fleet_frame(items))
+        counters["frames"] += len(items)
+
+
+async def _run(mode: str, clients: int, events: int, records: list) -> dict:
+    broadcaster = TelemetryBroadcaster()
+    counters = {"bytes": 0, "frames": 0}
+
+    if mode == "shared":
+        broadcaster.set_loop(asyncio.get_running_loop())
+        queues = [await broadcaster.subscribe(interval_seconds=0) for _ in range(clients)]
+        client = _shared_client
+    else:
+        queues = [asyncio.Queue(maxsize=100) for _ in range(clients)]
+        client = _legacy_client
+    tasks = [asyncio.create_task(client(q, counters)) for q in queues]
+
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    for n, record in enumerate(records[:events], start=1):
+        if mode == "shared":
+            broadcaster.publish(record["device_id"], record)
+            broadcaster._tick()
+        else:
+            for q in queues:
+                q.put_nowait(record)
+        # Passo a passo: espera todos os clientes drenarem o evento
+        while counters["frames"] < clients * n:
+            await asyncio.sleep(0)
+    wall, cpu = time.perf_counter() - wall0, time.process_time() - cpu0
+
+    for t in tasks:
+        t.cancel()
+    await broadcaster.close()
+    return {
+        "mode": mode,
+        "clients": clients,
+        "events": events,
+        "wall_s": round(wall, 3),
+        "cpu_s": round(cpu, 3),
+        "cpu_us_per_event": round(cpu / events * 1e6, 1),
+        "bytes": counters["bytes"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--events", type=int, default=2000)
+    args = parser.parse_args()
+
+    now = datetime.now(timezone.utc)
+    records = [make_record(f"bench_{i % 100:03d}", now) for i in range(args.events)]
+    results = [asyncio.run(_run(mode, args.clients, args.events, records)) for mode in ("legacy", "shared")]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark: CPU por atualização com subscribers filtrados.
+
+Cada subscriber acompanha poucos caminhões (devices=...) ou um bbox pequeno
+na mina. Com o índice (device / operador / grade espacial) só os
+interessados são visitados: o custo por frame entregue e os frames por
+cliente ficam estáveis ao aumentar o número de subscribers; o custo por
+atualização cresce apenas com a quantidade de interessados.
+
+Não precisa de banco nem MQTT.
+
+Uso:
+    python -m benchmarks.bench_subscription_filters [--updates 20000]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timezone
+
+from src.broadcaster import TelemetryBroadcaster
+from src.subscriptions import SubscriptionFilter
+
+from ._common import BASE_LAT, BASE_LON, make_record
+
+FLEET = 200
+
+
+async def _run(subscribers: int, updates: int) -> dict:
+    rng = random.Random(subscribers)
+    broadcaster = TelemetryBroadcaster()
+    broadcaster.set_loop(asyncio.get_running_loop())
+
+    mailboxes = []
+    for i in range(subscribers):
+        if i % 2:
+            devices = ",".join(f"bench_{rng.randrange(FLEET):03d}" for _ in range(3))
+            flt = SubscriptionFilter.from_params(devices=devices)
+        else:
+            lat = BASE_LAT + rng.uniform(-0.02, 0.02)
+            lon = BASE_LON + rng.uniform(-0.02, 0.02)
+            flt = SubscriptionFilter.from_params(bbox=f"{lon - 0.002},{lat - 0.002},{lon + 0.002},{lat + 0.002}")
+        mailboxes.append(await broadcaster.subscribe(flt))
+
+    now = datetime.now(timezone.utc)
+    records = [make_record(f"bench_{rng.randrange(FLEET):03d}", now, rng=rng) for _ in range(updates)]
+
+    cpu0 = time.process_time()
+    for record in records:
+        broadcaster._broadcast_to_subscribers(record)
+    cpu = time.process_time() - cpu0
+
+    delivered = sum(m.delivered + len(m) + m.coalesced for m in mailboxes)
+    await broadcaster.close()
+    return {
+        "subscribers": subscribers,
+        "cpu_us_per_update": round(cpu / updates * 1e6, 2),
+        # Custo por frame entregue: o que deve ficar constante
+        "cpu_us_per_delivery": round(cpu / max(delivered, 1) * 1e6, 2),
+        "frames_per_subscriber_per_1k_updates": round(delivered / subscribers / updates * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=20000)
+    args = parser.parse_args()
+    results = [asyncio.run(_run(n, args.updates)) for n in (10, 100, 1000, 5000)]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Benchmark: /tiles/{z}/{x}/{y} (histórico como Mapbox Vector Tiles).
+
+Gera trajetórias sintéticas a 1 Hz (as mesmas de bench_simplify), emula
+o filtro de bbox e a camada de resolução que o endpoint escolhe por zoom
+(buckets médios como os continuous aggregates) e mede, por zoom:
+- tiles com dados, bytes por tile (MVT) contra os pontos do mesmo tile em
+  json de /api/history
+- CPU de render_tile por tile
+- conferência: cada tile decodifica (decodificador mínimo abaixo), as
+  linhas ficam dentro do tile + BUFFER, os pontos dentro do tile, e as
+  propriedades voltam intactas
+
+Não precisa de banco.
+
+Uso:
+    python -m benchmarks.bench_tiles [--devices 6] [--points 21600] [--tiles 40]
+"""
+
+import argparse
+import json
+import math
+import random
+import struct
+import time
+from datetime import datetime, timezone
+
+from benchmarks.bench_simplify import make_track
+from src.mvt import EXTENT
+from src.simplify import COL_DEVICE, COL_LAT, COL_LON, COL_SPEED, COL_TIME
+from src.tiles import BUFFER, render_tile, tile_bounds, tile_tier
+
+ZOOMS = [6, 10, 13, 16]
+
+
+def _read_varint(buf, pos):
+    value = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        value |= (b & 0x7F) << shift
+        if b < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _fields(buf):
+    """(campo, valor) de uma mensagem protobuf (varint, fixed64 e length-delimited)."""
+    pos = 0
+    while pos < len(buf):
+        key, pos = _read_varint(buf, pos)
+        field, wire = key >> 3, key & 7
+        if wire == 0:
+            value, pos = _read_varint(buf, pos)
+        elif wire == 1:
+            value, pos = struct.unpack("<d", buf[pos:pos + 8])[0], pos + 8
+        elif wire == 2:
+            size, pos = _read_varint(buf, pos)
+            value, pos = buf[pos:pos + size], pos + size
+        else:
+            raise ValueError(f"wire type {wire}")
+        yield field, value
+
+
+def _packed(buf):
+    pos, out = 0, []
+    while pos < len(buf):
+        v, pos = _read_varint(buf, pos)
+        out.append(v)
+    return out
+
+
+def _unzigzag(v):
+    return (v >> 1) ^ -(v & 1)
+
+
+def decode_tile(data):
+    """Tile MVT -> {camada: [(tipo, [[(x, y), ...], ...], props)]}."""
+    layers = {}
+    for field, layer_buf in _fields(data):
+        assert field == 3
+        name, features, keys, values = None, [], [], []
+        for f, v in _fields(layer_buf):
+            if f == 1:
+                name = v.decode()
+            elif f == 2:
+                features.append(v)
+            elif f == 3:
+                keys.append(v.decode())
+            elif f == 4:
+                (vf, vv), = _fields(v)
+                values.append(vv.decode() if vf == 1 else _unzigzag(vv) if vf == 6 else bool(vv) if vf == 7 else vv)
+        decoded = []
+        for feature in features:
+            geom_type, tags, geometry = None, [], []
+            for f, v in _fields(feature):
+                if f == 2:
+                    tags = _packed(v)
+                elif f == 3:
+                    geom_type = v
+                elif f == 4:
+                    geometry = _packed(v)
+            parts, x, y, i = [], 0, 0, 0
+            while i < len(geometry):
+                cmd, count = geometry[i] & 7, geometry[i] >> 3
+                i += 1
+                for _ in range(count):
+                    x += _unzigzag(geometry[i])
+                    y += _unzigzag(geometry[i + 1])
+                    i += 2
+                    if cmd == 1:
+                        parts.append([])
+                    parts[-1].append((x, y))
+            props = {keys[tags[k]]: values[tags[k + 1]] for k in range(0, len(tags), 2)}
+            decoded.append((geom_type, parts, props))
+        layers[name] = decoded
+    return layers
+
+
+def tile_of(lat, lon, z):
+    n = 2 ** z
+    s = math.sin(math.radians(lat))
+    return int((lon + 180.0) / 360.0 * n), int((0.5 - math.log((1 + s) / (1 - s)) / (4 * math.pi)) * n)
+
+
+def bucketed(rows, seconds):
+    """Médias por (device, bucket), como os continuous aggregates (sample_count na coluna 2)."""
+    if not seconds:
+        return rows
+    out, acc = [], {}
+    for r in rows:
+        b = int(r[COL_TIME].timestamp()) // seconds * seconds
+        a = acc.setdefault((r[COL_DEVICE], b), [0, 0.0, 0.0, 0.0])
+        a[0] += 1
+        a[1] += r[COL_LAT]
+        a[2] += r[COL_LON]
+        a[3] += r[COL_SPEED] or 0.0
+    for (device, b), (n, la, lo, sp) in sorted(acc.items()):
+        out.append((datetime.fromtimestamp(b, timezone.utc), device, n, la / n, lo / n, sp / n))
+    return out
+
+
+def in_bbox(rows, bounds):
+    """Mesmo filtro de build_tile_query (bbox com margem de BUFFER), em ordem (device, time)."""
+    west, south, east, north = bounds
+    pad_lon, pad_lat = (east - west) * BUFFER / EXTENT, (north - south) * BUFFER / EXTENT
+    return [r for r in rows
+            if south - pad_lat <= r[COL_LAT] <= north + pad_lat and west - pad_lon <= r[COL_LON] <= east + pad_lon]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=6)
+    parser.add_argument("--points", type=int, default=21600, help="pontos por device (21600 = 6 h a 1 Hz)")
+    parser.add_argument("--tiles", type=int, default=40, help="tiles mais cheios medidos por zoom")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    raw = [r for d in range(args.devices) for r in make_track(f"truck_{d:02d}", args.points, rng)]
+    lat0 = sum(r[COL_LAT] for r in raw) / len(raw)
+
+    report = {"devices": args.devices, "points": len(raw), "zooms": []}
+    for z in ZOOMS:
+        tier = tile_tier(z, lat0)
+        rows = bucketed(raw, tier.seconds)
+        counts = {}
+        for r in rows:
+            key = tile_of(r[COL_LAT], r[COL_LON], z)
+            counts[key] = counts.get(key, 0) + 1
+        busiest = sorted(counts, key=counts.get, reverse=True)[:args.tiles]
+
+        tile_bytes = json_bytes = features = 0
+        cpu = 0.0
+        for x, y in busiest:
+            bounds = tile_bounds(z, x, y)
+            tile_rows = in_bbox(rows, bounds)
+            c0 = time.process_time()
+            body = render_tile(tile_rows, z, x, y, tier)
+            cpu += time.process_time() - c0
+            tile_bytes += len(body)
+            json_bytes += len(json.dumps([
+                {"ts": r[COL_TIME].isoformat(), "device_id": r[COL_DEVICE], "lat": r[COL_LAT],
+                 "lon": r[COL_LON], "speed_kmh": r[COL_SPEED]}
+                for r in tile_rows
+            ]).encode())
+
+            layers = decode_tile(body)
+            for geom_type, parts, props in layers.get("tracks", []):
+                assert geom_type == 2 and props["resolution"] == tier.name
+                assert props["device_id"].startswith("truck_") and props["start"] <= props["end"]
+                for part in parts:
+                    assert len(part) >= 2
+                    assert all(-BUFFER <= px <= EXTENT + BUFFER and -BUFFER <= py <= EXTENT + BUFFER
+                               for px, py in part), "linha fora do tile + buffer"
+            for geom_type, parts, props in layers.get("points", []):
+                (px, py), = parts[0]
+                assert geom_type == 1 and 0 <= px < EXTENT and 0 <= py < EXTENT, "ponto fora do tile"
+                assert "time" in props
+            features += sum(len(v) for v in layers.values())
+
+        n = max(len(busiest), 1)
+        report["zooms"].append({
+            "z": z,
+            "resolution": tier.name,
+            "tiles_with_data": len(counts),
+            "tiles_measured": len(busiest),
+            "features_per_tile": round(features / n, 1),
+            "mvt_bytes_per_tile": round(tile_bytes / n),
+            "points_json_bytes_per_tile": round(json_bytes / n),
+            "reduction": round(json_bytes / max(tile_bytes, 1), 1),
+            "render_ms_per_tile": round(cpu * 1000 / n, 2),
+        })
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
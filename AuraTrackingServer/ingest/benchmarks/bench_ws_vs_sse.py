@@ -0,0 +1,124 @@
+"""
+Benchmark: bytes por atualização e CPU do feed binário (WebSocket) vs SSE.
+
+Simula uma frota a 1 Hz com trajetórias contínuas (random walk) e N
+clientes sem filtro:
+- sse: a cada tick do cliente, um frame JSON "fleet-update" com todas as
+  atualizações pendentes (fragmentos compartilhados, só concatenados)
+- ws: a cada tick do cliente, um frame binário com todas as atualizações
+  pendentes (FleetFrameEncoder por cliente: dicionário + deltas)
+
+Mede os bytes que sairiam pelo socket e a CPU de publish + montagem dos
+frames. Não precisa de banco, MQTT nem rede.
+
+Uso:
+    python -m benchmarks.bench_ws_vs_sse [--devices 200] [--clients 50] \\
+        [--seconds 60] [--tick 1.0]
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from src.broadcaster import TelemetryBroadcaster, format_fleet_frame
+from src.ws_codec import FleetFrameDecoder, FleetFrameEncoder
+
+from ._common import BASE_LAT, BASE_LON, make_record
+
+
+def _walk(devices: int, seconds: int, seed: int = 42) -> list:
+    """Registros por segundo: cada device anda até ~15 m/s em rumo variável."""
+    rng = random.Random(seed)
+    start = datetime.now(timezone.utc)
+    pos = [[BASE_LAT + rng.uniform(-0.02, 0.02), BASE_LON + rng.uniform(-0.02, 0.02),
+            rng.uniform(0, 2 * math.pi)] for _ in range(devices)]
+    per_second = []
+    for s in range(seconds):
+        ts = start + timedelta(seconds=s)
+        batch = []
+        for d in range(devices):
+            record = make_record(f"bench_{d:03d}", ts, rng=rng)
+            p = pos[d]
+            p[2] += rng.uniform(-0.3, 0.3)
+            step = record["speed"] / 111_000
+            p[0] += step * math.cos(p[2])
+            p[1] += step * math.sin(p[2])
+            record["latitude"], record["longitude"] = p[0], p[1]
+            batch.append(record)
+        per_second.append(batch)
+    return per_second
+
+
+async def _run(mode: str, clients: int, per_second: list, tick: float) -> dict:
+    broadcaster = TelemetryBroadcaster()
+    binary = mode == "ws"
+    mailboxes = [await broadcaster.subscribe(binary=binary) for _ in range(clients)]
+    encoders = [FleetFrameEncoder() for _ in range(clients)]
+
+    updates = sum(len(b) for b in per_second)
+    out_bytes = frames = 0
+    next_tick = tick
+    cpu0 = time.process_time()
+    for s, batch in enumerate(per_second, start=1):
+        for record in batch:
+            broadcaster._broadcast_to_subscribers(record)
+        if s < next_tick and s != len(per_second):
+            continue
+        next_tick += tick
+        for i, mailbox in enumerate(mailboxes):
+            items = mailbox.drain()
+            if binary:
+                if items:
+                    frame = encoders[i].encode(items)
+                    out_bytes += len(frame)
+                    frames += 1
+            elif items:
+                out_bytes += len(format_fleet_frame(items))
+                frames += 1
+    cpu = time.process_time() - cpu0
+
+    return {
+        "mode": mode,
+        "clients": clients,
+        "updates_published": updates,
+        "frames_sent": frames,
+        "bytes": out_bytes,
+        "bytes_per_update": round(out_bytes / (updates * clients), 2),
+        "cpu_s": round(cpu, 3),
+        "cpu_us_per_update": round(cpu / updates * 1e6, 1),
+    }
+
+
+def _check_roundtrip(per_second: list):
+    """Garante que o decoder reconstrói as posições com erro <= 1e-6 grau."""
+    encoder, decoder = FleetFrameEncoder(), FleetFrameDecoder()
+    for batch in per_second[:5]:
+        payloads = [dict(id=r["device_id"], ts=r["time"].timestamp(), lat=r["latitude"],
+                         lon=r["longitude"], sp=round(r["speed"] * 3.6, 1), st="online")
+                    for r in batch]
+        decoded = decoder.decode(encoder.encode(payloads))
+        for p, d in zip(payloads, decoded):
+            assert d["id"] == p["id"]
+            assert abs(d["lat"] - p["lat"]) <= 1e-6 and abs(d["lon"] - p["lon"]) <= 1e-6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--seconds", type=int, default=60)
+    parser.add_argument("--tick", type=float, default=1.0, help="intervalo de tick dos clientes (s)")
+    args = parser.parse_args()
+
+    per_second = _walk(args.devices, args.seconds)
+    _check_roundtrip(per_second)
+    results = [asyncio.run(_run(mode, args.clients, per_second, args.tick)) for mode in ("sse", "ws")]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+AuraTracking API - Processos de API separados do ingest
+
+Serve a mesma API REST/SSE/WebSocket de src.main em N processos uvicorn,
+sem MQTT: o estado ao vivo chega do ingest pelo fan-out local
+(FANOUT_SOCKET, ver src/fanout.py) e o histórico vem do TimescaleDB.
+
+Uso:
+    FANOUT_SOCKET=/app/run/fanout.sock API_WORKERS=4 python -m src.api
+"""
+
+import os
+import shutil
+import tempfile
+import time
+from typing import Any, Dict
+
+import structlog
+import uvicorn
+from fastapi import FastAPI
+
+from .broadcaster import TelemetryBroadcaster
+from .fanout import FanoutSubscriber
+from .fleet_state import FleetState
+from .main import Config, DatabasePool, create_health_app, create_instrumentation, create_response_cache
+from .read_pool import ReadPool
+
+logger = structlog.get_logger("api")
+
+
+class ApiWorker:
+    """
+    Substituto do IngestWorker para create_health_app num processo de API.
+
+    Expõe os mesmos atributos usados pelos endpoints (config, db, read_pool, response_cache,
+    instrumentation, broadcaster, fleet_state, mqtt_connected, get_stats); "mqtt_connected"
+    indica a conexão com o fan-out do ingest.
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.db = DatabasePool(config)
+        self.instrumentation = create_instrumentation(config)
+        self.read_pool = ReadPool(
+            config,
+            size=config.read_pool_size,
+            statement_timeout_ms=config.read_statement_timeout_ms,
+            wait_seconds=config.read_pool_wait_seconds,
+            cursor_factory=self.instrumentation.cursor_factory()
+        )
+        self.instrumentation.attach_explain(self.read_pool.connection)
+        self.response_cache = create_response_cache(config)
+        # /api/summary lê summary_1min (os buckets em memória ficam no ingest)
+        self.summary_buckets = None
+        self.fleet_state = FleetState()
+        self.broadcaster = TelemetryBroadcaster(
+            tick_ms=config.broadcast_tick_ms,
+            subscriber_interval_seconds=config.stream_interval_seconds,
+            offline_after_seconds=config.device_offline_seconds
+        )
+        self.fanout = FanoutSubscriber(
+            config.fanout_socket, self.fleet_state, self.broadcaster,
+            response_cache=self.response_cache
+        )
+        self.start_time = time.time()
+
+    @property
+    def mqtt_connected(self) -> bool:
+        return self.fanout.connected
+
+    def get_stats(self) -> Dict[str, Any]:
+        fanout = self.fanout.get_stats()
+        return {
+            "uptime_seconds": time.time() - self.start_time,
+            "mqtt_connected": self.mqtt_connected,
+            "db_connected": self.db.is_connected(),
+            "messages_received": fanout["fanout_rows_received"],
+            "messages_inserted": 0,
+            "offline_queue_size": 0,
+            "tracked_devices": len(self.fleet_state),
+            **self.read_pool.get_stats(),
+            **self.response_cache.get_stats(),
+            **fanout
+        }
+
+
+def create_app() -> FastAPI:
+    """Factory do uvicorn: executada uma vez em cada processo worker."""
+    config = Config()
+    worker = ApiWorker(config)
+    try:
+        worker.db.connect()
+    except Exception as e:
+        # Stream ao vivo funciona sem banco; histórico volta quando reconectar
+        logger.error("database_init_failed", error=str(e))
+    return create_health_app(worker, fanout=worker.fanout)
+
+
+def main():
+    """Função principal."""
+    config = Config()
+    if not config.fanout_socket:
+        raise SystemExit("FANOUT_SOCKET não definido")
+
+    if config.api_workers > 1:
+        # /metrics agrega os workers: cada processo grava em arquivos mmap
+        # neste diretório (limpo a cada subida, valores antigos não somam)
+        metrics_dir = os.environ.setdefault(
+            "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "auratracking-metrics")
+        )
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir, exist_ok=True)
+
+    logger.info("starting_api_server", port=config.api_port, workers=config.api_workers,
+                fanout_socket=config.fanout_socket)
+    uvicorn.run(
+        "src.api:create_app",
+        factory=True,
+        host="0.0.0.0",
+        port=config.api_port,
+        workers=config.api_workers,
+        log_level="warning"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import structlog
+
+from .batching import sort_and_merge
+
+logger = structlog.get_logger("backfill")
+
+
+class BackfillLane:
+    """
+    Lane separada para telemetria atrasada (transmissionMode == "queued").
+
+    Pacotes enfileirados no dispositivo (até 30 dias) mais antigos que o
+    horizonte de compressão caem em chunks já comprimidos. Inserir esses
+    registros misturados ao batch online faz o TimescaleDB descomprimir o
+    chunk a cada página de 100 linhas.
+
+    Funcionalidades:
+    - Agrupa registros pelo chunk de destino (chunk_time_interval da hypertable)
+    - Acumula grupos grandes por chunk e insere cada grupo em um único INSERT
+    - Conexão e thread próprias: não bloqueia o flush do tráfego online;
+      só a thread da lane usa a conexão (inclusive no flush final do stop)
+    - Faixas gravadas são rematerializadas nos continuous aggregates (as
+      políticas de refresh não chegam tão atrás), por chunk e no máximo a
+      cada refresh_seconds; faixa com refresh falho fica para a próxima vez
+    - on_written(device_id, início, fim) depois de cada INSERT de chunk e de
+      cada refresh dos aggregates (invalidação de caches de resposta: o dado
+      só fica visível aqui, não na chegada do pacote)
+    """
+
+    def __init__(
+        self,
+        db: Any,
+        offline_queue: Any,
+        horizon_hours: float = 72,
+        chunk_interval_hours: float = 24,
+        batch_size: int = 5000,
+        timeout_ms: int = 30000,
+        refresh_seconds: float = 60.0,
+        on_written: Optional[Callable[[str, datetime, datetime], None]] = None,
+    ):
+        self.db = db
+        self.offline_queue = offline_queue
+        self.horizon = timedelta(hours=horizon_hours)
+        self.chunk_interval_seconds = chunk_interval_hours * 3600
+        self.batch_size = batch_size
+        self.timeout_seconds = timeout_ms / 1000
+        self.refresh_seconds = refresh_seconds
+        self.on_written = on_written
+
+        # chunk_start -> registros pendentes / instante do primeiro registro
+        self._groups: Dict[datetime, List[dict]] = {}
+        self._group_started: Dict[datetime, float] = {}
+        # chunk_start -> device_id -> (início, fim) gravados ainda sem refresh
+        # dos aggregates (só a thread da lane mexe)
+        self._refresh: Dict[datetime, Dict[str, Tuple[datetime, datetime]]] = {}
+        self._last_refresh = time.monotonic()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {
+            "backfill_received": 0,
+            "backfill_inserted": 0,
+            "backfill_failed": 0,
+            "backfill_chunk_inserts": 0,
+            "backfill_duplicates_merged": 0,
+            "backfill_aggregate_refreshes": 0,
+            "backfill_aggregate_refresh_failed": 0,
+        }
+
+    def accepts(self, record: dict) -> bool:
+        """Indica se o registro pertence à lane de backfill."""
+        if record.get("transmission_mode") != "queued":
+            return False
+        return record["time"] < datetime.now(timezone.utc) - self.horizon
+
+    def chunk_start(self, ts: datetime) -> datetime:
+        """Início do chunk da hypertable que contém o timestamp.
+
+        Chunks do TimescaleDB são alinhados a múltiplos do intervalo desde a época Unix.
+        """
+        epoch = ts.timestamp()
+        start = epoch - (epoch % self.chunk_interval_seconds)
+        return datetime.fromtimestamp(start, tz=timezone.utc)
+
+    def add(self, record: dict):
+        """Adiciona um registro ao grupo do seu chunk (chamado da thread MQTT)."""
+        key = self.chunk_start(record["time"])
+        with self._lock:
+            group = self._groups.setdefault(key, [])
+            if not group:
+                self._group_started[key] = time.time()
+            group.append(record)
+            self._stats["backfill_received"] += 1
+            full = len(group) >= self.batch_size
+
+        if full:
+            self._wakeup.set()
+
+    def _take_ready_groups(self, force: bool = False) -> List[tuple]:
+        """Remove e retorna os grupos prontos para inserção."""
+        now = time.time()
+        ready = []
+        with self._lock:
+            for key in list(self._groups):
+                group = self._groups[key]
+                aged = (now - self._group_started[key]) >= self.timeout_seconds
+                if force or aged or len(group) >= self.batch_size:
+                    ready.append((key, group))
+                    del self._groups[key]
+                    del self._group_started[key]
+        return ready
+
+    def flush(self, force: bool = False):
+        """Insere os grupos prontos, um INSERT por chunk, e atualiza os aggregates se for a hora."""
+        for key, originals in self._take_ready_groups(force):
+            group, merged = sort_and_merge(originals)
+            self._stats["backfill_duplicates_merged"] += merged
+            try:
+                inserted = self.db.insert_telemetry_chunk(group)
+                self._stats["backfill_inserted"] += inserted
+                self._stats["backfill_chunk_inserts"] += 1
+                logger.info("backfill_chunk_flushed", chunk=key.isoformat(), count=len(group))
+                spans = self._device_spans(group)
+                self._notify(spans)
+                self._queue_refresh(key, spans)
+            except Exception as e:
+                # Mesmo fallback do batch online: fila offline com o payload original.
+                # Na reprodução da fila (_process_offline_queue) os registros
+                # voltam para esta lane (accepts), não para o batch online.
+                # Registros originais: o raw_payload de um fundido não tem os
+                # campos que vieram das duplicatas
+                for record in originals:
+                    self.offline_queue.enqueue(
+                        record.get("topic", "unknown"),
+                        record.get("raw_payload", "{}"),
+                        time.time()
+                    )
+                self._stats["backfill_failed"] += len(originals)
+                logger.warning("backfill_chunk_queued_offline", chunk=key.isoformat(),
+                               count=len(group), error=str(e))
+
+        if self._refresh and (force or time.monotonic() - self._last_refresh >= self.refresh_seconds):
+            self._refresh_aggregates()
+
+    @staticmethod
+    def _device_spans(group: List[dict]) -> Dict[str, Tuple[datetime, datetime]]:
+        """Faixa gravada por device (grupo já em ordem (device_id, time))."""
+        spans: Dict[str, Tuple[datetime, datetime]] = {}
+        for record in group:
+            span = spans.get(record["device_id"])
+            spans[record["device_id"]] = (span[0] if span else record["time"], record["time"])
+        return spans
+
+    def _notify(self, spans: Dict[str, Tuple[datetime, datetime]]):
+        if self.on_written is None:
+            return
+        for device_id, (start, end) in spans.items():
+            try:
+                self.on_written(device_id, start, end)
+            except Exception as e:
+                logger.error("backfill_on_written_error", device_id=device_id, error=str(e))
+
+    def _queue_refresh(self, key: datetime, spans: Dict[str, Tuple[datetime, datetime]]):
+        pending = self._refresh.setdefault(key, {})
+        for device_id, (start, end) in spans.items():
+            span = pending.get(device_id)
+            pending[device_id] = (min(start, span[0]), max(end, span[1])) if span else (start, end)
+
+    def _refresh_aggregates(self):
+        """Um refresh por chunk com a faixa acumulada desde o último."""
+        self._last_refresh = time.monotonic()
+        pending, self._refresh = self._refresh, {}
+        for key, spans in sorted(pending.items()):
+            start = min(s for s, _ in spans.values())
+            end = max(e for _, e in spans.values())
+            try:
+                self.db.refresh_continuous_aggregates(start, end)
+                self._stats["backfill_aggregate_refreshes"] += 1
+            except Exception as e:
+                self._queue_refresh(key, spans)
+                self._stats["backfill_aggregate_refresh_failed"] += 1
+                logger.warning("backfill_refresh_failed", chunk=key.isoformat(), error=str(e))
+                continue
+            # Camadas agregadas mudaram só agora para esses devices
+            self._notify(spans)
+
+    def start(self):
+        """Inicia a thread da lane."""
+        self._running = True
+        self._thread = threading.Thread(target=self.run, daemon=True, name="backfill-lane")
+        self._thread.start()
+
+    def run(self):
+        """Loop da lane; ao sair insere o que estiver pendente (na mesma thread da conexão)."""
+        self._running = True
+        while self._running:
+            self._wakeup.wait(timeout=1.0)
+            self._wakeup.clear()
+            if not self._running:
+                break
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("backfill_loop_error", error=str(e))
+                time.sleep(5)
+        try:
+            self.flush(force=True)
+        except Exception as e:
+            logger.error("backfill_final_flush_error", error=str(e))
+
+    def stop(self, timeout: float = 30.0):
+        """Para o loop e espera o flush final da thread da lane."""
+        self._running = False
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                logger.warning("backfill_stop_timeout", timeout=timeout)
+            self._thread = None
+        else:
+            # Lane sem thread (ex.: benchmarks): o chamador é o único usuário da conexão
+            self.flush(force=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = sum(len(g) for g in self._groups.values())
+            chunks = len(self._groups)
+        return {
+            **self._stats,
+            "backfill_pending": pending,
+            "backfill_pending_chunks": chunks,
+            "backfill_pending_refreshes": len(self._refresh),
+        }
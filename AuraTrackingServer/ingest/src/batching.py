@@ -0,0 +1,40 @@
+from typing import List, Tuple
+
+
+def sort_and_merge(records: List[dict]) -> Tuple[List[dict], int]:
+    """
+    Ordena um batch por (device_id, time) e funde duplicatas exatas.
+
+    O buffer chega em ordem de chegada: dispositivos intercalados e, para
+    dados queued, tempos fora de ordem. Ordenar agrupa as escritas nas
+    mesmas páginas dos índices (device_id, time DESC) e (time, device_id).
+
+    Registros com a mesma chave de conflito (time, device_id) viram um só:
+    o primeiro recebido prevalece e campos nulos são completados pelos
+    seguintes. Assim uma linha do batch nunca conflita com outra do mesmo batch.
+
+    Returns:
+        (registros ordenados e únicos, quantidade de duplicatas fundidas)
+    """
+    merged: dict = {}
+    copied: set = set()
+
+    for record in records:
+        key = (record["device_id"], record["time"])
+        current = merged.get(key)
+        if current is None:
+            merged[key] = record
+            continue
+
+        missing = [c for c, v in record.items() if v is not None and current.get(c) is None]
+        if missing:
+            # Copia uma vez antes de alterar, para não mexer no registro original
+            if key not in copied:
+                current = dict(current)
+                merged[key] = current
+                copied.add(key)
+            for column in missing:
+                current[column] = record[column]
+
+    ordered = [merged[key] for key in sorted(merged)]
+    return ordered, len(records) - len(ordered)
@@ -0,0 +1,182 @@
+import math
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .columnar import FLOAT, INT
+from .simplify import M_PER_DEG_LAT, M_PER_DEG_LON
+
+CELL_TYPES = ("hex", "grid")
+MIN_CELL_M = 1.0
+MAX_CELL_M = 10_000.0
+
+_SQRT3 = math.sqrt(3.0)
+
+BIN_COLUMNS = ["lat", "lon", "count", "dwell_s", "mean_speed_kmh", "devices", "i", "j"]
+BIN_SCHEMA: List[Tuple[str, str]] = [
+    ("lat", FLOAT), ("lon", FLOAT), ("count", INT), ("dwell_s", FLOAT),
+    ("mean_speed_kmh", FLOAT), ("devices", INT), ("i", INT), ("j", INT),
+]
+
+
+class BinPoints(NamedTuple):
+    """Pontos da janela em arrays, ordenados por (device, time)."""
+    t: np.ndarray        # epoch em segundos (float64)
+    device: np.ndarray   # código do device (int32), índice em device_ids
+    lat: np.ndarray
+    lon: np.ndarray
+    speed: np.ndarray    # km/h, NaN quando ausente
+    device_ids: List[str]
+
+
+def build_bins_query(start: datetime, end: datetime,
+                     device_ids: Optional[Sequence[str]]) -> Tuple[str, List[Any]]:
+    """Pontos com posição da janela, em ordem (device_id, time) para o tempo de permanência."""
+    query = """
+        SELECT EXTRACT(EPOCH FROM time)::float8, device_id, latitude, longitude, speed_kmh
+        FROM telemetry
+        WHERE time >= %s AND time <= %s
+          AND latitude IS NOT NULL AND longitude IS NOT NULL
+    """
+    params: List[Any] = [start, end]
+    if device_ids:
+        query += " AND device_id = ANY(%s)"
+        params.append(list(device_ids))
+    query += " ORDER BY device_id, time"
+    return query, params
+
+
+def fetch_points(cursor, chunk_rows: int = 50_000) -> BinPoints:
+    """
+    Lê o cursor em lotes e converte cada lote em arrays na hora, sem manter
+    a lista de tuplas da janela inteira em memória.
+    """
+    codes: Dict[str, int] = {}
+    parts: List[Tuple[np.ndarray, ...]] = []
+    while True:
+        batch = cursor.fetchmany(chunk_rows)
+        if not batch:
+            break
+        t, dev, lat, lon, speed = zip(*batch)
+        parts.append((
+            np.array(t, dtype=np.float64),
+            np.array([codes.setdefault(d, len(codes)) for d in dev], dtype=np.int32),
+            np.array(lat, dtype=np.float64),
+            np.array(lon, dtype=np.float64),
+            np.array([np.nan if s is None else s for s in speed], dtype=np.float64),
+        ))
+    if not parts:
+        empty = np.empty(0, dtype=np.float64)
+        return BinPoints(empty, np.empty(0, dtype=np.int32), empty, empty, empty, [])
+    columns = [np.concatenate(col) for col in zip(*parts)]
+    return BinPoints(*columns, device_ids=list(codes))
+
+
+def dwell_seconds(t: np.ndarray, device: np.ndarray, max_gap_s: float) -> np.ndarray:
+    """
+    Tempo atribuído a cada ponto: até a próxima amostra do mesmo device,
+    limitado a max_gap_s (lacunas maiores são perda de sinal, não permanência).
+    O último ponto de cada device recebe 0.
+    """
+    dwell = np.zeros_like(t)
+    if len(t) > 1:
+        dt = np.diff(t)
+        same = device[1:] == device[:-1]
+        dwell[:-1] = np.where(same, np.clip(dt, 0.0, max_gap_s), 0.0)
+    return dwell
+
+
+def _cell_index(x: np.ndarray, y: np.ndarray, cell: str, size_m: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Índices inteiros da célula (grid: coluna/linha; hex: axial q/r, pointy-top de raio size_m)."""
+    if cell == "grid":
+        return np.floor(x / size_m).astype(np.int64), np.floor(y / size_m).astype(np.int64)
+    # Coordenadas axiais fracionárias e arredondamento cúbico
+    qf = (_SQRT3 / 3.0 * x - y / 3.0) / size_m
+    rf = (2.0 / 3.0 * y) / size_m
+    sf = -qf - rf
+    q, r, s = np.rint(qf), np.rint(rf), np.rint(sf)
+    dq, dr, ds = np.abs(q - qf), np.abs(r - rf), np.abs(s - sf)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    q = np.where(fix_q, -r - s, q)
+    r = np.where(fix_r, -q - s, r)
+    return q.astype(np.int64), r.astype(np.int64)
+
+
+def _cell_center(i: np.ndarray, j: np.ndarray, cell: str, size_m: float) -> Tuple[np.ndarray, np.ndarray]:
+    if cell == "grid":
+        return (i + 0.5) * size_m, (j + 0.5) * size_m
+    return size_m * _SQRT3 * (i + j / 2.0), size_m * 1.5 * j
+
+
+def bin_points(points: BinPoints, cell: str = "hex", size_m: float = 40.0,
+               max_gap_s: float = 30.0) -> Dict[str, Any]:
+    """
+    Agrega os pontos por célula de grid ou hexágono de size_m metros.
+
+    Kernel vetorizado: projeção equiretangular local (latitude de
+    referência arredondada a 0,01° para células estáveis entre consultas),
+    índice da célula, np.unique sobre a chave e np.bincount para as somas.
+    Por célula: count, dwell_s, mean_speed_kmh (NaN sem velocidade) e
+    devices (distintos). Devolve colunas em arrays, na ordem de BIN_COLUMNS.
+    """
+    n = len(points.t)
+    ref_lat = round(float(np.median(points.lat)), 2) if n else 0.0
+    kx = M_PER_DEG_LON * math.cos(math.radians(ref_lat))
+    result: Dict[str, Any] = {"cell": cell, "size_m": size_m, "ref_lat": ref_lat, "points": n}
+    if not n:
+        result["columns"] = {name: np.empty(0) for name in BIN_COLUMNS}
+        return result
+
+    i, j = _cell_index(points.lon * kx, points.lat * M_PER_DEG_LAT, cell, size_m)
+    # Chave única por célula (índices cabem folgados em 32 bits cada)
+    keys = (i << 32) ^ (j & 0xFFFFFFFF)
+    cells, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    m = len(cells)
+
+    count = np.bincount(inverse, minlength=m)
+    dwell = np.bincount(inverse, weights=dwell_seconds(points.t, points.device, max_gap_s), minlength=m)
+    has_speed = ~np.isnan(points.speed)
+    speed_sum = np.bincount(inverse[has_speed], weights=points.speed[has_speed], minlength=m)
+    speed_n = np.bincount(inverse[has_speed], minlength=m)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_speed = np.where(speed_n > 0, speed_sum / np.maximum(speed_n, 1), np.nan)
+    # Devices distintos: pares (célula, device) únicos contados por célula
+    pairs = np.unique(inverse.astype(np.int64) * max(len(points.device_ids), 1) + points.device)
+    devices = np.bincount(pairs // max(len(points.device_ids), 1), minlength=m)
+
+    ci, cj = i[first], j[first]
+    cx, cy = _cell_center(ci, cj, cell, size_m)
+    result["columns"] = {
+        "lat": cy / M_PER_DEG_LAT,
+        "lon": cx / kx,
+        "count": count,
+        "dwell_s": dwell,
+        "mean_speed_kmh": mean_speed,
+        "devices": devices,
+        "i": ci,
+        "j": cj,
+    }
+    return result
+
+
+def bin_rows(columns: Dict[str, np.ndarray]) -> List[tuple]:
+    """Células como tuplas na ordem de BIN_SCHEMA (para encode_columnar); NaN vira None."""
+    out = []
+    for lat, lon, count, dwell, speed, devices, i, j in zip(*(columns[c].tolist() for c in BIN_COLUMNS)):
+        out.append((lat, lon, count, dwell, None if speed != speed else speed, devices, i, j))
+    return out
+
+
+def bin_cells(columns: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+    """Células como objetos JSON (coordenadas com 6 casas, tempos em segundos com 1 casa)."""
+    return [
+        {
+            "lat": round(lat, 6), "lon": round(lon, 6), "count": count,
+            "dwell_s": round(dwell, 1),
+            "mean_speed_kmh": None if speed is None else round(speed, 1),
+            "devices": devices, "i": i, "j": j,
+        }
+        for lat, lon, count, dwell, speed, devices, i, j in bin_rows(columns)
+    ]
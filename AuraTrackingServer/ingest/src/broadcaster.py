@@ -1,113 +1,462 @@
 import asyncio
+import itertools
+import json
+import threading
 import time
 import structlog
-from typing import Dict, Set, Optional, Any
+from typing import Dict, Iterable, List, Set, Optional, Any
+
+from .device_tracker import DeviceTracker, StatusChange
+from .subscriptions import SubscriptionFilter, SubscriptionIndex
+from .ws_codec import FIELD_LEFT, FIELD_OFFLINE, WireUpdate, quantize
 
 logger = structlog.get_logger("broadcaster")
 
+# Chave e valor da mailbox para o heartbeat (coalescido como qualquer device)
+HEARTBEAT_KEY = "__heartbeat__"
+HEARTBEAT = object()
+
+
+class StatusFragment(bytes):
+    """Fragmento JSON de uma transição online/offline (evento "device-status")."""
+
+
+class LeaveFragment(bytes):
+    """Fragmento JSON de um device que saiu do filtro do subscriber (evento "device-leave")."""
+
+
+def format_sse_frame(event: str, data: Any) -> bytes:
+    """Monta um frame SSE compacto (JSON sem espaços) já codificado em bytes."""
+    body = json.dumps(data, separators=(",", ":"))
+    return f"event: {event}\ndata: {body}\n\n".encode("utf-8")
+
+
+def to_sse_payload(record: Dict[str, Any], status: str = "online") -> Dict[str, Any]:
+    """Reduz o registro completo do IngestWorker ao payload mínimo do stream."""
+    ts = record.get("time")
+    speed = record.get("speed")
+    return {
+        "id": record.get("device_id"),
+        "ts": ts.timestamp() if ts else time.time(),
+        "lat": record.get("latitude"),
+        "lon": record.get("longitude"),
+        "sp": round(speed * 3.6, 1) if speed is not None else None,
+        "op": record.get("operator_id"),
+        "st": status
+    }
+
+
+def to_status_payload(change: StatusChange) -> Dict[str, Any]:
+    """Payload de um evento device-status (ts = última amostra do device)."""
+    return {
+        "id": change.device_id,
+        "st": "online" if change.online else "offline",
+        "ts": change.last_seen,
+    }
+
+
+def format_fleet_frame(items: List[Any]) -> bytes:
+    """
+    Frame SSE de um tick do subscriber: um "fleet-update" com todas as
+    atualizações pendentes (fragmentos JSON já serializados, só concatenados),
+    um "device-status" com as transições online/offline, um "device-leave"
+    com os devices que saíram do filtro e, se houver, o heartbeat.
+    """
+    updates = []
+    statuses = []
+    leaves = []
+    heartbeat = False
+    for item in items:
+        if item is HEARTBEAT:
+            heartbeat = True
+        elif isinstance(item, StatusFragment):
+            statuses.append(item)
+        elif isinstance(item, LeaveFragment):
+            leaves.append(item)
+        else:
+            updates.append(item)
+
+    frame = b""
+    if updates:
+        frame = b"event: fleet-update\ndata: [" + b",".join(updates) + b"]\n\n"
+    if statuses:
+        frame += b"event: device-status\ndata: [" + b",".join(statuses) + b"]\n\n"
+    if leaves:
+        frame += b"event: device-leave\ndata: [" + b",".join(leaves) + b"]\n\n"
+    if heartbeat:
+        frame += f"event: heartbeat\ndata: {time.time()}\n\n".encode("utf-8")
+    return frame
+
+
+def snapshot_payloads(records: Iterable[Dict[str, Any]],
+                      flt: Optional[SubscriptionFilter] = None,
+                      offline_after_seconds: float = 60.0) -> List[Dict[str, Any]]:
+    """Payloads do estado atual da frota que passam no filtro do subscriber."""
+    now = time.time()
+    return [
+        to_sse_payload(r, "online" if now - r["time"].timestamp() < offline_after_seconds else "offline")
+        for r in records
+        if flt is None or flt.is_empty() or flt.matches(
+            r.get("device_id"), r.get("operator_id"), r.get("latitude"), r.get("longitude")
+        )
+    ]
+
+
+def format_snapshot_frame(records: Iterable[Dict[str, Any]],
+                          flt: Optional[SubscriptionFilter] = None,
+                          offline_after_seconds: float = 60.0) -> bytes:
+    """Frame SSE "snapshot" com o estado atual da frota (filtrado para o subscriber)."""
+    return format_sse_frame("snapshot", snapshot_payloads(records, flt, offline_after_seconds))
+
+
+class CoalescingMailbox:
+    """
+    Caixa de entrada de um subscriber com coalescência por chave (device_id).
+    
+    Cada chave guarda apenas a atualização mais recente; a leitura entrega só
+    as chaves que mudaram, na ordem da primeira alteração ainda não lida.
+    Memória limitada pelo tamanho da frota e um consumidor lento sempre
+    alcança o estado atual (em vez de receber posições velhas).
+    
+    O intervalo da mailbox é a taxa do subscriber: next_batch() entrega no
+    máximo um lote por intervalo, com o valor mais recente de cada chave.
+    """
+    
+    _ids = itertools.count(1)
+    
+    def __init__(self, binary: bool = False, interval_seconds: float = 0.0):
+        self.id = next(self._ids)
+        # binary: recebe WireUpdate (codec WebSocket) em vez de fragmentos JSON
+        self.binary = binary
+        self.interval_seconds = interval_seconds
+        self._next_due = 0.0
+        self.created_at = time.time()
+        # dict preserva a ordem de inserção: a chave mantém a posição ao ser coalescida
+        self._pending: Dict[str, Any] = {}
+        self._changed_at: Dict[str, float] = {}
+        self._ready = asyncio.Event()
+        # Devices entregues que ainda passam no filtro (só filtros dinâmicos)
+        self.dynamic = False
+        self.members: Set[str] = set()
+        self.delivered = 0
+        self.coalesced = 0
+    
+    def put(self, key: str, item: Any):
+        """Substitui o valor pendente da chave (executa no loop principal)."""
+        if key in self._pending:
+            self.coalesced += 1
+        else:
+            self._changed_at[key] = time.monotonic()
+        self._pending[key] = item
+        self._ready.set()
+    
+    async def next_batch(self) -> List[Any]:
+        """Aguarda alterações e o intervalo do subscriber; retorna o lote pendente."""
+        while not self._pending:
+            self._ready.clear()
+            await self._ready.wait()
+        delay = self._next_due - time.monotonic()
+        if delay > 0:
+            # Alterações que chegarem durante a espera são coalescidas no mesmo lote
+            await asyncio.sleep(delay)
+        self._next_due = time.monotonic() + self.interval_seconds
+        return self.drain()
+    
+    def drain(self) -> List[Any]:
+        """Retorna e remove todas as chaves alteradas, sem aguardar (tick do cliente)."""
+        items = list(self._pending.values())
+        self._pending.clear()
+        self._changed_at.clear()
+        self.delivered += len(items)
+        return items
+    
+    def __len__(self) -> int:
+        return len(self._pending)
+    
+    def lag_seconds(self) -> float:
+        """Idade da alteração pendente mais antiga (0 se em dia)."""
+        if not self._changed_at:
+            return 0.0
+        return time.monotonic() - next(iter(self._changed_at.values()))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "transport": "ws" if self.binary else "sse",
+            "interval_seconds": self.interval_seconds,
+            "connected_seconds": round(time.time() - self.created_at, 1),
+            "pending": len(self._pending),
+            "lag_seconds": round(self.lag_seconds(), 3),
+            "delivered": self.delivered,
+            "coalesced": self.coalesced
+        }
+
+
 class TelemetryBroadcaster:
     """
     Gerencia o broadcast interno de telemetria em memória.
     
     Funcionalidades:
-    - Throttling por device_id (default 5s)
-    - Thread-safe (pode ser chamado da thread MQTT)
+    - Broadcast por tick: publish() só registra o estado mais recente do
+      device; a cada tick_ms o loop principal distribui todas as mudanças
+      de uma vez (um único handoff entre threads por tick)
+    - Thread-safe (publish pode ser chamado da thread MQTT)
     - Desacoplado (fire-and-forget)
+    - Payload serializado uma única vez por mudança (fragmento compartilhado)
+    - Taxa por subscriber (intervalo da mailbox), não um gate global por device
+    - Um frame por subscriber a cada intervalo, com todas as suas mudanças
+    - Heartbeat único para todos os subscribers
+    - Presença online/offline (DeviceTracker) emitida como evento "device-status"
+    - Filtros por subscriber (devices, operador, bbox/área) via índice espacial
+    - Evento de saída ("device-leave") quando um device entregue deixa de
+      passar no filtro dinâmico (bbox/área/operador) do subscriber
+    - Subscribers binários (WebSocket) recebem a atualização já quantizada, compartilhada
     """
     
-    def __init__(self, throttle_seconds: float = 5.0):
-        self.throttle_seconds = throttle_seconds
-        self._subscribers: Set[asyncio.Queue] = set()
-        self._last_broadcast: Dict[str, float] = {}
+    def __init__(self, tick_ms: int = 250, subscriber_interval_seconds: float = 5.0,
+                 heartbeat_seconds: float = 15.0, grid_cell_degrees: float = 0.01,
+                 offline_after_seconds: float = 60.0):
+        self.tick_seconds = tick_ms / 1000
+        self.subscriber_interval_seconds = subscriber_interval_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self._subscribers: Set[CoalescingMailbox] = set()
+        self._index = SubscriptionIndex(cell_degrees=grid_cell_degrees)
+        # device_id -> subscribers de filtro dinâmico que têm o device (members)
+        self._members: Dict[str, Set[CoalescingMailbox]] = {}
+        # device_id -> registro mais recente desde o último tick (escrito pela thread MQTT)
+        self._pending: Dict[str, Any] = {}
+        self._pending_lock = threading.Lock()
+        self.tracker = DeviceTracker(offline_after_seconds)
         self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: List[asyncio.Task] = []
         self._stats = {
             "events_received": 0,
             "events_emitted": 0,
-            "events_dropped_throttle": 0,
-            "events_dropped_queue_full": 0
+            "events_coalesced_before_tick": 0,
+            "ticks": 0,
+            "status_events": 0,
+            "leave_events": 0,
+            "heartbeats_sent": 0
         }
 
     def set_loop(self, loop: asyncio.AbstractEventLoop):
         """Define o event loop principal (chamado no startup do FastAPI)."""
         self._loop = loop
-        logger.info("broadcaster_loop_set")
+        self._tasks = [
+            loop.create_task(self._tick_loop()),
+            loop.create_task(self._heartbeat_loop()),
+        ]
+        logger.info("broadcaster_loop_set", tick_seconds=self.tick_seconds)
+
+    async def close(self):
+        """Encerra os tickers (chamado no shutdown do FastAPI)."""
+        for task in self._tasks:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
 
     def publish(self, device_id: str, payload: Any):
         """
         Publica um evento de telemetria.
-        Pode ser chamado de qualquer thread (ex: MQTT).
+        Pode ser chamado de qualquer thread (ex: MQTT); não acorda o event loop.
         """
-        self._stats["events_received"] += 1
-        
-        # 1. Throttling (Check rápido em memória)
+        with self._pending_lock:
+            self._stats["events_received"] += 1
+            if device_id in self._pending:
+                self._stats["events_coalesced_before_tick"] += 1
+            self._pending[device_id] = payload
+
+        ts = payload.get("time")
         now = time.time()
-        last_time = self._last_broadcast.get(device_id, 0)
-        
-        if (now - last_time) < self.throttle_seconds:
-            self._stats["events_dropped_throttle"] += 1
+        self.tracker.touch(
+            device_id,
+            ts.timestamp() if ts else now,
+            payload.get("operator_id"),
+            payload.get("latitude"),
+            payload.get("longitude"),
+            now=now
+        )
+
+    async def _tick_loop(self):
+        """Ticker: distribui as mudanças acumuladas a cada tick_seconds."""
+        while True:
+            await asyncio.sleep(self.tick_seconds)
+            try:
+                self._tick()
+            except Exception as e:
+                logger.error("broadcast_tick_error", error=str(e))
+
+    def _tick(self):
+        """Executa no loop principal: troca o buffer pendente e distribui."""
+        with self._pending_lock:
+            changes, self._pending = self._pending, {}
+        # A roda avança mesmo sem subscribers, para manter a presença correta
+        transitions = self.tracker.advance()
+        if not self._subscribers or not (changes or transitions):
             return
 
-        # 2. Atualiza timestamp
-        self._last_broadcast[device_id] = now
-        
-        # 3. Despacha para o loop principal
-        if self._loop and not self._loop.is_closed():
-            self._loop.call_soon_threadsafe(
-                self._broadcast_to_subscribers, 
-                payload
-            )
+        self._stats["ticks"] += 1
+        for payload in changes.values():
+            self._broadcast_to_subscribers(payload)
+        for change in transitions:
+            self._broadcast_status(change)
+
+    def _broadcast_status(self, change: StatusChange):
+        """Distribui uma transição online/offline (chave própria na mailbox)."""
+        self._stats["status_events"] += 1
+        key = f"{change.device_id}:status"
+        fragment = None
+        wire = None
+        matched = self._index.match(change.device_id, change.operator_id, change.latitude, change.longitude)
+        for mailbox in list(matched):
+            if mailbox.binary:
+                if wire is None:
+                    wire = WireUpdate(change.device_id, change.last_seen, None, None, None,
+                                      0 if change.online else FIELD_OFFLINE)
+                mailbox.put(key, wire)
+                continue
+            if fragment is None:
+                fragment = StatusFragment(
+                    json.dumps(to_status_payload(change), separators=(",", ":")).encode("utf-8")
+                )
+            mailbox.put(key, fragment)
+
+    def _track_members(self, device_id: str, matched: List[CoalescingMailbox], ts: float):
+        """
+        Atualiza quem tem o device entre os subscribers de filtro dinâmico e
+        envia "device-leave" a quem o tinha e não passa mais no filtro.
+        A saída usa a chave do device: substitui uma posição ainda não lida
+        e é substituída se o device voltar antes do próximo frame.
+        """
+        previous = self._members.get(device_id)
+        current = {m for m in matched if m.dynamic}
+        if previous:
+            fragment = None
+            wire = None
+            for mailbox in previous - current:
+                mailbox.members.discard(device_id)
+                self._stats["leave_events"] += 1
+                if mailbox.binary:
+                    if wire is None:
+                        wire = WireUpdate(device_id, ts, None, None, None, FIELD_LEFT)
+                    mailbox.put(device_id, wire)
+                    continue
+                if fragment is None:
+                    fragment = LeaveFragment(
+                        json.dumps({"id": device_id, "ts": ts}, separators=(",", ":")).encode("utf-8")
+                    )
+                mailbox.put(device_id, fragment)
+        for mailbox in current:
+            mailbox.members.add(device_id)
+        if current:
+            self._members[device_id] = current
         else:
-            # Se o loop não estiver pronto, dropamos silenciosamente (fase de startup/shutdown)
-            pass
+            self._members.pop(device_id, None)
+
+    def track_snapshot(self, mailbox: CoalescingMailbox, payloads: Iterable[Dict[str, Any]]):
+        """Registra os devices do snapshot enviado (saem do filtro como os demais)."""
+        if not mailbox.dynamic:
+            return
+        for payload in payloads:
+            device_id = payload["id"]
+            mailbox.members.add(device_id)
+            self._members.setdefault(device_id, set()).add(mailbox)
 
     def _broadcast_to_subscribers(self, payload: Any):
-        """Executa no loop principal: distribui para filas."""
+        """Serializa uma vez e coloca nas mailboxes dos subscribers interessados."""
         if not self._subscribers:
             return
 
         self._stats["events_emitted"] += 1
         
-        # Copia para evitar erro de modificação durante iteração
-        for queue in list(self._subscribers):
-            try:
-                queue.put_nowait(payload)
-            except asyncio.QueueFull:
-                self._stats["events_dropped_queue_full"] += 1
-                # Estratégia: Drop tail (ignora o novo)
-                # Alternativa: Drop head (remove antigo e insere novo) - mais complexo
-                pass
+        device_id = payload.get("device_id")
+        # list() evita erro de modificação do índice durante iteração
+        matched = list(self._index.match(
+            device_id,
+            payload.get("operator_id"),
+            payload.get("latitude"),
+            payload.get("longitude")
+        ))
+        if matched or device_id in self._members:
+            ts = payload.get("time")
+            self._track_members(device_id, matched, ts.timestamp() if ts else time.time())
+        
+        # Um único payload/fragmento (tratados como imutáveis) compartilhado
+        # pelos subscribers interessados, montado só se houver ao menos um
+        compact = None
+        wire = None
+        fragment = None
+        # Se o subscriber ainda não leu a posição anterior, ela é substituída
+        for mailbox in matched:
+            if compact is None:
+                compact = to_sse_payload(payload)
+            if mailbox.binary:
+                if wire is None:
+                    wire = quantize(compact)
+                mailbox.put(device_id, wire)
+                continue
+            if fragment is None:
+                fragment = json.dumps(compact, separators=(",", ":")).encode("utf-8")
+            mailbox.put(device_id, fragment)
+
+    async def _heartbeat_loop(self):
+        """Ticker compartilhado: um heartbeat para todos a cada intervalo."""
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            if not self._subscribers:
+                continue
+            for mailbox in list(self._subscribers):
+                # WebSocket usa o ping do próprio protocolo
+                if not mailbox.binary:
+                    mailbox.put(HEARTBEAT_KEY, HEARTBEAT)
+            self._stats["heartbeats_sent"] += 1
 
-    async def subscribe(self) -> asyncio.Queue:
-        """Cria uma nova fila de assinatura."""
-        queue = asyncio.Queue(maxsize=100) # Buffer limitado para evitar OOM
-        self._subscribers.add(queue)
+    async def subscribe(self, flt: Optional[SubscriptionFilter] = None,
+                        binary: bool = False,
+                        interval_seconds: Optional[float] = None) -> CoalescingMailbox:
+        """Cria uma nova mailbox de assinatura, opcionalmente filtrada.
+        
+        interval_seconds: taxa do subscriber (default subscriber_interval_seconds)
+        """
+        if interval_seconds is None:
+            interval_seconds = self.subscriber_interval_seconds
+        # Limitada pelo tamanho da frota
+        mailbox = CoalescingMailbox(binary=binary, interval_seconds=interval_seconds)
+        mailbox.dynamic = flt is not None and flt.is_dynamic()
+        self._subscribers.add(mailbox)
+        self._index.add(mailbox, flt or SubscriptionFilter())
         logger.debug("subscriber_added", total=len(self._subscribers))
-        return queue
+        return mailbox
 
-    def unsubscribe(self, queue: asyncio.Queue):
-        """Remove uma fila de assinatura."""
-        if queue in self._subscribers:
-            self._subscribers.remove(queue)
+    def unsubscribe(self, mailbox: CoalescingMailbox):
+        """Remove uma mailbox de assinatura."""
+        if mailbox in self._subscribers:
+            self._subscribers.remove(mailbox)
+            self._index.remove(mailbox)
+            for device_id in mailbox.members:
+                holders = self._members.get(device_id)
+                if holders is not None:
+                    holders.discard(mailbox)
+                    if not holders:
+                        del self._members[device_id]
+            mailbox.members.clear()
             logger.debug("subscriber_removed", total=len(self._subscribers))
 
-    def cleanup_stale_devices(self, max_age_seconds: float = 3600):
-        """Remove dispositivos que não enviam dados há muito tempo."""
-        now = time.time()
-        to_remove = []
-        
-        for device_id, last_seen in self._last_broadcast.items():
-            if (now - last_seen) > max_age_seconds:
-                to_remove.append(device_id)
-        
-        for device_id in to_remove:
-            del self._last_broadcast[device_id]
-            
-        if to_remove:
-            logger.info("cleanup_stale_devices", removed=len(to_remove), remaining=len(self._last_broadcast))
-
     def get_stats(self) -> Dict[str, Any]:
+        subscribers = [m.get_stats() for m in list(self._subscribers)]
+        with self._pending_lock:
+            pending = len(self._pending)
+            stats = dict(self._stats)
         return {
-            **self._stats,
-            "active_subscribers": len(self._subscribers),
-            "tracked_devices": len(self._last_broadcast)
+            **stats,
+            "tick_seconds": self.tick_seconds,
+            "events_coalesced": sum(s["coalesced"] for s in subscribers),
+            "max_subscriber_lag_seconds": max((s["lag_seconds"] for s in subscribers), default=0.0),
+            "active_subscribers": len(subscribers),
+            "pending_devices": pending,
+            **self.tracker.get_stats(),
+            "subscribers": subscribers
         }
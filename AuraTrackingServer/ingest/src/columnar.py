@@ -0,0 +1,223 @@
+"""
+Formato colunar binário para consultas históricas (format=columnar).
+
+Pacote de typed arrays pensado para o cliente criar Float32Array/Int32Array
+direto sobre o ArrayBuffer (sem parse por linha) e mandar os buffers para a
+GPU. Layout (little-endian):
+
+    4 bytes  magic "ATC1"
+    u32      tamanho do cabeçalho JSON (bytes)
+    bytes    cabeçalho JSON (UTF-8), com padding de espaços até múltiplo de 8
+    bytes    corpo: buffers das colunas, cada um alinhado em 8 bytes
+
+Cabeçalho:
+
+    {
+      "rows": n,
+      "base_time": "2025-01-01T00:00:00+00:00",   // ISO, piso do menor time
+      "time_unit": "ms" | "s",                      // unidade dos offsets int32
+      "columns": [
+        {"name": "lat", "type": "float32", "offset": 0, "length": 4n,
+         "validity": 4n8 | null},                  // offsets relativos ao corpo
+        {"name": "device_id", "type": "uint16", "offset": ..., "length": ...,
+         "validity": null, "dictionary": ["dev_a", "dev_b", ...]},
+        ...
+      ]
+    }
+
+Tipos: float32, int32, uint16, uint32. Colunas de texto são
+codificadas por dicionário (índices uint16, ou uint32 acima de 65535
+valores). Colunas de tempo viram int32 de deslocamento a partir de base_time
+em "ms" quando o intervalo cabe em int32 (~24 dias) e em "s" caso contrário.
+
+"validity" aponta para um bitmap de nulos no estilo Arrow (bit i, LSB
+primeiro, 1 = valor presente); é omitido (null) quando a coluna não tem
+nulos. Valores nulos ficam NaN nas colunas float32 e 0 nas demais.
+"""
+
+import json
+import math
+import struct
+import sys
+from array import array
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+MAGIC = b"ATC1"
+MEDIA_TYPE = "application/vnd.auratracking.columnar"
+
+# Tipos lógicos das colunas de entrada
+TIME = "time"
+FLOAT = "float32"
+INT = "int32"
+DICT = "dict"
+
+_TYPECODES = {"float32": "f", "int32": "i", "uint16": "H", "uint32": "I"}
+_TYPENAMES = {code: name for name, code in _TYPECODES.items()}
+_INT32_MAX = 2**31 - 1
+_LITTLE = sys.byteorder == "little"
+
+# Colunas de HISTORY_COLUMNS (src/history.py), na mesma ordem
+HISTORY_SCHEMA: List[Tuple[str, str]] = [
+    ("time", TIME), ("device_id", DICT), ("operator_id", DICT),
+    ("lat", FLOAT), ("lon", FLOAT), ("speed_kmh", FLOAT),
+    ("satellites", INT), ("h_acc", FLOAT), ("v_acc", FLOAT), ("s_acc", FLOAT),
+    ("accel_magnitude", FLOAT), ("gyro_magnitude", FLOAT),
+    ("mag_x", FLOAT), ("mag_y", FLOAT), ("mag_z", FLOAT), ("mag_magnitude", FLOAT),
+    ("linear_accel_magnitude", FLOAT),
+    ("azimuth", FLOAT), ("pitch", FLOAT), ("roll", FLOAT),
+    ("battery_level", INT), ("battery_status", DICT), ("battery_temperature", FLOAT),
+    ("wifi_rssi", INT), ("cellular_network_type", DICT), ("cellular_operator", DICT),
+    ("cellular_rsrp", INT),
+    ("transmission_mode", DICT),
+]
+
+# Colunas inteiras conhecidas de /api/telemetry; o resto é inferido (ver infer_schema)
+_INT_COLUMNS = {"sample_count", "satellites", "battery_level", "wifi_rssi", "cellular_rsrp"}
+
+
+def infer_schema(columns: Sequence[str], rows: Sequence[tuple]) -> List[Tuple[str, str]]:
+    """Schema a partir de cursor.description: time/bucket, texto por dicionário, resto float."""
+    schema = []
+    for i, name in enumerate(columns):
+        sample = next((row[i] for row in rows if row[i] is not None), None)
+        if isinstance(sample, datetime) or name in ("time", "bucket"):
+            schema.append((name, TIME))
+        elif isinstance(sample, str):
+            schema.append((name, DICT))
+        elif name in _INT_COLUMNS:
+            schema.append((name, INT))
+        else:
+            schema.append((name, FLOAT))
+    return schema
+
+
+def _validity(values: Sequence[Any]) -> Optional[bytes]:
+    if None not in values:
+        return None
+    bitmap = bytearray((len(values) + 7) // 8)
+    for i, v in enumerate(values):
+        if v is not None:
+            bitmap[i >> 3] |= 1 << (i & 7)
+    return bytes(bitmap)
+
+
+def _pad8(n: int) -> int:
+    return (8 - n % 8) % 8
+
+
+def _time_column(values: Sequence[Optional[datetime]]) -> Tuple[array, Dict[str, Any]]:
+    present = [v for v in values if v is not None]
+    if not present:
+        return array("i", bytes(4 * len(values))), {"base_time": None, "time_unit": "ms"}
+    lo, hi = min(present), max(present)
+    base = lo.replace(microsecond=0)
+    unit = "ms" if (hi - base).total_seconds() * 1000 <= _INT32_MAX else "s"
+    scale = 1000 if unit == "ms" else 1
+    step = timedelta(seconds=1) / scale
+    data = array("i", (0 if v is None else (v - base) // step for v in values))
+    return data, {"base_time": base.isoformat(), "time_unit": unit}
+
+
+def _dict_column(values: Sequence[Optional[str]]) -> Tuple[array, List[str]]:
+    index: Dict[str, int] = {}
+    codes = []
+    for v in values:
+        if v is None or v == "":
+            codes.append(0)
+            continue
+        code = index.get(v)
+        if code is None:
+            code = index[v] = len(index)
+        codes.append(code)
+    typecode = "H" if len(index) <= 0xFFFF else "I"
+    return array(typecode, codes), list(index)
+
+
+def encode_columnar(schema: Sequence[Tuple[str, str]], rows: Sequence[tuple]) -> bytes:
+    """
+    Codifica as linhas do cursor (tuplas na ordem do schema) no pacote colunar.
+
+    A transposição é feita uma vez (zip) e cada coluna vira um array tipado,
+    sem montar dicionários por linha.
+    """
+    n = len(rows)
+    columns = list(zip(*rows)) if n else [()] * len(schema)
+    header: Dict[str, Any] = {"rows": n, "base_time": None, "time_unit": "ms", "columns": []}
+    buffers: List[bytes] = []
+    offset = 0
+
+    def append(buf: bytes) -> Tuple[int, int]:
+        nonlocal offset
+        start = offset
+        buffers.append(buf)
+        pad = _pad8(len(buf))
+        if pad:
+            buffers.append(b"\0" * pad)
+        offset += len(buf) + pad
+        return start, len(buf)
+
+    for (name, kind), values in zip(schema, columns):
+        meta: Dict[str, Any] = {"name": name}
+        if kind == TIME:
+            data, time_meta = _time_column(values)
+            if header["base_time"] is None:
+                header.update(time_meta)
+        elif kind == DICT:
+            # String vazia conta como nulo (mesma regra de history_point)
+            values = [v if v else None for v in values]
+            data, dictionary = _dict_column(values)
+            meta["dictionary"] = dictionary
+        elif kind == INT:
+            data = array("i", (0 if v is None else int(v) for v in values))
+        else:
+            data = array("f", (math.nan if v is None else float(v) for v in values))
+        validity = _validity(values)
+
+        if not _LITTLE:
+            data.byteswap()
+        meta["type"] = _TYPENAMES[data.typecode]
+        meta["offset"], meta["length"] = append(data.tobytes())
+        meta["validity"] = append(validity)[0] if validity is not None else None
+        header["columns"].append(meta)
+
+    head = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    # MAGIC + u32 somam 8 bytes; o padding do cabeçalho mantém o corpo alinhado
+    head += b" " * _pad8(len(head))
+    return b"".join([MAGIC, struct.pack("<I", len(head)), head, *buffers])
+
+
+def decode_columnar(payload: bytes) -> Dict[str, Any]:
+    """
+    Decodifica o pacote em {"rows", "base_time", "time_unit", "columns": {nome: lista}}.
+
+    Usado pelo benchmark e para depuração; nulos voltam como None e colunas
+    de dicionário voltam como strings.
+    """
+    if payload[:4] != MAGIC:
+        raise ValueError("payload colunar inválido")
+    (head_len,) = struct.unpack_from("<I", payload, 4)
+    header = json.loads(payload[8:8 + head_len])
+    body = memoryview(payload)[8 + head_len:]
+    n = header["rows"]
+
+    out: Dict[str, List[Any]] = {}
+    for meta in header["columns"]:
+        data = array(_TYPECODES[meta["type"]])
+        data.frombytes(body[meta["offset"]:meta["offset"] + meta["length"]])
+        if not _LITTLE:
+            data.byteswap()
+        values: List[Any] = data.tolist()
+        if "dictionary" in meta:
+            dictionary = meta["dictionary"]
+            values = [dictionary[v] if dictionary else None for v in values]
+        if meta["validity"] is not None:
+            bitmap = body[meta["validity"]:meta["validity"] + (n + 7) // 8]
+            values = [v if bitmap[i >> 3] >> (i & 7) & 1 else None for i, v in enumerate(values)]
+        out[meta["name"]] = values
+    return {
+        "rows": n,
+        "base_time": header["base_time"],
+        "time_unit": header["time_unit"],
+        "columns": out,
+    }
@@ -0,0 +1,268 @@
+"""
+Compressão negociada (Accept-Encoding) das respostas HTTP da API.
+
+- gzip sempre; br e zstd quando os pacotes brotli / zstandard estão
+  instalados (requirements.txt), preferidos nessa ordem: zstd, br, gzip
+- Respostas abaixo de minimum_size e tipos já comprimidos (imagens,
+  octet-stream) passam direto
+- Respostas que já trazem Content-Encoding (o cache de respostas,
+  src/response_cache.py, guarda o corpo em gzip) vão sem recomprimir; só
+  para um cliente que não aceita gzip o corpo é decodificado aqui
+- Streams (ndjson, SSE) são comprimidos chunk a chunk com flush a cada
+  chunk: o cliente recebe cada lote/frame na hora, e o contexto do
+  compressor é compartilhado entre chunks (chaves JSON repetidas custam
+  quase nada a partir do segundo frame)
+- Corpos/chunks a partir de OFFLOAD_MIN_BYTES são (des)comprimidos no
+  threadpool: o event loop também roda o tick do broadcaster, SSE e
+  WebSockets (gzip de um histórico de ~15 MB leva ~1 s)
+"""
+
+import gzip
+import threading
+import zlib
+from typing import Any, Callable, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+GZIP = "gzip"
+BROTLI = "br"
+ZSTD = "zstd"
+
+# Níveis para resposta dinâmica: rápidos, a maior parte do ganho
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+ZSTD_LEVEL = 3
+
+# Acima disto a (des)compressão sai do event loop (custo da troca de thread
+# só compensa em corpos grandes)
+OFFLOAD_MIN_BYTES = 64 * 1024
+
+# Tipos que não compensam: já comprimidos ou binários densos
+_SKIP_PREFIXES = ("image/", "video/", "audio/", "application/zip", "application/gzip",
+                  "application/octet-stream")
+
+
+def available_encodings() -> List[str]:
+    """Codificações suportadas neste processo, em ordem de preferência."""
+    out = []
+    if zstandard is not None:
+        out.append(ZSTD)
+    if brotli is not None:
+        out.append(BROTLI)
+    out.append(GZIP)
+    return out
+
+
+def negotiate(accept_encoding: str, available: List[str]) -> Optional[str]:
+    """
+    Codificação a usar para o Accept-Encoding do cliente: maior q entre as
+    disponíveis, empate resolvido pela ordem de `available`. None = identity.
+    """
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[token] = q
+    star = weights.get("*")
+    best, best_q = None, 0.0
+    for encoding in available:
+        q = weights.get(encoding, star if star is not None else 0.0)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == ZSTD:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    if encoding == BROTLI:
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def decompress(body: bytes, encoding: str) -> bytes:
+    if encoding == ZSTD:
+        return zstandard.ZstdDecompressor().decompress(body)
+    if encoding == BROTLI:
+        return brotli.decompress(body)
+    return gzip.decompress(body)
+
+
+class StreamCompressor:
+    """Compressor incremental: cada chunk sai completo (flush) para o cliente decodificar na hora."""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == ZSTD:
+            self._obj = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        elif encoding == BROTLI:
+            self._obj = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._obj = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        if self.encoding == ZSTD:
+            return self._obj.compress(data) + self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        if self.encoding == BROTLI:
+            return self._obj.process(data) + self._obj.flush()
+        return self._obj.compress(data) + self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == ZSTD:
+            return self._obj.flush()
+        if self.encoding == BROTLI:
+            return self._obj.finish()
+        return self._obj.flush(zlib.Z_FINISH)
+
+
+async def run_sized(size: int, fn: Callable[..., Any], *args: Any) -> Any:
+    """Executa fn(*args) no threadpool se size >= OFFLOAD_MIN_BYTES; senão direto no loop."""
+    if size >= OFFLOAD_MIN_BYTES:
+        return await run_in_threadpool(fn, *args)
+    return fn(*args)
+
+
+def _compressible(content_type: str) -> bool:
+    content_type = content_type.lower()
+    return bool(content_type) and not content_type.startswith(_SKIP_PREFIXES)
+
+
+def _add_vary(headers: MutableHeaders):
+    vary = headers.get("vary")
+    if not vary:
+        headers["Vary"] = "Accept-Encoding"
+    elif "accept-encoding" not in vary.lower():
+        headers["Vary"] = vary + ", Accept-Encoding"
+
+
+class CompressionStats:
+    """Contadores do middleware (em /stats)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, int] = {
+            "compression_responses": 0,
+            "compression_streams": 0,
+            "compression_bytes_in": 0,
+            "compression_bytes_out": 0,
+        }
+
+    def count(self, key: str, n: int = 1):
+        with self._lock:
+            self._stats[key] += n
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "compression_encodings": ",".join(available_encodings())}
+
+
+class CompressionMiddleware:
+    """
+    Middleware ASGI de compressão (no lugar do GZipMiddleware do Starlette:
+    br/zstd, flush por chunk em streams e respeito a Content-Encoding já
+    definido pela resposta).
+    """
+
+    def __init__(self, app: Callable, minimum_size: int = 1024, encodings: Optional[List[str]] = None,
+                 stats: Optional[CompressionStats] = None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encodings = encodings or available_encodings()
+        self.stats = stats or CompressionStats()
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = Headers(scope=scope).get("accept-encoding", "")
+        encoding = negotiate(accept, self.encodings)
+        state: Dict[str, Any] = {"start": None, "mode": None, "stream": None}
+
+        async def send_wrapper(message: Dict[str, Any]):
+            kind = message["type"]
+            if kind == "http.response.start":
+                # Só decide no primeiro corpo (tamanho e se é stream)
+                state["start"] = message
+                return
+            if kind != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            if state["mode"] is None:
+                start = state["start"]
+                headers = MutableHeaders(raw=start["headers"])
+                pre_encoded = headers.get("content-encoding")
+                if pre_encoded == GZIP and not more and negotiate(accept, [GZIP]) is None:
+                    # Pré-codificada (cache) para um cliente sem gzip: decodifica
+                    body = await run_sized(len(body), decompress, body, GZIP)
+                    del headers["Content-Encoding"]
+                    headers["Content-Length"] = str(len(body))
+                    pre_encoded = None
+                if pre_encoded:
+                    # Pré-codificada e aceita: vai como está, sem recomprimir
+                    _add_vary(headers)
+                    state["mode"] = "pass"
+                elif (encoding is None or start["status"] in (204, 206, 304)
+                        or not _compressible(headers.get("content-type", ""))
+                        or (not more and len(body) < self.minimum_size)):
+                    state["mode"] = "pass"
+                elif not more:
+                    compressed = await run_sized(len(body), compress, body, encoding)
+                    self.stats.count("compression_responses")
+                    self.stats.count("compression_bytes_in", len(body))
+                    self.stats.count("compression_bytes_out", len(compressed))
+                    headers["Content-Encoding"] = encoding
+                    headers["Content-Length"] = str(len(compressed))
+                    self._weaken_etag(headers)
+                    _add_vary(headers)
+                    body = compressed
+                    state["mode"] = "pass"
+                else:
+                    state["mode"] = "stream"
+                    state["stream"] = StreamCompressor(encoding)
+                    del headers["Content-Length"]
+                    headers["Content-Encoding"] = encoding
+                    self._weaken_etag(headers)
+                    _add_vary(headers)
+                    self.stats.count("compression_streams")
+                await send(start)
+
+            if state["mode"] == "stream":
+                out = await run_sized(len(body), state["stream"].chunk, body) if body else b""
+                if not more:
+                    out += state["stream"].finish()
+                self.stats.count("compression_bytes_in", len(body))
+                self.stats.count("compression_bytes_out", len(out))
+                body = out
+            await send({"type": "http.response.body", "body": body, "more_body": more})
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def _weaken_etag(headers: MutableHeaders):
+        # Outra representação dos mesmos bytes: ETag fraco (como o nginx)
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = "W/" + etag
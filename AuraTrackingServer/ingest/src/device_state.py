@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Tuple
+
+# Contagem móvel de 1 h: um contador por minuto, o último é o minuto base
+COUNT_SLOTS = 60
+
+# Colunas da última amostra (mesmas da antiga view device_last_position)
+LATEST_COLUMNS = (
+    "operator_id", "latitude", "longitude", "altitude", "speed_kmh",
+    "bearing", "gps_accuracy", "accel_magnitude",
+)
+
+DEVICE_STATE_COLUMNS = ("device_id", "time") + LATEST_COLUMNS + ("counts_base", "minute_counts")
+
+_LATEST_SET = ",\n        ".join(
+    f"{c} = CASE WHEN EXCLUDED.time >= device_state.time THEN EXCLUDED.{c} ELSE device_state.{c} END"
+    for c in LATEST_COLUMNS
+)
+
+# Última amostra só avança (batches atrasados não voltam a posição) e os
+# contadores são somados alinhando os minutos no banco (função da migration
+# 06_device_state.sql): correto mesmo após reinício do worker ou com a lane
+# de backfill gravando em paralelo
+DEVICE_STATE_UPSERT = f"""
+    INSERT INTO device_state ({", ".join(DEVICE_STATE_COLUMNS)})
+    VALUES %s
+    ON CONFLICT (device_id) DO UPDATE SET
+        {_LATEST_SET},
+        time = GREATEST(device_state.time, EXCLUDED.time),
+        minute_counts = device_state_merge_counts(
+            device_state.minute_counts, device_state.counts_base,
+            EXCLUDED.minute_counts, EXCLUDED.counts_base
+        ),
+        counts_base = GREATEST(device_state.counts_base, EXCLUDED.counts_base),
+        updated_at = NOW()
+"""
+
+
+def _minute(ts: datetime) -> datetime:
+    return ts.astimezone(timezone.utc).replace(second=0, microsecond=0)
+
+
+def device_state_rows(records: List[Dict[str, Any]]) -> List[Tuple[Any, ...]]:
+    """
+    Linhas de DEVICE_STATE_UPSERT para um batch: uma por device, com a
+    amostra mais recente do batch e as contagens por minuto da hora que
+    termina no minuto dela (amostras mais antigas só valem para a posição).
+    """
+    latest: Dict[str, Dict[str, Any]] = {}
+    minutes: Dict[str, Dict[datetime, int]] = {}
+    for record in records:
+        device_id = record["device_id"]
+        current = latest.get(device_id)
+        if current is None or record["time"] > current["time"]:
+            latest[device_id] = record
+        per_minute = minutes.setdefault(device_id, {})
+        minute = _minute(record["time"])
+        per_minute[minute] = per_minute.get(minute, 0) + 1
+
+    rows = []
+    for device_id, record in latest.items():
+        base = _minute(record["time"])
+        counts = [0] * COUNT_SLOTS
+        for minute, n in minutes[device_id].items():
+            slot = COUNT_SLOTS - 1 - int((base - minute) / timedelta(minutes=1))
+            if slot >= 0:
+                counts[slot] += n
+        speed = record.get("speed")
+        rows.append((
+            device_id, record["time"], record.get("operator_id"),
+            record.get("latitude"), record.get("longitude"), record.get("altitude"),
+            speed * 3.6 if speed is not None else None,
+            record.get("bearing"), record.get("gps_accuracy"), record.get("accel_magnitude"),
+            base, counts,
+        ))
+    return rows
@@ -0,0 +1,155 @@
+import math
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Set
+
+import structlog
+
+logger = structlog.get_logger("device_tracker")
+
+
+class StatusChange(NamedTuple):
+    """Transição online/offline de um dispositivo."""
+    device_id: str
+    online: bool
+    last_seen: float
+    operator_id: Optional[str]
+    latitude: Optional[float]
+    longitude: Optional[float]
+
+
+class _Device:
+    """Estado compacto por dispositivo."""
+
+    __slots__ = ("last_seen", "received_at", "online", "scheduled", "operator_id", "latitude", "longitude")
+
+    def __init__(self):
+        self.last_seen = 0.0     # ts da amostra mais recente (relógio do device)
+        self.received_at = 0.0   # chegada dessa amostra (relógio do tracker)
+        self.online = False
+        self.scheduled = False
+        self.operator_id: Optional[str] = None
+        self.latitude: Optional[float] = None
+        self.longitude: Optional[float] = None
+
+
+class DeviceTracker:
+    """
+    Presença online/offline dos dispositivos com expiração por timing wheel.
+
+    Funcionalidades:
+    - touch() O(1), thread-safe (chamado da thread MQTT via broadcaster)
+    - Cada device fica no máximo uma vez na roda, no slot do seu prazo
+      (chegada da última amostra + offline_after). Ao vencer o slot, quem foi
+      visto de novo é reagendado; os demais viram offline. Nada varre a
+      frota inteira.
+    - Prazos no relógio do servidor (clock, monotônico por padrão): um device
+      com relógio adiantado ou atrasado expira offline_after depois da
+      última amostra recebida. O ts do device só decide se a amostra é mais
+      nova que a anterior e se já chegou vencida (atrasada).
+    - Transições (online e offline) ficam pendentes até advance(), que as
+      devolve para virarem eventos do stream
+    """
+
+    def __init__(self, offline_after_seconds: float = 60.0, resolution_seconds: float = 1.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.offline_after = offline_after_seconds
+        self.resolution = resolution_seconds
+        self._clock = clock
+        self._n_slots = int(math.ceil(offline_after_seconds / resolution_seconds)) + 2
+        self._wheel: List[Set[str]] = [set() for _ in range(self._n_slots)]
+        self._devices: Dict[str, _Device] = {}
+        self._transitions: List[StatusChange] = []
+        self._cursor: Optional[int] = None  # Próximo slot absoluto a processar
+        self._online = 0
+        self._lock = threading.Lock()
+
+    def _tick_of(self, ts: float) -> int:
+        return int(ts // self.resolution)
+
+    def _schedule(self, device_id: str, device: _Device):
+        due = self._tick_of(device.received_at + self.offline_after)
+        if self._cursor is not None and due < self._cursor:
+            due = self._cursor
+        self._wheel[due % self._n_slots].add(device_id)
+        device.scheduled = True
+
+    def touch(self, device_id: str, seen_at: float, operator_id: Optional[str] = None,
+              latitude: Optional[float] = None, longitude: Optional[float] = None,
+              now: Optional[float] = None, received_at: Optional[float] = None):
+        """Registra uma amostra; amostras já vencidas (atrasadas) não mudam a presença.
+
+        now: instante atual no relógio de parede, comparado ao ts do device
+        received_at: chegada no relógio do tracker (default clock())
+        """
+        if received_at is None:
+            received_at = self._clock()
+        with self._lock:
+            device = self._devices.get(device_id)
+            if device is None:
+                device = _Device()
+                self._devices[device_id] = device
+
+            if operator_id:
+                device.operator_id = operator_id
+            if latitude is not None and longitude is not None:
+                device.latitude, device.longitude = latitude, longitude
+            if seen_at <= device.last_seen:
+                return
+            device.last_seen = seen_at
+
+            if now is not None and now - seen_at >= self.offline_after:
+                return
+            device.received_at = received_at
+            if not device.online:
+                device.online = True
+                self._online += 1
+                self._transitions.append(self._change(device_id, device))
+            if not device.scheduled:
+                self._schedule(device_id, device)
+
+    def advance(self, now: Optional[float] = None) -> List[StatusChange]:
+        """Processa os slots vencidos até now (relógio do tracker) e retorna as transições pendentes."""
+        if now is None:
+            now = self._clock()
+        target = self._tick_of(now)
+        with self._lock:
+            if self._cursor is None:
+                self._cursor = target
+            # Após uma pausa longa basta uma volta: todos os prazos estão na roda
+            start = max(self._cursor, target - self._n_slots + 1)
+            for tick in range(start, target + 1):
+                slot = self._wheel[tick % self._n_slots]
+                if not slot:
+                    continue
+                self._wheel[tick % self._n_slots] = set()
+                # Slot já processado: quem for reagendado agora cai num slot
+                # à frente (prazo no próprio tick voltaria ao slot esvaziado e
+                # só seria visto uma volta inteira depois)
+                self._cursor = tick + 1
+                for device_id in slot:
+                    device = self._devices[device_id]
+                    device.scheduled = False
+                    if now - device.received_at >= self.offline_after:
+                        device.online = False
+                        self._online -= 1
+                        self._transitions.append(self._change(device_id, device))
+                    else:
+                        self._schedule(device_id, device)
+            self._cursor = target + 1
+
+            transitions, self._transitions = self._transitions, []
+        return transitions
+
+    @staticmethod
+    def _change(device_id: str, device: _Device) -> StatusChange:
+        return StatusChange(device_id, device.online, device.last_seen,
+                            device.operator_id, device.latitude, device.longitude)
+
+    def is_online(self, device_id: str) -> bool:
+        with self._lock:
+            device = self._devices.get(device_id)
+            return bool(device and device.online)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"devices_tracked": len(self._devices), "devices_online": self._online}
@@ -0,0 +1,314 @@
+"""
+Fan-out local da telemetria ao vivo entre processos (Unix domain socket).
+
+O processo de ingest publica; qualquer número de processos de API (ver
+src/api.py) assina e mantém sua própria réplica de FleetState e seu
+próprio TelemetryBroadcaster. Assim o serviço de SSE/WebSocket escala em
+vários cores, independente do ingest.
+
+Protocolo (stream, por conexão):
+    u32 big-endian  tamanho do corpo
+    bytes           JSON
+        {"t": "snapshot", "rows": [...], "counts": [...]}  primeira mensagem
+        {"t": "batch", "rows": [...], "late": [...]}       uma por tick
+
+Cada row é uma lista na ordem de ROW_FIELDS. counts são as contagens
+horárias do FleetState ([device_id, início da hora epoch, n]). late
+(opcional) são gravações que não vêm nas rows, como eventos e chunks da
+lane de backfill, e só invalidam o cache de respostas
+([device_id, início epoch, fim epoch]).
+"""
+
+import asyncio
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import structlog
+
+logger = structlog.get_logger("fanout")
+
+ROW_FIELDS = (
+    "device_id", "operator_id", "time", "latitude", "longitude",
+    "speed", "battery_level", "cellular_rsrp", "wifi_rssi", "live",
+)
+
+_LENGTH = struct.Struct(">I")
+
+
+def encode_row(record: Dict[str, Any], live: bool = True) -> list:
+    """Reduz o registro do IngestWorker aos campos usados por FleetState e broadcaster."""
+    row = [record.get(f) for f in ROW_FIELDS[:-1]]
+    row[2] = record["time"].timestamp()
+    row.append(live)
+    return row
+
+
+def decode_row(row: list) -> Dict[str, Any]:
+    record = dict(zip(ROW_FIELDS, row))
+    record["time"] = datetime.fromtimestamp(record["time"], tz=timezone.utc)
+    return record
+
+
+def _frame(message: Dict[str, Any]) -> bytes:
+    body = json.dumps(message, separators=(",", ":")).encode("utf-8")
+    return _LENGTH.pack(len(body)) + body
+
+
+class _Client:
+    """Conexão de um assinante: socket não bloqueante e bytes ainda não enviados."""
+
+    __slots__ = ("conn", "pending")
+
+    def __init__(self, conn: socket.socket):
+        conn.setblocking(False)
+        self.conn = conn
+        self.pending = bytearray()
+
+    def flush(self):
+        """Envia o que o socket aceitar agora; o resto fica para o próximo tick.
+
+        Raises:
+            OSError: conexão encerrada pelo assinante
+        """
+        while self.pending:
+            try:
+                sent = self.conn.send(self.pending)
+            except (BlockingIOError, InterruptedError):
+                return
+            del self.pending[:sent]
+
+
+class FanoutPublisher:
+    """
+    Lado do ingest: servidor UDS que envia um lote por tick a cada assinante.
+
+    Funcionalidades:
+    - publish() só acumula (chamado da thread MQTT, não faz I/O)
+    - Thread de tick: um lote por assinante por tick, com todos os registros
+    - Snapshot do FleetState para cada assinante novo
+    - Envio não bloqueante com buffer por assinante: um assinante lento não
+      atrasa os demais; o que o socket não aceitou sai nos ticks seguintes
+    - Assinante cujo buffer passa de max_buffer_bytes é desconectado; ao
+      reconectar recebe um snapshot novo em vez de um backlog
+    """
+
+    def __init__(self, path: str, fleet_state: Any, tick_ms: int = 100,
+                 max_buffer_bytes: int = 8 * 1024 * 1024):
+        self.path = path
+        self.fleet_state = fleet_state
+        self.tick_seconds = tick_ms / 1000
+        self.max_buffer_bytes = max_buffer_bytes
+        self._buffer: List[list] = []
+        self._late: List[list] = []
+        self._lock = threading.Lock()
+        self._clients: List[_Client] = []
+        self._new_clients: List[socket.socket] = []
+        self._server: Optional[socket.socket] = None
+        self._running = False
+        self._stats = {
+            "fanout_rows_published": 0,
+            "fanout_batches_sent": 0,
+            "fanout_clients_dropped": 0,
+        }
+
+    def start(self):
+        """Abre o socket e inicia as threads de accept e de tick."""
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # Socket de uma execução anterior
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.path)
+        self._server.listen(64)
+        self._running = True
+        threading.Thread(target=self._accept_loop, daemon=True, name="fanout-accept").start()
+        threading.Thread(target=self._tick_loop, daemon=True, name="fanout-tick").start()
+        logger.info("fanout_publisher_started", path=self.path, tick_seconds=self.tick_seconds)
+
+    def stop(self):
+        self._running = False
+        if self._server:
+            self._server.close()
+        with self._lock:
+            conns = [c.conn for c in self._clients] + self._new_clients
+            self._clients, self._new_clients = [], []
+        for conn in conns:
+            conn.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def publish(self, record: Dict[str, Any], live: bool = True):
+        """Acumula um registro para o próximo tick (live=False: backfill, só estado)."""
+        row = encode_row(record, live)
+        with self._lock:
+            self._buffer.append(row)
+            self._stats["fanout_rows_published"] += 1
+
+    def invalidate(self, device_id: str, start: datetime, end: Optional[datetime] = None):
+        """Acumula uma invalidação de [start, end] para o próximo tick (eventos e backfill gravados)."""
+        with self._lock:
+            self._late.append([device_id, start.timestamp(), (end or start).timestamp()])
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                break
+            with self._lock:
+                self._new_clients.append(conn)
+            logger.info("fanout_client_connected")
+
+    def _tick_loop(self):
+        while self._running:
+            time.sleep(self.tick_seconds)
+            try:
+                self._tick()
+            except Exception as e:
+                logger.error("fanout_tick_error", error=str(e))
+
+    def _tick(self):
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+            late, self._late = self._late, []
+            new_clients, self._new_clients = self._new_clients, []
+
+        if (rows or late) and self._clients:
+            message: Dict[str, Any] = {"t": "batch", "rows": rows}
+            if late:
+                message["late"] = late
+            frame = _frame(message)
+            for client in self._clients:
+                client.pending += frame
+            self._stats["fanout_batches_sent"] += 1
+
+        if new_clients:
+            # Depois do lote: o snapshot já contém esses registros
+            snapshot = _frame({
+                "t": "snapshot",
+                "rows": [encode_row(r) for r in self.fleet_state.records()],
+                "counts": [[d, h.timestamp(), n] for d, h, n in self.fleet_state.hourly_counts()],
+            })
+            for conn in new_clients:
+                client = _Client(conn)
+                client.pending += snapshot
+                self._clients.append(client)
+
+        # Só esta thread mexe em _clients depois do accept
+        self._clients = [c for c in self._clients if self._flush(c)]
+
+    def _flush(self, client: _Client) -> bool:
+        error = None
+        try:
+            client.flush()
+        except OSError as e:
+            error = str(e)
+        if error is None and len(client.pending) > self.max_buffer_bytes:
+            error = "buffer cheio"
+        if error is None:
+            return True
+        self._stats["fanout_clients_dropped"] += 1
+        logger.warning("fanout_client_dropped", error=error, pending_bytes=len(client.pending))
+        client.conn.close()
+        return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        clients = list(self._clients)
+        return {
+            **self._stats,
+            "fanout_clients": len(clients),
+            "fanout_pending_bytes": sum(len(c.pending) for c in clients),
+        }
+
+
+class FanoutSubscriber:
+    """
+    Lado da API: assina o publisher e alimenta FleetState e broadcaster locais.
+
+    Roda como task no event loop do processo de API e reconecta sozinho.
+    Com response_cache, cada linha atrasada (e cada invalidação de "late")
+    invalida as respostas em cache que cobrem o device/instante.
+    """
+
+    def __init__(self, path: str, fleet_state: Any, broadcaster: Any, reconnect_seconds: float = 1.0,
+                 response_cache: Any = None):
+        self.path = path
+        self.fleet_state = fleet_state
+        self.broadcaster = broadcaster
+        self.response_cache = response_cache
+        self.reconnect_seconds = reconnect_seconds
+        self.connected = False
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {
+            "fanout_rows_received": 0,
+            "fanout_batches_received": 0,
+            "fanout_snapshots_received": 0,
+            "fanout_reconnects": 0,
+        }
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self):
+        while True:
+            writer = None
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+                self.connected = True
+                logger.info("fanout_connected", path=self.path)
+                while True:
+                    header = await reader.readexactly(_LENGTH.size)
+                    body = await reader.readexactly(_LENGTH.unpack(header)[0])
+                    self._handle(json.loads(body))
+            except (OSError, asyncio.IncompleteReadError) as e:
+                if self.connected:
+                    logger.warning("fanout_disconnected", error=str(e))
+                self.connected = False
+                self._stats["fanout_reconnects"] += 1
+            finally:
+                if writer is not None:
+                    writer.close()
+            await asyncio.sleep(self.reconnect_seconds)
+
+    def _handle(self, message: Dict[str, Any]):
+        rows = [decode_row(r) for r in message.get("rows", [])]
+        if message.get("t") == "snapshot":
+            self.fleet_state.clear()
+            counts = [(d, datetime.fromtimestamp(h, tz=timezone.utc), n) for d, h, n in message["counts"]]
+            self.fleet_state.seed(rows, counts)
+            self._stats["fanout_snapshots_received"] += 1
+            return
+
+        self._stats["fanout_batches_received"] += 1
+        self._stats["fanout_rows_received"] += len(rows)
+        for record in rows:
+            self.fleet_state.update(record)
+            if self.response_cache is not None:
+                self.response_cache.invalidate_late(record["device_id"], record["time"])
+            if record.pop("live") and self.broadcaster:
+                self.broadcaster.publish(record["device_id"], record)
+        if self.response_cache is not None:
+            for device_id, start, end in message.get("late", ()):
+                self.response_cache.invalidate_late(
+                    device_id,
+                    datetime.fromtimestamp(start, tz=timezone.utc),
+                    datetime.fromtimestamp(end, tz=timezone.utc),
+                )
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self._stats, "fanout_connected": self.connected}
@@ -0,0 +1,188 @@
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+import structlog
+
+logger = structlog.get_logger("fleet_state")
+
+# Janela do contador de pontos (buckets de 1 hora)
+COUNT_WINDOW_HOURS = 24
+
+
+class DeviceState:
+    """Último estado conhecido de um dispositivo."""
+
+    __slots__ = (
+        "device_id", "operator_id", "time",
+        "latitude", "longitude", "speed_kmh",
+        "battery_level", "cellular_rsrp", "wifi_rssi",
+        "_hour_slots", "_hour_counts",
+    )
+
+    def __init__(self, device_id: str):
+        self.device_id = device_id
+        self.operator_id: Optional[str] = None
+        self.time: Optional[datetime] = None
+        self.latitude: Optional[float] = None
+        self.longitude: Optional[float] = None
+        self.speed_kmh: Optional[float] = None
+        self.battery_level: Optional[int] = None
+        self.cellular_rsrp: Optional[int] = None
+        self.wifi_rssi: Optional[int] = None
+        # Ring de 24 buckets horários: hora (epoch // 3600) e contagem
+        self._hour_slots = [-1] * COUNT_WINDOW_HOURS
+        self._hour_counts = [0] * COUNT_WINDOW_HOURS
+
+    def count(self, hour: int, n: int = 1):
+        slot = hour % COUNT_WINDOW_HOURS
+        if self._hour_slots[slot] != hour:
+            if self._hour_slots[slot] > hour:
+                return  # Amostra mais antiga que a janela
+            self._hour_slots[slot] = hour
+            self._hour_counts[slot] = 0
+        self._hour_counts[slot] += n
+
+    def hours(self) -> List[tuple]:
+        """Buckets horários preenchidos: [(hora epoch // 3600, contagem)]."""
+        return [(h, c) for h, c in zip(self._hour_slots, self._hour_counts) if h >= 0 and c]
+
+    def points_24h(self, now_hour: int) -> int:
+        oldest = now_hour - COUNT_WINDOW_HOURS
+        return sum(c for h, c in zip(self._hour_slots, self._hour_counts) if h > oldest)
+
+    def to_record(self) -> Dict[str, Any]:
+        """Estado no mesmo formato de chaves do registro do IngestWorker."""
+        return {
+            "device_id": self.device_id,
+            "operator_id": self.operator_id,
+            "time": self.time,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "speed": self.speed_kmh / 3.6 if self.speed_kmh is not None else None,
+            "battery_level": self.battery_level,
+            "cellular_rsrp": self.cellular_rsrp,
+            "wifi_rssi": self.wifi_rssi,
+        }
+
+
+class FleetState:
+    """
+    Tabela em memória com o último estado conhecido de cada dispositivo.
+
+    Funcionalidades:
+    - Atualizada pelo IngestWorker a cada pacote aceito (thread MQTT)
+    - Pacotes atrasados (queued) não sobrescrevem um estado mais recente
+    - Contagem de pontos nas últimas 24h por dispositivo
+    - Serve /api/devices e o snapshot inicial do stream sem consultar o banco
+    """
+
+    def __init__(self):
+        self._devices: Dict[str, DeviceState] = {}
+        self._lock = threading.Lock()
+
+    def update(self, record: Dict[str, Any]):
+        """Aplica um registro de telemetria aceito."""
+        ts: datetime = record["time"]
+        with self._lock:
+            state = self._devices.get(record["device_id"])
+            if state is None:
+                state = DeviceState(record["device_id"])
+                self._devices[state.device_id] = state
+
+            state.count(int(ts.timestamp()) // 3600)
+
+            if state.time is not None and ts < state.time:
+                return
+
+            speed = record.get("speed")
+            state.time = ts
+            state.operator_id = record.get("operator_id") or state.operator_id
+            if record.get("latitude") is not None and record.get("longitude") is not None:
+                state.latitude = record["latitude"]
+                state.longitude = record["longitude"]
+            state.speed_kmh = speed * 3.6 if speed is not None else None
+            if record.get("battery_level") is not None:
+                state.battery_level = record["battery_level"]
+            if record.get("cellular_rsrp") is not None:
+                state.cellular_rsrp = record["cellular_rsrp"]
+            if record.get("wifi_rssi") is not None:
+                state.wifi_rssi = record["wifi_rssi"]
+
+    def seed(self, last_rows: Iterable[Dict[str, Any]], hourly_counts: Iterable[tuple] = ()):
+        """Carga inicial a partir do banco (startup), antes do tráfego MQTT."""
+        for row in last_rows:
+            self.update(row)
+        with self._lock:
+            for device_id, hour_start, n in hourly_counts:
+                state = self._devices.get(device_id)
+                if state is not None:
+                    hour = int(hour_start.timestamp()) // 3600
+                    # update() já contou a última amostra na sua hora
+                    if state.time and int(state.time.timestamp()) // 3600 == hour:
+                        n -= 1
+                    state.count(hour, n)
+        logger.info("fleet_state_seeded", devices=len(self._devices))
+
+    def hourly_counts(self) -> List[tuple]:
+        """Contagens horárias no formato aceito por seed(): (device_id, início da hora, n)."""
+        with self._lock:
+            return [
+                (s.device_id, datetime.fromtimestamp(hour * 3600, tz=timezone.utc), n)
+                for s in self._devices.values()
+                for hour, n in s.hours()
+            ]
+
+    def clear(self):
+        with self._lock:
+            self._devices.clear()
+
+    def get(self, device_id: str) -> Optional[DeviceState]:
+        with self._lock:
+            return self._devices.get(device_id)
+
+    def records(self, max_age_seconds: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Estados como registros (para o snapshot do stream), do mais recente ao mais antigo."""
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            states = [
+                s for s in self._devices.values()
+                if s.time is not None and (
+                    max_age_seconds is None or (now - s.time).total_seconds() <= max_age_seconds
+                )
+            ]
+            records = [s.to_record() for s in states]
+        records.sort(key=lambda r: r["time"], reverse=True)
+        return records
+
+    def devices(self, max_age_seconds: float = 300, online_seconds: float = 60) -> List[Dict[str, Any]]:
+        """Lista no formato de /api/devices."""
+        now = datetime.now(timezone.utc)
+        now_hour = int(time.time()) // 3600
+        devices = []
+        with self._lock:
+            for state in self._devices.values():
+                if state.time is None:
+                    continue
+                age = (now - state.time).total_seconds()
+                if age > max_age_seconds:
+                    continue
+                devices.append({
+                    "device_id": state.device_id,
+                    "operator_id": state.operator_id,
+                    "last_seen": state.time.isoformat(),
+                    "latitude": state.latitude,
+                    "longitude": state.longitude,
+                    "speed_kmh": state.speed_kmh,
+                    "battery_level": state.battery_level,
+                    "cellular_rsrp": state.cellular_rsrp,
+                    "wifi_rssi": state.wifi_rssi,
+                    "total_points_24h": state.points_24h(now_hour),
+                    "status": "online" if age < online_seconds else "offline",
+                })
+        devices.sort(key=lambda d: d["last_seen"], reverse=True)
+        return devices
+
+    def __len__(self) -> int:
+        return len(self._devices)
@@ -0,0 +1,202 @@
+import heapq
+import json
+from datetime import datetime
+from typing import Any, Callable, ContextManager, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import structlog
+
+from .pagination import Cursor
+
+logger = structlog.get_logger("history")
+
+# Colunas de /api/history, na ordem esperada por history_point()
+HISTORY_COLUMNS = """
+    time, device_id, operator_id,
+    latitude, longitude, speed_kmh,
+    satellites, h_acc, v_acc, s_acc,
+    accel_magnitude, gyro_magnitude,
+    mag_x, mag_y, mag_z, mag_magnitude,
+    linear_accel_magnitude,
+    azimuth, pitch, roll,
+    battery_level, battery_status, battery_temperature,
+    wifi_rssi, cellular_network_type, cellular_operator, cellular_rsrp,
+    transmission_mode
+"""
+
+
+def _f(value: Any) -> Optional[float]:
+    return float(value) if value is not None else None
+
+
+def _i(value: Any) -> Optional[int]:
+    return int(value) if value is not None else None
+
+
+def history_point(row: tuple) -> Dict[str, Any]:
+    """Converte uma linha de HISTORY_COLUMNS no ponto JSON de /api/history."""
+    return {
+        "ts": row[0].isoformat() if row[0] else None,
+        "device_id": row[1],
+        "operator_id": row[2],
+        "lat": _f(row[3]),
+        "lon": _f(row[4]),
+        "speed_kmh": _f(row[5]),
+        # GPS detalhado
+        "satellites": _i(row[6]),
+        "h_acc": _f(row[7]),
+        "v_acc": _f(row[8]),
+        "s_acc": _f(row[9]),
+        # IMU expandido
+        "accel_magnitude": _f(row[10]),
+        "gyro_magnitude": _f(row[11]),
+        "mag_x": _f(row[12]),
+        "mag_y": _f(row[13]),
+        "mag_z": _f(row[14]),
+        "mag_magnitude": _f(row[15]),
+        "linear_accel_magnitude": _f(row[16]),
+        # Orientação
+        "azimuth": _f(row[17]),
+        "pitch": _f(row[18]),
+        "roll": _f(row[19]),
+        # Sistema
+        "battery_level": _i(row[20]),
+        "battery_status": row[21] if row[21] else None,
+        "battery_temperature": _f(row[22]),
+        "wifi_rssi": _i(row[23]),
+        "cellular_network_type": row[24] if row[24] else None,
+        "cellular_operator": row[25] if row[25] else None,
+        "cellular_rsrp": _i(row[26]),
+        # Flag de transmissão
+        "transmission_mode": row[27] if row[27] else "online",
+    }
+
+
+def build_history_query(start: datetime, end: datetime, device_id: Optional[str],
+                        limit: Optional[int], after: Optional[Cursor] = None) -> Tuple[str, List[Any]]:
+    """
+    SQL e parâmetros de /api/history (pontos com posição, ordem temporal).
+
+    after: keyset (time, device_id) da página anterior. (time, device_id) é
+    único em telemetry, então a página seguinte é um range scan no índice
+    único (ou em (device_id, time) com device_id) sem OFFSET.
+    """
+    query = f"""
+        SELECT {HISTORY_COLUMNS}
+        FROM telemetry
+        WHERE time >= %s AND time <= %s
+          AND latitude IS NOT NULL AND longitude IS NOT NULL
+    """
+    params: List[Any] = [start, end]
+
+    if device_id:
+        query += " AND device_id = %s"
+        params.append(device_id)
+        if after is not None:
+            query += " AND time > %s"
+            params.append(after.time)
+    elif after is not None:
+        query += " AND (time, device_id) > (%s, %s)"
+        params.extend([after.time, after.device_id])
+
+    query += " ORDER BY time ASC, device_id ASC"
+    if limit:
+        query += " LIMIT %s"
+        params.append(limit)
+    return query, params
+
+
+# Devices com amostra na janela, pelos buckets por minuto de /api/summary
+# (src/summary_buckets.py): sem varrer a telemetria
+ACTIVE_DEVICES_QUERY = """
+    SELECT DISTINCT unnest(devices)
+    FROM summary_1min
+    WHERE bucket >= time_bucket('1 minute', %s::timestamptz) AND bucket <= %s
+    ORDER BY 1
+"""
+
+
+def fetch_active_devices(cursor, start: datetime, end: datetime) -> List[str]:
+    cursor.execute(ACTIVE_DEVICES_QUERY, [start, end])
+    return [row[0] for row in cursor.fetchall()]
+
+
+def fetch_device_histories(cursor, start: datetime, end: datetime, device_ids: Sequence[str],
+                           per_device_limit: Optional[int], max_total: Optional[int] = None) -> Dict[str, List[tuple]]:
+    """
+    Um range scan por device (índice (device_id, time)), cada um com o
+    próprio orçamento: um device falante não consome o limite dos outros.
+    per_device_limit None lê a janela inteira de cada device; max_total
+    interrompe os scans quando o total do lote passa dele.
+    """
+    out: Dict[str, List[tuple]] = {}
+    total = 0
+    for device_id in device_ids:
+        cursor.execute(*build_history_query(start, end, device_id, per_device_limit))
+        out[device_id] = cursor.fetchall()
+        total += len(out[device_id])
+        if max_total is not None and total > max_total:
+            break
+    return out
+
+
+def split_devices(device_ids: Sequence[str], groups: int) -> List[List[str]]:
+    """Reparte os devices em até `groups` lotes (round-robin), um por conexão de leitura."""
+    groups = max(1, min(groups, len(device_ids)))
+    return [list(device_ids[i::groups]) for i in range(groups)]
+
+
+def merge_histories(histories: Iterable[List[tuple]]) -> Iterator[tuple]:
+    """Intercala as listas por device (já em ordem de time) em ordem (time, device_id), sob demanda."""
+    return heapq.merge(*histories, key=lambda row: (row[0], row[1]))
+
+
+def ndjson_chunk(rows: List[tuple]) -> bytes:
+    """Um ponto NDJSON por linha do cursor."""
+    return "".join(
+        json.dumps(history_point(row), separators=(",", ":")) + "\n" for row in rows
+    ).encode("utf-8")
+
+
+def iter_ndjson(rows: Iterable[tuple], chunk_rows: int = 2000) -> Iterator[bytes]:
+    """NDJSON de linhas já em memória ou de um iterador (ex.: merge_histories), em chunks."""
+    batch: List[tuple] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == chunk_rows:
+            yield ndjson_chunk(batch)
+            batch = []
+    if batch:
+        yield ndjson_chunk(batch)
+
+
+def stream_ndjson(connection: Callable[[], ContextManager[Any]], start: datetime, end: datetime,
+                  device_id: Optional[str], limit: Optional[int], after: Optional[Cursor] = None,
+                  chunk_rows: int = 2000) -> Iterator[bytes]:
+    """
+    Gera o NDJSON de build_history_query em páginas keyset de chunk_rows.
+
+    Um ponto por linha, um chunk de bytes por página: a memória fica
+    limitada à página, independente do total. Cada página pega uma conexão
+    do pool de leitura (connection() é o context manager de ReadPool) e a
+    devolve antes do chunk ser entregue: um cliente lento não prende
+    conexão enquanto lê. Cada página é uma consulta própria (linhas que
+    chegarem atrasadas antes da posição já entregue não entram).
+    Erro no meio do stream (ou pool ocupado) vira uma última linha {"error": ...}.
+    """
+    rows = 0
+    try:
+        while True:
+            page = chunk_rows if not limit else min(chunk_rows, limit - rows)
+            with connection() as conn, conn.cursor() as cur:
+                cur.execute(*build_history_query(start, end, device_id, page, after))
+                batch = cur.fetchall()
+            if not batch:
+                break
+            rows += len(batch)
+            yield ndjson_chunk(batch)
+            if len(batch) < page or (limit and rows >= limit):
+                break
+            after = Cursor(batch[-1][0], batch[-1][1])
+    except Exception as e:
+        logger.error("history_stream_failed", rows=rows, error=str(e))
+        yield (json.dumps({"error": str(e)}) + "\n").encode("utf-8")
@@ -0,0 +1,452 @@
+"""
+Instrumentação das consultas da API: por endpoint e por instrução SQL.
+
+- QueryInstrumentationMiddleware (ASGI): tempo de parede, status, bytes
+  serializados (antes da compressão), tempo de banco e linhas de cada
+  requisição, agregados pelo template da rota (/api/history, /tiles/{z}/...)
+- Cursor instrumentado (cursor_factory das conexões do ReadPool): tempo
+  de execute + fetch e linhas devolvidas por instrução, identificada pelo
+  texto normalizado (as consultas usam placeholders, o texto é estável)
+- Escritas do ingest (DatabasePool) via measure(): um registro por
+  chamada com o template SQL, tempo até o commit e linhas escritas
+  (execute_batch/execute_values mandam páginas com os valores no texto,
+  que virariam uma instrução distinta por página no cursor instrumentado)
+- Instruções acima de slow_ms entram num ring limitado em memória; uma
+  thread captura o plano com EXPLAIN (ANALYZE, BUFFERS) numa conexão do
+  pool de leitura, no máximo uma vez por instrução a cada cooldown
+  (EXPLAIN ANALYZE executa a consulta de novo)
+- Exposto em /debug/queries (JSON) e /metrics (Prometheus). Com vários
+  processos de API, PROMETHEUS_MULTIPROC_DIR agrega os processos
+  (src/api.py define e limpa o diretório)
+"""
+
+import contextlib
+import contextvars
+import hashlib
+import json
+import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Callable, ContextManager, Deque, Dict, Iterator, List, Optional, Tuple
+
+import psycopg2.extensions
+import structlog
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:
+    prometheus_client = None
+
+# Content-Type do formato texto de exposição do Prometheus
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+logger = structlog.get_logger("instrumentation")
+
+# Limites de memória: instruções distintas, texto e parâmetros guardados
+MAX_STATEMENTS = 500
+STATEMENT_TEXT_CHARS = 2000
+PARAMS_TEXT_CHARS = 500
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_statement(query: Any) -> str:
+    """Texto da instrução sem espaços repetidos (identidade da instrução)."""
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    elif not isinstance(query, str):
+        query = str(query)  # psycopg2.sql.Composed
+    return _WHITESPACE.sub(" ", query).strip()
+
+
+def statement_id(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=6).hexdigest()
+
+
+class RequestStats:
+    """Acumulado de banco da requisição corrente (compartilhado com as threads do threadpool)."""
+
+    __slots__ = ("scope", "db_seconds", "rows", "statements", "_lock")
+
+    def __init__(self, scope: Dict[str, Any]):
+        self.scope = scope
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.statements = 0
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float, rows: int):
+        with self._lock:
+            self.db_seconds += seconds
+            self.rows += rows
+            self.statements += 1
+
+    @property
+    def endpoint(self) -> str:
+        # O roteador do FastAPI grava a rota no próprio scope antes do handler rodar
+        route = self.scope.get("route")
+        return route.path if route is not None else "unmatched"
+
+
+# Requisição corrente: o anyio copia o contexto para as threads de run_in_threadpool
+_current_request: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar(
+    "current_request", default=None
+)
+
+
+class _Aggregate:
+    """Contadores de um endpoint ou de uma instrução."""
+
+    __slots__ = ("calls", "errors", "seconds", "max_seconds", "rows", "bytes", "db_seconds", "endpoints")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.db_seconds = 0.0
+        self.endpoints: set = set()
+
+    def add(self, seconds: float, rows: int, error: bool):
+        self.calls += 1
+        self.errors += int(error)
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.rows += rows
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "total_ms": round(self.seconds * 1000, 1),
+            "mean_ms": round(self.seconds * 1000 / max(self.calls, 1), 2),
+            "max_ms": round(self.max_seconds * 1000, 1),
+            "rows": self.rows,
+        }
+
+
+class _Metrics:
+    """Métricas Prometheus (registro próprio; multiprocesso quando configurado)."""
+
+    def __init__(self):
+        self.registry = prometheus_client.CollectorRegistry()
+        self.request_seconds = prometheus_client.Histogram(
+            "auratracking_http_request_duration_seconds", "Tempo de parede das requisições HTTP",
+            ["endpoint", "method", "status"], registry=self.registry,
+        )
+        self.response_bytes = prometheus_client.Counter(
+            "auratracking_http_response_bytes", "Bytes serializados (antes da compressão)",
+            ["endpoint"], registry=self.registry,
+        )
+        self.request_db_seconds = prometheus_client.Counter(
+            "auratracking_http_db_seconds", "Tempo de banco das requisições",
+            ["endpoint"], registry=self.registry,
+        )
+        self.request_rows = prometheus_client.Counter(
+            "auratracking_http_db_rows", "Linhas lidas do banco pelas requisições",
+            ["endpoint"], registry=self.registry,
+        )
+        self.sql_seconds = prometheus_client.Histogram(
+            "auratracking_sql_duration_seconds", "Tempo de execute + fetch por instrução SQL",
+            ["query_id"], registry=self.registry,
+        )
+        self.sql_rows = prometheus_client.Counter(
+            "auratracking_sql_rows", "Linhas devolvidas por instrução SQL",
+            ["query_id"], registry=self.registry,
+        )
+        self.sql_errors = prometheus_client.Counter(
+            "auratracking_sql_errors", "Instruções SQL com erro",
+            ["query_id"], registry=self.registry,
+        )
+        self.sql_slow = prometheus_client.Counter(
+            "auratracking_sql_slow", "Instruções SQL acima do limite de lentidão",
+            ["query_id"], registry=self.registry,
+        )
+
+    def render(self) -> bytes:
+        registry = self.registry
+        if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+            registry = prometheus_client.CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        return prometheus_client.generate_latest(registry)
+
+
+class QueryInstrumentation:
+    """
+    Agregados por endpoint e por instrução, ring de instruções lentas e
+    captura de planos. Uma instância por processo (worker), como o cache
+    de respostas.
+    """
+
+    def __init__(self, slow_ms: float = 500, ring_size: int = 50, explain_cooldown_seconds: float = 300):
+        self.slow_seconds = slow_ms / 1000.0
+        self.explain_cooldown_seconds = explain_cooldown_seconds
+        self._lock = threading.Lock()
+        self._endpoints: Dict[Tuple[str, str], _Aggregate] = {}
+        self._statements: Dict[str, Tuple[str, _Aggregate]] = {}
+        self._slow: Deque[Dict[str, Any]] = deque(maxlen=ring_size)
+        self._explained_at: Dict[str, float] = {}
+        self._explain_queue: "queue.Queue[Tuple[Dict[str, Any], str, Any]]" = queue.Queue(maxsize=8)
+        self._explain_connection: Optional[Callable[[], ContextManager[Any]]] = None
+        self._explain_thread: Optional[threading.Thread] = None
+        self.metrics = _Metrics() if prometheus_client is not None else None
+
+    # ------------------------------------------------------------------
+    # Ligações
+    # ------------------------------------------------------------------
+
+    def cursor_factory(self) -> type:
+        """Classe de cursor psycopg2 que reporta para esta instância (cursor_factory da conexão)."""
+        return type("InstrumentedCursor", (InstrumentedCursor,), {"instrumentation": self})
+
+    def attach_explain(self, connection: Callable[[], ContextManager[Any]]):
+        """Conexões para capturar planos (ReadPool.connection)."""
+        self._explain_connection = connection
+
+    # ------------------------------------------------------------------
+    # Registro
+    # ------------------------------------------------------------------
+
+    @contextlib.contextmanager
+    def measure(self, statement: str, rows: int) -> Iterator[None]:
+        """Registra o bloco como uma execução de `statement` (template SQL) com `rows` linhas."""
+        t0 = time.perf_counter()
+        error = False
+        try:
+            yield
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.record_statement(statement, None, time.perf_counter() - t0, rows, error)
+
+    def record_statement(self, query: Any, params: Any, seconds: float, rows: int, error: bool):
+        text = normalize_statement(query)[:STATEMENT_TEXT_CHARS]
+        qid = statement_id(text)
+        request = _current_request.get()
+        endpoint = "-"
+        if request is not None:
+            request.add(seconds, rows)
+            endpoint = request.endpoint
+
+        slow = seconds >= self.slow_seconds
+        with self._lock:
+            entry = self._statements.get(qid)
+            if entry is None:
+                if len(self._statements) >= MAX_STATEMENTS:
+                    # Descarta a instrução menos chamada para abrir espaço
+                    victim = min(self._statements, key=lambda k: self._statements[k][1].calls)
+                    del self._statements[victim]
+                entry = self._statements[qid] = (text, _Aggregate())
+            aggregate = entry[1]
+            aggregate.add(seconds, rows, error)
+            aggregate.endpoints.add(endpoint)
+            explain = False
+            if slow:
+                slow_entry = {
+                    "at": datetime.now(timezone.utc).isoformat(),
+                    "query_id": qid,
+                    "endpoint": endpoint,
+                    "duration_ms": round(seconds * 1000, 1),
+                    "rows": rows,
+                    "error": error,
+                    "statement": text,
+                    "params": repr(params)[:PARAMS_TEXT_CHARS],
+                    "plan": None,
+                }
+                self._slow.append(slow_entry)
+                now = time.monotonic()
+                if (not error and self._explain_connection is not None
+                        and text.lstrip("( ").upper().startswith(("SELECT", "WITH"))
+                        and now - self._explained_at.get(qid, -1e9) >= self.explain_cooldown_seconds):
+                    self._explained_at[qid] = now
+                    explain = True
+
+        if self.metrics is not None:
+            self.metrics.sql_seconds.labels(qid).observe(seconds)
+            self.metrics.sql_rows.labels(qid).inc(rows)
+            if error:
+                self.metrics.sql_errors.labels(qid).inc()
+            if slow:
+                self.metrics.sql_slow.labels(qid).inc()
+        if explain:
+            self._enqueue_explain(slow_entry, query, params)
+
+    def record_request(self, request: RequestStats, method: str, status: int, seconds: float,
+                       response_bytes: int):
+        endpoint = request.endpoint
+        with self._lock:
+            aggregate = self._endpoints.get((endpoint, method))
+            if aggregate is None:
+                aggregate = self._endpoints[(endpoint, method)] = _Aggregate()
+            aggregate.add(seconds, request.rows, status >= 500)
+            aggregate.bytes += response_bytes
+            aggregate.db_seconds += request.db_seconds
+        if self.metrics is not None:
+            self.metrics.request_seconds.labels(endpoint, method, str(status)).observe(seconds)
+            self.metrics.response_bytes.labels(endpoint).inc(response_bytes)
+            self.metrics.request_db_seconds.labels(endpoint).inc(request.db_seconds)
+            self.metrics.request_rows.labels(endpoint).inc(request.rows)
+
+    # ------------------------------------------------------------------
+    # Planos
+    # ------------------------------------------------------------------
+
+    def _enqueue_explain(self, slow_entry: Dict[str, Any], query: Any, params: Any):
+        try:
+            self._explain_queue.put_nowait((slow_entry, query, params))
+        except queue.Full:
+            return
+        with self._lock:
+            if self._explain_thread is None:
+                self._explain_thread = threading.Thread(
+                    target=self._explain_loop, name="explain-capture", daemon=True
+                )
+                self._explain_thread.start()
+
+    def _explain_loop(self):
+        while True:
+            slow_entry, query, params = self._explain_queue.get()
+            plan: Any
+            try:
+                with self._explain_connection() as conn:
+                    # Cursor comum: a captura não se mede a si mesma
+                    with conn.cursor(cursor_factory=psycopg2.extensions.cursor) as cur:
+                        cur.execute(b"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + cur.mogrify(query, params))
+                        plan = cur.fetchone()[0]
+                        if isinstance(plan, str):
+                            plan = json.loads(plan)
+            except Exception as e:
+                logger.warning("explain_capture_failed", query_id=slow_entry["query_id"], error=str(e))
+                plan = {"error": str(e)}
+            with self._lock:
+                slow_entry["plan"] = plan
+
+    # ------------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------------
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Conteúdo de /debug/queries: endpoints e instruções por tempo total, lentas mais recentes primeiro."""
+        with self._lock:
+            endpoints = [
+                {"endpoint": endpoint, "method": method, **a.summary(),
+                 "db_ms_total": round(a.db_seconds * 1000, 1), "bytes": a.bytes}
+                for (endpoint, method), a in self._endpoints.items()
+            ]
+            statements = [
+                {"query_id": qid, **a.summary(), "endpoints": sorted(a.endpoints), "statement": text}
+                for qid, (text, a) in self._statements.items()
+            ]
+            slow = [dict(e) for e in reversed(self._slow)]
+        endpoints.sort(key=lambda e: e["total_ms"], reverse=True)
+        statements.sort(key=lambda s: s["total_ms"], reverse=True)
+        return {
+            "slow_ms": self.slow_seconds * 1000,
+            "explain_cooldown_seconds": self.explain_cooldown_seconds,
+            "endpoints": endpoints,
+            "statements": statements,
+            "slow": slow,
+        }
+
+    def render_metrics(self) -> Optional[bytes]:
+        return self.metrics.render() if self.metrics is not None else None
+
+
+class InstrumentedCursor(psycopg2.extensions.cursor):
+    """
+    Cursor que mede cada instrução: tempo de execute mais o dos fetch*
+    seguintes (cursores nomeados buscam no servidor a cada fetch) e linhas
+    devolvidas. A instrução é registrada no próximo execute ou no close.
+    """
+
+    instrumentation: QueryInstrumentation
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._pending: Optional[List[Any]] = None  # [query, params, segundos, linhas]
+
+    def _flush(self, error: bool = False):
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            self.instrumentation.record_statement(pending[0], pending[1], pending[2], pending[3], error)
+
+    def execute(self, query: Any, vars: Any = None):
+        self._flush()
+        t0 = time.perf_counter()
+        try:
+            result = super().execute(query, vars)
+        except Exception:
+            self._pending = [query, vars, time.perf_counter() - t0, 0]
+            self._flush(error=True)
+            raise
+        self._pending = [query, vars, time.perf_counter() - t0, 0]
+        return result
+
+    def _timed_fetch(self, fetch: Callable[[], Any], many: bool) -> Any:
+        t0 = time.perf_counter()
+        try:
+            result = fetch()
+        finally:
+            if self._pending is not None:
+                self._pending[2] += time.perf_counter() - t0
+        if self._pending is not None:
+            self._pending[3] += len(result) if many else int(result is not None)
+        return result
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone, many=False)
+
+    def fetchmany(self, size: Optional[int] = None):
+        fetch = super().fetchmany
+        return self._timed_fetch(lambda: fetch(size) if size is not None else fetch(), many=True)
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall, many=True)
+
+    def close(self):
+        self._flush()
+        super().close()
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Middleware ASGI que mede cada requisição HTTP e expõe o acumulado de
+    banco às instruções executadas nela (contextvars). Registrada dentro do
+    middleware de compressão: bytes contados são os serializados.
+    """
+
+    def __init__(self, app: Callable, instrumentation: QueryInstrumentation):
+        self.app = app
+        self.instrumentation = instrumentation
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request = RequestStats(scope)
+        state = {"status": 500, "bytes": 0}
+        token = _current_request.set(request)
+
+        async def send_wrapper(message: Dict[str, Any]):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                state["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_request.reset(token)
+            self.instrumentation.record_request(
+                request, scope.get("method", ""), state["status"], time.perf_counter() - t0, state["bytes"]
+            )
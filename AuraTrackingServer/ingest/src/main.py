@@ -17,6 +17,7 @@ Funcionalidades:
 """
 
 import asyncio
+import contextlib
 import json
 import os
 import signal
@@ -34,12 +35,44 @@ import paho.mqtt.client as mqtt
 import psycopg2
 import psycopg2.extras
 import structlog
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
 from pydantic import BaseModel, Field, ValidationError
 from tenacity import retry, stop_after_attempt, wait_exponential
 import uvicorn
 
-from .broadcaster import TelemetryBroadcaster
+from .backfill import BackfillLane
+from .batching import sort_and_merge
+from .binning import (
+    BIN_SCHEMA, CELL_TYPES, MAX_CELL_M, MIN_CELL_M, bin_cells, bin_points, bin_rows,
+    build_bins_query, fetch_points,
+)
+from .broadcaster import (
+    TelemetryBroadcaster, format_fleet_frame, format_sse_frame, snapshot_payloads,
+)
+from .columnar import HISTORY_SCHEMA, MEDIA_TYPE as COLUMNAR_MEDIA_TYPE, encode_columnar, infer_schema
+from .compression import CompressionMiddleware, CompressionStats
+from .device_state import DEVICE_STATE_UPSERT, device_state_rows
+from .fanout import FanoutPublisher, FanoutSubscriber
+from .fleet_state import FleetState
+from .instrumentation import METRICS_CONTENT_TYPE, QueryInstrumentation, QueryInstrumentationMiddleware
+from .history import (
+    build_history_query, fetch_active_devices, fetch_device_histories, history_point, iter_ndjson,
+    merge_histories, split_devices, stream_ndjson,
+)
+from .pagination import Cursor, decode_cursor, next_cursor
+from .playback import (
+    FIRST_ROUND_SLICES, MAX_SLICE_SECONDS, MAX_SPEED, MIN_SLICE_SECONDS, MIN_SPEED, ROUND_SLICES,
+    fetch_slices, fetch_snapshot, format_playback_frame,
+)
+from .mvt import MEDIA_TYPE as MVT_MEDIA_TYPE
+from .read_pool import ReadPool, ReadPoolBusy
+from .response_cache import ResponseCache, cache_key
+from .resolution import TIER_COLUMNS, TIERS_BY_NAME, build_tier_query, choose_tier, refresh_windows, tier_point
+from .simplify import simplify_rows
+from .summary_buckets import SUMMARY_SELECT, SUMMARY_UPSERT, MinuteBucket, SummaryBuckets, summarize
+from .tiles import MAX_ZOOM, build_tile_query, render_tile, tile_bounds, tile_tier
+from .subscriptions import SubscriptionFilter, load_areas
+from .ws_codec import FleetFrameEncoder
 
 logger = structlog.get_logger()
 
@@ -71,12 +104,72 @@ class Config:
     batch_timeout_ms: int = field(default_factory=lambda: int(os.getenv("BATCH_TIMEOUT_MS", "5000")))
     offline_queue_path: str = field(default_factory=lambda: os.getenv("OFFLINE_QUEUE_PATH", "/app/queue/offline.db"))
     
+    # Backfill (pacotes queued mais antigos que a política de compressão)
+    compression_horizon_hours: float = field(default_factory=lambda: float(os.getenv("COMPRESSION_HORIZON_HOURS", "72")))
+    chunk_interval_hours: float = field(default_factory=lambda: float(os.getenv("CHUNK_INTERVAL_HOURS", "24")))
+    backfill_batch_size: int = field(default_factory=lambda: int(os.getenv("BACKFILL_BATCH_SIZE", "5000")))
+    backfill_timeout_ms: int = field(default_factory=lambda: int(os.getenv("BACKFILL_TIMEOUT_MS", "30000")))
+    # Intervalo mínimo entre refreshes dos continuous aggregates nas faixas gravadas pelo backfill
+    backfill_refresh_seconds: float = field(default_factory=lambda: float(os.getenv("BACKFILL_REFRESH_SECONDS", "60")))
+    
     # Logging
     log_level: str = field(default_factory=lambda: os.getenv("LOG_LEVEL", "INFO"))
     log_path: str = field(default_factory=lambda: os.getenv("LOG_PATH", "/app/logs"))
     
     # Health
     health_port: int = field(default_factory=lambda: int(os.getenv("HEALTH_PORT", "8080")))
+    
+    # Pool de leitura da API REST (separado da conexão de ingestão)
+    read_pool_size: int = field(default_factory=lambda: int(os.getenv("READ_POOL_SIZE", "4")))
+    read_statement_timeout_ms: int = field(default_factory=lambda: int(os.getenv("READ_STATEMENT_TIMEOUT_MS", "15000")))
+    read_pool_wait_seconds: float = field(default_factory=lambda: float(os.getenv("READ_POOL_WAIT_SECONDS", "5")))
+    # Conexões usadas em paralelo por /api/history?devices= (limitado ao tamanho do pool)
+    history_parallel_scans: int = field(default_factory=lambda: int(os.getenv("HISTORY_PARALLEL_SCANS", "3")))
+    # Pontos brutos lidos para simplificar uma janela (max_points/zoom); acima disso 413
+    history_simplify_max_rows: int = field(default_factory=lambda: int(os.getenv("HISTORY_SIMPLIFY_MAX_ROWS", "1000000")))
+    
+    # Instrumentação de consultas (/debug/queries, /metrics): instruções acima
+    # deste tempo entram no ring de lentas com o plano EXPLAIN (ANALYZE, BUFFERS)
+    slow_query_ms: float = field(default_factory=lambda: float(os.getenv("SLOW_QUERY_MS", "500")))
+    slow_query_ring_size: int = field(default_factory=lambda: int(os.getenv("SLOW_QUERY_RING_SIZE", "50")))
+    slow_query_explain_cooldown_seconds: float = field(
+        default_factory=lambda: float(os.getenv("SLOW_QUERY_EXPLAIN_COOLDOWN_SECONDS", "300"))
+    )
+    
+    # Compressão negociada das respostas (gzip; br/zstd se instalados) a partir deste tamanho
+    compression_min_bytes: int = field(default_factory=lambda: int(os.getenv("COMPRESSION_MIN_BYTES", "1024")))
+    
+    # Cache de respostas históricas (janelas fechadas, com ETag)
+    response_cache_mb: int = field(default_factory=lambda: int(os.getenv("RESPONSE_CACHE_MB", "64")))
+    # Janelas que terminam há menos que isto ainda podem receber dados e não são cacheadas
+    response_cache_late_arrival_seconds: float = field(default_factory=lambda: float(os.getenv("RESPONSE_CACHE_LATE_ARRIVAL_SECONDS", "900")))
+    response_cache_hold_seconds: float = field(default_factory=lambda: float(os.getenv("RESPONSE_CACHE_HOLD_SECONDS", "120")))
+    # Diretório para despejo em disco (vazio desativa)
+    response_cache_dir: str = field(default_factory=lambda: os.getenv("RESPONSE_CACHE_DIR", ""))
+    response_cache_disk_mb: int = field(default_factory=lambda: int(os.getenv("RESPONSE_CACHE_DISK_MB", "512")))
+    
+    # Linhas no máximo por tile de /tiles/{z}/{x}/{y}
+    tile_max_rows: int = field(default_factory=lambda: int(os.getenv("TILE_MAX_ROWS", "200000")))
+    
+    # Buckets por minuto de /api/summary (memória + tabela summary_1min)
+    summary_retention_hours: int = field(default_factory=lambda: int(os.getenv("SUMMARY_RETENTION_HOURS", "168")))
+    summary_persist_seconds: float = field(default_factory=lambda: float(os.getenv("SUMMARY_PERSIST_SECONDS", "30")))
+    
+    # Stream ao vivo (filtros por área nomeada)
+    areas_path: str = field(default_factory=lambda: os.getenv("AREAS_PATH", "/app/config/areas_carregamento.json"))
+    # Tick do broadcaster e intervalo default de cada subscriber (sobrescrito por ?rate_hz=)
+    broadcast_tick_ms: int = field(default_factory=lambda: int(os.getenv("BROADCAST_TICK_MS", "250")))
+    stream_interval_seconds: float = field(default_factory=lambda: float(os.getenv("STREAM_INTERVAL_SECONDS", "5")))
+    # Sem amostra por este tempo o device passa a offline (evento device-status)
+    device_offline_seconds: float = field(default_factory=lambda: float(os.getenv("DEVICE_OFFLINE_SECONDS", "60")))
+    
+    # Fan-out para processos de API (src/api.py); vazio desativa
+    fanout_socket: str = field(default_factory=lambda: os.getenv("FANOUT_SOCKET", ""))
+    fanout_tick_ms: int = field(default_factory=lambda: int(os.getenv("FANOUT_TICK_MS", "100")))
+    # Bytes ainda não lidos por um processo de API antes de desconectá-lo
+    fanout_max_buffer_bytes: int = field(default_factory=lambda: int(os.getenv("FANOUT_MAX_BUFFER_BYTES", str(8 * 1024 * 1024))))
+    api_port: int = field(default_factory=lambda: int(os.getenv("API_PORT", "8081")))
+    api_workers: int = field(default_factory=lambda: int(os.getenv("API_WORKERS", "4")))
 
 
 # ============================================================
@@ -404,15 +497,86 @@ class OfflineQueue:
 # DATABASE CONNECTION POOL
 # ============================================================
 
+# SQL de insert de telemetria, dividido em cabeçalho / template de linha /
+# cláusula de conflito para ser reutilizado por execute_batch e execute_values
+TELEMETRY_INSERT_HEAD = """
+    INSERT INTO telemetry (
+        time, device_id, operator_id, message_id,
+        latitude, longitude, altitude, speed, bearing, gps_accuracy,
+        satellites, h_acc, v_acc, s_acc, hdop, vdop, pdop, gps_timestamp,
+        accel_x, accel_y, accel_z, gyro_x, gyro_y, gyro_z,
+        accel_magnitude,
+        gyro_magnitude,
+        mag_x, mag_y, mag_z, mag_magnitude,
+        linear_accel_x, linear_accel_y, linear_accel_z, linear_accel_magnitude,
+        gravity_x, gravity_y, gravity_z,
+        rotation_vector_x, rotation_vector_y, rotation_vector_z, rotation_vector_w,
+        azimuth, pitch, roll,
+        battery_level, battery_temperature, battery_status, battery_voltage,
+        battery_health, battery_technology,
+        wifi_rssi, wifi_ssid,
+        wifi_bssid, wifi_frequency, wifi_channel,
+        cellular_network_type, cellular_operator, cellular_rsrp, cellular_rsrq, cellular_rssnr,
+        cellular_ci, cellular_pci, cellular_tac, cellular_earfcn, cellular_band, cellular_bandwidth,
+        battery_charge_counter, battery_full_capacity,
+        -- REMOVIDO: motion_significant_motion, motion_stationary_detect, motion_motion_detect,
+        -- motion_flat_up, motion_flat_down, motion_stowed, motion_display_rotate,
+        transmission_mode,
+        topic, received_at, raw_payload
+    ) VALUES
+"""
+
+# Placeholders das colunas motion removidos também dos comentários:
+# o psycopg2 interpreta %(...)s mesmo dentro de comentários SQL
+TELEMETRY_VALUES_TEMPLATE = """(
+        %(time)s, %(device_id)s, %(operator_id)s, %(message_id)s,
+        %(latitude)s, %(longitude)s, %(altitude)s, %(speed)s, %(bearing)s, %(gps_accuracy)s,
+        %(satellites)s, %(h_acc)s, %(v_acc)s, %(s_acc)s, %(hdop)s, %(vdop)s, %(pdop)s, %(gps_timestamp)s,
+        %(accel_x)s, %(accel_y)s, %(accel_z)s, %(gyro_x)s, %(gyro_y)s, %(gyro_z)s,
+        %(accel_magnitude)s,
+        %(gyro_magnitude)s,
+        %(mag_x)s, %(mag_y)s, %(mag_z)s, %(mag_magnitude)s,
+        %(linear_accel_x)s, %(linear_accel_y)s, %(linear_accel_z)s, %(linear_accel_magnitude)s,
+        %(gravity_x)s, %(gravity_y)s, %(gravity_z)s,
+        %(rotation_vector_x)s, %(rotation_vector_y)s, %(rotation_vector_z)s, %(rotation_vector_w)s,
+        %(azimuth)s, %(pitch)s, %(roll)s,
+        %(battery_level)s, %(battery_temperature)s, %(battery_status)s, %(battery_voltage)s,
+        %(battery_health)s, %(battery_technology)s,
+        %(wifi_rssi)s, %(wifi_ssid)s,
+        %(wifi_bssid)s, %(wifi_frequency)s, %(wifi_channel)s,
+        %(cellular_network_type)s, %(cellular_operator)s, %(cellular_rsrp)s, %(cellular_rsrq)s, %(cellular_rssnr)s,
+        %(cellular_ci)s, %(cellular_pci)s, %(cellular_tac)s, %(cellular_earfcn)s, %(cellular_band)s, %(cellular_bandwidth)s,
+        %(battery_charge_counter)s, %(battery_full_capacity)s,
+        -- REMOVIDO: colunas motion_* (sensores não disponíveis no dispositivo)
+        %(transmission_mode)s,
+        %(topic)s, %(received_at)s, %(raw_payload)s
+    )"""
+
+TELEMETRY_ON_CONFLICT = """
+    ON CONFLICT (time, device_id) DO NOTHING
+"""
+
+REFRESH_AGGREGATE_CALL = "CALL refresh_continuous_aggregate(%s, %s, %s)"
+
 class DatabasePool:
-    """Pool de conexões PostgreSQL."""
+    """Pool de conexões PostgreSQL.
     
-    def __init__(self, config: Config):
+    Com instrumentation, cada escrita (insert/upsert/refresh) entra em
+    /debug/queries e /metrics pelo template SQL, até o commit.
+    """
+    
+    def __init__(self, config: Config, instrumentation: Optional[QueryInstrumentation] = None):
         self.config = config
         self.logger = structlog.get_logger("database")
+        self.instrumentation = instrumentation
         self._conn: Optional[psycopg2.extensions.connection] = None
         self._connected = False
     
+    def _measure(self, statement: str, rows: int):
+        if self.instrumentation is None:
+            return contextlib.nullcontext()
+        return self.instrumentation.measure(statement, rows)
+    
     @retry(
         stop=stop_after_attempt(5),
         wait=wait_exponential(multiplier=1, min=1, max=30)
@@ -420,15 +584,7 @@ class DatabasePool:
     def connect(self):
         """Conecta ao banco de dados."""
         try:
-            self._conn = psycopg2.connect(
-                host=self.config.db_host,
-                port=self.config.db_port,
-                dbname=self.config.db_name,
-                user=self.config.db_user,
-                password=self.config.db_password,
-                connect_timeout=10,
-                options="-c statement_timeout=30000"
-            )
+            self._conn = self._open()
             self._conn.autocommit = False
             self._connected = True
             self.logger.info("database_connected", 
@@ -439,6 +595,17 @@ class DatabasePool:
             self.logger.error("database_connection_failed", error=str(e))
             raise
     
+    def _open(self):
+        return psycopg2.connect(
+            host=self.config.db_host,
+            port=self.config.db_port,
+            dbname=self.config.db_name,
+            user=self.config.db_user,
+            password=self.config.db_password,
+            connect_timeout=10,
+            options="-c statement_timeout=30000"
+        )
+    
     def is_connected(self) -> bool:
         """Verifica se está conectado."""
         if not self._conn or not self._connected:
@@ -475,67 +642,88 @@ class DatabasePool:
         
         # ON CONFLICT DO NOTHING para ignorar duplicatas
         # Requer índice único em (time, device_id)
-        insert_sql = """
-            INSERT INTO telemetry (
-                time, device_id, operator_id, message_id,
-                latitude, longitude, altitude, speed, bearing, gps_accuracy,
-                satellites, h_acc, v_acc, s_acc, hdop, vdop, pdop, gps_timestamp,
-                accel_x, accel_y, accel_z, gyro_x, gyro_y, gyro_z,
-                accel_magnitude,
-                gyro_magnitude,
-                mag_x, mag_y, mag_z, mag_magnitude,
-                linear_accel_x, linear_accel_y, linear_accel_z, linear_accel_magnitude,
-                gravity_x, gravity_y, gravity_z,
-                rotation_vector_x, rotation_vector_y, rotation_vector_z, rotation_vector_w,
-                azimuth, pitch, roll,
-                battery_level, battery_temperature, battery_status, battery_voltage,
-                battery_health, battery_technology,
-                wifi_rssi, wifi_ssid,
-                wifi_bssid, wifi_frequency, wifi_channel,
-                cellular_network_type, cellular_operator, cellular_rsrp, cellular_rsrq, cellular_rssnr,
-                cellular_ci, cellular_pci, cellular_tac, cellular_earfcn, cellular_band, cellular_bandwidth,
-                battery_charge_counter, battery_full_capacity,
-                -- REMOVIDO: motion_significant_motion, motion_stationary_detect, motion_motion_detect,
-                -- motion_flat_up, motion_flat_down, motion_stowed, motion_display_rotate,
-                transmission_mode,
-                topic, received_at, raw_payload
-            ) VALUES (
-                %(time)s, %(device_id)s, %(operator_id)s, %(message_id)s,
-                %(latitude)s, %(longitude)s, %(altitude)s, %(speed)s, %(bearing)s, %(gps_accuracy)s,
-                %(satellites)s, %(h_acc)s, %(v_acc)s, %(s_acc)s, %(hdop)s, %(vdop)s, %(pdop)s, %(gps_timestamp)s,
-                %(accel_x)s, %(accel_y)s, %(accel_z)s, %(gyro_x)s, %(gyro_y)s, %(gyro_z)s,
-                %(accel_magnitude)s,
-                %(gyro_magnitude)s,
-                %(mag_x)s, %(mag_y)s, %(mag_z)s, %(mag_magnitude)s,
-                %(linear_accel_x)s, %(linear_accel_y)s, %(linear_accel_z)s, %(linear_accel_magnitude)s,
-                %(gravity_x)s, %(gravity_y)s, %(gravity_z)s,
-                %(rotation_vector_x)s, %(rotation_vector_y)s, %(rotation_vector_z)s, %(rotation_vector_w)s,
-                %(azimuth)s, %(pitch)s, %(roll)s,
-                %(battery_level)s, %(battery_temperature)s, %(battery_status)s, %(battery_voltage)s,
-                %(battery_health)s, %(battery_technology)s,
-                %(wifi_rssi)s, %(wifi_ssid)s,
-                %(wifi_bssid)s, %(wifi_frequency)s, %(wifi_channel)s,
-                %(cellular_network_type)s, %(cellular_operator)s, %(cellular_rsrp)s, %(cellular_rsrq)s, %(cellular_rssnr)s,
-                %(cellular_ci)s, %(cellular_pci)s, %(cellular_tac)s, %(cellular_earfcn)s, %(cellular_band)s, %(cellular_bandwidth)s,
-                %(battery_charge_counter)s, %(battery_full_capacity)s,
-                -- REMOVIDO: %(motion_significant_motion)s, %(motion_stationary_detect)s, %(motion_motion_detect)s,
-                -- %(motion_flat_up)s, %(motion_flat_down)s, %(motion_stowed)s, %(motion_display_rotate)s,
-                %(transmission_mode)s,
-                %(topic)s, %(received_at)s, %(raw_payload)s
-            )
-            ON CONFLICT (time, device_id) DO NOTHING
-        """
+        insert_sql = TELEMETRY_INSERT_HEAD + TELEMETRY_VALUES_TEMPLATE + TELEMETRY_ON_CONFLICT
         
         try:
-            with self._conn.cursor() as cur:
-                psycopg2.extras.execute_batch(cur, insert_sql, records, page_size=100)
-            self._conn.commit()
+            with self._measure(insert_sql, len(records)):
+                with self._conn.cursor() as cur:
+                    psycopg2.extras.execute_batch(cur, insert_sql, records, page_size=100)
+                self._conn.commit()
             self.logger.info("batch_inserted", count=len(records))
-            return len(records)
         except Exception as e:
             self._conn.rollback()
             self.logger.error("batch_insert_failed", error=str(e), count=len(records))
             raise
+        self.upsert_device_state(records)
+        return len(records)
+    
+    def insert_telemetry_chunk(self, records: list[dict]) -> int:
+        """Insere um grupo de registros do mesmo chunk em um único INSERT.
+        
+        Usado pela lane de backfill: um único statement multi-VALUES faz o
+        TimescaleDB descomprimir o chunk alvo uma vez por grupo, em vez de
+        uma vez a cada página de 100 linhas.
+        """
+        if not records:
+            return 0
+        
+        self.ensure_connected()
+        
+        insert_sql = TELEMETRY_INSERT_HEAD + " %s " + TELEMETRY_ON_CONFLICT
+        
+        try:
+            with self._measure(insert_sql, len(records)):
+                with self._conn.cursor() as cur:
+                    psycopg2.extras.execute_values(
+                        cur, insert_sql, records,
+                        template=TELEMETRY_VALUES_TEMPLATE,
+                        page_size=len(records)
+                    )
+                self._conn.commit()
+            self.logger.info("chunk_inserted", count=len(records))
+        except Exception as e:
+            self._conn.rollback()
+            self.logger.error("chunk_insert_failed", error=str(e), count=len(records))
+            raise
+        self.upsert_device_state(records)
+        return len(records)
+    
+    def refresh_continuous_aggregates(self, start: datetime, end: datetime):
+        """Rematerializa telemetry_10s/1min/1hour em [start, end] (buckets inteiros).
+        
+        Usado pela lane de backfill: as políticas de refresh só olham a
+        última hora/dia, então dado gravado além disso nunca entraria nas
+        camadas agregadas. CALL refresh_continuous_aggregate não roda dentro
+        de transação: a conexão fica em autocommit durante as chamadas.
+        """
+        self.ensure_connected()
+        self._conn.autocommit = True
+        try:
+            with self._conn.cursor() as cur:
+                for relation, lo, hi in refresh_windows(start, end):
+                    with self._measure(REFRESH_AGGREGATE_CALL, 0):
+                        cur.execute(REFRESH_AGGREGATE_CALL, [relation, lo, hi])
+        finally:
+            self._conn.autocommit = False
+        self.logger.info("aggregates_refreshed", start=start.isoformat(), end=end.isoformat())
+    
+    def upsert_device_state(self, records: list[dict]):
+        """Atualiza device_state (última amostra e contagem de 1 h por device) com um batch já gravado.
+        
+        Transação própria depois do INSERT: uma falha aqui (ex.: migration
+        06_device_state.sql ainda não aplicada) não devolve o batch à fila
+        offline. Duplicatas descartadas pelo ON CONFLICT da telemetria
+        entram na contagem, como em summary_1min.
+        """
+        rows = device_state_rows(records)
+        try:
+            with self._measure(DEVICE_STATE_UPSERT, len(rows)):
+                with self._conn.cursor() as cur:
+                    psycopg2.extras.execute_values(cur, DEVICE_STATE_UPSERT, rows, page_size=500)
+                self._conn.commit()
+        except Exception as e:
+            self._conn.rollback()
+            self.logger.warning("device_state_upsert_failed", error=str(e), devices=len(rows))
     
     def insert_event(self, record: dict):
         """Insere um evento."""
@@ -547,14 +735,33 @@ class DatabasePool:
         """
         
         try:
-            with self._conn.cursor() as cur:
-                cur.execute(insert_sql, record)
-            self._conn.commit()
+            with self._measure(insert_sql, 1):
+                with self._conn.cursor() as cur:
+                    cur.execute(insert_sql, record)
+                self._conn.commit()
         except Exception as e:
             self._conn.rollback()
             self.logger.error("event_insert_failed", error=str(e))
             raise
     
+    def upsert_summary_buckets(self, rows: list[tuple]) -> int:
+        """Soma os deltas dos buckets de resumo em summary_1min."""
+        if not rows:
+            return 0
+        
+        self.ensure_connected()
+        
+        try:
+            with self._measure(SUMMARY_UPSERT, len(rows)):
+                with self._conn.cursor() as cur:
+                    psycopg2.extras.execute_values(cur, SUMMARY_UPSERT, rows, page_size=500)
+                self._conn.commit()
+            return len(rows)
+        except Exception as e:
+            self._conn.rollback()
+            self.logger.error("summary_upsert_failed", error=str(e), count=len(rows))
+            raise
+    
     def close(self):
         """Fecha conexão."""
         if self._conn:
@@ -575,8 +782,42 @@ class IngestWorker:
         self.broadcaster = broadcaster
         
         # Componentes
-        self.db = DatabasePool(config)
+        self.instrumentation = create_instrumentation(config)
+        self.db = DatabasePool(config, self.instrumentation)
+        # Consultas da API em pool próprio: não disputam a conexão de ingestão
+        self.read_pool = ReadPool(
+            config,
+            size=config.read_pool_size,
+            statement_timeout_ms=config.read_statement_timeout_ms,
+            wait_seconds=config.read_pool_wait_seconds,
+            cursor_factory=self.instrumentation.cursor_factory()
+        )
+        self.instrumentation.attach_explain(self.read_pool.connection)
+        # Respostas históricas de janelas fechadas (invalidadas por dado atrasado)
+        self.response_cache = create_response_cache(config)
         self.offline_queue = OfflineQueue(config.offline_queue_path)
+        # Último estado conhecido por dispositivo (serve /api/devices e snapshot do stream)
+        self.fleet_state = FleetState()
+        # Contadores por minuto de /api/summary (sem varrer telemetry)
+        self.summary_buckets = SummaryBuckets(config.summary_retention_hours)
+        self.last_summary_persist = time.time()
+        # Lane de backfill com conexão própria (não disputa com o batch online)
+        self.backfill = BackfillLane(
+            DatabasePool(config, self.instrumentation),
+            self.offline_queue,
+            horizon_hours=config.compression_horizon_hours,
+            chunk_interval_hours=config.chunk_interval_hours,
+            batch_size=config.backfill_batch_size,
+            timeout_ms=config.backfill_timeout_ms,
+            refresh_seconds=config.backfill_refresh_seconds,
+            on_written=self._on_backfill_written
+        )
+        # Fan-out para processos de API (opcional)
+        self.fanout = (
+            FanoutPublisher(config.fanout_socket, self.fleet_state, tick_ms=config.fanout_tick_ms,
+                            max_buffer_bytes=config.fanout_max_buffer_bytes)
+            if config.fanout_socket else None
+        )
         
         # MQTT Client - Sessão persistente para não perder mensagens
         # clean_start=False mantém subscriptions e recebe mensagens pendentes
@@ -603,6 +844,7 @@ class IngestWorker:
             "messages_inserted": 0,
             "messages_failed": 0,
             "batch_count": 0,
+            "duplicates_merged": 0,
             "mqtt_reconnects": 0,
             "db_reconnects": 0,
             "start_time": time.time()
@@ -781,13 +1023,29 @@ class IngestWorker:
         # Converter para registro do banco usando método auxiliar
         record = self._convert_packet_to_record(packet, topic, json.dumps(data))
         
+        # Estado da frota em memória (pacotes atrasados não sobrescrevem o atual)
+        self.fleet_state.update(record)
+        self.summary_buckets.add_telemetry(record)
+        # Dado atrasado (queued/backfill) muda janelas que podem estar em cache
+        self.response_cache.invalidate_late(record["device_id"], record["time"])
+        
+        backfill = self.backfill.accepts(record)
+        if self.fanout:
+            # Réplicas dos processos de API; backfill só atualiza o estado, não vai ao stream
+            self.fanout.publish(record, live=not backfill)
+        
+        # Pacotes queued antigos vão para a lane de backfill (chunks comprimidos)
+        if backfill:
+            self.backfill.add(record)
+            return
+        
         # Adicionar ao buffer
         self.batch_buffer.append(record)
 
         # Broadcast interno (Fase 1)
         if self.broadcaster:
             # Envia o record processado (dict) para o broadcaster
-            # O broadcaster aplica throttling e despacha para subscribers
+            # O broadcaster guarda o mais recente e distribui no próximo tick
             self.broadcaster.publish(packet.deviceId, record)
         
         # Verificar se deve fazer flush
@@ -816,15 +1074,31 @@ class IngestWorker:
             "topic": topic,
             "received_at": datetime.now(timezone.utc)
         }
+        self.summary_buckets.add_event(packet.eventType, record["time"])
         
         try:
             self.db.insert_event(record)
             self.logger.debug("event_inserted", event_type=packet.eventType, device=packet.deviceId)
+            # Evento atrasado (reenviado do buffer do device) muda janelas de /api/events em cache
+            self.response_cache.invalidate_late(record["device_id"], record["time"])
+            if self.fanout:
+                self.fanout.invalidate(record["device_id"], record["time"])
         except Exception as e:
             # Enfileirar offline
             self.offline_queue.enqueue(topic, raw_payload, time.time())
             self.logger.warning("event_queued_offline", error=str(e))
-    
+
+    def _on_backfill_written(self, device_id: str, start: datetime, end: datetime):
+        """Chunk (ou refresh dos aggregates) gravado pela lane de backfill (thread da lane).
+
+        A invalidação na chegada do pacote não basta: o chunk só é gravado até
+        BACKFILL_TIMEOUT_MS depois, e uma consulta nesse meio-tempo pode
+        voltar a pôr a janela antiga em cache.
+        """
+        self.response_cache.invalidate(device_id, start, end)
+        if self.fanout:
+            self.fanout.invalidate(device_id, start, end)
+
     def _flush_batch(self):
         """Faz flush do batch buffer para o banco."""
         if not self.batch_buffer:
@@ -834,13 +1108,20 @@ class IngestWorker:
         self.batch_buffer.clear()
         self.last_flush_time = time.time()
         
+        # Ordena por (device_id, time) e funde duplicatas do próprio batch
+        originals = batch
+        batch, merged = sort_and_merge(batch)
+        self.stats["duplicates_merged"] += merged
+        
         try:
             inserted = self.db.insert_telemetry_batch(batch)
             self.stats["messages_inserted"] += inserted
             self.stats["batch_count"] += 1
         except Exception as e:
-            # Enfileirar offline
-            for record in batch:
+            # Enfileirar offline os registros recebidos, não os fundidos: o
+            # raw_payload do fundido é só o do primeiro, sem os campos que
+            # vieram das duplicatas (a fusão é refeita na reprodução)
+            for record in originals:
                 payload = record.get("raw_payload", "{}")
                 topic = record.get("topic", "unknown")
                 self.offline_queue.enqueue(topic, payload, time.time())
@@ -866,17 +1147,31 @@ class IngestWorker:
                 # Usa o mesmo método de conversão que _handle_telemetry
                 # (reutiliza a lógica de conversão)
                 record = self._convert_packet_to_record(packet, topic, payload)
-                records.append(record)
             except Exception as e:
                 self.logger.warning("offline_record_invalid", error=str(e))
+                continue
+            if self.backfill.accepts(record):
+                # Chunk já comprimido (inclusive grupo da lane que falhou): volta
+                # para a lane, não para o INSERT paginado da conexão online
+                self.backfill.add(record)
+            else:
+                records.append(record)
         
         if records:
+            originals = records
+            records, merged = sort_and_merge(records)
+            self.stats["duplicates_merged"] += merged
             try:
                 self.db.insert_telemetry_batch(records)
                 self.logger.info("offline_queue_processed", count=len(records))
-            except Exception as e:
-                # Re-enqueue
+                # Só agora os registros estão no banco: invalida de novo (local e processos de API)
                 for record in records:
+                    self.response_cache.invalidate_late(record["device_id"], record["time"])
+                    if self.fanout:
+                        self.fanout.publish(record, live=False)
+            except Exception as e:
+                # Re-enqueue (registros originais, como em _flush_batch)
+                for record in originals:
                     self.offline_queue.enqueue(
                         record.get("topic", "unknown"),
                         record.get("raw_payload", "{}"),
@@ -884,6 +1179,63 @@ class IngestWorker:
                     )
                 self.logger.error("offline_requeue", error=str(e))
     
+    def _persist_summary_buckets(self):
+        """Grava em summary_1min os deltas dos buckets de resumo."""
+        self.last_summary_persist = time.time()
+        rows = self.summary_buckets.take_pending()
+        if not rows:
+            return
+        try:
+            self.summary_buckets.mark_persisted(self.db.upsert_summary_buckets(rows))
+        except Exception as e:
+            self.summary_buckets.restore_pending(rows)
+            self.logger.warning("summary_persist_failed", count=len(rows), error=str(e))
+    
+    def _seed_summary_buckets(self):
+        """Carrega os buckets de resumo da janela em memória."""
+        try:
+            conn = self.db.get_connection()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(SUMMARY_SELECT, (self.config.summary_retention_hours,))
+                    rows = cur.fetchall()
+                conn.commit()
+            except Exception:
+                # Ex.: summary_1min ainda não criada; não deixar a conexão de ingestão abortada
+                conn.rollback()
+                raise
+            self.summary_buckets.seed(rows)
+            self.logger.info("summary_buckets_seeded", buckets=len(rows))
+        except Exception as e:
+            self.logger.warning("summary_buckets_seed_failed", error=str(e))
+    
+    def _seed_fleet_state(self):
+        """Carrega o último estado de cada dispositivo (24h) antes do tráfego MQTT."""
+        try:
+            conn = self.db.get_connection()
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                cur.execute("""
+                    SELECT DISTINCT ON (device_id)
+                        device_id, operator_id, time,
+                        latitude, longitude, speed,
+                        battery_level, cellular_rsrp, wifi_rssi
+                    FROM telemetry
+                    WHERE time > NOW() - INTERVAL '24 hours'
+                    ORDER BY device_id, time DESC
+                """)
+                last_rows = cur.fetchall()
+                cur.execute("""
+                    SELECT device_id, time_bucket('1 hour', time) AS hour, COUNT(*)
+                    FROM telemetry
+                    WHERE time > NOW() - INTERVAL '24 hours'
+                    GROUP BY 1, 2
+                """)
+                hourly_counts = [tuple(r.values()) for r in cur.fetchall()]
+            conn.commit()
+            self.fleet_state.seed(last_rows, hourly_counts)
+        except Exception as e:
+            self.logger.warning("fleet_state_seed_failed", error=str(e))
+    
     def start(self):
         """Inicia o worker."""
         self.logger.info("starting_ingest_worker", 
@@ -895,10 +1247,16 @@ class IngestWorker:
         # Conectar ao banco
         try:
             self.db.connect()
+            self._seed_fleet_state()
+            self._seed_summary_buckets()
         except Exception as e:
             self.logger.error("database_init_failed", error=str(e))
             # Continuar mesmo sem banco (modo offline)
         
+        # Depois da carga inicial: novos assinantes recebem o estado já semeado
+        if self.fanout:
+            self.fanout.start()
+        
         # Conectar ao MQTT com sessão persistente
         try:
             # MQTTv5: clean_start=False para manter sessão e receber mensagens pendentes
@@ -927,15 +1285,11 @@ class IngestWorker:
                 # Processar fila offline se banco disponível
                 if self.db.is_connected():
                     self._process_offline_queue()
+                    if time.time() - self.last_summary_persist >= self.config.summary_persist_seconds:
+                        self._persist_summary_buckets()
                 
                 # Purge de mensagens antigas
                 self.offline_queue.purge_old(48)
-                
-                # Cleanup broadcaster stale devices (cada 1h aprox - 3600s)
-                # Como o loop roda a cada 5s, podemos usar um contador ou check de tempo
-                # Simplificação: check a cada loop, o método é leve
-                if self.broadcaster:
-                    self.broadcaster.cleanup_stale_devices()
 
                 # Aguardar
                 time.sleep(5)
@@ -951,6 +1305,11 @@ class IngestWorker:
         
         # Flush final
         self._flush_batch()
+        if self.db.is_connected():
+            self._persist_summary_buckets()
+        self.backfill.stop()
+        if self.fanout:
+            self.fanout.stop()
         
         # Desconectar MQTT
         self.mqtt_client.loop_stop()
@@ -958,6 +1317,8 @@ class IngestWorker:
         
         # Fechar banco
         self.db.close()
+        self.backfill.db.close()
+        self.read_pool.close()
         
         self.logger.info("ingest_worker_stopped", stats=self.stats)
     
@@ -971,7 +1332,12 @@ class IngestWorker:
             "mqtt_connected": self.mqtt_connected,
             "db_connected": self.db.is_connected(),
             "offline_queue_size": self.offline_queue.size(),
-            "batch_buffer_size": len(self.batch_buffer)
+            "batch_buffer_size": len(self.batch_buffer),
+            **self.backfill.get_stats(),
+            **self.read_pool.get_stats(),
+            **self.response_cache.get_stats(),
+            **self.summary_buckets.get_stats(),
+            **(self.fanout.get_stats() if self.fanout else {})
         }
 
 
@@ -980,19 +1346,70 @@ class IngestWorker:
 # ============================================================
 
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional
 from datetime import datetime, timedelta
 
-def create_health_app(worker: IngestWorker) -> FastAPI:
-    """Cria app FastAPI para health check e REST API."""
+def create_instrumentation(config: Config) -> QueryInstrumentation:
+    """Instrumentação de consultas do processo (ligada ao ReadPool pelo cursor_factory)."""
+    return QueryInstrumentation(
+        slow_ms=config.slow_query_ms,
+        ring_size=config.slow_query_ring_size,
+        explain_cooldown_seconds=config.slow_query_explain_cooldown_seconds
+    )
+
+
+def create_response_cache(config: Config) -> ResponseCache:
+    """Cache de respostas do processo (despejo em subdiretório próprio por PID)."""
+    spill_dir = (
+        os.path.join(config.response_cache_dir, str(os.getpid()))
+        if config.response_cache_dir else ""
+    )
+    return ResponseCache(
+        max_bytes=config.response_cache_mb * 1024 * 1024,
+        late_arrival_seconds=config.response_cache_late_arrival_seconds,
+        hold_seconds=config.response_cache_hold_seconds,
+        spill_dir=spill_dir,
+        spill_max_bytes=config.response_cache_disk_mb * 1024 * 1024,
+        compress_min_bytes=config.compression_min_bytes
+    )
+
+
+def create_health_app(worker: IngestWorker, fanout: Optional[FanoutSubscriber] = None) -> FastAPI:
+    """Cria app FastAPI para health check e REST API.
+    
+    fanout: nos processos de API (src/api.py), assinatura do ingest que
+    alimenta fleet_state e broadcaster locais
+    """
+    
+    # Polígonos nomeados para filtro do stream (?area=PAIOL)
+    areas = load_areas(worker.config.areas_path)
+    
+    def parse_window(start: Optional[str], end: Optional[str], default_hours: float = 1):
+        """Janela ISO em UTC (datas sem fuso são UTC); padrão: últimas default_hours."""
+        now = datetime.now(timezone.utc)
+        start_dt = datetime.fromisoformat(start.replace("Z", "+00:00")) if start else now - timedelta(hours=default_hours)
+        end_dt = datetime.fromisoformat(end.replace("Z", "+00:00")) if end else now
+        if start_dt.tzinfo is None:
+            start_dt = start_dt.replace(tzinfo=timezone.utc)
+        if end_dt.tzinfo is None:
+            end_dt = end_dt.replace(tzinfo=timezone.utc)
+        return start_dt, end_dt
     
     @asynccontextmanager
     async def lifespan(app: FastAPI):
         # Startup: Injetar loop no broadcaster
         if worker.broadcaster:
             worker.broadcaster.set_loop(asyncio.get_running_loop())
+        if fanout:
+            fanout.start()
         yield
+        # Shutdown: parar os tickers e a assinatura
+        if fanout:
+            await fanout.stop()
+        if worker.broadcaster:
+            await worker.broadcaster.close()
     
     app = FastAPI(
         title="AuraTracking API",
@@ -1009,6 +1426,15 @@ def create_health_app(worker: IngestWorker) -> FastAPI:
         allow_methods=["*"],
         allow_headers=["*"],
     )
+    # Medição por endpoint (dentro da compressão: conta bytes serializados)
+    app.add_middleware(QueryInstrumentationMiddleware, instrumentation=worker.instrumentation)
+    # Compressão negociada; respostas do cache já saem em gzip (ver src/compression.py)
+    compression_stats = CompressionStats()
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=worker.config.compression_min_bytes,
+        stats=compression_stats,
+    )
     
     # ========== Health Endpoints ==========
     
@@ -1034,56 +1460,89 @@ def create_health_app(worker: IngestWorker) -> FastAPI:
     
     @app.get("/stats")
     async def stats():
-        return worker.get_stats()
+        return {**worker.get_stats(), **compression_stats.get_stats()}
+    
+    @app.get("/debug/queries")
+    async def debug_queries():
+        """
+        Instrumentação de consultas deste processo: por endpoint (tempo de
+        parede, tempo de banco, linhas, bytes serializados), por instrução
+        SQL (tempo de execute + fetch, linhas) e ring das instruções lentas
+        com o plano EXPLAIN (ANALYZE, BUFFERS) capturado.
+        """
+        return worker.instrumentation.snapshot()
+    
+    @app.get("/metrics")
+    async def metrics():
+        """Métricas Prometheus (requisições e instruções SQL)."""
+        body = worker.instrumentation.render_metrics()
+        if body is None:
+            return JSONResponse({"error": "prometheus_client not installed"}, status_code=503)
+        return Response(body, media_type=METRICS_CONTENT_TYPE)
     
     @app.get("/ready")
     async def ready():
         if worker.mqtt_connected:
             return {"status": "ready"}
-        return {"status": "not_ready"}, 503
+        return JSONResponse({"status": "not_ready"}, status_code=503)
     
     # ========== REST API Endpoints ==========
     
     @app.get("/api/events/stream")
-    async def stream_events():
+    async def stream_events(
+        devices: Optional[str] = None,
+        operator: Optional[str] = None,
+        bbox: Optional[str] = None,
+        area: Optional[str] = None,
+        rate_hz: Optional[float] = None,
+    ):
         """
         Endpoint SSE para atualizações em tempo real.
         Eventos:
-        - device-update: Atualização de posição/status
-        - heartbeat: Keep-alive a cada 15s
+        - snapshot: Estado atual da frota, enviado uma vez na conexão
+        - fleet-update: Lista com a última posição/status de cada device
+          alterado desde o frame anterior (um frame por intervalo)
+        - device-status: Lista de transições online/offline ({id, st, ts})
+        - device-leave: Devices que saíram do bbox/área/operador do filtro ({id, ts})
+        - heartbeat: Keep-alive a cada 15s (ticker único do broadcaster)
+        
+        - rate_hz: frames por segundo (0.1 a 10); default STREAM_INTERVAL_SECONDS
+        
+        Filtros (opcionais, combinados com AND):
+        - devices: lista separada por vírgula
+        - operator: operator_id
+        - bbox: min_lon,min_lat,max_lon,max_lat
+        - area: nome de polígono em areas_carregamento.json
         """
         if not worker.broadcaster:
-            return {"error": "Broadcaster not available"}, 503
+            return JSONResponse({"error": "Broadcaster not available"}, status_code=503)
+
+        try:
+            flt = SubscriptionFilter.from_params(devices, operator, bbox, area, areas)
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+
+        interval = 1.0 / min(max(rate_hz, 0.1), 10.0) if rate_hz else None
 
         async def event_generator():
-            queue = await worker.broadcaster.subscribe()
+            # Assina antes do snapshot: nenhuma atualização se perde entre os dois
+            mailbox = await worker.broadcaster.subscribe(flt, interval_seconds=interval)
             try:
+                snapshot = snapshot_payloads(
+                    worker.fleet_state.records(max_age_seconds=86400), flt,
+                    worker.config.device_offline_seconds
+                )
+                worker.broadcaster.track_snapshot(mailbox, snapshot)
+                yield format_sse_frame("snapshot", snapshot)
                 while True:
-                    try:
-                        # Wait for event or heartbeat timeout
-                        payload = await asyncio.wait_for(queue.get(), timeout=15.0)
-                        
-                        # Format payload for SSE (minimal data)
-                        # Payload vem do IngestWorker._handle_telemetry (dict completo)
-                        sse_data = {
-                            "id": payload.get("device_id"),
-                            "ts": payload.get("time").timestamp() if payload.get("time") else time.time(),
-                            "lat": payload.get("latitude"),
-                            "lon": payload.get("longitude"),
-                            "st": "online" # Simplificação por enquanto
-                        }
-                        
-                        yield f"event: device-update\ndata: {json.dumps(sse_data)}\n\n"
-                        
-                    except asyncio.TimeoutError:
-                        # Heartbeat
-                        yield f"event: heartbeat\ndata: {time.time()}\n\n"
-                        
+                    # Fragmentos chegam prontos (bytes) do broadcaster, apenas o
+                    # mais recente por device; um frame por intervalo do subscriber
+                    yield format_fleet_frame(await mailbox.next_batch())
             except asyncio.CancelledError:
                 # Client disconnected
                 pass
             finally:
-                worker.broadcaster.unsubscribe(queue)
+                worker.broadcaster.unsubscribe(mailbox)
 
         return StreamingResponse(
             event_generator(),
@@ -1095,173 +1554,553 @@ def create_health_app(worker: IngestWorker) -> FastAPI:
             }
         )
 
-    @app.get("/api/devices")
-    async def get_devices():
-        """Lista apenas dispositivos online (últimos 5 minutos)."""
+    @app.websocket("/api/events/ws")
+    async def stream_events_ws(
+        websocket: WebSocket,
+        devices: Optional[str] = None,
+        operator: Optional[str] = None,
+        bbox: Optional[str] = None,
+        area: Optional[str] = None,
+        rate_hz: float = 1.0,
+    ):
+        """
+        Feed ao vivo binário (formato em src/ws_codec.py).
+        
+        A cada tick do cliente um único frame com todas as atualizações
+        pendentes (apenas a mais recente por device). O primeiro frame é o
+        snapshot da frota. Mesmos filtros de /api/events/stream.
+        Transições online/offline vão como atualizações sem posição
+        (máscara 0x04 = offline); a saída de um device do bbox/área/operador
+        do filtro, como atualização sem posição com máscara 0x08.
+        
+        - rate_hz: ticks por segundo (0.1 a 10); pode ser alterado durante a
+          conexão com a mensagem de texto {"rate_hz": 2}
+        """
+        if not worker.broadcaster:
+            await websocket.close(code=1013)
+            return
+
         try:
-            conn = worker.db.get_connection()
-            if not conn:
-                return {"error": "Database not connected"}, 503
-
-            cursor = conn.cursor()
-
-            # Always use 5 minutes filter for online devices only
-            time_filter = "NOW() - INTERVAL '5 minutes'"
-
-            cursor.execute(f"""
-                SELECT
-                    device_id,
-                    operator_id,
-                    MAX(time) as last_seen,
-                    (SELECT latitude FROM telemetry t2
-                     WHERE t2.device_id = t.device_id
-                     ORDER BY time DESC LIMIT 1) as latitude,
-                    (SELECT longitude FROM telemetry t2
-                     WHERE t2.device_id = t.device_id
-                     ORDER BY time DESC LIMIT 1) as longitude,
-                    (SELECT speed_kmh FROM telemetry t2
-                     WHERE t2.device_id = t.device_id
-                     ORDER BY time DESC LIMIT 1) as speed_kmh,
-                    COUNT(*) as total_points
-                FROM telemetry t
-                WHERE time > {time_filter}
-                GROUP BY device_id, operator_id
-                ORDER BY last_seen DESC
-            """)
-            
-            devices = []
-            for row in cursor.fetchall():
-                devices.append({
-                    "device_id": row[0],
-                    "operator_id": row[1],
-                    "last_seen": row[2].isoformat() if row[2] else None,
-                    "latitude": float(row[3]) if row[3] else None,
-                    "longitude": float(row[4]) if row[4] else None,
-                    "speed_kmh": float(row[5]) if row[5] else None,
-                    "total_points_24h": row[6],
-                    "status": "online" if row[2] and (datetime.now(timezone.utc) - row[2]).seconds < 60 else "offline"
-                })
-            
-            cursor.close()
-            return {"devices": devices, "count": len(devices)}
-            
+            flt = SubscriptionFilter.from_params(devices, operator, bbox, area, areas)
+        except ValueError as e:
+            await websocket.close(code=1008, reason=str(e))
+            return
+
+        await websocket.accept()
+        tick = {"interval": 1.0 / min(max(rate_hz, 0.1), 10.0)}
+        mailbox = await worker.broadcaster.subscribe(flt, binary=True, interval_seconds=tick["interval"])
+        encoder = FleetFrameEncoder()
+        closed = asyncio.Event()
+
+        async def read_control():
+            # Único leitor do socket: detecta desconexão e ajusta a taxa
+            try:
+                while True:
+                    message = await websocket.receive_text()
+                    try:
+                        rate = float(json.loads(message)["rate_hz"])
+                        tick["interval"] = 1.0 / min(max(rate, 0.1), 10.0)
+                        mailbox.interval_seconds = tick["interval"]
+                    except (ValueError, KeyError, TypeError):
+                        pass
+            except (WebSocketDisconnect, RuntimeError):
+                pass
+            finally:
+                closed.set()
+
+        reader = asyncio.create_task(read_control())
+        try:
+            snapshot = snapshot_payloads(
+                worker.fleet_state.records(max_age_seconds=86400), flt,
+                worker.config.device_offline_seconds
+            )
+            worker.broadcaster.track_snapshot(mailbox, snapshot)
+            await websocket.send_bytes(encoder.encode(snapshot))
+            while not closed.is_set():
+                try:
+                    await asyncio.wait_for(closed.wait(), timeout=tick["interval"])
+                    break
+                except asyncio.TimeoutError:
+                    pass
+                updates = mailbox.drain()
+                if updates:
+                    await websocket.send_bytes(encoder.encode(updates))
+        except (WebSocketDisconnect, RuntimeError, asyncio.CancelledError):
+            # Client disconnected
+            pass
+        finally:
+            reader.cancel()
+            worker.broadcaster.unsubscribe(mailbox)
+
+    @app.get("/api/playback")
+    async def stream_playback(
+        device_id: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        slice_seconds: int = 10,
+        speed: float = 1.0,
+    ):
+        """
+        Replay de um período como SSE, no ritmo pedido.
+        Eventos:
+        - snapshot: última posição de cada device antes de start (mesmo
+          payload do stream ao vivo)
+        - playback-frame: uma fatia de slice_seconds, {t0, t1, updates} com
+          a última amostra de cada device na fatia (fatias vazias também
+          saem, para o relógio do replay avançar)
+        - heartbeat: keep-alive quando a próxima fatia demora mais de 15s
+        - end: fim do período ({frames, t}); error: falha no meio do stream
+        
+        - device_id: um ou vários separados por vírgula (omitido = todos)
+        - start/end ISO, intervalo [start, end) (padrão: últimas 12 horas)
+        - slice_seconds: tempo de dado por frame (1 a 600)
+        - speed: multiplicador (0.1 a 1000): um frame a cada
+          slice_seconds / speed segundos; 0 = sem ritmo (o cliente dita)
+        
+        Memória limitada dos dois lados: o servidor lê rodadas de
+        ROUND_SLICES fatias com cursor nomeado, compactando na leitura (uma
+        rodada em uso e a próxima já pedida), e a conexão de leitura só
+        fica emprestada durante cada rodada. A primeira rodada é curta para
+        o primeiro frame sair na hora.
+        """
+        try:
+            start_dt, end_dt = parse_window(start, end, default_hours=12)
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        if end_dt <= start_dt:
+            return JSONResponse({"error": "end must be after start"}, status_code=400)
+        if not MIN_SLICE_SECONDS <= slice_seconds <= MAX_SLICE_SECONDS:
+            return JSONResponse(
+                {"error": f"slice_seconds must be between {MIN_SLICE_SECONDS} and {MAX_SLICE_SECONDS}"},
+                status_code=400,
+            )
+        if speed != 0 and not MIN_SPEED <= speed <= MAX_SPEED:
+            return JSONResponse({"error": f"speed must be 0 or between {MIN_SPEED} and {MAX_SPEED:g}"},
+                                status_code=400)
+        device_ids = sorted({d.strip() for d in device_id.split(",") if d.strip()}) if device_id else []
+        interval = slice_seconds / speed if speed else 0.0
+        
+        def read_round(round_start: datetime, n_slices: int):
+            return fetch_slices(worker.read_pool.connection, round_start, slice_seconds, n_slices,
+                                end_dt, device_ids)
+        
+        # Snapshot e primeira rodada antes de responder: erro de banco vira status HTTP
+        try:
+            snapshot = await worker.read_pool.run(fetch_snapshot, start_dt, device_ids)
+            first = await run_in_threadpool(read_round, start_dt, FIRST_ROUND_SLICES)
+        except ReadPoolBusy as e:
+            return JSONResponse({"error": str(e)}, status_code=503)
         except Exception as e:
-            return {"error": str(e)}, 500
+            return JSONResponse({"error": str(e)}, status_code=500)
+        
+        async def event_generator():
+            loop = asyncio.get_running_loop()
+            pending = list(reversed(first))
+            next_start = first[-1].end if first else end_dt
+            prefetch = None
+            frames = 0
+            due = loop.time()
+            try:
+                yield format_sse_frame("snapshot", snapshot)
+                while pending or prefetch is not None or next_start < end_dt:
+                    if prefetch is None and next_start < end_dt:
+                        # Próxima rodada em paralelo com a reprodução da atual
+                        prefetch = asyncio.ensure_future(run_in_threadpool(read_round, next_start, ROUND_SLICES))
+                        next_start = min(next_start + timedelta(seconds=slice_seconds * ROUND_SLICES), end_dt)
+                    if not pending:
+                        pending = list(reversed(await prefetch))
+                        prefetch = None
+                        continue
+                    item = pending.pop()
+                    if interval:
+                        while True:
+                            wait = due - loop.time()
+                            if wait <= 0:
+                                break
+                            await asyncio.sleep(min(wait, 15.0))
+                            if due - loop.time() > 0:
+                                yield f"event: heartbeat\ndata: {time.time()}\n\n".encode("utf-8")
+                        due = max(due, loop.time() - interval) + interval
+                    yield format_playback_frame(item)
+                    frames += 1
+                yield format_sse_frame("end", {"frames": frames, "t": end_dt.timestamp()})
+            except asyncio.CancelledError:
+                # Client disconnected
+                pass
+            except Exception as e:
+                logger.error("playback_stream_failed", frames=frames, error=str(e))
+                yield format_sse_frame("error", {"error": str(e)})
+            finally:
+                if prefetch is not None:
+                    prefetch.cancel()
+        
+        return StreamingResponse(
+            event_generator(),
+            media_type="text/event-stream",
+            headers={
+                "Cache-Control": "no-store",
+                "Connection": "keep-alive",
+                "X-Accel-Buffering": "no"
+            }
+        )
+
+    @app.get("/api/devices")
+    async def get_devices():
+        """Lista apenas dispositivos online (últimos 5 minutos).
+        
+        Servido da tabela em memória do IngestWorker, sem consulta ao banco.
+        """
+        devices = worker.fleet_state.devices(
+            max_age_seconds=300, online_seconds=worker.config.device_offline_seconds
+        )
+        return {"devices": devices, "count": len(devices)}
     
     @app.get("/api/history")
     async def get_history(
+        request: Request,
         device_id: Optional[str] = None,
         start: Optional[str] = None,
         end: Optional[str] = None,
         limit: int = 20000,
+        format: str = "json",
+        max_points: Optional[int] = None,
+        zoom: Optional[float] = None,
+        cursor: Optional[str] = None,
+        devices: Optional[str] = None,
+        per_device_limit: int = 5000,
     ):
         """
         Busca pontos históricos de telemetria (raw).
         Filtros:
         - device_id opcional (se omitido, traz todos)
         - start/end ISO (padrão: última hora)
-        - limit (padrão 20k)
+        - limit (padrão 20k; 0 = sem limite, só com format=ndjson)
+        - format: json (objeto único), ndjson (um ponto por linha, em
+          streaming por páginas keyset, memória constante e conexão de
+          leitura emprestada só durante cada página) ou columnar
+          (typed arrays, ver src/columnar.py)
+        - max_points / zoom: simplifica a trajetória de cada device
+          (Douglas–Peucker mantendo paradas e curvas, ver src/simplify.py)
+          até o orçamento de pontos ou até 1 pixel no zoom do mapa;
+          max_points é o total da resposta, repartido entre os devices
+          (com menos de 2 por device, 1 ponto, a última amostra, para os
+          maiores). Lê a janela inteira de cada device (sem limit, um range
+          scan por device como em devices=); acima de
+          HISTORY_SIMPLIFY_MAX_ROWS pontos brutos responde 413
+        - cursor: continua após a página anterior (keyset em (time, device_id),
+          ver src/pagination.py); cada página de `limit` pontos devolve
+          next_cursor (X-Next-Cursor no columnar), null na última
+        - devices: modo multi-device, lista separada por vírgula ou "active"
+          (devices com dados na janela, via summary_1min). Cada device tem
+          o próprio orçamento (per_device_limit, no lugar de limit) e o seu
+          range scan no índice (device_id, time); os scans rodam em paralelo
+          em até HISTORY_PARALLEL_SCANS conexões e o resultado é intercalado
+          em ordem (time, device_id), em streaming no ndjson. Devices que
+          bateram no orçamento vão em X-Truncated-Devices. Não combina com
+          device_id nem cursor
+        Janelas fechadas (fora do horizonte de atraso) saem do cache de
+        respostas com ETag (If-None-Match -> 304), exceto o stream ndjson.
         """
         try:
-            conn = worker.db.get_connection()
-            if not conn:
-                return {"error": "Database not connected"}, 503
+            start_dt, end_dt = parse_window(start, end)
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
 
-            # Parse dates
-            if start:
-                start_dt = datetime.fromisoformat(start.replace("Z", "+00:00"))
-            else:
-                start_dt = datetime.now(timezone.utc) - timedelta(hours=1)
+        simplify = max_points is not None or zoom is not None
+        if simplify and max_points is not None and max_points < 2:
+            return JSONResponse({"error": "max_points must be >= 2"}, status_code=400)
+        try:
+            after = decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        if after is not None and simplify:
+            return JSONResponse({"error": "cursor cannot be combined with max_points/zoom"}, status_code=400)
+
+        multi = devices is not None
+        if multi:
+            if device_id or after is not None:
+                return JSONResponse({"error": "devices cannot be combined with device_id/cursor"}, status_code=400)
+            if not 1 <= per_device_limit <= 100000:
+                return JSONResponse({"error": "per_device_limit must be between 1 and 100000"}, status_code=400)
+            device_ids = None if devices.strip() == "active" else sorted(
+                {d.strip() for d in devices.split(",") if d.strip()}
+            )
+            devices = "active" if device_ids is None else ",".join(device_ids)
+
+        if format == "ndjson" and not simplify and not multi:
+            # Gerador síncrono: o Starlette o consome no threadpool, sem bloquear o loop
+            return StreamingResponse(
+                stream_ndjson(worker.read_pool.connection, start_dt, end_dt, device_id, limit or None, after),
+                media_type="application/x-ndjson",
+                headers={
+                    "Cache-Control": "no-store",
+                    "X-History-Start": start_dt.isoformat(),
+                    "X-History-End": end_dt.isoformat(),
+                }
+            )
 
-            if end:
-                end_dt = datetime.fromisoformat(end.replace("Z", "+00:00"))
-            else:
-                end_dt = datetime.now(timezone.utc)
-
-            cursor = conn.cursor()
-            query = """
-                SELECT 
-                    time, device_id, operator_id,
-                    latitude, longitude, speed_kmh,
-                    satellites, h_acc, v_acc, s_acc,
-                    accel_magnitude, gyro_magnitude,
-                    mag_x, mag_y, mag_z, mag_magnitude,
-                    linear_accel_magnitude,
-                    azimuth, pitch, roll,
-                    battery_level, battery_status, battery_temperature,
-                    wifi_rssi, cellular_network_type, cellular_operator, cellular_rsrp,
-                    transmission_mode
-                FROM telemetry
-                WHERE time >= %s AND time <= %s
-                  AND latitude IS NOT NULL AND longitude IS NOT NULL
-            """
-            params = [start_dt, end_dt]
-
-            if device_id:
-                query += " AND device_id = %s"
-                params.append(device_id)
-
-            query += " ORDER BY time ASC LIMIT %s"
-            params.append(limit)
-
-            cursor.execute(query, params)
-            points = []
-            for row in cursor.fetchall():
-                points.append(
-                    {
-                        "ts": row[0].isoformat() if row[0] else None,
-                        "device_id": row[1],
-                        "operator_id": row[2],
-                        "lat": float(row[3]) if row[3] is not None else None,
-                        "lon": float(row[4]) if row[4] is not None else None,
-                        "speed_kmh": float(row[5]) if row[5] is not None else None,
-                        # GPS detalhado
-                        "satellites": int(row[6]) if row[6] is not None else None,
-                        "h_acc": float(row[7]) if row[7] is not None else None,
-                        "v_acc": float(row[8]) if row[8] is not None else None,
-                        "s_acc": float(row[9]) if row[9] is not None else None,
-                        # IMU expandido
-                        "accel_magnitude": float(row[10]) if row[10] is not None else None,
-                        "gyro_magnitude": float(row[11]) if row[11] is not None else None,
-                        "mag_x": float(row[12]) if row[12] is not None else None,
-                        "mag_y": float(row[13]) if row[13] is not None else None,
-                        "mag_z": float(row[14]) if row[14] is not None else None,
-                        "mag_magnitude": float(row[15]) if row[15] is not None else None,
-                        "linear_accel_magnitude": float(row[16]) if row[16] is not None else None,
-                        # Orientação
-                        "azimuth": float(row[17]) if row[17] is not None else None,
-                        "pitch": float(row[18]) if row[18] is not None else None,
-                        "roll": float(row[19]) if row[19] is not None else None,
-                        # Sistema
-                        "battery_level": int(row[20]) if row[20] is not None else None,
-                        "battery_status": row[21] if row[21] else None,
-                        "battery_temperature": float(row[22]) if row[22] is not None else None,
-                        "wifi_rssi": int(row[23]) if row[23] is not None else None,
-                        "cellular_network_type": row[24] if row[24] else None,
-                        "cellular_operator": row[25] if row[25] else None,
-                        "cellular_rsrp": int(row[26]) if row[26] is not None else None,
-                        # Flag de transmissão
-                        "transmission_mode": row[27] if row[27] else "online",
-                    }
-                )
-            cursor.close()
-            return {
-                "count": len(points),
-                "device_id": device_id,
-                "start": start_dt.isoformat(),
-                "end": end_dt.isoformat(),
-                "points": points,
-            }
-        except Exception as e:
-            return {"error": str(e)}, 500
+        key = cache_key("/api/history", start_dt, end_dt, device_id=device_id, limit=limit,
+                        format=format, max_points=max_points, zoom=zoom, cursor=cursor,
+                        devices=devices, per_device_limit=per_device_limit if multi else None)
+        if_none_match = request.headers.get("if-none-match")
+        cached = worker.response_cache.get(key)
+        if cached is not None:
+            return worker.response_cache.respond(cached, if_none_match)
+
+        async def query():
+            page_size = limit or 20000
+
+            def fetch(cursor):
+                cursor.execute(*build_history_query(start_dt, end_dt, device_id, page_size, after))
+                return cursor.fetchall()
+
+            async def fetch_devices(ids, per_limit, max_total=None):
+                # Scans por device repartidos entre poucas conexões (não esgota o pool)
+                if ids is None:
+                    ids = await worker.read_pool.run(fetch_active_devices, start_dt, end_dt)
+                if not ids:
+                    return {}
+                groups = split_devices(ids, min(worker.config.history_parallel_scans, worker.read_pool.size))
+                parts = await asyncio.gather(*(
+                    worker.read_pool.run(fetch_device_histories, start_dt, end_dt, group, per_limit, max_total)
+                    for group in groups
+                ))
+                return {d: rows for part in parts for d, rows in part.items()}
+
+            try:
+                next_page = None
+                counts = {}
+                if simplify:
+                    # Janela inteira de cada device: o orçamento é do simplify, não
+                    # de limit/per_device_limit. Sem cache próprio: a resposta vai
+                    # para o response_cache, invalidado por dados atrasados
+                    max_rows = worker.config.history_simplify_max_rows
+                    ids = [device_id] if device_id else device_ids if multi else None
+                    histories = await fetch_devices(ids, None, max_rows)
+                    raw_count = sum(len(r) for r in histories.values())
+                    if raw_count > max_rows:
+                        return JSONResponse(
+                            {"error": f"more than {max_rows} points to simplify; narrow the window or devices"},
+                            status_code=413,
+                        )
+                    if multi:
+                        counts = {d: len(r) for d, r in histories.items()}
+                    raw = list(merge_histories(histories.values()))
+                    rows = await run_in_threadpool(simplify_rows, raw, max_points, zoom)
+                elif multi:
+                    histories = await fetch_devices(device_ids, per_device_limit)
+                    counts = {d: len(r) for d, r in histories.items()}
+                    raw_count = sum(counts.values())
+                    rows = merge_histories(histories.values())
+                    if format != "ndjson":
+                        rows = list(rows)
+                else:
+                    rows = await worker.read_pool.run(fetch)
+                    raw_count = len(rows)
+                    next_page = next_cursor(rows, page_size, after)
+
+                headers = {
+                    "X-History-Start": start_dt.isoformat(),
+                    "X-History-End": end_dt.isoformat(),
+                    "X-Raw-Count": str(raw_count),
+                }
+                if next_page:
+                    headers["X-Next-Cursor"] = next_page
+                # Com simplificação a janela é lida inteira: nenhum device é cortado
+                truncated = [] if simplify else sorted(d for d, n in counts.items() if n >= per_device_limit)
+                if truncated:
+                    headers["X-Truncated-Devices"] = ",".join(truncated)
+                if format == "columnar":
+                    return Response(
+                        encode_columnar(HISTORY_SCHEMA, rows),
+                        media_type=COLUMNAR_MEDIA_TYPE,
+                        headers=headers
+                    )
+                if format == "ndjson":
+                    return StreamingResponse(
+                        iter_ndjson(rows), media_type="application/x-ndjson", headers=headers
+                    )
+
+                points = [history_point(row) for row in rows]
+                return {
+                    "count": len(points),
+                    "raw_count": raw_count,
+                    "simplified": simplify,
+                    "device_id": device_id,
+                    "start": start_dt.isoformat(),
+                    "end": end_dt.isoformat(),
+                    "next_cursor": next_page,
+                    "devices": {
+                        d: {"count": n, "truncated": not simplify and n >= per_device_limit}
+                        for d, n in counts.items()
+                    } if multi else None,
+                    "points": points,
+                }
+            except ReadPoolBusy as e:
+                return JSONResponse({"error": str(e)}, status_code=503)
+            except Exception as e:
+                return JSONResponse({"error": str(e)}, status_code=500)
+
+        return await worker.response_cache.store(key, device_id, start_dt, end_dt, await query(), if_none_match)
+    
+    @app.get("/api/history/bins")
+    async def get_history_bins(
+        request: Request,
+        device_id: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        cell: str = "hex",
+        size_m: float = 40.0,
+        max_gap_s: float = 30.0,
+        format: str = "json",
+    ):
+        """
+        Agrega os pontos da janela por célula (heatmap, hex, grid) no servidor.
+        Filtros:
+        - device_id: um ou vários separados por vírgula (omitido = todos)
+        - start/end ISO (padrão: última hora)
+        - cell: hex (raio size_m) ou grid (lado size_m), em metros
+        - max_gap_s: teto do tempo atribuído a cada ponto (permanência)
+        - format: json ou columnar (BIN_SCHEMA, ver src/columnar.py)
+        Por célula: centro, count, dwell_s, mean_speed_kmh e devices
+        distintos (ver src/binning.py). Só as células são enviadas; janelas
+        fechadas ficam no cache de respostas.
+        """
+        try:
+            start_dt, end_dt = parse_window(start, end)
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        if cell not in CELL_TYPES:
+            return JSONResponse({"error": f"cell must be one of {', '.join(CELL_TYPES)}"}, status_code=400)
+        if not MIN_CELL_M <= size_m <= MAX_CELL_M:
+            return JSONResponse({"error": f"size_m must be between {MIN_CELL_M:g} and {MAX_CELL_M:g}"}, status_code=400)
+        if max_gap_s <= 0:
+            return JSONResponse({"error": "max_gap_s must be > 0"}, status_code=400)
+        
+        device_ids = sorted({d.strip() for d in device_id.split(",") if d.strip()}) if device_id else []
+        key = cache_key("/api/history/bins", start_dt, end_dt, device_id=",".join(device_ids) or None,
+                        cell=cell, size_m=size_m, max_gap_s=max_gap_s, format=format)
+        if_none_match = request.headers.get("if-none-match")
+        cached = worker.response_cache.get(key)
+        if cached is not None:
+            return worker.response_cache.respond(cached, if_none_match)
+        
+        async def query():
+            def fetch(cursor):
+                cursor.execute(*build_bins_query(start_dt, end_dt, device_ids))
+                return fetch_points(cursor)
+            
+            try:
+                points = await worker.read_pool.run(fetch)
+                binned = await run_in_threadpool(bin_points, points, cell, size_m, max_gap_s)
+                columns = binned["columns"]
+                
+                if format == "columnar":
+                    return Response(
+                        encode_columnar(BIN_SCHEMA, bin_rows(columns)),
+                        media_type=COLUMNAR_MEDIA_TYPE,
+                        headers={
+                            "X-History-Start": start_dt.isoformat(),
+                            "X-History-End": end_dt.isoformat(),
+                            "X-Raw-Count": str(binned["points"]),
+                            "X-Cell": cell,
+                            "X-Cell-Size-M": f"{size_m:g}",
+                        }
+                    )
+                
+                cells = bin_cells(columns)
+                return {
+                    "cell": cell,
+                    "size_m": size_m,
+                    "ref_lat": binned["ref_lat"],
+                    "raw_count": binned["points"],
+                    "count": len(cells),
+                    "devices": points.device_ids,
+                    "start": start_dt.isoformat(),
+                    "end": end_dt.isoformat(),
+                    "cells": cells,
+                }
+            except ReadPoolBusy as e:
+                return JSONResponse({"error": str(e)}, status_code=503)
+            except Exception as e:
+                return JSONResponse({"error": str(e)}, status_code=500)
+        
+        # Um único device invalida só as suas entradas; conjuntos ficam como "todos"
+        owner = device_ids[0] if len(device_ids) == 1 else None
+        return await worker.response_cache.store(key, owner, start_dt, end_dt, await query(), if_none_match)
+    
+    @app.get("/tiles/{z}/{x}/{y}")
+    async def get_tile(
+        request: Request,
+        z: int,
+        x: int,
+        y: str,
+        device_id: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+    ):
+        """
+        Histórico como Mapbox Vector Tile (esquema XYZ; y aceita .mvt/.pbf).
+        
+        Camadas tracks (linhas simplificadas a 1 pixel no zoom e recortadas
+        no tile) e points (uma amostra por device por pixel), ver
+        src/tiles.py. A fonte segue o zoom: dado bruto perto, continuous
+        aggregates (10s, 1min, 1hour) longe, com a cauda ainda não
+        materializada agregada de telemetry. Sem PostGIS: bbox em
+        latitude/longitude e recorte em Python. Tiles de janelas fechadas
+        ficam no cache de respostas (chave inclui z/x/y e a janela).
+        - device_id: um ou vários separados por vírgula (omitido = todos)
+        - start/end ISO (padrão: últimas 24 horas)
+        """
+        try:
+            y_int = int(y.split(".", 1)[0])
+            start_dt, end_dt = parse_window(start, end, default_hours=24)
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        if not 0 <= z <= MAX_ZOOM or not 0 <= x < 2 ** z or not 0 <= y_int < 2 ** z:
+            return JSONResponse({"error": "tile out of range"}, status_code=400)
+        
+        device_ids = sorted({d.strip() for d in device_id.split(",") if d.strip()}) if device_id else []
+        key = cache_key(f"/tiles/{z}/{x}/{y_int}", start_dt, end_dt, device_id=",".join(device_ids) or None)
+        if_none_match = request.headers.get("if-none-match")
+        cached = worker.response_cache.get(key)
+        if cached is not None:
+            return worker.response_cache.respond(cached, if_none_match)
+        
+        async def query():
+            bounds = tile_bounds(z, x, y_int)
+            tier = tile_tier(z, (bounds[1] + bounds[3]) / 2)
+            limit = worker.config.tile_max_rows
+            
+            def fetch(cursor):
+                cursor.execute(*build_tile_query(tier, start_dt, end_dt, bounds, device_ids, limit))
+                return cursor.fetchall()
+            
+            try:
+                rows = await worker.read_pool.run(fetch)
+                body = await run_in_threadpool(render_tile, rows, z, x, y_int, tier)
+                headers = {"X-Tile-Resolution": tier.name, "X-Raw-Count": str(len(rows))}
+                if len(rows) >= limit:
+                    headers["X-Tile-Truncated"] = "1"
+                return Response(body, media_type=MVT_MEDIA_TYPE, headers=headers)
+            except ReadPoolBusy as e:
+                return JSONResponse({"error": str(e)}, status_code=503)
+            except Exception as e:
+                return JSONResponse({"error": str(e)}, status_code=500)
+        
+        owner = device_ids[0] if len(device_ids) == 1 else None
+        return await worker.response_cache.store(key, owner, start_dt, end_dt, await query(), if_none_match)
     
     @app.get("/api/telemetry")
     async def get_telemetry(
+        request: Request,
         device_id: str,
         start: Optional[str] = None,
         end: Optional[str] = None,
         limit: int = 3600,
-        granularity: str = "raw"
+        granularity: str = "raw",
+        format: str = "json",
+        max_points: Optional[int] = None
     ):
         """
         Busca telemetria histórica.
@@ -1271,231 +2110,216 @@ def create_health_app(worker: IngestWorker) -> FastAPI:
             start: Data/hora início (ISO format)
             end: Data/hora fim (ISO format)
             limit: Máximo de registros (default 3600 = 1h @ 1Hz)
-            granularity: raw | 1min | 1hour
+            granularity: raw | 10s | 1min | 1hour | auto
+                raw mantém as colunas brutas; as demais usam o schema comum
+                das camadas (ver src/resolution.py), com a cauda ainda não
+                materializada agregada a partir de telemetry. auto escolhe a
+                camada mais fina cujo número de buckets cabe em max_points
+            max_points: orçamento de pontos do modo auto (default = limit)
+            format: json | columnar (typed arrays, ver src/columnar.py)
         """
         try:
-            conn = worker.db.get_connection()
-            if not conn:
-                return {"error": "Database not connected"}, 503
-            
-            # Parse dates
-            if start:
-                start_dt = datetime.fromisoformat(start.replace('Z', '+00:00'))
-            else:
-                start_dt = datetime.now(timezone.utc) - timedelta(hours=1)
-            
-            if end:
-                end_dt = datetime.fromisoformat(end.replace('Z', '+00:00'))
-            else:
-                end_dt = datetime.now(timezone.utc)
-            
-            cursor = conn.cursor()
-            
-            if granularity == "raw":
-                cursor.execute("""
-                    SELECT 
-                        time, device_id, operator_id,
-                        latitude, longitude, altitude,
-                        speed, speed_kmh, bearing, gps_accuracy,
-                        accel_x, accel_y, accel_z, accel_magnitude
-                    FROM telemetry
-                    WHERE device_id = %s AND time >= %s AND time <= %s
-                    ORDER BY time ASC
-                    LIMIT %s
-                """, (device_id, start_dt, end_dt, limit))
-                
-            elif granularity == "1min":
-                cursor.execute("""
-                    SELECT 
-                        bucket, device_id,
-                        sample_count,
-                        avg_speed_kmh, max_speed_kmh,
-                        avg_accel_magnitude, max_accel_magnitude,
-                        first_lat, first_lon, last_lat, last_lon
-                    FROM telemetry_1min
-                    WHERE device_id = %s AND bucket >= %s AND bucket <= %s
-                    ORDER BY bucket ASC
-                    LIMIT %s
-                """, (device_id, start_dt, end_dt, limit))
-                
-            elif granularity == "1hour":
-                cursor.execute("""
-                    SELECT 
-                        bucket, device_id, operator_id,
-                        sample_count,
-                        avg_speed_kmh, max_speed_kmh,
-                        avg_accel_magnitude, max_accel_magnitude,
-                        distance_km
-                    FROM telemetry_1hour
-                    WHERE device_id = %s AND bucket >= %s AND bucket <= %s
-                    ORDER BY bucket ASC
-                    LIMIT %s
-                """, (device_id, start_dt, end_dt, limit))
+            start_dt, end_dt = parse_window(start, end)
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        
+        key = cache_key("/api/telemetry", start_dt, end_dt, device_id=device_id, limit=limit,
+                        granularity=granularity, format=format, max_points=max_points)
+        if_none_match = request.headers.get("if-none-match")
+        cached = worker.response_cache.get(key)
+        if cached is not None:
+            return worker.response_cache.respond(cached, if_none_match)
+        
+        async def query():
+            try:
+                if granularity == "auto":
+                    tier = choose_tier(start_dt, end_dt, max_points or limit)
+                elif granularity == "raw":
+                    tier = None
+                elif granularity in TIERS_BY_NAME:
+                    tier = TIERS_BY_NAME[granularity]
+                else:
+                    return JSONResponse({"error": f"invalid granularity: {granularity}"}, status_code=400)
             
-            columns = [desc[0] for desc in cursor.description]
-            rows = []
-            for row in cursor.fetchall():
-                row_dict = {}
-                for i, col in enumerate(columns):
-                    val = row[i]
-                    if isinstance(val, datetime):
-                        row_dict[col] = val.isoformat()
-                    elif val is not None:
-                        row_dict[col] = float(val) if isinstance(val, (int, float)) else val
-                    else:
-                        row_dict[col] = None
-                rows.append(row_dict)
+                def fetch(cursor):
+                    if tier is None:
+                        cursor.execute("""
+                            SELECT 
+                                time, device_id, operator_id,
+                                latitude, longitude, altitude,
+                                speed, speed_kmh, bearing, gps_accuracy,
+                                accel_x, accel_y, accel_z, accel_magnitude
+                            FROM telemetry
+                            WHERE device_id = %s AND time >= %s AND time <= %s
+                            ORDER BY time ASC
+                            LIMIT %s
+                        """, (device_id, start_dt, end_dt, limit))
+                        return [desc[0] for desc in cursor.description], cursor.fetchall()
+                    cursor.execute(*build_tier_query(tier, device_id, start_dt, end_dt, limit))
+                    return TIER_COLUMNS, cursor.fetchall()
+
+                columns, fetched = await worker.read_pool.run(fetch)
+                resolution = tier.name if tier else "raw"
+                if format == "columnar":
+                    return Response(
+                        encode_columnar(infer_schema(columns, fetched), fetched),
+                        media_type=COLUMNAR_MEDIA_TYPE,
+                        headers={"X-Granularity": granularity, "X-Resolution": resolution}
+                    )
+
+                if tier is not None:
+                    return {
+                        "device_id": device_id,
+                        "start": start_dt.isoformat(),
+                        "end": end_dt.isoformat(),
+                        "granularity": granularity,
+                        "resolution": resolution,
+                        "bucket_seconds": tier.seconds,
+                        "count": len(fetched),
+                        "data": [tier_point(row) for row in fetched]
+                    }
+
+                rows = []
+                for row in fetched:
+                    row_dict = {}
+                    for i, col in enumerate(columns):
+                        val = row[i]
+                        if isinstance(val, datetime):
+                            row_dict[col] = val.isoformat()
+                        elif val is not None:
+                            row_dict[col] = float(val) if isinstance(val, (int, float)) else val
+                        else:
+                            row_dict[col] = None
+                    rows.append(row_dict)
             
-            cursor.close()
-            return {
-                "device_id": device_id,
-                "start": start_dt.isoformat(),
-                "end": end_dt.isoformat(),
-                "granularity": granularity,
-                "count": len(rows),
-                "data": rows
-            }
+                return {
+                    "device_id": device_id,
+                    "start": start_dt.isoformat(),
+                    "end": end_dt.isoformat(),
+                    "granularity": granularity,
+                    "resolution": resolution,
+                    "count": len(rows),
+                    "data": rows
+                }
             
-        except Exception as e:
-            return {"error": str(e)}, 500
+            except ReadPoolBusy as e:
+                return JSONResponse({"error": str(e)}, status_code=503)
+            except Exception as e:
+                return JSONResponse({"error": str(e)}, status_code=500)
+
+        return await worker.response_cache.store(key, device_id, start_dt, end_dt, await query(), if_none_match)
     
     @app.get("/api/events")
     async def get_events(
+        request: Request,
         device_id: Optional[str] = None,
         event_type: Optional[str] = None,
         start: Optional[str] = None,
         end: Optional[str] = None,
-        limit: int = 100
+        limit: int = 100,
+        cursor: Optional[str] = None
     ):
-        """Busca eventos (alertas, impactos, etc)."""
+        """
+        Busca eventos (alertas, impactos, etc), do mais recente ao mais antigo.
+        
+        Paginação por keyset em (time, device_id): cursor = next_cursor da
+        página anterior. (time, device_id) não é único em events; os empates
+        já entregues ficam no cursor e são pulados com OFFSET.
+        """
         try:
-            conn = worker.db.get_connection()
-            if not conn:
-                return {"error": "Database not connected"}, 503
-            
-            if start:
-                start_dt = datetime.fromisoformat(start.replace('Z', '+00:00'))
-            else:
-                start_dt = datetime.now(timezone.utc) - timedelta(hours=24)
-            
-            if end:
-                end_dt = datetime.fromisoformat(end.replace('Z', '+00:00'))
-            else:
-                end_dt = datetime.now(timezone.utc)
-            
-            cursor = conn.cursor()
+            start_dt, end_dt = parse_window(start, end, default_hours=24)
+            after = decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        
+        key = cache_key("/api/events", start_dt, end_dt, device_id=device_id,
+                        event_type=event_type, limit=limit, cursor=cursor)
+        if_none_match = request.headers.get("if-none-match")
+        cached = worker.response_cache.get(key)
+        if cached is not None:
+            return worker.response_cache.respond(cached, if_none_match)
+        
+        async def query():
+            try:
+                query = """
+                    SELECT time, device_id, operator_id, event_type, severity, data
+                    FROM events
+                    WHERE time >= %s AND time <= %s
+                """
+                params = [start_dt, end_dt]
             
-            query = """
-                SELECT time, device_id, operator_id, event_type, severity, data
-                FROM events
-                WHERE time >= %s AND time <= %s
-            """
-            params = [start_dt, end_dt]
+                if device_id:
+                    query += " AND device_id = %s"
+                    params.append(device_id)
             
-            if device_id:
-                query += " AND device_id = %s"
-                params.append(device_id)
+                if event_type:
+                    query += " AND event_type = %s"
+                    params.append(event_type)
             
-            if event_type:
-                query += " AND event_type = %s"
-                params.append(event_type)
+                if after is not None:
+                    query += " AND (time, device_id) <= (%s, %s)"
+                    params.extend([after.time, after.device_id])
             
-            query += " ORDER BY time DESC LIMIT %s"
-            params.append(limit)
+                # Desempate determinístico para o OFFSET dos empates do cursor
+                query += " ORDER BY time DESC, device_id DESC, received_at DESC, event_type LIMIT %s OFFSET %s"
+                params.extend([limit, after.skip if after else 0])
             
-            cursor.execute(query, params)
+                def fetch(cursor):
+                    cursor.execute(query, params)
+                    return cursor.fetchall()
             
-            events = []
-            for row in cursor.fetchall():
-                events.append({
-                    "time": row[0].isoformat() if row[0] else None,
-                    "device_id": row[1],
-                    "operator_id": row[2],
-                    "event_type": row[3],
-                    "severity": row[4],
-                    "data": row[5]
-                })
+                events = []
+                rows = await worker.read_pool.run(fetch)
+                for row in rows:
+                    events.append({
+                        "time": row[0].isoformat() if row[0] else None,
+                        "device_id": row[1],
+                        "operator_id": row[2],
+                        "event_type": row[3],
+                        "severity": row[4],
+                        "data": row[5]
+                    })
             
-            cursor.close()
-            return {"events": events, "count": len(events)}
+                return {"events": events, "count": len(events), "next_cursor": next_cursor(rows, limit, after)}
             
-        except Exception as e:
-            return {"error": str(e)}, 500
+            except ReadPoolBusy as e:
+                return JSONResponse({"error": str(e)}, status_code=503)
+            except Exception as e:
+                return JSONResponse({"error": str(e)}, status_code=500)
+
+        return await worker.response_cache.store(key, device_id, start_dt, end_dt, await query(), if_none_match)
     
     @app.get("/api/summary")
     async def get_summary(hours: int = 24):
-        """Resumo geral do sistema."""
+        """
+        Resumo geral do sistema.
+        
+        Vem dos buckets por minuto (src/summary_buckets.py): da memória do
+        ingest quando a janela cabe nela; senão (processos de API ou janelas
+        maiores) da tabela summary_1min. Nunca varre telemetry.
+        """
+        buckets = getattr(worker, "summary_buckets", None)
         try:
-            conn = worker.db.get_connection()
-            if not conn:
-                return {"error": "Database not connected"}, 503
-            
-            cursor = conn.cursor()
-            
-            # Dispositivos ativos
-            cursor.execute("""
-                SELECT COUNT(DISTINCT device_id)
-                FROM telemetry
-                WHERE time > NOW() - INTERVAL '5 minutes'
-            """)
-            active_devices = cursor.fetchone()[0]
-            
-            # Total de telemetrias no período
-            cursor.execute("""
-                SELECT COUNT(*)
-                FROM telemetry
-                WHERE time > NOW() - INTERVAL '%s hours'
-            """, (hours,))
-            total_telemetries = cursor.fetchone()[0]
-            
-            # Velocidade média e máxima
-            cursor.execute("""
-                SELECT AVG(speed_kmh), MAX(speed_kmh)
-                FROM telemetry
-                WHERE time > NOW() - INTERVAL '%s hours'
-                AND speed_kmh IS NOT NULL
-            """, (hours,))
-            row = cursor.fetchone()
-            avg_speed = float(row[0]) if row[0] else 0
-            max_speed = float(row[1]) if row[1] else 0
-            
-            # Aceleração máxima
-            cursor.execute("""
-                SELECT MAX(accel_magnitude)
-                FROM telemetry
-                WHERE time > NOW() - INTERVAL '%s hours'
-                AND accel_magnitude IS NOT NULL
-            """, (hours,))
-            max_accel = float(cursor.fetchone()[0] or 0)
-            
-            # Eventos por severidade (se tabela existir)
-            events_by_severity = {}
-            try:
-                cursor.execute("""
-                    SELECT event_type, COUNT(*)
-                    FROM events
-                    WHERE time > NOW() - INTERVAL '%s hours'
-                    GROUP BY event_type
-                """, (hours,))
-                events_by_severity = {row[0]: row[1] for row in cursor.fetchall()}
-            except Exception:
-                pass  # Tabela events pode não existir
-            
-            cursor.close()
+            if buckets is not None and buckets.covers(hours):
+                summary = buckets.summarize(hours)
+            else:
+                def fetch(cursor):
+                    cursor.execute(SUMMARY_SELECT, (hours,))
+                    return cursor.fetchall()
+                
+                rows = await worker.read_pool.run(fetch)
+                summary = summarize((row[0], MinuteBucket.from_row(row[1:])) for row in rows)
             
             return {
                 "period_hours": hours,
-                "active_devices": active_devices,
-                "total_telemetries": total_telemetries,
-                "avg_speed_kmh": round(avg_speed, 1),
-                "max_speed_kmh": round(max_speed, 1),
-                "max_acceleration": round(max_accel, 2),
-                "events": events_by_severity,
+                **summary,
                 "ingest_stats": worker.get_stats()
             }
             
+        except ReadPoolBusy as e:
+            return JSONResponse({"error": str(e)}, status_code=503)
         except Exception as e:
-            return {"error": str(e)}, 500
+            return JSONResponse({"error": str(e)}, status_code=500)
     
     return app
 
@@ -1518,7 +2342,11 @@ def main():
                batch_size=config.batch_size)
     
     # Criar broadcaster
-    broadcaster = TelemetryBroadcaster(throttle_seconds=5.0)
+    broadcaster = TelemetryBroadcaster(
+        tick_ms=config.broadcast_tick_ms,
+        subscriber_interval_seconds=config.stream_interval_seconds,
+        offline_after_seconds=config.device_offline_seconds
+    )
 
     # Criar worker com broadcaster
     worker = IngestWorker(config, broadcaster=broadcaster)
@@ -1542,6 +2370,9 @@ def main():
     maintenance_thread = Thread(target=worker.run_maintenance_loop, daemon=True)
     maintenance_thread.start()
     
+    # Iniciar thread da lane de backfill (worker.stop() espera o flush final dela)
+    worker.backfill.start()
+    
     # Rodar health server (blocking)
     logger.info("starting_health_server", port=config.health_port)
     uvicorn.run(
@@ -0,0 +1,154 @@
+"""
+Codificador mínimo de Mapbox Vector Tiles (MVT 2.1), sem dependências.
+
+Só o necessário para /tiles: camadas com features Point e LineString e
+propriedades string/int/float/bool. Segue vector_tile.proto:
+
+    Tile    { repeated Layer layers = 3; }
+    Layer   { uint32 version = 15; string name = 1; repeated Feature features = 2;
+              repeated string keys = 3; repeated Value values = 4; uint32 extent = 5; }
+    Feature { uint64 id = 1; repeated uint32 tags = 2 [packed];
+              GeomType type = 3; repeated uint32 geometry = 4 [packed]; }
+    Value   { string string_value = 1; double double_value = 3;
+              sint64 sint_value = 6; bool bool_value = 7; }
+
+Geometria em coordenadas inteiras do tile (0..extent), comandos MoveTo /
+LineTo com deltas em zigzag.
+"""
+
+import struct
+from typing import Any, Dict, List, Sequence, Tuple
+
+EXTENT = 4096
+MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+
+POINT = 1
+LINESTRING = 2
+
+_MOVE_TO = 1
+_LINE_TO = 2
+
+_VARINT = 0
+_FIXED64 = 1
+_LENGTH = 2
+
+
+def _varint(value: int, out: bytearray):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _tag(field: int, wire_type: int, out: bytearray):
+    _varint((field << 3) | wire_type, out)
+
+
+def _length_delimited(field: int, payload: bytes, out: bytearray):
+    _tag(field, _LENGTH, out)
+    _varint(len(payload), out)
+    out += payload
+
+
+def _packed(field: int, values: Sequence[int], out: bytearray):
+    body = bytearray()
+    for v in values:
+        _varint(v, body)
+    _length_delimited(field, bytes(body), out)
+
+
+def _value(value: Any) -> bytes:
+    out = bytearray()
+    if isinstance(value, bool):
+        _tag(7, _VARINT, out)
+        _varint(int(value), out)
+    elif isinstance(value, int):
+        _tag(6, _VARINT, out)
+        _varint(_zigzag(value) & 0xFFFFFFFFFFFFFFFF, out)
+    elif isinstance(value, float):
+        _tag(3, _FIXED64, out)
+        out += struct.pack("<d", value)
+    else:
+        _length_delimited(1, str(value).encode("utf-8"), out)
+    return bytes(out)
+
+
+class Layer:
+    """Camada MVT: features acumuladas, chaves e valores internados."""
+
+    def __init__(self, name: str, extent: int = EXTENT):
+        self.name = name
+        self.extent = extent
+        self._features: List[bytes] = []
+        self._keys: Dict[str, int] = {}
+        self._values: Dict[Tuple[type, Any], int] = {}
+        self._value_bytes: List[bytes] = []
+
+    def __len__(self) -> int:
+        return len(self._features)
+
+    def _tags(self, properties: Dict[str, Any]) -> List[int]:
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            k = self._keys.setdefault(key, len(self._keys))
+            vkey = (type(value), value)
+            v = self._values.get(vkey)
+            if v is None:
+                v = self._values[vkey] = len(self._value_bytes)
+                self._value_bytes.append(_value(value))
+            tags += (k, v)
+        return tags
+
+    def _add(self, geom_type: int, geometry: List[int], properties: Dict[str, Any]):
+        out = bytearray()
+        _tag(1, _VARINT, out)
+        _varint(len(self._features) + 1, out)
+        tags = self._tags(properties)
+        if tags:
+            _packed(2, tags, out)
+        _tag(3, _VARINT, out)
+        _varint(geom_type, out)
+        _packed(4, geometry, out)
+        self._features.append(bytes(out))
+
+    def add_point(self, x: int, y: int, properties: Dict[str, Any]):
+        self._add(POINT, [(_MOVE_TO | (1 << 3)), _zigzag(x), _zigzag(y)], properties)
+
+    def add_line(self, coords: Sequence[Tuple[int, int]], properties: Dict[str, Any]):
+        """LineString com ao menos 2 vértices (coordenadas inteiras do tile)."""
+        x0, y0 = coords[0]
+        geometry = [(_MOVE_TO | (1 << 3)), _zigzag(x0), _zigzag(y0), (_LINE_TO | ((len(coords) - 1) << 3))]
+        for x, y in coords[1:]:
+            geometry += (_zigzag(x - x0), _zigzag(y - y0))
+            x0, y0 = x, y
+        self._add(LINESTRING, geometry, properties)
+
+    def encode(self) -> bytes:
+        out = bytearray()
+        _tag(15, _VARINT, out)
+        _varint(2, out)
+        _length_delimited(1, self.name.encode("utf-8"), out)
+        for feature in self._features:
+            _length_delimited(2, feature, out)
+        for key in self._keys:
+            _length_delimited(3, key.encode("utf-8"), out)
+        for value in self._value_bytes:
+            _length_delimited(4, value, out)
+        _tag(5, _VARINT, out)
+        _varint(self.extent, out)
+        return bytes(out)
+
+
+def encode_tile(layers: Sequence[Layer]) -> bytes:
+    """Tile com as camadas não vazias (tile sem features = corpo vazio)."""
+    out = bytearray()
+    for layer in layers:
+        if len(layer):
+            _length_delimited(3, layer.encode(), out)
+    return bytes(out)
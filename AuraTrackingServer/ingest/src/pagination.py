@@ -0,0 +1,59 @@
+import base64
+import json
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional, Sequence
+
+
+class Cursor(NamedTuple):
+    """
+    Posição de keyset: última chave (time, device_id) já entregue.
+
+    skip: linhas com exatamente essa chave já entregues. Só importa em
+    tabelas onde a chave não é única (events); em telemetry é sempre 0.
+    """
+    time: datetime
+    device_id: str
+    skip: int = 0
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    """Token opaco (base64 url-safe de [epoch µs, device_id, skip])."""
+    micros = int(cursor.time.timestamp()) * 1_000_000 + cursor.time.microsecond
+    raw = json.dumps([micros, cursor.device_id, cursor.skip], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> Cursor:
+    """Inverso de encode_cursor; ValueError se o token for inválido."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        micros, device_id, skip = json.loads(raw)
+        seconds, rest = divmod(int(micros), 1_000_000)
+        ts = datetime.fromtimestamp(seconds, tz=timezone.utc).replace(microsecond=rest)
+        if not isinstance(device_id, str) or int(skip) < 0:
+            raise ValueError
+        return Cursor(ts, device_id, int(skip))
+    except (ValueError, TypeError, json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise ValueError("invalid cursor") from e
+
+
+def next_cursor(rows: Sequence[tuple], limit: int, after: Optional[Cursor] = None,
+                time_col: int = 0, device_col: int = 1) -> Optional[str]:
+    """
+    Cursor da próxima página, ou None se esta foi a última (menos que limit linhas).
+
+    Conta as linhas finais com a mesma chave da última, somando as já
+    puladas quando a chave é a mesma do cursor anterior.
+    """
+    if not limit or len(rows) < limit:
+        return None
+    last = rows[-1]
+    key = (last[time_col], last[device_col])
+    skip = 0
+    for row in reversed(rows):
+        if (row[time_col], row[device_col]) != key:
+            break
+        skip += 1
+    if after is not None and key == (after.time, after.device_id):
+        skip += after.skip
+    return encode_cursor(Cursor(key[0], key[1], skip))
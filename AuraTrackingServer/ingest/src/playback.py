@@ -0,0 +1,128 @@
+import json
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, ContextManager, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import structlog
+
+logger = structlog.get_logger("playback")
+
+MIN_SLICE_SECONDS = 1
+MAX_SLICE_SECONDS = 600
+MIN_SPEED = 0.1
+MAX_SPEED = 1000.0
+# Fatias lidas por ida ao banco: a primeira é curta para o replay começar
+# na hora; as seguintes amortizam a consulta
+FIRST_ROUND_SLICES = 3
+ROUND_SLICES = 60
+# Estado inicial: última amostra de cada device até SNAPSHOT_LOOKBACK antes do início
+SNAPSHOT_LOOKBACK = timedelta(minutes=15)
+
+PLAYBACK_COLUMNS = "time, device_id, operator_id, latitude, longitude, speed_kmh"
+
+
+class Slice(NamedTuple):
+    """Uma fatia do replay: intervalo [start, end) e a última amostra de cada device nele."""
+    start: datetime
+    end: datetime
+    updates: List[Dict[str, Any]]
+
+
+def playback_payload(row: tuple) -> Dict[str, Any]:
+    """Linha de PLAYBACK_COLUMNS no payload de "fleet-update" do stream ao vivo."""
+    time, device_id, operator_id, lat, lon, speed = row
+    return {
+        "id": device_id,
+        "ts": time.timestamp(),
+        "lat": float(lat),
+        "lon": float(lon),
+        "sp": round(float(speed), 1) if speed is not None else None,
+        "op": operator_id,
+        "st": "online",
+    }
+
+
+def _device_filter(device_ids: Optional[Sequence[str]], params: List[Any]) -> str:
+    if not device_ids:
+        return ""
+    params.append(list(device_ids))
+    return " AND device_id = ANY(%s)"
+
+
+def build_snapshot_query(start: datetime, device_ids: Optional[Sequence[str]]) -> Tuple[str, List[Any]]:
+    """Última posição de cada device em [start - SNAPSHOT_LOOKBACK, start)."""
+    params: List[Any] = [start - SNAPSHOT_LOOKBACK, start]
+    query = f"""
+        SELECT DISTINCT ON (device_id) {PLAYBACK_COLUMNS}
+        FROM telemetry
+        WHERE time >= %s AND time < %s
+          AND latitude IS NOT NULL AND longitude IS NOT NULL
+    """
+    query += _device_filter(device_ids, params)
+    query += " ORDER BY device_id, time DESC"
+    return query, params
+
+
+def build_slices_query(start: datetime, end: datetime,
+                       device_ids: Optional[Sequence[str]]) -> Tuple[str, List[Any]]:
+    """Amostras com posição em [start, end), em ordem temporal (índice em time)."""
+    params: List[Any] = [start, end]
+    query = f"""
+        SELECT {PLAYBACK_COLUMNS}
+        FROM telemetry
+        WHERE time >= %s AND time < %s
+          AND latitude IS NOT NULL AND longitude IS NOT NULL
+    """
+    query += _device_filter(device_ids, params)
+    query += " ORDER BY time"
+    return query, params
+
+
+def fetch_snapshot(cursor, start: datetime, device_ids: Optional[Sequence[str]]) -> List[Dict[str, Any]]:
+    cursor.execute(*build_snapshot_query(start, device_ids))
+    return [playback_payload(row) for row in cursor.fetchall()]
+
+
+def fetch_slices(connection: Callable[[], ContextManager[Any]], start: datetime, slice_seconds: int,
+                 n_slices: int, end: datetime, device_ids: Optional[Sequence[str]],
+                 chunk_rows: int = 5000) -> List[Slice]:
+    """
+    Lê até n_slices fatias a partir de start com um cursor nomeado
+    (server-side) e compacta cada fatia na última amostra por device.
+
+    As linhas chegam em lotes de chunk_rows e são descartadas ao compactar:
+    a memória fica em (fatias x devices), não nas amostras brutas. A conexão
+    do pool de leitura é emprestada só durante a leitura da rodada, nunca
+    durante a espera do ritmo de reprodução. Fatias sem dados saem vazias
+    (o relógio do replay avança mesmo assim).
+    """
+    step = timedelta(seconds=slice_seconds)
+    bounds = []
+    t = start
+    while t < end and len(bounds) < n_slices:
+        bounds.append((t, min(t + step, end)))
+        t += step
+    if not bounds:
+        return []
+
+    compacted: List[Dict[str, Dict[str, Any]]] = [{} for _ in bounds]
+    with connection() as conn, conn.cursor(name=f"playback_{uuid.uuid4().hex[:12]}") as cur:
+        cur.itersize = chunk_rows
+        cur.execute(*build_slices_query(start, bounds[-1][1], device_ids))
+        while True:
+            batch = cur.fetchmany(chunk_rows)
+            if not batch:
+                break
+            for row in batch:
+                k = min(int((row[0] - start).total_seconds() // slice_seconds), len(bounds) - 1)
+                compacted[k][row[1]] = playback_payload(row)
+    return [Slice(a, b, list(updates.values())) for (a, b), updates in zip(bounds, compacted)]
+
+
+def format_playback_frame(item: Slice) -> bytes:
+    """Frame SSE "playback-frame": relógio da fatia (epoch) e as atualizações compactadas."""
+    body = json.dumps(
+        {"t0": item.start.timestamp(), "t1": item.end.timestamp(), "updates": item.updates},
+        separators=(",", ":"),
+    )
+    return f"event: playback-frame\ndata: {body}\n\n".encode("utf-8")
@@ -0,0 +1,144 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import psycopg2
+import psycopg2.pool
+import structlog
+from starlette.concurrency import run_in_threadpool
+
+logger = structlog.get_logger("read_pool")
+
+
+class ReadPoolBusy(Exception):
+    """Todas as conexões de leitura ocupadas além do tempo de espera."""
+
+
+class ReadPool:
+    """
+    Pool de conexões somente leitura para a API REST.
+
+    A conexão de DatabasePool é da ingestão (insert_telemetry_batch); consultas
+    da API nela serializam com os commits e, rodando em handlers async,
+    bloqueiam o event loop inteiro.
+
+    Funcionalidades:
+    - Conexões próprias (ThreadedConnectionPool), read-only, com
+      statement_timeout e application_name separados da ingestão
+    - Limite de concorrência: quem não consegue conexão em wait_seconds
+      recebe ReadPoolBusy (503) em vez de enfileirar indefinidamente
+    - run() executa a consulta no threadpool do Starlette, fora do event loop
+    """
+
+    def __init__(
+        self,
+        config: Any,
+        size: int = 4,
+        statement_timeout_ms: int = 15000,
+        wait_seconds: float = 5.0,
+        cursor_factory: Optional[type] = None,
+    ):
+        self.config = config
+        self.size = size
+        self.statement_timeout_ms = statement_timeout_ms
+        self.wait_seconds = wait_seconds
+        # Cursor padrão das conexões (instrumentação, ver src/instrumentation.py)
+        self.cursor_factory = cursor_factory
+        self._pool: Optional[psycopg2.pool.ThreadedConnectionPool] = None
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self._in_use = 0
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "read_queries": 0,
+            "read_failed": 0,
+            "read_rejected": 0,
+            "read_wait_seconds_total": 0.0,
+        }
+
+    def _get_pool(self) -> psycopg2.pool.ThreadedConnectionPool:
+        # Criação preguiçosa: a API sobe mesmo com o banco fora do ar
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = psycopg2.pool.ThreadedConnectionPool(
+                    0, self.size,
+                    host=self.config.db_host,
+                    port=self.config.db_port,
+                    dbname=self.config.db_name,
+                    user=self.config.db_user,
+                    password=self.config.db_password,
+                    connect_timeout=10,
+                    application_name="auratracking-api",
+                    cursor_factory=self.cursor_factory,
+                    options=(
+                        f"-c statement_timeout={self.statement_timeout_ms}"
+                        " -c default_transaction_read_only=on"
+                    )
+                )
+                logger.info("read_pool_created", size=self.size,
+                            statement_timeout_ms=self.statement_timeout_ms)
+            return self._pool
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """
+        Empresta uma conexão do pool (bloqueante; use em thread).
+
+        A transação é encerrada com rollback na devolução; conexões quebradas
+        são descartadas do pool.
+        """
+        waited = time.monotonic()
+        if not self._slots.acquire(timeout=self.wait_seconds):
+            self._count("read_rejected")
+            raise ReadPoolBusy(f"read pool busy ({self.size} connections in use)")
+        with self._stats_lock:
+            self._stats["read_wait_seconds_total"] += time.monotonic() - waited
+            self._in_use += 1
+
+        try:
+            pool = self._get_pool()
+            conn = pool.getconn()
+            try:
+                yield conn
+            except Exception:
+                self._count("read_failed")
+                raise
+            finally:
+                broken = bool(conn.closed)
+                if not broken:
+                    try:
+                        conn.rollback()
+                    except psycopg2.Error:
+                        broken = True
+                pool.putconn(conn, close=broken)
+        finally:
+            with self._stats_lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def _call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        with self.connection() as conn, conn.cursor() as cur:
+            self._count("read_queries")
+            return fn(cur, *args)
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Executa fn(cursor, *args) numa conexão do pool, fora do event loop."""
+        return await run_in_threadpool(self._call, fn, *args)
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "read_pool_size": self.size,
+            "read_pool_in_use": self._in_use,
+        }
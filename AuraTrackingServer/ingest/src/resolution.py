@@ -0,0 +1,156 @@
+import math
+from datetime import datetime, timezone
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+
+class Tier(NamedTuple):
+    """Camada de resolução de /api/telemetry."""
+    name: str
+    seconds: int
+    relation: Optional[str]  # continuous aggregate; None = tabela telemetry
+
+
+# Da mais fina para a mais grossa (1 s = dado bruto a 1 Hz)
+TIERS: List[Tier] = [
+    Tier("raw", 1, None),
+    Tier("10s", 10, "telemetry_10s"),
+    Tier("1min", 60, "telemetry_1min"),
+    Tier("1hour", 3600, "telemetry_1hour"),
+]
+TIERS_BY_NAME: Dict[str, Tier] = {t.name: t for t in TIERS}
+
+# Schema comum a todas as camadas (colunas dos continuous aggregates)
+TIER_COLUMNS = [
+    "bucket", "device_id", "sample_count",
+    "avg_speed_kmh", "max_speed_kmh",
+    "avg_lat", "avg_lon", "avg_accuracy",
+    "avg_accel", "max_accel",
+    "first_sample", "last_sample",
+]
+
+# Mesmas agregações das views (timescale/init/01_schema.sql), para a cauda
+_AGGREGATES = """
+    COUNT(*) AS sample_count,
+    AVG(speed_kmh) AS avg_speed_kmh,
+    MAX(speed_kmh) AS max_speed_kmh,
+    AVG(latitude) AS avg_lat,
+    AVG(longitude) AS avg_lon,
+    AVG(gps_accuracy) AS avg_accuracy,
+    AVG(accel_magnitude) AS avg_accel,
+    MAX(accel_magnitude) AS max_accel,
+    MIN(time) AS first_sample,
+    MAX(time) AS last_sample
+"""
+
+# Camada bruta projetada no mesmo schema (um "bucket" por amostra)
+_RAW_AS_TIER = """
+    SELECT
+        time AS bucket, device_id, 1 AS sample_count,
+        speed_kmh AS avg_speed_kmh, speed_kmh AS max_speed_kmh,
+        latitude AS avg_lat, longitude AS avg_lon, gps_accuracy AS avg_accuracy,
+        accel_magnitude AS avg_accel, accel_magnitude AS max_accel,
+        time AS first_sample, time AS last_sample
+    FROM telemetry
+    WHERE device_id = %(device_id)s AND time >= %(start)s AND time <= %(end)s
+    ORDER BY time ASC
+    LIMIT %(limit)s
+"""
+
+
+def choose_tier(start: datetime, end: datetime, max_points: int) -> Tier:
+    """
+    Camada mais fina cujo número de buckets na janela cabe em max_points.
+
+    Ex.: 1 h com orçamento 3600 -> raw; 6 h -> 10s; 2 dias -> 1min;
+    acima de max_points minutos -> 1hour (a mais grossa disponível).
+    """
+    span = max((end - start).total_seconds(), 0.0)
+    for tier in TIERS:
+        if span / tier.seconds <= max_points:
+            return tier
+    return TIERS[-1]
+
+
+def build_tier_query(tier: Tier, device_id: str, start: datetime, end: datetime,
+                     limit: int) -> Tuple[str, Dict[str, Any]]:
+    """
+    SQL da camada no schema comum (TIER_COLUMNS), em ordem de bucket.
+
+    Para os continuous aggregates (materialized_only), usa o que já foi
+    materializado e agrega a cauda a partir de telemetry: do bucket seguinte
+    ao último materializado (ou do início da janela) até end, com as mesmas
+    expressões das views. A resposta fica contínua mesmo com a política de
+    refresh atrasada.
+    """
+    params: Dict[str, Any] = {
+        "device_id": device_id, "start": start, "end": end, "limit": limit,
+        "step": f"{tier.seconds} seconds",
+    }
+    if tier.relation is None:
+        return _RAW_AS_TIER, params
+
+    columns = ", ".join(TIER_COLUMNS)
+    query = f"""
+        WITH materialized AS (
+            SELECT {columns}
+            FROM {tier.relation}
+            WHERE device_id = %(device_id)s
+              AND bucket >= time_bucket(%(step)s::interval, %(start)s::timestamptz)
+              AND bucket <= %(end)s
+        ),
+        watermark AS (
+            SELECT COALESCE(
+                MAX(bucket) + %(step)s::interval,
+                time_bucket(%(step)s::interval, %(start)s::timestamptz)
+            ) AS tail_start
+            FROM materialized
+        )
+        SELECT * FROM materialized
+        UNION ALL
+        SELECT time_bucket(%(step)s::interval, time) AS bucket, device_id, {_AGGREGATES}
+        FROM telemetry
+        WHERE device_id = %(device_id)s
+          AND time >= (SELECT tail_start FROM watermark)
+          AND time <= %(end)s
+        GROUP BY 1, 2
+        ORDER BY bucket ASC
+        LIMIT %(limit)s
+    """
+    return query, params
+
+
+def refresh_windows(start: datetime, end: datetime) -> List[Tuple[str, datetime, datetime]]:
+    """
+    (aggregate, início, fim) para refresh_continuous_aggregate cobrir
+    [start, end] em cada camada agregada.
+
+    O refresh só materializa buckets inteiros dentro da janela: os limites
+    são alinhados para fora, ao bucket de cada camada.
+    """
+    windows = []
+    for tier in TIERS:
+        if tier.relation is None:
+            continue
+        lo = math.floor(start.timestamp() / tier.seconds) * tier.seconds
+        hi = (math.floor(end.timestamp() / tier.seconds) + 1) * tier.seconds
+        windows.append((
+            tier.relation,
+            datetime.fromtimestamp(lo, tz=timezone.utc),
+            datetime.fromtimestamp(hi, tz=timezone.utc),
+        ))
+    return windows
+
+
+def tier_point(row: tuple) -> Dict[str, Any]:
+    """Linha de TIER_COLUMNS como dict JSON (datas em ISO, números em float)."""
+    point: Dict[str, Any] = {}
+    for col, val in zip(TIER_COLUMNS, row):
+        if isinstance(val, datetime):
+            point[col] = val.isoformat()
+        elif val is None or isinstance(val, str):
+            point[col] = val
+        elif col == "sample_count":
+            point[col] = int(val)
+        else:
+            point[col] = float(val)
+    return point
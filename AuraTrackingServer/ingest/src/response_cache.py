@@ -0,0 +1,318 @@
+import hashlib
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+
+import structlog
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+from .compression import GZIP, compress, run_sized
+
+logger = structlog.get_logger("response_cache")
+
+# Chave de entradas sem device_id (consulta de todos os dispositivos)
+ALL_DEVICES = "*"
+
+
+class CachedResponse(NamedTuple):
+    """Resposta serializada de uma janela fechada."""
+    body: bytes
+    media_type: str
+    headers: Dict[str, str]
+    etag: str
+    device_id: str
+    start: datetime
+    end: datetime
+    # "gzip" quando o corpo está guardado comprimido; "" = identity
+    encoding: str = ""
+
+
+def cache_key(path: str, start: datetime, end: datetime, **params: Any) -> Tuple:
+    """Chave normalizada: caminho, janela em UTC e demais parâmetros ordenados."""
+    normalized = tuple(sorted((k, str(v)) for k, v in params.items() if v is not None))
+    return (path, start.astimezone(timezone.utc).isoformat(),
+            end.astimezone(timezone.utc).isoformat(), normalized)
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [t.strip() for t in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+class ResponseCache:
+    """
+    Cache de respostas de consultas históricas em janelas fechadas.
+
+    Funcionalidades:
+    - Só guarda janelas com end < agora - late_arrival_seconds (o resultado
+      não muda, salvo dado atrasado)
+    - LRU limitado em bytes na memória; opcionalmente despeja no disco
+      (spill_dir, também LRU limitado) em vez de descartar
+    - ETag por conteúdo; If-None-Match devolve 304 sem corpo
+    - Corpos a partir de compress_min_bytes guardados em gzip: cabem ~10x
+      mais entradas no mesmo limite e saem pré-codificados (o middleware
+      de src/compression.py não recomprime; decodifica só para cliente
+      sem gzip)
+    - invalidate(): dado atrasado (backfill, fila offline, queued recente)
+      remove as entradas que cobrem o device/instante e segura a janela
+      por hold_seconds, para não recachear antes da escrita no banco
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        late_arrival_seconds: float = 900,
+        hold_seconds: float = 120,
+        spill_dir: str = "",
+        spill_max_bytes: int = 512 * 1024 * 1024,
+        compress_min_bytes: int = 1024,
+    ):
+        self.max_bytes = max_bytes
+        self.late_arrival = timedelta(seconds=late_arrival_seconds)
+        self.hold_seconds = hold_seconds
+        self.spill_dir = spill_dir
+        self.spill_max_bytes = spill_max_bytes
+        self.compress_min_bytes = compress_min_bytes
+
+        self._memory: "OrderedDict[Tuple, CachedResponse]" = OrderedDict()
+        self._memory_bytes = 0
+        # Spill: chave -> (arquivo, metadados sem corpo, tamanho)
+        self._disk: "OrderedDict[Tuple, Tuple[str, CachedResponse, int]]" = OrderedDict()
+        self._disk_bytes = 0
+        # device_id -> chaves (memória ou disco) que cobrem o device
+        self._by_device: Dict[str, Set[Tuple]] = {}
+        # device_id -> (início, fim, válido até) de janelas em espera
+        self._holds: Dict[str, Tuple[datetime, datetime, float]] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "response_cache_hits": 0,
+            "response_cache_misses": 0,
+            "response_cache_not_modified": 0,
+            "response_cache_stores": 0,
+            "response_cache_invalidations": 0,
+            "response_cache_spills": 0,
+        }
+
+        if spill_dir:
+            # Entradas de uma execução anterior podem ter perdido invalidações
+            shutil.rmtree(spill_dir, ignore_errors=True)
+            os.makedirs(spill_dir, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------------
+
+    def get(self, key: Tuple) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self._stats["response_cache_hits"] += 1
+                return entry
+            spilled = self._disk.pop(key, None)
+            if spilled is None:
+                self._stats["response_cache_misses"] += 1
+                return None
+            path, meta, size = spilled
+            self._disk_bytes -= size
+        try:
+            with open(path, "rb") as f:
+                body = f.read()
+            os.remove(path)
+        except OSError:
+            with self._lock:
+                self._unindex(key, meta.device_id)
+                self._stats["response_cache_misses"] += 1
+            return None
+        entry = meta._replace(body=body)
+        with self._lock:
+            # Invalidada enquanto o arquivo era lido
+            if self._held(meta.device_id, meta.start, meta.end):
+                self._unindex(key, meta.device_id)
+                self._stats["response_cache_misses"] += 1
+                return None
+            self._stats["response_cache_hits"] += 1
+            self._put_memory(key, entry)
+        return entry
+
+    def respond(self, entry: CachedResponse, if_none_match: Optional[str]) -> Response:
+        headers = {**entry.headers, "ETag": entry.etag, "Cache-Control": "private, no-cache"}
+        if _etag_matches(if_none_match, entry.etag):
+            self._stats["response_cache_not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+        if entry.encoding:
+            headers["Content-Encoding"] = entry.encoding
+        return Response(entry.body, media_type=entry.media_type, headers=headers)
+
+    # ------------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------------
+
+    def cacheable(self, device_id: Optional[str], start: datetime, end: datetime) -> bool:
+        if end >= datetime.now(timezone.utc) - self.late_arrival:
+            return False
+        with self._lock:
+            return not self._held(device_id or ALL_DEVICES, start, end)
+
+    async def store(self, key: Tuple, device_id: Optional[str], start: datetime, end: datetime,
+                    result: Any, if_none_match: Optional[str] = None) -> Any:
+        """
+        Guarda o resultado do handler se a janela for cacheável e devolve a
+        resposta (com ETag) a enviar. Erros e streams passam direto. ETag e
+        gzip de corpos grandes são calculados fora do event loop.
+        """
+        if isinstance(result, StreamingResponse) or not self.cacheable(device_id, start, end):
+            return result
+        if isinstance(result, dict):
+            if "error" in result:
+                return result
+            result = JSONResponse(result)
+        if not isinstance(result, Response) or result.status_code != 200:
+            return result
+
+        body = bytes(result.body)
+        headers = {
+            k: v for k, v in result.headers.items()
+            if k.lower() not in ("content-length", "content-type")
+        }
+        body, etag, encoding = await run_sized(len(body), self._encode, body)
+        entry = CachedResponse(
+            body=body,
+            media_type=result.media_type or result.headers.get("content-type", "application/octet-stream"),
+            headers=headers,
+            etag=etag,
+            device_id=device_id or ALL_DEVICES,
+            start=start,
+            end=end,
+            encoding=encoding,
+        )
+        with self._lock:
+            # Dado atrasado pode ter chegado durante a consulta
+            if self._held(entry.device_id, start, end):
+                return result
+            self._put_memory(key, entry)
+            self._stats["response_cache_stores"] += 1
+        return self.respond(entry, if_none_match)
+
+    def _encode(self, body: bytes) -> Tuple[bytes, str, str]:
+        """(corpo guardado, ETag, codificação) de um corpo identity."""
+        # ETag do conteúdo (identity): o mesmo em qualquer codificação
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        if self.compress_min_bytes and len(body) >= self.compress_min_bytes:
+            compressed = compress(body, GZIP)
+            if len(compressed) < len(body):
+                return compressed, etag, GZIP
+        return body, etag, ""
+
+    def _put_memory(self, key: Tuple, entry: CachedResponse):
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old.body)
+        self._memory[key] = entry
+        self._memory_bytes += len(entry.body)
+        self._by_device.setdefault(entry.device_id, set()).add(key)
+        while self._memory_bytes > self.max_bytes and len(self._memory) > 1:
+            old_key, old_entry = self._memory.popitem(last=False)
+            self._memory_bytes -= len(old_entry.body)
+            if not self._spill(old_key, old_entry):
+                self._unindex(old_key, old_entry.device_id)
+
+    def _spill(self, key: Tuple, entry: CachedResponse) -> bool:
+        if not self.spill_dir or len(entry.body) > self.spill_max_bytes:
+            return False
+        name = hashlib.blake2b(repr(key).encode("utf-8"), digest_size=16).hexdigest()
+        path = os.path.join(self.spill_dir, name + ".bin")
+        try:
+            with open(path, "wb") as f:
+                f.write(entry.body)
+        except OSError as e:
+            logger.warning("response_cache_spill_failed", error=str(e))
+            return False
+        self._disk[key] = (path, entry._replace(body=b""), len(entry.body))
+        self._disk_bytes += len(entry.body)
+        self._stats["response_cache_spills"] += 1
+        while self._disk_bytes > self.spill_max_bytes:
+            old_key, (old_path, old_meta, old_size) = self._disk.popitem(last=False)
+            self._disk_bytes -= old_size
+            self._unindex(old_key, old_meta.device_id)
+            self._remove_file(old_path)
+        return True
+
+    # ------------------------------------------------------------------
+    # Invalidação
+    # ------------------------------------------------------------------
+
+    def invalidate_late(self, device_id: str, at: datetime, until: Optional[datetime] = None):
+        """Registro(s) recebido(s)/escrito(s) em [at, until]: invalida se começar além do horizonte."""
+        if at < datetime.now(timezone.utc) - self.late_arrival:
+            self.invalidate(device_id, at, until or at)
+
+    def invalidate(self, device_id: str, start: datetime, end: datetime):
+        """Remove entradas do device (e de todos os devices) que cobrem [start, end]."""
+        until = time.monotonic() + self.hold_seconds
+        removed_files: List[str] = []
+        with self._lock:
+            hold = self._holds.get(device_id)
+            if hold is not None and hold[2] > time.monotonic():
+                start, end = min(start, hold[0]), max(end, hold[1])
+            self._holds[device_id] = (start, end, until)
+
+            for owner in (device_id, ALL_DEVICES):
+                for key in list(self._by_device.get(owner, ())):
+                    entry = self._memory.get(key)
+                    meta = entry if entry is not None else self._disk.get(key, (None, None))[1]
+                    if meta is None or meta.end < start or meta.start > end:
+                        continue
+                    if entry is not None:
+                        del self._memory[key]
+                        self._memory_bytes -= len(entry.body)
+                    else:
+                        path, _, size = self._disk.pop(key)
+                        self._disk_bytes -= size
+                        removed_files.append(path)
+                    self._unindex(key, owner)
+                    self._stats["response_cache_invalidations"] += 1
+        for path in removed_files:
+            self._remove_file(path)
+
+    def _held(self, device_id: str, start: datetime, end: datetime) -> bool:
+        now = time.monotonic()
+        owners = self._holds if device_id == ALL_DEVICES else (device_id,)
+        for owner in list(owners):
+            hold = self._holds.get(owner)
+            if hold is None:
+                continue
+            if hold[2] <= now:
+                del self._holds[owner]
+            elif not (hold[1] < start or hold[0] > end):
+                return True
+        return False
+
+    def _unindex(self, key: Tuple, device_id: str):
+        keys = self._by_device.get(device_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_device[device_id]
+
+    @staticmethod
+    def _remove_file(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "response_cache_entries": len(self._memory),
+            "response_cache_bytes": self._memory_bytes,
+            "response_cache_spilled_entries": len(self._disk),
+            "response_cache_spilled_bytes": self._disk_bytes,
+        }
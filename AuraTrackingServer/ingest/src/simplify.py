@@ -0,0 +1,163 @@
+import heapq
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Índices das colunas em HISTORY_COLUMNS (src/history.py)
+COL_TIME, COL_DEVICE, COL_LAT, COL_LON, COL_SPEED = 0, 1, 3, 4, 5
+
+# Metros por grau (projeção equiretangular local; erro desprezível na escala de uma trajetória)
+M_PER_DEG_LAT = 110_540.0
+M_PER_DEG_LON = 111_320.0
+# Web Mercator: metros por pixel no equador no zoom 0 (tiles de 256 px)
+MERCATOR_M_PER_PX_Z0 = 156_543.03392
+
+
+def zoom_tolerance_m(zoom: float, latitude: float, pixels: float = 1.0) -> float:
+    """Tolerância em metros equivalente a `pixels` de tela no zoom dado."""
+    return MERCATOR_M_PER_PX_Z0 * math.cos(math.radians(latitude)) / (2 ** zoom) * pixels
+
+
+def _segment_max(xs: List[float], ys: List[float], i: int, j: int) -> Tuple[float, int]:
+    """Maior distância perpendicular (m) dos pontos entre i e j ao segmento i-j."""
+    x0, y0, x1, y1 = xs[i], ys[i], xs[j], ys[j]
+    dx, dy = x1 - x0, y1 - y0
+    norm2 = dx * dx + dy * dy
+    best, best_k = -1.0, -1
+    for k in range(i + 1, j):
+        px, py = xs[k] - x0, ys[k] - y0
+        if norm2 == 0.0:
+            d2 = px * px + py * py
+        else:
+            t = (px * dx + py * dy) / norm2
+            t = 0.0 if t < 0.0 else 1.0 if t > 1.0 else t
+            ex, ey = px - t * dx, py - t * dy
+            d2 = ex * ex + ey * ey
+        if d2 > best:
+            best, best_k = d2, k
+    return math.sqrt(best) if best >= 0 else 0.0, best_k
+
+
+def simplify_track(
+    rows: Sequence[tuple],
+    max_points: Optional[int] = None,
+    tolerance_m: Optional[float] = None,
+    stop_speed_kmh: float = 1.0,
+) -> List[tuple]:
+    """
+    Simplifica a trajetória de um dispositivo (linhas em ordem temporal).
+
+    Douglas–Peucker em coordenadas projetadas (metros), refinado pelo maior
+    desvio primeiro (heap): para quando atinge max_points ou quando nenhum
+    segmento desvia mais que tolerance_m — o que vier antes. Curvas são
+    mantidas porque são exatamente os pontos de maior desvio.
+
+    Paradas (speed <= stop_speed_kmh) viram dois pontos fixos, início e fim,
+    preservando a duração e o local; a oscilação do GPS parado é descartada.
+    max_points é um teto: com mais âncoras do que ele, ficam âncoras
+    espaçadas (sempre a última amostra; com 1 ponto, só ela).
+    """
+    n = len(rows)
+    if max_points is not None and max_points < 2:
+        return list(rows[-1:]) if max_points == 1 else []
+    if n <= 2 or (max_points is None and tolerance_m is None):
+        return list(rows)
+
+    lat0 = math.radians(rows[0][COL_LAT])
+    kx = M_PER_DEG_LON * math.cos(lat0)
+    xs = [r[COL_LON] * kx for r in rows]
+    ys = [r[COL_LAT] * M_PER_DEG_LAT for r in rows]
+
+    # Âncoras: extremos da trajetória e bordas de cada parada
+    anchors = [0]
+    stopped = [r[COL_SPEED] is not None and r[COL_SPEED] <= stop_speed_kmh for r in rows]
+    for k in range(1, n - 1):
+        if stopped[k] and (not stopped[k - 1] or not stopped[k + 1]):
+            anchors.append(k)
+    anchors.append(n - 1)
+    if max_points is not None and len(anchors) > max_points:
+        anchors = _spread(anchors, max_points)
+
+    keep = set(anchors)
+    heap: List[Tuple[float, int, int, int]] = []
+    for i, j in zip(anchors, anchors[1:]):
+        # Dentro de uma parada não há o que refinar
+        if j - i > 1 and not (stopped[i] and stopped[j] and all(stopped[i:j + 1])):
+            dist, k = _segment_max(xs, ys, i, j)
+            heapq.heappush(heap, (-dist, i, j, k))
+
+    budget = max_points or n
+    tolerance = tolerance_m or 0.0
+    while heap and len(keep) < budget:
+        neg_dist, i, j, k = heapq.heappop(heap)
+        if -neg_dist <= tolerance:
+            break
+        keep.add(k)
+        for a, b in ((i, k), (k, j)):
+            if b - a > 1:
+                dist, m = _segment_max(xs, ys, a, b)
+                heapq.heappush(heap, (-dist, a, b, m))
+
+    return [rows[k] for k in sorted(keep)]
+
+
+def _spread(items: List[int], k: int) -> List[int]:
+    """k elementos (k >= 2) igualmente espaçados de items, incluindo o primeiro e o último."""
+    last = len(items) - 1
+    return [items[round(i * last / (k - 1))] for i in range(k)]
+
+
+def split_budget(sizes: Sequence[int], budget: int) -> List[int]:
+    """
+    Reparte budget pontos entre trajetórias de tamanhos sizes, somando no
+    máximo budget: piso de 2 por trajetória (1 se não couber; com menos
+    pontos que trajetórias, 1 para as maiores) e o restante na proporção do
+    tamanho, pelo método dos maiores restos.
+    """
+    n = len(sizes)
+    floor = 2 if budget >= 2 * n else 1 if budget >= n else 0
+    shares = [floor] * n
+    if not floor:
+        for i in sorted(range(n), key=lambda i: -sizes[i])[:budget]:
+            shares[i] = 1
+        return shares
+    rest = budget - floor * n
+    total = sum(sizes)
+    quotas = [rest * s / total for s in sizes]
+    for i, q in enumerate(quotas):
+        shares[i] += int(q)
+    left = rest - sum(int(q) for q in quotas)
+    for i in sorted(range(n), key=lambda i: int(quotas[i]) - quotas[i])[:left]:
+        shares[i] += 1
+    return shares
+
+
+def simplify_rows(
+    rows: Sequence[tuple],
+    max_points: Optional[int] = None,
+    zoom: Optional[float] = None,
+    stop_speed_kmh: float = 1.0,
+) -> List[tuple]:
+    """
+    Simplifica cada dispositivo separadamente e devolve em ordem temporal.
+
+    O orçamento total (max_points) é repartido entre os dispositivos na
+    proporção dos pontos de cada um (split_budget) e nunca é excedido.
+    """
+    tracks: Dict[str, List[tuple]] = {}
+    for row in rows:
+        if row[COL_LAT] is None or row[COL_LON] is None:
+            continue
+        tracks.setdefault(row[COL_DEVICE], []).append(row)
+    total = sum(len(t) for t in tracks.values())
+    if not total:
+        return []
+
+    shares = split_budget([len(t) for t in tracks.values()], max_points) if max_points else None
+    out: List[tuple] = []
+    for i, track in enumerate(tracks.values()):
+        share = shares[i] if shares is not None else None
+        tolerance = zoom_tolerance_m(zoom, track[0][COL_LAT]) if zoom is not None else None
+        out.extend(simplify_track(track, share, tolerance, stop_speed_kmh))
+    if len(tracks) > 1:
+        out.sort(key=lambda r: r[COL_TIME])
+    return out
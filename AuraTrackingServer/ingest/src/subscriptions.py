@@ -0,0 +1,227 @@
+import json
+import math
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import structlog
+
+logger = structlog.get_logger("subscriptions")
+
+# (min_lon, min_lat, max_lon, max_lat)
+BBox = Tuple[float, float, float, float]
+
+
+def point_in_polygon(lat: float, lon: float, ring: List[List[float]]) -> bool:
+    """Ray casting sobre um anel GeoJSON ([lon, lat], ...)."""
+    inside = False
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        xi, yi = ring[i][0], ring[i][1]
+        xj, yj = ring[j][0], ring[j][1]
+        if (yi > lat) != (yj > lat) and lon < (xj - xi) * (lat - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+def load_areas(path: str) -> Dict[str, List[List[float]]]:
+    """
+    Carrega os polígonos nomeados de areas_carregamento.json (GeoJSON).
+
+    Returns:
+        nome da área -> anel externo do polígono ([lon, lat], ...)
+    """
+    file = Path(path)
+    if not file.exists():
+        logger.warning("areas_file_not_found", path=path)
+        return {}
+
+    with file.open("r", encoding="utf-8") as f:
+        geojson = json.load(f)
+
+    areas = {}
+    for feature in geojson.get("features", []):
+        name = feature.get("properties", {}).get("name")
+        geometry = feature.get("geometry") or {}
+        if name and geometry.get("type") == "Polygon" and geometry.get("coordinates"):
+            areas[name] = geometry["coordinates"][0]
+
+    logger.info("areas_loaded", path=path, count=len(areas))
+    return areas
+
+
+@dataclass(frozen=True)
+class SubscriptionFilter:
+    """
+    Filtro de um subscriber do stream ao vivo.
+
+    Critérios combinados com AND; filtro vazio recebe toda a frota.
+    """
+    devices: Optional[frozenset] = None
+    operator: Optional[str] = None
+    bbox: Optional[BBox] = None
+    area: Optional[str] = None
+    polygon: Optional[tuple] = field(default=None, compare=False, repr=False)
+
+    @classmethod
+    def from_params(
+        cls,
+        devices: Optional[str] = None,
+        operator: Optional[str] = None,
+        bbox: Optional[str] = None,
+        area: Optional[str] = None,
+        areas: Optional[Dict[str, List[List[float]]]] = None,
+    ) -> "SubscriptionFilter":
+        """Monta o filtro a partir dos query params do endpoint.
+
+        Raises:
+            ValueError: bbox malformado ou área desconhecida
+        """
+        device_set = None
+        if devices:
+            device_set = frozenset(d.strip() for d in devices.split(",") if d.strip()) or None
+
+        box = None
+        if bbox:
+            parts = [float(v) for v in bbox.split(",")]
+            if len(parts) != 4 or parts[0] > parts[2] or parts[1] > parts[3]:
+                raise ValueError("bbox deve ser min_lon,min_lat,max_lon,max_lat")
+            box = tuple(parts)
+
+        polygon = None
+        if area:
+            ring = (areas or {}).get(area)
+            if ring is None:
+                raise ValueError(f"área desconhecida: {area}")
+            polygon = tuple(tuple(p) for p in ring)
+
+        return cls(devices=device_set, operator=operator or None, bbox=box, area=area, polygon=polygon)
+
+    def is_empty(self) -> bool:
+        return not (self.devices or self.operator or self.bbox or self.polygon)
+
+    def is_dynamic(self) -> bool:
+        """Um device pode deixar de passar no filtro (muda de posição ou operador)."""
+        return bool(self.operator or self.bbox or self.polygon)
+
+    def spatial_bbox(self) -> Optional[BBox]:
+        """Envelope espacial do filtro (interseção de bbox e polígono)."""
+        boxes = []
+        if self.bbox:
+            boxes.append(self.bbox)
+        if self.polygon:
+            lons = [p[0] for p in self.polygon]
+            lats = [p[1] for p in self.polygon]
+            boxes.append((min(lons), min(lats), max(lons), max(lats)))
+        if not boxes:
+            return None
+        return (
+            max(b[0] for b in boxes), max(b[1] for b in boxes),
+            min(b[2] for b in boxes), min(b[3] for b in boxes),
+        )
+
+    def matches(self, device_id: str, operator_id: Optional[str],
+                lat: Optional[float], lon: Optional[float]) -> bool:
+        if self.devices and device_id not in self.devices:
+            return False
+        if self.operator and operator_id != self.operator:
+            return False
+        if self.bbox or self.polygon:
+            if lat is None or lon is None:
+                return False
+            if self.bbox:
+                min_lon, min_lat, max_lon, max_lat = self.bbox
+                if not (min_lon <= lon <= max_lon and min_lat <= lat <= max_lat):
+                    return False
+            if self.polygon and not point_in_polygon(lat, lon, self.polygon):
+                return False
+        return True
+
+
+class SubscriptionIndex:
+    """
+    Índice de subscribers por device, operador e grade espacial.
+
+    Cada subscriber é indexado por um único critério (o mais seletivo:
+    devices > operador > área/bbox) e os demais critérios são verificados
+    apenas nos candidatos. Uma atualização consulta uma chave de device,
+    uma de operador e uma célula da grade, sem varrer todos os subscribers.
+    """
+
+    def __init__(self, cell_degrees: float = 0.01, max_cells: int = 10000):
+        self.cell_degrees = cell_degrees
+        self.max_cells = max_cells
+        self._unfiltered: Set[Any] = set()
+        self._by_device: Dict[str, Set[Any]] = {}
+        self._by_operator: Dict[str, Set[Any]] = {}
+        self._grid: Dict[Tuple[int, int], Set[Any]] = {}
+        self._filters: Dict[Any, SubscriptionFilter] = {}
+        # subscriber -> [(índice, chave)] para remoção O(chaves)
+        self._entries: Dict[Any, List[Tuple[dict, Any]]] = {}
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return (math.floor(lon / self.cell_degrees), math.floor(lat / self.cell_degrees))
+
+    def _register(self, subscriber: Any, index: dict, key: Any):
+        index.setdefault(key, set()).add(subscriber)
+        self._entries[subscriber].append((index, key))
+
+    def add(self, subscriber: Any, flt: SubscriptionFilter):
+        self._filters[subscriber] = flt
+        self._entries[subscriber] = []
+
+        if flt.devices:
+            for device_id in flt.devices:
+                self._register(subscriber, self._by_device, device_id)
+            return
+        if flt.operator:
+            self._register(subscriber, self._by_operator, flt.operator)
+            return
+
+        box = flt.spatial_bbox()
+        if box:
+            min_x, min_y = self._cell(box[1], box[0])
+            max_x, max_y = self._cell(box[3], box[2])
+            n_cells = (max_x - min_x + 1) * (max_y - min_y + 1)
+            if n_cells <= 0:
+                return  # bbox e polígono sem interseção: nunca recebe nada
+            if n_cells <= self.max_cells:
+                for x in range(min_x, max_x + 1):
+                    for y in range(min_y, max_y + 1):
+                        self._register(subscriber, self._grid, (x, y))
+                return
+            # Área grande demais para a grade: verificado a cada atualização
+
+        self._unfiltered.add(subscriber)
+
+    def remove(self, subscriber: Any):
+        for index, key in self._entries.pop(subscriber, []):
+            bucket = index.get(key)
+            if bucket is not None:
+                bucket.discard(subscriber)
+                if not bucket:
+                    del index[key]
+        self._unfiltered.discard(subscriber)
+        self._filters.pop(subscriber, None)
+
+    def filter_of(self, subscriber: Any) -> Optional[SubscriptionFilter]:
+        return self._filters.get(subscriber)
+
+    def match(self, device_id: str, operator_id: Optional[str],
+              lat: Optional[float], lon: Optional[float]) -> Iterable[Any]:
+        """Subscribers interessados na atualização."""
+        candidates: List[Any] = list(self._unfiltered)
+        candidates.extend(self._by_device.get(device_id, ()))
+        if operator_id:
+            candidates.extend(self._by_operator.get(operator_id, ()))
+        if lat is not None and lon is not None:
+            candidates.extend(self._grid.get(self._cell(lat, lon), ()))
+
+        for subscriber in candidates:
+            flt = self._filters[subscriber]
+            if flt.is_empty() or flt.matches(device_id, operator_id, lat, lon):
+                yield subscriber
+
+    def __len__(self) -> int:
+        return len(self._filters)
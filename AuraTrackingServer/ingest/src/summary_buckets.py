@@ -0,0 +1,227 @@
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+# Dispositivos "ativos" em /api/summary: com amostra nos últimos N minutos
+ACTIVE_MINUTES = 5
+
+SUMMARY_COLUMNS = (
+    "bucket", "sample_count", "speed_sum", "speed_count",
+    "speed_max", "accel_max", "devices", "events",
+)
+
+# Aplica deltas (não sobrescreve): o banco continua certo mesmo se o worker
+# reiniciar sem conseguir carregar os buckets anteriores
+SUMMARY_UPSERT = """
+    INSERT INTO summary_1min (bucket, sample_count, speed_sum, speed_count,
+                              speed_max, accel_max, devices, events)
+    VALUES %s
+    ON CONFLICT (bucket) DO UPDATE SET
+        sample_count = summary_1min.sample_count + EXCLUDED.sample_count,
+        speed_sum = summary_1min.speed_sum + EXCLUDED.speed_sum,
+        speed_count = summary_1min.speed_count + EXCLUDED.speed_count,
+        speed_max = GREATEST(summary_1min.speed_max, EXCLUDED.speed_max),
+        accel_max = GREATEST(summary_1min.accel_max, EXCLUDED.accel_max),
+        devices = ARRAY(SELECT DISTINCT unnest(summary_1min.devices || EXCLUDED.devices)),
+        events = (
+            SELECT COALESCE(jsonb_object_agg(key, total), '{}'::jsonb)
+            FROM (
+                SELECT key, SUM(value::bigint) AS total
+                FROM (
+                    SELECT * FROM jsonb_each_text(summary_1min.events)
+                    UNION ALL
+                    SELECT * FROM jsonb_each_text(EXCLUDED.events)
+                ) e
+                GROUP BY key
+            ) s
+        )
+"""
+
+SUMMARY_SELECT = """
+    SELECT bucket, sample_count, speed_sum, speed_count,
+           speed_max, accel_max, devices, events
+    FROM summary_1min
+    WHERE bucket >= time_bucket('1 minute', NOW() - make_interval(hours => %s))
+"""
+
+
+def _minute(ts: datetime) -> datetime:
+    return ts.astimezone(timezone.utc).replace(second=0, microsecond=0)
+
+
+def _max(a: Optional[float], b: Optional[float]) -> Optional[float]:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return a if a >= b else b
+
+
+class MinuteBucket:
+    """Agregados de um minuto: contagem, soma/máximo de velocidade, aceleração máxima, eventos."""
+
+    __slots__ = ("sample_count", "speed_sum", "speed_count", "speed_max", "accel_max", "devices", "events")
+
+    def __init__(self):
+        self.sample_count = 0
+        self.speed_sum = 0.0
+        self.speed_count = 0
+        self.speed_max: Optional[float] = None
+        self.accel_max: Optional[float] = None
+        self.devices: Set[str] = set()
+        self.events: Dict[str, int] = {}
+
+    def add_sample(self, device_id: str, speed_kmh: Optional[float], accel: Optional[float]):
+        self.sample_count += 1
+        self.devices.add(device_id)
+        if speed_kmh is not None:
+            self.speed_sum += speed_kmh
+            self.speed_count += 1
+            self.speed_max = _max(self.speed_max, speed_kmh)
+        if accel is not None:
+            self.accel_max = _max(self.accel_max, accel)
+
+    def add_event(self, event_type: str, n: int = 1):
+        self.events[event_type] = self.events.get(event_type, 0) + n
+
+    def merge(self, other: "MinuteBucket"):
+        self.sample_count += other.sample_count
+        self.speed_sum += other.speed_sum
+        self.speed_count += other.speed_count
+        self.speed_max = _max(self.speed_max, other.speed_max)
+        self.accel_max = _max(self.accel_max, other.accel_max)
+        self.devices |= other.devices
+        for event_type, n in other.events.items():
+            self.add_event(event_type, n)
+
+    @classmethod
+    def from_row(cls, row: tuple) -> "MinuteBucket":
+        """Linha de SUMMARY_COLUMNS (sem o bucket) lida do banco."""
+        b = cls()
+        b.sample_count = int(row[0] or 0)
+        b.speed_sum = float(row[1] or 0)
+        b.speed_count = int(row[2] or 0)
+        b.speed_max = float(row[3]) if row[3] is not None else None
+        b.accel_max = float(row[4]) if row[4] is not None else None
+        b.devices = set(row[5] or ())
+        events = row[6] or {}
+        b.events = {k: int(v) for k, v in (json.loads(events) if isinstance(events, str) else events).items()}
+        return b
+
+    def to_row(self, bucket: datetime) -> tuple:
+        return (
+            bucket, self.sample_count, self.speed_sum, self.speed_count,
+            self.speed_max, self.accel_max, sorted(self.devices), json.dumps(self.events),
+        )
+
+
+def summarize(buckets: Iterable[tuple], now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Resumo de /api/summary a partir de pares (início do minuto, MinuteBucket).
+
+    O(buckets): nenhum acesso à tabela telemetry.
+    """
+    active_since = _minute((now or datetime.now(timezone.utc)) - timedelta(minutes=ACTIVE_MINUTES))
+    total = MinuteBucket()
+    active: Set[str] = set()
+    for start, bucket in buckets:
+        total.merge(bucket)
+        if start >= active_since:
+            active |= bucket.devices
+    return {
+        "active_devices": len(active),
+        "total_telemetries": total.sample_count,
+        "avg_speed_kmh": round(total.speed_sum / total.speed_count, 1) if total.speed_count else 0,
+        "max_speed_kmh": round(total.speed_max or 0, 1),
+        "max_acceleration": round(total.accel_max or 0, 2),
+        "events": total.events,
+    }
+
+
+class SummaryBuckets:
+    """
+    Buckets por minuto mantidos pelo IngestWorker para /api/summary.
+
+    Funcionalidades:
+    - Atualizados a cada pacote aceito (telemetria e eventos), inclusive
+      atrasados, no minuto da amostra
+    - Janela em memória de retention_hours; pedidos maiores vão à tabela
+    - Deltas pendentes persistidos periodicamente em summary_1min
+      (take_pending / restore_pending em caso de falha)
+    - Duplicatas reenviadas pelo device entram na contagem (o banco as
+      descarta no INSERT); a diferença é desprezível para o resumo
+    """
+
+    def __init__(self, retention_hours: int = 168):
+        self.retention = timedelta(hours=retention_hours)
+        self._buckets: Dict[datetime, MinuteBucket] = {}
+        self._pending: Dict[datetime, MinuteBucket] = {}
+        self._lock = threading.Lock()
+        self._stats = {"summary_buckets_persisted": 0, "summary_persist_failures": 0}
+
+    def _targets(self, ts: datetime) -> List[MinuteBucket]:
+        minute = _minute(ts)
+        targets = [self._pending.setdefault(minute, MinuteBucket())]
+        # Fora da janela em memória: só vai para o banco
+        if minute >= _minute(datetime.now(timezone.utc) - self.retention):
+            targets.append(self._buckets.setdefault(minute, MinuteBucket()))
+        return targets
+
+    def add_telemetry(self, record: Dict[str, Any]):
+        speed = record.get("speed")
+        speed_kmh = speed * 3.6 if speed is not None else None
+        with self._lock:
+            for bucket in self._targets(record["time"]):
+                bucket.add_sample(record["device_id"], speed_kmh, record.get("accel_magnitude"))
+
+    def add_event(self, event_type: str, at: datetime):
+        with self._lock:
+            for bucket in self._targets(at):
+                bucket.add_event(event_type)
+
+    def covers(self, hours: float) -> bool:
+        return timedelta(hours=hours) <= self.retention
+
+    def summarize(self, hours: float) -> Dict[str, Any]:
+        now = datetime.now(timezone.utc)
+        since = _minute(now - timedelta(hours=hours))
+        with self._lock:
+            self._prune(now)
+            window = [(start, b) for start, b in self._buckets.items() if start >= since]
+            return summarize(window, now)
+
+    def seed(self, rows: Iterable[tuple]):
+        """Carga inicial a partir de summary_1min (linhas em SUMMARY_COLUMNS)."""
+        with self._lock:
+            for row in rows:
+                self._buckets.setdefault(_minute(row[0]), MinuteBucket()).merge(MinuteBucket.from_row(row[1:]))
+
+    def take_pending(self) -> List[tuple]:
+        """Deltas desde a última persistência, como linhas para SUMMARY_UPSERT."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._prune(datetime.now(timezone.utc))
+        return [b.to_row(start) for start, b in sorted(pending.items())]
+
+    def restore_pending(self, rows: List[tuple]):
+        """Devolve deltas cuja escrita falhou (somados aos que chegaram no meio tempo)."""
+        with self._lock:
+            for row in rows:
+                self._pending.setdefault(row[0], MinuteBucket()).merge(MinuteBucket.from_row(row[1:]))
+            self._stats["summary_persist_failures"] += 1
+
+    def mark_persisted(self, n: int):
+        self._stats["summary_buckets_persisted"] += n
+
+    def _prune(self, now: datetime):
+        cutoff = _minute(now - self.retention)
+        for start in [s for s in self._buckets if s < cutoff]:
+            del self._buckets[start]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "summary_buckets": len(self._buckets),
+            "summary_pending_buckets": len(self._pending),
+        }
@@ -0,0 +1,242 @@
+import math
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .mvt import EXTENT, Layer, encode_tile
+from .resolution import TIERS, Tier
+from .simplify import COL_DEVICE, COL_LAT, COL_LON, COL_SPEED, COL_TIME, simplify_track, zoom_tolerance_m
+
+MAX_ZOOM = 22
+# Margem além do tile (unidades do extent), como nos geradores de MVT usuais
+BUFFER = 64
+# Um ponto por device por pixel de tela (tile de 256 px)
+POINT_GRID = EXTENT // 256
+# Deslocamento típico de um caminhão (m/s) e quantos pixels ele pode andar
+# dentro de um bucket da camada escolhida
+TYPICAL_SPEED_MS = 8.0
+PIXELS_PER_BUCKET = 4.0
+# Lacuna mínima (s) que quebra a linha de um device. Curta de propósito: as
+# linhas vêm filtradas pelo bbox, e um device que sai do tile e volta não
+# pode virar uma corda atravessando o tile
+MIN_GAP_SECONDS = 10
+
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """(oeste, sul, leste, norte) em graus do tile z/x/y (Web Mercator, esquema XYZ)."""
+    n = 2 ** z
+
+    def lat(row: float) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y)
+
+
+def tile_tier(z: int, latitude: float) -> Tier:
+    """
+    Camada de resolução (src/resolution.py) para o zoom: a mais grossa cujo
+    bucket, à velocidade típica, anda no máximo PIXELS_PER_BUCKET pixels.
+    Zooms de rua usam o dado bruto; a frota inteira em zoom baixo sai dos
+    continuous aggregates.
+    """
+    meters_per_px = zoom_tolerance_m(z, latitude)
+    chosen = TIERS[0]
+    for tier in TIERS:
+        if tier.seconds * TYPICAL_SPEED_MS <= PIXELS_PER_BUCKET * meters_per_px:
+            chosen = tier
+    return chosen
+
+
+def build_tile_query(tier: Tier, start: datetime, end: datetime,
+                     bounds: Tuple[float, float, float, float],
+                     device_ids: Optional[Sequence[str]], limit: int) -> Tuple[str, Dict[str, Any]]:
+    """
+    Linhas (time, device_id, samples, lat, lon, speed_kmh) no bbox do tile
+    (com margem), em ordem (device_id, time): mesmos índices de coluna de
+    HISTORY_COLUMNS usados por src/simplify.py.
+
+    Nos continuous aggregates (materialized_only) costura a cauda como
+    build_tier_query: buckets depois do último materializado na janela (de
+    qualquer device: o refresh materializa todos até o mesmo ponto) são
+    agregados de telemetry com as mesmas expressões, e o bbox é aplicado à
+    média do bucket nos dois lados. Sem isso um tile de zoom baixo (camada
+    1hour, refresh atrasado em até ~2 h) de uma janela já "fechada" para o
+    cache de respostas sairia, e ficaria em cache, sem as últimas horas.
+    """
+    west, south, east, north = bounds
+    # Margem de BUFFER unidades em graus (aproximação linear basta para o filtro)
+    pad_lon = (east - west) * BUFFER / EXTENT
+    pad_lat = (north - south) * BUFFER / EXTENT
+    params: Dict[str, Any] = {
+        "start": start, "end": end, "limit": limit,
+        "west": west - pad_lon, "east": east + pad_lon,
+        "south": south - pad_lat, "north": north + pad_lat,
+        "device_ids": list(device_ids) if device_ids else None,
+        "step": f"{tier.seconds} seconds",
+    }
+    device_filter = " AND device_id = ANY(%(device_ids)s)" if device_ids else ""
+    if tier.relation is None:
+        query = f"""
+            SELECT time, device_id, 1, latitude, longitude, speed_kmh
+            FROM telemetry
+            WHERE time >= %(start)s AND time <= %(end)s
+              AND latitude BETWEEN %(south)s AND %(north)s
+              AND longitude BETWEEN %(west)s AND %(east)s
+              {device_filter}
+        """
+    else:
+        query = f"""
+            WITH watermark AS (
+                SELECT COALESCE(
+                    MAX(bucket) + %(step)s::interval,
+                    time_bucket(%(step)s::interval, %(start)s::timestamptz)
+                ) AS tail_start
+                FROM {tier.relation}
+                WHERE bucket >= time_bucket(%(step)s::interval, %(start)s::timestamptz)
+                  AND bucket <= %(end)s
+            )
+            SELECT bucket, device_id, sample_count, avg_lat, avg_lon, avg_speed_kmh
+            FROM {tier.relation}
+            WHERE bucket >= %(start)s AND bucket <= %(end)s
+              AND avg_lat BETWEEN %(south)s AND %(north)s
+              AND avg_lon BETWEEN %(west)s AND %(east)s
+              {device_filter}
+            UNION ALL
+            SELECT time_bucket(%(step)s::interval, time), device_id, COUNT(*),
+                   AVG(latitude), AVG(longitude), AVG(speed_kmh)
+            FROM telemetry
+            WHERE time >= (SELECT tail_start FROM watermark) AND time <= %(end)s
+              {device_filter}
+            GROUP BY 1, 2
+            HAVING AVG(latitude) BETWEEN %(south)s AND %(north)s
+               AND AVG(longitude) BETWEEN %(west)s AND %(east)s
+        """
+    query += " ORDER BY device_id, 1 LIMIT %(limit)s"
+    return query, params
+
+
+class _Projector:
+    """Graus -> coordenadas do tile (float, 0..extent dentro do tile)."""
+
+    def __init__(self, z: int, x: int, y: int, extent: int = EXTENT):
+        self.n = 2 ** z
+        self.x, self.y, self.extent = x, y, extent
+
+    def __call__(self, lat: float, lon: float) -> Tuple[float, float]:
+        wx = (lon + 180.0) / 360.0 * self.n
+        s = math.sin(math.radians(max(min(lat, 85.0511), -85.0511)))
+        wy = (0.5 - math.log((1 + s) / (1 - s)) / (4 * math.pi)) * self.n
+        return (wx - self.x) * self.extent, (wy - self.y) * self.extent
+
+
+def _clip_segment(x0: float, y0: float, x1: float, y1: float,
+                  lo: float, hi: float) -> Optional[Tuple[float, float]]:
+    """Liang–Barsky: intervalo [t0, t1] do segmento dentro do quadrado [lo, hi]²."""
+    t0, t1 = 0.0, 1.0
+    dx, dy = x1 - x0, y1 - y0
+    for p, q in ((-dx, x0 - lo), (dx, hi - x0), (-dy, y0 - lo), (dy, hi - y0)):
+        if p == 0:
+            if q < 0:
+                return None
+        else:
+            t = q / p
+            if p < 0:
+                if t > t1:
+                    return None
+                t0 = max(t0, t)
+            else:
+                if t < t0:
+                    return None
+                t1 = min(t1, t)
+    return t0, t1
+
+
+def clip_line(coords: Sequence[Tuple[float, float]], lo: float, hi: float) -> List[List[Tuple[int, int]]]:
+    """
+    Recorta a polilinha no quadrado [lo, hi]² e quantiza para inteiros.
+    Cada trecho contínuo dentro do quadrado vira uma linha; vértices
+    repetidos após a quantização são descartados.
+    """
+    parts: List[List[Tuple[int, int]]] = []
+    current: List[Tuple[int, int]] = []
+    for (x0, y0), (x1, y1) in zip(coords, coords[1:]):
+        clipped = _clip_segment(x0, y0, x1, y1, lo, hi)
+        if clipped is None:
+            if len(current) > 1:
+                parts.append(current)
+            current = []
+            continue
+        t0, t1 = clipped
+        a = (round(x0 + t0 * (x1 - x0)), round(y0 + t0 * (y1 - y0)))
+        b = (round(x0 + t1 * (x1 - x0)), round(y0 + t1 * (y1 - y0)))
+        if t0 > 0.0 or not current:
+            if len(current) > 1:
+                parts.append(current)
+            current = [a]
+        if b != current[-1]:
+            current.append(b)
+        if t1 < 1.0:
+            if len(current) > 1:
+                parts.append(current)
+            current = []
+    if len(current) > 1:
+        parts.append(current)
+    return parts
+
+
+def _runs(rows: Sequence[tuple], max_gap_seconds: float) -> Iterator[List[tuple]]:
+    """Trechos contínuos de cada device (linhas já em ordem device, time)."""
+    run: List[tuple] = []
+    for row in rows:
+        if run and (row[COL_DEVICE] != run[-1][COL_DEVICE]
+                    or (row[COL_TIME] - run[-1][COL_TIME]).total_seconds() > max_gap_seconds):
+            yield run
+            run = []
+        run.append(row)
+    if run:
+        yield run
+
+
+def render_tile(rows: Sequence[tuple], z: int, x: int, y: int, tier: Tier) -> bytes:
+    """
+    Tile MVT com duas camadas:
+    - tracks: LineString por trecho contínuo de cada device, simplificada
+      até 1 pixel no zoom (Douglas–Peucker de src/simplify.py, mantendo
+      paradas) e recortada no tile + BUFFER
+    - points: amostras dentro do tile, no máximo uma por device por pixel
+    Propriedades: device_id, tempos em epoch (s), velocidade em km/h.
+    """
+    project = _Projector(z, x, y)
+    tracks, points = Layer("tracks"), Layer("points")
+    max_gap = max(MIN_GAP_SECONDS, 3 * tier.seconds)
+    seen = set()
+
+    for run in _runs(rows, max_gap):
+        device_id = run[0][COL_DEVICE]
+        if len(run) > 1:
+            tolerance = zoom_tolerance_m(z, run[0][COL_LAT])
+            simplified = simplify_track(run, tolerance_m=tolerance)
+            coords = [project(r[COL_LAT], r[COL_LON]) for r in simplified]
+            for part in clip_line(coords, -BUFFER, EXTENT + BUFFER):
+                tracks.add_line(part, {
+                    "device_id": device_id,
+                    "start": int(run[0][COL_TIME].timestamp()),
+                    "end": int(run[-1][COL_TIME].timestamp()),
+                    "resolution": tier.name,
+                })
+
+        for r in run:
+            px, py = project(r[COL_LAT], r[COL_LON])
+            if not (0 <= px < EXTENT and 0 <= py < EXTENT):
+                continue
+            cell = (device_id, int(px) // POINT_GRID, int(py) // POINT_GRID)
+            if cell in seen:
+                continue
+            seen.add(cell)
+            speed = r[COL_SPEED]
+            points.add_point(int(px), int(py), {
+                "device_id": device_id,
+                "time": int(r[COL_TIME].timestamp()),
+                "speed_kmh": round(float(speed), 1) if speed is not None else None,
+            })
+
+    return encode_tile([tracks, points])
@@ -0,0 +1,201 @@
+"""
+Codec binário do feed ao vivo via WebSocket (/api/events/ws).
+
+Cada mensagem binária é um frame com várias atualizações de dispositivos
+(todas as mudanças desde o tick anterior do cliente). Inteiros usam varint
+LEB128; valores com sinal usam zigzag. Layout (little-endian):
+
+    u8      magic (0xA7)
+    u8      versão (1)
+    u8      flags            bit0 = keyframe (primeiro frame da conexão)
+    u32     base_ts          segundos Unix (piso do menor ts do frame)
+    varint  n_dict           novas entradas do dicionário de device_id
+      varint  índice
+      varint  tamanho
+      bytes   device_id (UTF-8)
+    varint  n_updates
+      varint  índice do device no dicionário
+      u8      máscara        0x01 posição, 0x02 velocidade, 0x04 offline,
+                             0x08 saiu do filtro (bbox/área/operador) da conexão
+      varint  dts            décimos de segundo desde base_ts
+      [0x01]  zigzag dlat, zigzag dlon
+              coordenadas em ponto fixo (graus * 1e6), delta em relação à
+              última posição enviada para o device nesta conexão
+              (absolutas na primeira vez)
+      [0x02]  varint speed   décimos de km/h
+
+O dicionário e o estado de delta são por conexão: o cliente mantém a mesma
+tabela índice -> device_id e última posição para reconstruir os valores.
+"""
+
+import struct
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+MAGIC = 0xA7
+VERSION = 1
+
+FLAG_KEYFRAME = 0x01
+
+FIELD_POSITION = 0x01
+FIELD_SPEED = 0x02
+FIELD_OFFLINE = 0x04
+FIELD_LEFT = 0x08
+
+COORD_SCALE = 1_000_000  # 1e-6 grau ~ 0,11 m
+
+_HEADER = struct.Struct("<BBBI")
+
+
+class WireUpdate(NamedTuple):
+    """Atualização já quantizada (montada uma vez por evento no broadcaster)."""
+    device_id: str
+    ts: float
+    qlat: Optional[int]
+    qlon: Optional[int]
+    speed: Optional[int]   # décimos de km/h
+    mask: int
+
+
+def quantize(payload: Dict[str, Any]) -> WireUpdate:
+    """Converte o payload compacto (id, ts, lat, lon, sp, st) para ponto fixo."""
+    mask = 0
+    qlat = qlon = speed = None
+    if payload.get("lat") is not None and payload.get("lon") is not None:
+        mask |= FIELD_POSITION
+        qlat = int(round(payload["lat"] * COORD_SCALE))
+        qlon = int(round(payload["lon"] * COORD_SCALE))
+    if payload.get("sp") is not None:
+        mask |= FIELD_SPEED
+        speed = max(0, int(round(payload["sp"] * 10)))
+    if payload.get("st") == "offline":
+        mask |= FIELD_OFFLINE
+    elif payload.get("st") == "left":
+        mask |= FIELD_LEFT
+    return WireUpdate(payload["id"], payload["ts"], qlat, qlon, speed, mask)
+
+
+def _varint(value: int, out: bytearray):
+    if value < 0x80:
+        out.append(value)
+        return
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _read_varint(buf: bytes, pos: int) -> Tuple[int, int]:
+    result = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _unzigzag(value: int) -> int:
+    return (value >> 1) ^ -(value & 1)
+
+
+class FleetFrameEncoder:
+    """Codificador com estado de uma conexão WebSocket (dicionário + último frame)."""
+
+    def __init__(self):
+        self._index: Dict[str, int] = {}
+        self._last_pos: Dict[int, Tuple[int, int]] = {}
+        self._sent_frames = 0
+
+    def encode(self, updates: Iterable[Any]) -> bytes:
+        """Codifica WireUpdate (ou payloads compactos do broadcaster, quantizados aqui)."""
+        updates = [u if isinstance(u, WireUpdate) else quantize(u) for u in updates if u]
+        base_ts = int(min((u.ts for u in updates), default=0))
+
+        new_entries: List[Tuple[int, bytes]] = []
+        body = bytearray()
+        _varint(len(updates), body)
+        index = self._index
+        last_pos = self._last_pos
+
+        for u in updates:
+            idx = index.get(u.device_id)
+            if idx is None:
+                idx = len(index)
+                index[u.device_id] = idx
+                new_entries.append((idx, u.device_id.encode("utf-8")))
+
+            _varint(idx, body)
+            body.append(u.mask)
+            _varint(max(0, int((u.ts - base_ts) * 10 + 0.5)), body)
+
+            if u.mask & FIELD_POSITION:
+                last_lat, last_lon = last_pos.get(idx, (0, 0))
+                _varint(_zigzag(u.qlat - last_lat), body)
+                _varint(_zigzag(u.qlon - last_lon), body)
+                last_pos[idx] = (u.qlat, u.qlon)
+            if u.mask & FIELD_SPEED:
+                _varint(u.speed, body)
+
+        flags = FLAG_KEYFRAME if self._sent_frames == 0 else 0
+        self._sent_frames += 1
+
+        out = bytearray(_HEADER.pack(MAGIC, VERSION, flags, base_ts))
+        _varint(len(new_entries), out)
+        for idx, name in new_entries:
+            _varint(idx, out)
+            _varint(len(name), out)
+            out += name
+        out += body
+        return bytes(out)
+
+
+class FleetFrameDecoder:
+    """Decodificador de referência (mesma lógica esperada do cliente)."""
+
+    def __init__(self):
+        self._names: Dict[int, str] = {}
+        self._last_pos: Dict[int, Tuple[int, int]] = {}
+
+    def decode(self, frame: bytes) -> List[Dict[str, Any]]:
+        magic, version, _flags, base_ts = _HEADER.unpack_from(frame, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("frame inválido")
+        pos = _HEADER.size
+
+        n_dict, pos = _read_varint(frame, pos)
+        for _ in range(n_dict):
+            idx, pos = _read_varint(frame, pos)
+            size, pos = _read_varint(frame, pos)
+            self._names[idx] = frame[pos:pos + size].decode("utf-8")
+            pos += size
+
+        n_updates, pos = _read_varint(frame, pos)
+        updates = []
+        for _ in range(n_updates):
+            idx, pos = _read_varint(frame, pos)
+            mask = frame[pos]
+            pos += 1
+            dts, pos = _read_varint(frame, pos)
+            update = {
+                "id": self._names[idx],
+                "ts": base_ts + dts / 10,
+                "st": "offline" if mask & FIELD_OFFLINE else "left" if mask & FIELD_LEFT else "online",
+            }
+            if mask & FIELD_POSITION:
+                dlat, pos = _read_varint(frame, pos)
+                dlon, pos = _read_varint(frame, pos)
+                last_lat, last_lon = self._last_pos.get(idx, (0, 0))
+                qlat, qlon = last_lat + _unzigzag(dlat), last_lon + _unzigzag(dlon)
+                self._last_pos[idx] = (qlat, qlon)
+                update["lat"] = qlat / COORD_SCALE
+                update["lon"] = qlon / COORD_SCALE
+            if mask & FIELD_SPEED:
+                speed, pos = _read_varint(frame, pos)
+                update["sp"] = speed / 10
+            updates.append(update)
+        return updates
@@ -0,0 +1,100 @@
+"""
+Fixtures dos testes do ingest (sem banco, MQTT nem broker).
+
+Rodar a partir de ingest/:
+    python -m pytest -q
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.main import Config, IngestWorker, create_health_app
+
+T0 = datetime(2026, 1, 5, 12, 0, tzinfo=timezone.utc)
+
+
+def telemetry_row(ts: datetime, device_id: str, lat: float, lon: float, speed_kmh: float = 20.0) -> tuple:
+    """Linha de HISTORY_COLUMNS (demais colunas nulas)."""
+    return (ts, device_id, "op1", lat, lon, speed_kmh) + (None,) * 22
+
+
+class FakeTelemetryCursor:
+    """
+    Cursor que responde às consultas de src/history.py a partir de uma
+    lista de linhas em ordem (time, device_id).
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+        self._result = []
+
+    def execute(self, query, params=None):
+        params = list(params or [])
+        self.executed.append(query)
+        if "summary_1min" in query:
+            self._result = sorted({(r[1],) for r in self.rows})
+            return
+        start, end = params[0], params[1]
+        rest = params[2:]
+        rows = [r for r in self.rows if start <= r[0] <= end]
+        if "AND device_id = %s" in query:
+            device_id = rest.pop(0)
+            rows = [r for r in rows if r[1] == device_id]
+            if "AND time > %s" in query:
+                after = rest.pop(0)
+                rows = [r for r in rows if r[0] > after]
+        elif "(time, device_id) > (%s, %s)" in query:
+            after = (rest.pop(0), rest.pop(0))
+            rows = [r for r in rows if (r[0], r[1]) > after]
+        if "LIMIT %s" in query:
+            rows = rows[:rest.pop(0)]
+        self._result = rows
+
+    def fetchall(self):
+        return list(self._result)
+
+
+class FakeReadPool:
+    """Substitui ReadPool.run: executa fn(cursor, *args) no cursor falso."""
+
+    size = 2
+
+    def __init__(self, rows):
+        self.cursor = FakeTelemetryCursor(rows)
+
+    async def run(self, fn, *args):
+        return fn(self.cursor, *args)
+
+
+@pytest.fixture
+def worker(tmp_path):
+    config = Config()
+    config.offline_queue_path = str(tmp_path / "offline.db")
+    config.response_cache_dir = ""
+    return IngestWorker(config)
+
+
+@pytest.fixture
+def history_client(worker):
+    """TestClient do app com read_pool falso; devolve (client, set_rows)."""
+
+    def set_rows(rows):
+        worker.read_pool = FakeReadPool(sorted(rows, key=lambda r: (r[0], r[1])))
+        return worker.read_pool
+
+    set_rows([])
+    return TestClient(create_health_app(worker)), set_rows
+
+
+def track(device_id: str, n: int, start: datetime = T0, step_s: float = 1.0):
+    """Trajetória em zigue-zague (curvas a cada 50 amostras) de n pontos."""
+    rows = []
+    for i in range(n):
+        leg, k = divmod(i, 50)
+        lat = -20.0 + leg * 0.001
+        lon = -43.0 + (k if leg % 2 == 0 else 50 - k) * 0.0002
+        rows.append(telemetry_row(start + timedelta(seconds=i * step_s), device_id, lat, lon))
+    return rows
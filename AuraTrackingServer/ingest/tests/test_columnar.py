@@ -0,0 +1,90 @@
+import json
+import math
+import struct
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.columnar import (
+    DICT, FLOAT, HISTORY_SCHEMA, INT, MAGIC, TIME, decode_columnar, encode_columnar, infer_schema,
+)
+
+from .conftest import T0, telemetry_row
+
+SCHEMA = [("time", TIME), ("device_id", DICT), ("lat", FLOAT), ("battery_level", INT)]
+
+
+def _header_and_body(payload):
+    (head_len,) = struct.unpack_from("<I", payload, 4)
+    return head_len, payload[8 + head_len:]
+
+
+def test_round_trip_with_nulls():
+    rows = [
+        (T0, "dev_a", -20.5, 80),
+        (T0 + timedelta(milliseconds=1500), "dev_b", None, None),
+        (T0 + timedelta(seconds=3), None, -20.25, 79),
+    ]
+
+    decoded = decode_columnar(encode_columnar(SCHEMA, rows))
+
+    assert decoded["rows"] == 3
+    assert decoded["time_unit"] == "ms"
+    base = datetime.fromisoformat(decoded["base_time"])
+    times = [base + timedelta(milliseconds=v) for v in decoded["columns"]["time"]]
+    assert times == [r[0] for r in rows]
+    assert decoded["columns"]["device_id"] == ["dev_a", "dev_b", None]
+    assert decoded["columns"]["lat"] == [-20.5, None, -20.25]
+    assert decoded["columns"]["battery_level"] == [80, None, 79]
+
+
+def test_buffers_are_aligned_and_header_padded():
+    payload = encode_columnar(SCHEMA, [(T0, "dev_a", 1.0, 1)] * 5)
+    head_len, _ = _header_and_body(payload)
+
+    assert payload[:4] == MAGIC
+    assert (8 + head_len) % 8 == 0
+    for column in json.loads(payload[8:8 + head_len])["columns"]:
+        assert column["offset"] % 8 == 0
+
+
+def test_long_windows_switch_to_seconds():
+    rows = [(T0, "a", 0.0, 0), (T0 + timedelta(days=40), "a", 0.0, 0)]
+    decoded = decode_columnar(encode_columnar(SCHEMA, rows))
+    assert decoded["time_unit"] == "s"
+    assert decoded["columns"]["time"][1] - decoded["columns"]["time"][0] == 40 * 86400
+
+
+def test_float_nulls_are_nan_in_the_buffer():
+    payload = encode_columnar([("lat", FLOAT)], [(None,), (1.0,)])
+    _, body = _header_and_body(payload)
+    assert math.isnan(struct.unpack_from("<f", body, 0)[0])
+
+
+def test_empty_result():
+    decoded = decode_columnar(encode_columnar(HISTORY_SCHEMA, []))
+    assert decoded["rows"] == 0
+    assert all(values == [] for values in decoded["columns"].values())
+
+
+def test_history_rows_round_trip():
+    rows = [telemetry_row(T0 + timedelta(seconds=i), f"dev_{i % 3}", -20 + i * 1e-4, -43.0) for i in range(10)]
+    decoded = decode_columnar(encode_columnar(HISTORY_SCHEMA, rows))
+    assert decoded["columns"]["device_id"] == [r[1] for r in rows]
+    assert decoded["columns"]["lat"] == pytest.approx([r[3] for r in rows], abs=1e-5)
+    assert decoded["columns"]["satellites"] == [None] * 10
+
+
+def test_infer_schema():
+    rows = [(T0, "a", 1.5, 3, None)]
+    schema = infer_schema(["bucket", "device_id", "avg_speed_kmh", "sample_count", "max_accel"], rows)
+    assert schema == [
+        ("bucket", TIME), ("device_id", DICT), ("avg_speed_kmh", FLOAT),
+        ("sample_count", INT), ("max_accel", FLOAT),
+    ]
+
+
+def test_invalid_payload_is_rejected():
+    with pytest.raises(ValueError):
+        decode_columnar(b"XXXX" + bytes(8))
+
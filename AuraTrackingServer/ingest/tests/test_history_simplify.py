@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+from .conftest import T0, track
+
+
+WINDOW = {"start": T0.isoformat(), "end": (T0 + timedelta(days=1)).isoformat()}
+
+
+def test_simplify_reads_the_whole_window_beyond_20k_rows(history_client):
+    client, set_rows = history_client
+    rows = track("d1", 30000)
+    set_rows(rows)
+
+    r = client.get("/api/history", params={**WINDOW, "device_id": "d1", "max_points": 500})
+
+    assert r.status_code == 200
+    body = r.json()
+    assert body["raw_count"] == 30000
+    assert 2 <= body["count"] <= 500
+    # A simplificação cobre a janela inteira, não as primeiras 20k amostras
+    assert body["points"][0]["ts"] == rows[0][0].isoformat()
+    assert body["points"][-1]["ts"] == rows[-1][0].isoformat()
+
+
+def test_simplify_all_devices_keeps_every_device_and_the_budget(history_client):
+    client, set_rows = history_client
+    rows = track("d1", 15000) + track("d2", 15000) + track("d3", 40, start=T0 + timedelta(hours=5))
+    set_rows(rows)
+
+    r = client.get("/api/history", params={**WINDOW, "max_points": 300})
+
+    assert r.status_code == 200
+    body = r.json()
+    assert body["raw_count"] == 30040
+    assert body["count"] <= 300
+    assert {p["device_id"] for p in body["points"]} == {"d1", "d2", "d3"}
+
+
+def test_simplify_over_the_row_cap_is_rejected(history_client, worker):
+    client, set_rows = history_client
+    worker.config.history_simplify_max_rows = 1000
+    rows = track("d1", 1500)
+    set_rows(rows)
+
+    r = client.get("/api/history", params={**WINDOW, "device_id": "d1", "max_points": 100})
+
+    assert r.status_code == 413
+    assert "error" in r.json()
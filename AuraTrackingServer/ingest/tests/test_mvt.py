@@ -0,0 +1,136 @@
+import struct
+
+from src.mvt import EXTENT, LINESTRING, POINT, Layer, encode_tile
+
+
+def _varint(buf, pos):
+    result = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _fields(buf):
+    """Campos protobuf (número, valor) de uma mensagem; length-delimited como bytes."""
+    pos, out = 0, []
+    while pos < len(buf):
+        key, pos = _varint(buf, pos)
+        number, wire = key >> 3, key & 7
+        if wire == 0:
+            value, pos = _varint(buf, pos)
+        elif wire == 1:
+            value, pos = buf[pos:pos + 8], pos + 8
+        elif wire == 2:
+            size, pos = _varint(buf, pos)
+            value, pos = buf[pos:pos + size], pos + size
+        else:
+            raise AssertionError(f"wire type {wire}")
+        out.append((number, value))
+    return out
+
+
+def _packed(buf):
+    pos, out = 0, []
+    while pos < len(buf):
+        value, pos = _varint(buf, pos)
+        out.append(value)
+    return out
+
+
+def _unzigzag(v):
+    return (v >> 1) ^ -(v & 1)
+
+
+def _decode_value(buf):
+    (number, value), = _fields(buf)
+    if number == 1:
+        return value.decode("utf-8")
+    if number == 3:
+        return struct.unpack("<d", value)[0]
+    if number == 6:
+        return _unzigzag(value)
+    if number == 7:
+        return bool(value)
+    raise AssertionError(f"value field {number}")
+
+
+def _decode_geometry(commands):
+    coords, x, y, i = [], 0, 0, 0
+    while i < len(commands):
+        count = commands[i] >> 3
+        i += 1
+        for _ in range(count):
+            x += _unzigzag(commands[i])
+            y += _unzigzag(commands[i + 1])
+            coords.append((x, y))
+            i += 2
+    return coords
+
+
+def decode_tile(data):
+    """Decodificador de referência: {camada: {"extent", "version", "features"}}."""
+    layers = {}
+    for number, layer_buf in _fields(data):
+        assert number == 3
+        fields = _fields(layer_buf)
+        keys = [v.decode("utf-8") for n, v in fields if n == 3]
+        values = [_decode_value(v) for n, v in fields if n == 4]
+        features = []
+        for n, feature_buf in fields:
+            if n != 2:
+                continue
+            f = dict((k, v) for k, v in _fields(feature_buf))
+            tags = _packed(f.get(2, b""))
+            features.append({
+                "id": f[1],
+                "type": f[3],
+                "coords": _decode_geometry(_packed(f[4])),
+                "properties": {keys[tags[i]]: values[tags[i + 1]] for i in range(0, len(tags), 2)},
+            })
+        meta = dict((n, v) for n, v in fields if n in (1, 5, 15))
+        layers[meta[1].decode("utf-8")] = {"extent": meta[5], "version": meta[15], "features": features}
+    return layers
+
+
+def test_points_and_lines_round_trip():
+    devices = Layer("devices")
+    devices.add_point(10, 4000, {"device_id": "dev_a", "speed": 12.5, "online": True, "count": -3})
+    devices.add_point(0, 0, {"device_id": "dev_b", "speed": None})
+    tracks = Layer("tracks")
+    tracks.add_line([(100, 100), (120, 90), (4096, 4096), (-5, 30)], {"device_id": "dev_a"})
+
+    tile = decode_tile(encode_tile([devices, tracks]))
+
+    assert tile["devices"]["extent"] == EXTENT
+    assert tile["devices"]["version"] == 2
+    a, b = tile["devices"]["features"]
+    assert (a["id"], a["type"], a["coords"]) == (1, POINT, [(10, 4000)])
+    assert a["properties"] == {"device_id": "dev_a", "speed": 12.5, "online": True, "count": -3}
+    # Propriedades nulas são omitidas
+    assert b["properties"] == {"device_id": "dev_b"}
+    line, = tile["tracks"]["features"]
+    assert line["type"] == LINESTRING
+    assert line["coords"] == [(100, 100), (120, 90), (4096, 4096), (-5, 30)]
+
+
+def test_keys_and_values_are_interned():
+    layer = Layer("devices")
+    for i in range(50):
+        layer.add_point(i, i, {"device_id": "same", "online": True})
+
+    fields = _fields(layer.encode())
+
+    assert sum(1 for n, _ in fields if n == 3) == 2
+    assert sum(1 for n, _ in fields if n == 4) == 2
+    assert len(decode_tile(encode_tile([layer]))["devices"]["features"]) == 50
+
+
+def test_empty_layers_are_skipped():
+    full = Layer("full")
+    full.add_point(1, 1, {})
+    assert encode_tile([Layer("empty")]) == b""
+    assert list(decode_tile(encode_tile([Layer("empty"), full]))) == ["full"]
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src.pagination import Cursor, decode_cursor, encode_cursor, next_cursor
+
+from .conftest import T0
+
+
+@pytest.mark.parametrize("cursor", [
+    Cursor(T0, "dev_a"),
+    Cursor(T0.replace(microsecond=123456), "dev/ç/ü", 7),
+    Cursor(datetime(1970, 1, 1, tzinfo=timezone.utc), "", 0),
+])
+def test_round_trip(cursor):
+    token = encode_cursor(cursor)
+    assert "=" not in token
+    assert decode_cursor(token) == cursor
+
+
+@pytest.mark.parametrize("token", [
+    "", "not-base64!", "e30", encode_cursor(Cursor(T0, "a"))[:-3],
+    # JSON válido com tipos errados / skip negativo
+    "WzEsMiwzXQ", "WzEsImEiLC0xXQ",
+])
+def test_invalid_tokens(token):
+    with pytest.raises(ValueError):
+        decode_cursor(token)
+
+
+def _rows(keys):
+    return [(T0 + timedelta(seconds=s), d) for s, d in keys]
+
+
+def test_last_page_has_no_cursor():
+    assert next_cursor(_rows([(0, "a"), (1, "a")]), limit=3) is None
+    assert next_cursor([], limit=3) is None
+    assert next_cursor(_rows([(0, "a")]), limit=0) is None
+
+
+def test_full_page_points_after_the_last_key():
+    token = next_cursor(_rows([(0, "a"), (0, "b"), (1, "a")]), limit=3)
+    assert decode_cursor(token) == Cursor(T0 + timedelta(seconds=1), "a", 1)
+
+
+def test_repeated_keys_accumulate_skip_across_pages():
+    # events: a chave (time, device_id) não é única
+    first = decode_cursor(next_cursor(_rows([(0, "a"), (1, "a"), (1, "a")]), limit=3))
+    assert first.skip == 2
+    second = decode_cursor(next_cursor(_rows([(1, "a")] * 3), limit=3, after=first))
+    assert second == Cursor(T0 + timedelta(seconds=1), "a", 5)
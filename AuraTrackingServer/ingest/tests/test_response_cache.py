@@ -0,0 +1,142 @@
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+
+from fastapi.responses import JSONResponse
+
+from src.response_cache import ALL_DEVICES, ResponseCache, cache_key
+
+# Janela fechada: bem antes do horizonte de dados atrasados (900 s)
+START = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(days=2)
+END = START + timedelta(hours=1)
+
+
+def _key(device_id, start=START, end=END):
+    return cache_key("/api/history", start, end, device_id=device_id)
+
+
+def _store(cache, device_id, start=START, end=END, body=None, if_none_match=None):
+    result = JSONResponse(body if body is not None else {"device_id": device_id, "rows": [1, 2, 3]})
+    return asyncio.run(cache.store(_key(device_id, start, end), device_id, start, end, result, if_none_match))
+
+
+def test_store_then_hit_and_not_modified():
+    cache = ResponseCache()
+    response = _store(cache, "dev_a")
+    etag = response.headers["ETag"]
+
+    entry = cache.get(_key("dev_a"))
+
+    assert entry is not None and entry.etag == etag
+    assert cache.respond(entry, etag).status_code == 304
+    assert cache.respond(entry, None).body == entry.body
+    assert cache.get_stats()["response_cache_stores"] == 1
+
+
+def test_open_windows_are_not_cached():
+    cache = ResponseCache()
+    end = datetime.now(timezone.utc)
+    _store(cache, "dev_a", end - timedelta(hours=1), end)
+    assert cache.get(_key("dev_a", end - timedelta(hours=1), end)) is None
+    assert not cache.cacheable("dev_a", end - timedelta(hours=1), end)
+
+
+def test_invalidate_removes_overlapping_device_and_fleet_entries():
+    cache = ResponseCache()
+    later = START + timedelta(hours=5)
+    _store(cache, "dev_a")
+    _store(cache, "dev_a", later, later + timedelta(hours=1))
+    _store(cache, "dev_b")
+    _store(cache, ALL_DEVICES)
+
+    cache.invalidate("dev_a", START + timedelta(minutes=10), START + timedelta(minutes=10))
+
+    assert cache.get(_key("dev_a")) is None
+    assert cache.get(_key(ALL_DEVICES)) is None
+    # Outro device e outra janela do mesmo device continuam
+    assert cache.get(_key("dev_b")) is not None
+    assert cache.get(_key("dev_a", later, later + timedelta(hours=1))) is not None
+    assert cache.get_stats()["response_cache_invalidations"] == 2
+
+
+def test_hold_blocks_a_store_started_before_the_write():
+    cache = ResponseCache()
+    # Dado atrasado chega enquanto a consulta ainda roda
+    cache.invalidate("dev_a", START, START)
+
+    response = _store(cache, "dev_a")
+
+    assert "ETag" not in response.headers
+    assert cache.get(_key("dev_a")) is None
+    # O hold de um device também segura a resposta da frota inteira
+    _store(cache, ALL_DEVICES)
+    assert cache.get(_key(ALL_DEVICES)) is None
+    # ... mas não a de outro device
+    _store(cache, "dev_b")
+    assert cache.get(_key("dev_b")) is not None
+
+
+def test_invalidation_during_encoding_is_not_cached():
+    cache = ResponseCache()
+    encode = cache._encode
+
+    def racing_encode(body):
+        cache.invalidate("dev_a", START, END)
+        return encode(body)
+
+    cache._encode = racing_encode
+    _store(cache, "dev_a")
+
+    assert cache.get(_key("dev_a")) is None
+    assert cache.get_stats()["response_cache_stores"] == 0
+
+
+def test_holds_are_merged_and_expire():
+    cache = ResponseCache(hold_seconds=0)
+    cache.invalidate("dev_a", START, END)
+    _store(cache, "dev_a")
+    assert cache.get(_key("dev_a")) is not None
+
+    cache = ResponseCache(hold_seconds=60)
+    later = START + timedelta(hours=5)
+    cache.invalidate("dev_a", START, START)
+    cache.invalidate("dev_a", later, later)
+    # Holds sucessivos cobrem a união das janelas
+    assert not cache.cacheable("dev_a", START + timedelta(hours=2), START + timedelta(hours=3))
+
+
+def test_invalidate_late_ignores_recent_records():
+    cache = ResponseCache()
+    _store(cache, "dev_a")
+
+    cache.invalidate_late("dev_a", datetime.now(timezone.utc) - timedelta(seconds=5))
+    assert cache.get(_key("dev_a")) is not None
+
+    cache.invalidate_late("dev_a", START + timedelta(minutes=1))
+    assert cache.get(_key("dev_a")) is None
+
+
+def test_invalidate_removes_spilled_entries(tmp_path):
+    spill_dir = str(tmp_path / "spill")
+    cache = ResponseCache(max_bytes=1, spill_dir=spill_dir, compress_min_bytes=0)
+    _store(cache, "dev_a")
+    _store(cache, "dev_b")
+    assert cache.get_stats()["response_cache_spilled_entries"] == 1
+    assert len(os.listdir(spill_dir)) == 1
+
+    cache.invalidate("dev_a", START, END)
+
+    assert os.listdir(spill_dir) == []
+    assert cache.get(_key("dev_a")) is None
+    assert cache.get(_key("dev_b")) is not None
+
+
+def test_gzip_entries_keep_the_identity_etag():
+    rows = {"rows": list(range(2000))}
+    plain = _store(ResponseCache(compress_min_bytes=0), "dev_a", body=rows)
+    compressed_cache = ResponseCache(compress_min_bytes=1024)
+    compressed = _store(compressed_cache, "dev_a", body=rows)
+
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert compressed.headers["ETag"] == plain.headers["ETag"]
+    assert len(compressed_cache.get(_key("dev_a")).body) < len(plain.body)
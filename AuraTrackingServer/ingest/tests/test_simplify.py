@@ -0,0 +1,89 @@
+import random
+from datetime import timedelta
+
+import pytest
+
+from src.simplify import simplify_rows, simplify_track, split_budget
+
+from .conftest import T0, telemetry_row, track
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_split_budget_never_exceeds_the_budget(seed):
+    rng = random.Random(seed)
+    sizes = [rng.randint(1, 5000) for _ in range(rng.randint(1, 40))]
+    for budget in (1, len(sizes) - 1, len(sizes), 2 * len(sizes), 2 * len(sizes) + 7, 1000, 20000):
+        if budget < 1:
+            continue
+        shares = split_budget(sizes, budget)
+        assert sum(shares) <= budget
+        assert all(s >= 0 for s in shares)
+        if budget >= 2 * len(sizes):
+            assert sum(shares) == budget
+            assert min(shares) >= 2
+        elif budget >= len(sizes):
+            assert min(shares) >= 1
+
+
+def test_split_budget_below_one_per_track_favours_the_largest():
+    assert split_budget([10, 500, 30, 200], 2) == [0, 1, 0, 1]
+
+
+def test_split_budget_is_proportional():
+    # Piso de 2 cada; os 396 restantes na proporção 1:3
+    assert split_budget([1000, 3000], 400) == [101, 299]
+
+
+@pytest.mark.parametrize("max_points", [2, 3, 10, 57, 200])
+def test_simplify_track_is_a_hard_cap_and_keeps_the_ends(max_points):
+    rows = track("d1", 2000)
+    out = simplify_track(rows, max_points)
+    assert 2 <= len(out) <= max_points
+    assert out[0] is rows[0] and out[-1] is rows[-1]
+    assert [r[0] for r in out] == sorted(r[0] for r in out)
+
+
+def test_simplify_track_with_more_stops_than_budget():
+    # Alterna movimento e paradas: âncoras (bordas de parada) > orçamento
+    rows = []
+    for i in range(600):
+        speed = 0.0 if (i // 10) % 2 else 30.0
+        rows.append(telemetry_row(T0 + timedelta(seconds=i), "d1", -20 + i * 1e-5, -43.0, speed))
+    out = simplify_track(rows, 8)
+    assert len(out) <= 8
+    assert out[-1] is rows[-1]
+
+
+def test_simplify_track_tiny_budgets():
+    rows = track("d1", 100)
+    assert simplify_track(rows, 1) == [rows[-1]]
+    assert simplify_track(rows, 0) == []
+
+
+def test_simplify_track_tolerance_keeps_corners():
+    rows = track("d1", 200)  # Zigue-zague: curvas a cada 50 amostras
+    out = simplify_track(rows, tolerance_m=1.0)
+    kept = {r[0] for r in out}
+    for corner in (49, 50, 99, 100, 149, 150):
+        assert rows[corner][0] in kept or rows[corner - 1][0] in kept or rows[corner + 1][0] in kept
+    assert len(out) < 20
+
+
+@pytest.mark.parametrize("budget", [1, 2, 3, 5, 8, 100, 1000])
+def test_simplify_rows_total_budget(budget):
+    rows = track("a", 3000) + track("b", 40) + track("c", 1) + track("d", 700, start=T0 + timedelta(hours=1))
+    rows.sort(key=lambda r: r[0])
+
+    out = simplify_rows(rows, budget)
+
+    assert len(out) <= budget
+    assert [r[0] for r in out] == sorted(r[0] for r in out)
+    if budget >= 8:
+        # Piso de 2 por device (ou o device inteiro, se tiver menos)
+        assert {r[1] for r in out} == {"a", "b", "c", "d"}
+
+
+def test_simplify_rows_skips_rows_without_position():
+    rows = track("a", 10) + [telemetry_row(T0, "b", None, None)]
+    assert {r[1] for r in simplify_rows(rows, 100)} == {"a"}
+    assert simplify_rows([telemetry_row(T0, "b", None, None)], 10) == []
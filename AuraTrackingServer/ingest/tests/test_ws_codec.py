@@ -0,0 +1,78 @@
+import pytest
+
+from src.ws_codec import (
+    FIELD_LEFT, FIELD_OFFLINE, FleetFrameDecoder, FleetFrameEncoder, WireUpdate, quantize,
+)
+
+
+def _payload(device_id, ts, lat=None, lon=None, sp=None, st="online"):
+    return {"id": device_id, "ts": ts, "lat": lat, "lon": lon, "sp": sp, "st": st}
+
+
+def test_round_trip_over_several_frames():
+    encoder, decoder = FleetFrameEncoder(), FleetFrameDecoder()
+    frames = [
+        [_payload("dev_a", 1_700_000_000.0, -20.123456, -43.654321, 42.3),
+         _payload("dev_b", 1_700_000_000.5, -20.2, -43.7, 0.0)],
+        # Só dev_a muda: deltas em relação ao frame anterior
+        [_payload("dev_a", 1_700_000_001.0, -20.123466, -43.654301, 43.0)],
+        # Device novo entra no dicionário no meio da conexão
+        [_payload("dev_c", 1_700_000_002.0, 10.0, 20.0),
+         _payload("dev_b", 1_700_000_002.0, -20.2001, -43.7001, 5.5)],
+    ]
+
+    for sent in frames:
+        received = decoder.decode(encoder.encode(sent))
+        assert [u["id"] for u in received] == [p["id"] for p in sent]
+        for got, want in zip(received, sent):
+            assert got["ts"] == pytest.approx(want["ts"], abs=0.05)
+            assert got["lat"] == pytest.approx(want["lat"], abs=1e-6)
+            assert got["lon"] == pytest.approx(want["lon"], abs=1e-6)
+            if want["sp"] is not None:
+                assert got["sp"] == pytest.approx(want["sp"], abs=0.05)
+            assert got["st"] == "online"
+
+
+def test_status_and_leave_updates_carry_no_position():
+    encoder, decoder = FleetFrameEncoder(), FleetFrameDecoder()
+    decoder.decode(encoder.encode([_payload("dev_a", 1_700_000_000.0, 1.0, 2.0)]))
+
+    received = decoder.decode(encoder.encode([
+        WireUpdate("dev_a", 1_700_000_060.0, None, None, None, FIELD_OFFLINE),
+        WireUpdate("dev_b", 1_700_000_060.0, None, None, None, FIELD_LEFT),
+    ]))
+
+    assert received == [
+        {"id": "dev_a", "ts": 1_700_000_060.0, "st": "offline"},
+        {"id": "dev_b", "ts": 1_700_000_060.0, "st": "left"},
+    ]
+
+
+def test_delta_state_survives_updates_without_position():
+    encoder, decoder = FleetFrameEncoder(), FleetFrameDecoder()
+    decoder.decode(encoder.encode([_payload("dev_a", 1_700_000_000.0, 1.5, 2.5)]))
+    decoder.decode(encoder.encode([_payload("dev_a", 1_700_000_001.0, st="offline")]))
+
+    received = decoder.decode(encoder.encode([_payload("dev_a", 1_700_000_002.0, 1.500001, 2.499999)]))
+
+    assert received[0]["lat"] == pytest.approx(1.500001, abs=1e-7)
+    assert received[0]["lon"] == pytest.approx(2.499999, abs=1e-7)
+
+
+def test_only_the_first_frame_is_a_keyframe():
+    encoder = FleetFrameEncoder()
+    first = encoder.encode([_payload("dev_a", 1_700_000_000.0, 1.0, 2.0)])
+    second = encoder.encode([_payload("dev_a", 1_700_000_001.0, 1.0, 2.0)])
+    assert first[2] & 0x01
+    assert not second[2] & 0x01
+
+
+def test_quantize_masks():
+    assert quantize(_payload("d", 0.0, 1.0, 2.0, 3.0)).mask == 0x03
+    assert quantize(_payload("d", 0.0, st="offline")).mask == FIELD_OFFLINE
+    assert quantize(_payload("d", 0.0, st="left")).mask == FIELD_LEFT
+
+
+def test_invalid_frame_is_rejected():
+    with pytest.raises(ValueError):
+        FleetFrameDecoder().decode(b"\x00\x01\x00\x00\x00\x00\x00")
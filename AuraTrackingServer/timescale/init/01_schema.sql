@@ -274,6 +274,77 @@ SELECT create_hypertable('ingest_stats', 'time',
     if_not_exists => TRUE
 );
 
+-- ============================================================
+-- TABELA: summary_1min
+-- ============================================================
+-- Contadores por minuto mantidos pelo ingest (/api/summary e
+-- painéis do Grafana sem varrer telemetry; ver
+-- ingest/src/summary_buckets.py). Gravados como deltas somados.
+-- ============================================================
+CREATE TABLE IF NOT EXISTS summary_1min (
+    bucket TIMESTAMPTZ NOT NULL PRIMARY KEY,
+    sample_count BIGINT NOT NULL DEFAULT 0,
+    speed_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    speed_count BIGINT NOT NULL DEFAULT 0,
+    speed_max DOUBLE PRECISION,
+    accel_max DOUBLE PRECISION,
+    devices TEXT[] NOT NULL DEFAULT '{}',
+    events JSONB NOT NULL DEFAULT '{}'
+);
+
+SELECT create_hypertable('summary_1min', 'bucket',
+    chunk_time_interval => INTERVAL '7 days',
+    if_not_exists => TRUE
+);
+
+-- ============================================================
+-- TABELA: device_state
+-- ============================================================
+-- Última amostra e contagem de amostras por minuto da última
+-- hora, uma linha por device, atualizadas pelo ingest a cada
+-- batch (ver ingest/src/device_state.py). Base das views
+-- device_last_position e device_status.
+-- ============================================================
+CREATE TABLE IF NOT EXISTS device_state (
+    device_id VARCHAR(100) NOT NULL PRIMARY KEY,
+    time TIMESTAMPTZ NOT NULL,
+    operator_id VARCHAR(100),
+    latitude DOUBLE PRECISION,
+    longitude DOUBLE PRECISION,
+    altitude DOUBLE PRECISION,
+    speed_kmh DOUBLE PRECISION,
+    bearing DOUBLE PRECISION,
+    gps_accuracy DOUBLE PRECISION,
+    accel_magnitude DOUBLE PRECISION,
+    -- Contagem móvel: minute_counts[60] é o minuto counts_base,
+    -- minute_counts[i] o minuto counts_base - (60 - i)
+    counts_base TIMESTAMPTZ NOT NULL,
+    minute_counts INTEGER[] NOT NULL DEFAULT array_fill(0, ARRAY[60]),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Soma dois vetores de contagem alinhando pelos minutos; o resultado
+-- termina no minuto mais recente dos dois (minutos que saem da hora caem)
+CREATE OR REPLACE FUNCTION device_state_merge_counts(
+    old_counts INTEGER[], old_base TIMESTAMPTZ,
+    new_counts INTEGER[], new_base TIMESTAMPTZ
+) RETURNS INTEGER[] AS $$
+    SELECT ARRAY(
+        SELECT COALESCE(old_counts[i + (EXTRACT(EPOCH FROM b.base - old_base) / 60)::int], 0)
+             + COALESCE(new_counts[i + (EXTRACT(EPOCH FROM b.base - new_base) / 60)::int], 0)
+        FROM (SELECT GREATEST(old_base, new_base) AS base) b, generate_series(1, 60) AS i
+        ORDER BY i
+    )
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Amostras dos últimos 60 minutos (incluindo o corrente) de um vetor de contagem
+CREATE OR REPLACE FUNCTION device_state_samples_last_hour(counts INTEGER[], base TIMESTAMPTZ)
+RETURNS BIGINT AS $$
+    SELECT COALESCE(SUM(u.c), 0)::bigint
+    FROM unnest(counts) WITH ORDINALITY AS u(c, i)
+    WHERE base - (60 - u.i) * INTERVAL '1 minute' >= date_trunc('minute', NOW()) - INTERVAL '59 minutes'
+$$ LANGUAGE sql STABLE;
+
 -- ============================================================
 -- POLÍTICAS DE COMPRESSÃO
 -- ============================================================
@@ -303,6 +374,7 @@ SELECT add_compression_policy('events', INTERVAL '3 days', if_not_exists => TRUE
 SELECT add_retention_policy('telemetry', INTERVAL '180 days', if_not_exists => TRUE);
 SELECT add_retention_policy('events', INTERVAL '365 days', if_not_exists => TRUE);
 SELECT add_retention_policy('ingest_stats', INTERVAL '30 days', if_not_exists => TRUE);
+SELECT add_retention_policy('summary_1min', INTERVAL '365 days', if_not_exists => TRUE);
 
 -- ============================================================
 -- CONTINUOUS AGGREGATES (Materializações)
@@ -310,9 +382,34 @@ SELECT add_retention_policy('ingest_stats', INTERVAL '30 days', if_not_exists =>
 -- Agregações pré-calculadas para dashboards rápidos
 -- ============================================================
 
+-- Todas as camadas têm o mesmo schema (bucket, device_id, sample_count,
+-- médias/máximos, posição média, primeira/última amostra) e são
+-- materialized_only: /api/telemetry costura a cauda ainda não materializada
+-- a partir de telemetry (ver ingest/src/resolution.py)
+
+-- Agregação por 10 segundos (janelas de minutos a poucas horas)
+CREATE MATERIALIZED VIEW telemetry_10s
+WITH (timescaledb.continuous, timescaledb.materialized_only = true) AS
+SELECT
+    time_bucket('10 seconds', time) AS bucket,
+    device_id,
+    COUNT(*) AS sample_count,
+    AVG(speed_kmh) AS avg_speed_kmh,
+    MAX(speed_kmh) AS max_speed_kmh,
+    AVG(latitude) AS avg_lat,
+    AVG(longitude) AS avg_lon,
+    AVG(gps_accuracy) AS avg_accuracy,
+    AVG(accel_magnitude) AS avg_accel,
+    MAX(accel_magnitude) AS max_accel,
+    MIN(time) AS first_sample,
+    MAX(time) AS last_sample
+FROM telemetry
+GROUP BY bucket, device_id
+WITH NO DATA;
+
 -- Agregação por minuto (para gráficos em tempo real)
 CREATE MATERIALIZED VIEW telemetry_1min
-WITH (timescaledb.continuous) AS
+WITH (timescaledb.continuous, timescaledb.materialized_only = true) AS
 SELECT
     time_bucket('1 minute', time) AS bucket,
     device_id,
@@ -332,27 +429,37 @@ WITH NO DATA;
 
 -- Agregação por hora (para análises históricas)
 CREATE MATERIALIZED VIEW telemetry_1hour
-WITH (timescaledb.continuous) AS
+WITH (timescaledb.continuous, timescaledb.materialized_only = true) AS
 SELECT
     time_bucket('1 hour', time) AS bucket,
     device_id,
-    operator_id,
     COUNT(*) AS sample_count,
     AVG(speed_kmh) AS avg_speed_kmh,
     MAX(speed_kmh) AS max_speed_kmh,
-    SUM(speed * 1) AS total_distance_approx,  -- Aproximação
+    AVG(latitude) AS avg_lat,
+    AVG(longitude) AS avg_lon,
+    AVG(gps_accuracy) AS avg_accuracy,
     AVG(accel_magnitude) AS avg_accel,
     MAX(accel_magnitude) AS max_accel,
+    MIN(time) AS first_sample,
+    MAX(time) AS last_sample,
     -- Bounding box do trajeto
     MIN(latitude) AS min_lat,
     MAX(latitude) AS max_lat,
     MIN(longitude) AS min_lon,
     MAX(longitude) AS max_lon
 FROM telemetry
-GROUP BY bucket, device_id, operator_id
+GROUP BY bucket, device_id
 WITH NO DATA;
 
 -- Políticas de refresh para continuous aggregates
+SELECT add_continuous_aggregate_policy('telemetry_10s',
+    start_offset => INTERVAL '1 hour',
+    end_offset => INTERVAL '20 seconds',
+    schedule_interval => INTERVAL '30 seconds',
+    if_not_exists => TRUE
+);
+
 SELECT add_continuous_aggregate_policy('telemetry_1min',
     start_offset => INTERVAL '1 hour',
     end_offset => INTERVAL '1 minute',
@@ -367,13 +474,15 @@ SELECT add_continuous_aggregate_policy('telemetry_1hour',
     if_not_exists => TRUE
 );
 
+SELECT add_retention_policy('telemetry_10s', INTERVAL '30 days', if_not_exists => TRUE);
+
 -- ============================================================
 -- VIEWS ÚTEIS
 -- ============================================================
 
--- Última posição de cada dispositivo
+-- Última posição de cada dispositivo (device_state)
 CREATE OR REPLACE VIEW device_last_position AS
-SELECT DISTINCT ON (device_id)
+SELECT
     device_id,
     time,
     operator_id,
@@ -384,9 +493,8 @@ SELECT DISTINCT ON (device_id)
     bearing,
     gps_accuracy,
     accel_magnitude
-FROM telemetry
-WHERE time > NOW() - INTERVAL '24 hours'
-ORDER BY device_id, time DESC;
+FROM device_state
+WHERE time > NOW() - INTERVAL '24 hours';
 
 -- Status dos dispositivos (ativos nas últimas horas)
 CREATE OR REPLACE VIEW device_status AS
@@ -402,10 +510,9 @@ SELECT
         WHEN d.last_seen > NOW() - INTERVAL '1 hour' THEN 'AWAY'
         ELSE 'OFFLINE'
     END AS status,
-    (SELECT COUNT(*) FROM telemetry t 
-     WHERE t.device_id = d.device_id 
-     AND t.time > NOW() - INTERVAL '1 hour') AS samples_last_hour
-FROM devices d;
+    COALESCE(device_state_samples_last_hour(s.minute_counts, s.counts_base), 0) AS samples_last_hour
+FROM devices d
+LEFT JOIN device_state s ON s.device_id = d.device_id;
 
 -- ============================================================
 -- FUNÇÕES UTILITÁRIAS
@@ -488,7 +595,7 @@ ON CONFLICT (device_id) DO NOTHING;
 DO $$
 BEGIN
     RAISE NOTICE '✅ AuraTracking database schema created successfully!';
-    RAISE NOTICE '   - Tables: telemetry, events, devices, operators, ingest_stats';
+    RAISE NOTICE '   - Tables: telemetry, events, devices, operators, ingest_stats, summary_1min, device_state';
     RAISE NOTICE '   - Hypertables configured with 1-day chunks';
     RAISE NOTICE '   - Compression policy: 3 days';
     RAISE NOTICE '   - Retention policy: 180 days';
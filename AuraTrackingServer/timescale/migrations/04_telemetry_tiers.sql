@@ -0,0 +1,77 @@
+-- Migration: Camadas de resolução para /api/telemetry (granularity=auto)
+-- Data: 2026-10-18
+-- Descrição: Adiciona o continuous aggregate de 10 segundos e recria telemetry_1hour
+--            com as mesmas colunas de telemetry_1min, para que todas as camadas
+--            (raw, 10s, 1min, 1hour) tenham o mesmo schema. As views passam a
+--            materialized_only: a API costura a cauda ainda não materializada
+--            a partir da tabela telemetry (ver ingest/src/resolution.py).
+
+-- 10 segundos (janelas de minutos a poucas horas)
+CREATE MATERIALIZED VIEW IF NOT EXISTS telemetry_10s
+WITH (timescaledb.continuous, timescaledb.materialized_only = true) AS
+SELECT
+    time_bucket('10 seconds', time) AS bucket,
+    device_id,
+    COUNT(*) AS sample_count,
+    AVG(speed_kmh) AS avg_speed_kmh,
+    MAX(speed_kmh) AS max_speed_kmh,
+    AVG(latitude) AS avg_lat,
+    AVG(longitude) AS avg_lon,
+    AVG(gps_accuracy) AS avg_accuracy,
+    AVG(accel_magnitude) AS avg_accel,
+    MAX(accel_magnitude) AS max_accel,
+    MIN(time) AS first_sample,
+    MAX(time) AS last_sample
+FROM telemetry
+GROUP BY bucket, device_id
+WITH NO DATA;
+
+SELECT add_continuous_aggregate_policy('telemetry_10s',
+    start_offset => INTERVAL '1 hour',
+    end_offset => INTERVAL '20 seconds',
+    schedule_interval => INTERVAL '30 seconds',
+    if_not_exists => TRUE
+);
+
+SELECT add_retention_policy('telemetry_10s', INTERVAL '30 days', if_not_exists => TRUE);
+
+-- 1 hora: mesmo schema de telemetry_1min (sem agrupar por operator_id,
+-- que gerava várias linhas por bucket)
+DROP MATERIALIZED VIEW IF EXISTS telemetry_1hour;
+
+CREATE MATERIALIZED VIEW telemetry_1hour
+WITH (timescaledb.continuous, timescaledb.materialized_only = true) AS
+SELECT
+    time_bucket('1 hour', time) AS bucket,
+    device_id,
+    COUNT(*) AS sample_count,
+    AVG(speed_kmh) AS avg_speed_kmh,
+    MAX(speed_kmh) AS max_speed_kmh,
+    AVG(latitude) AS avg_lat,
+    AVG(longitude) AS avg_lon,
+    AVG(gps_accuracy) AS avg_accuracy,
+    AVG(accel_magnitude) AS avg_accel,
+    MAX(accel_magnitude) AS max_accel,
+    MIN(time) AS first_sample,
+    MAX(time) AS last_sample,
+    -- Bounding box do trajeto
+    MIN(latitude) AS min_lat,
+    MAX(latitude) AS max_lat,
+    MIN(longitude) AS min_lon,
+    MAX(longitude) AS max_lon
+FROM telemetry
+GROUP BY bucket, device_id
+WITH NO DATA;
+
+SELECT add_continuous_aggregate_policy('telemetry_1hour',
+    start_offset => INTERVAL '1 day',
+    end_offset => INTERVAL '1 hour',
+    schedule_interval => INTERVAL '1 hour',
+    if_not_exists => TRUE
+);
+
+ALTER MATERIALIZED VIEW telemetry_1min SET (timescaledb.materialized_only = true);
+
+-- Materializar o histórico existente (executar fora de transação)
+CALL refresh_continuous_aggregate('telemetry_10s', NOW() - INTERVAL '30 days', NOW() - INTERVAL '20 seconds');
+CALL refresh_continuous_aggregate('telemetry_1hour', NULL, NOW() - INTERVAL '1 hour');
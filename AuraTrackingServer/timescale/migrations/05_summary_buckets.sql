@@ -0,0 +1,56 @@
+-- Migration: Buckets de resumo por minuto (/api/summary)
+-- Data: 2026-10-18
+-- Descrição: Cria summary_1min, mantida pelo ingest a partir dos pacotes
+--            aceitos (contagem, soma/máximo de velocidade, aceleração máxima,
+--            devices e eventos por tipo). /api/summary e os painéis de
+--            overview do Grafana passam a ler esta tabela em vez de varrer
+--            telemetry (ver ingest/src/summary_buckets.py).
+
+CREATE TABLE IF NOT EXISTS summary_1min (
+    bucket TIMESTAMPTZ NOT NULL PRIMARY KEY,
+    sample_count BIGINT NOT NULL DEFAULT 0,
+    speed_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    speed_count BIGINT NOT NULL DEFAULT 0,
+    speed_max DOUBLE PRECISION,
+    accel_max DOUBLE PRECISION,
+    devices TEXT[] NOT NULL DEFAULT '{}',
+    events JSONB NOT NULL DEFAULT '{}'
+);
+
+SELECT create_hypertable('summary_1min', 'bucket',
+    chunk_time_interval => INTERVAL '7 days',
+    if_not_exists => TRUE
+);
+
+SELECT add_retention_policy('summary_1min', INTERVAL '365 days', if_not_exists => TRUE);
+
+GRANT SELECT ON summary_1min TO grafana_reader;
+
+-- Histórico existente (executar uma vez; o ingest soma os novos deltas)
+INSERT INTO summary_1min (bucket, sample_count, speed_sum, speed_count, speed_max, accel_max, devices)
+SELECT
+    time_bucket('1 minute', time) AS bucket,
+    COUNT(*),
+    COALESCE(SUM(speed_kmh), 0),
+    COUNT(speed_kmh),
+    MAX(speed_kmh),
+    MAX(accel_magnitude),
+    ARRAY_AGG(DISTINCT device_id)
+FROM telemetry
+WHERE time > NOW() - INTERVAL '7 days'
+GROUP BY 1
+ON CONFLICT (bucket) DO NOTHING;
+
+UPDATE summary_1min s
+SET events = e.events
+FROM (
+    SELECT bucket, jsonb_object_agg(event_type, n) AS events
+    FROM (
+        SELECT time_bucket('1 minute', time) AS bucket, event_type, COUNT(*) AS n
+        FROM events
+        WHERE time > NOW() - INTERVAL '7 days'
+        GROUP BY 1, 2
+    ) t
+    GROUP BY bucket
+) e
+WHERE s.bucket = e.bucket;
@@ -0,0 +1,110 @@
+-- Migration: Estado por dispositivo mantido pelo ingest (device_state)
+-- Data: 2026-10-18
+-- Descrição: Cria device_state (última amostra e contagem de amostras por
+--            minuto da última hora, uma linha por device), atualizada pelo
+--            ingest a cada batch gravado (ver ingest/src/device_state.py).
+--            Redefine device_last_position (antes DISTINCT ON sobre 24 h de
+--            telemetry) e device_status (antes COUNT(*) correlacionado por
+--            device) em cima dela: as consultas do Grafana passam a ser
+--            O(devices), sem varrer telemetry.
+
+CREATE TABLE IF NOT EXISTS device_state (
+    device_id VARCHAR(100) NOT NULL PRIMARY KEY,
+    time TIMESTAMPTZ NOT NULL,
+    operator_id VARCHAR(100),
+    latitude DOUBLE PRECISION,
+    longitude DOUBLE PRECISION,
+    altitude DOUBLE PRECISION,
+    speed_kmh DOUBLE PRECISION,
+    bearing DOUBLE PRECISION,
+    gps_accuracy DOUBLE PRECISION,
+    accel_magnitude DOUBLE PRECISION,
+    -- Contagem móvel: minute_counts[60] é o minuto counts_base,
+    -- minute_counts[i] o minuto counts_base - (60 - i)
+    counts_base TIMESTAMPTZ NOT NULL,
+    minute_counts INTEGER[] NOT NULL DEFAULT array_fill(0, ARRAY[60]),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Soma dois vetores de contagem alinhando pelos minutos; o resultado
+-- termina no minuto mais recente dos dois (minutos que saem da hora caem)
+CREATE OR REPLACE FUNCTION device_state_merge_counts(
+    old_counts INTEGER[], old_base TIMESTAMPTZ,
+    new_counts INTEGER[], new_base TIMESTAMPTZ
+) RETURNS INTEGER[] AS $$
+    SELECT ARRAY(
+        SELECT COALESCE(old_counts[i + (EXTRACT(EPOCH FROM b.base - old_base) / 60)::int], 0)
+             + COALESCE(new_counts[i + (EXTRACT(EPOCH FROM b.base - new_base) / 60)::int], 0)
+        FROM (SELECT GREATEST(old_base, new_base) AS base) b, generate_series(1, 60) AS i
+        ORDER BY i
+    )
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Amostras dos últimos 60 minutos (incluindo o corrente) de um vetor de contagem
+CREATE OR REPLACE FUNCTION device_state_samples_last_hour(counts INTEGER[], base TIMESTAMPTZ)
+RETURNS BIGINT AS $$
+    SELECT COALESCE(SUM(u.c), 0)::bigint
+    FROM unnest(counts) WITH ORDINALITY AS u(c, i)
+    WHERE base - (60 - u.i) * INTERVAL '1 minute' >= date_trunc('minute', NOW()) - INTERVAL '59 minutes'
+$$ LANGUAGE sql STABLE;
+
+GRANT SELECT ON device_state TO grafana_reader;
+
+-- Estado atual a partir do histórico (executar uma vez; o ingest mantém daqui em diante)
+INSERT INTO device_state (device_id, time, operator_id, latitude, longitude, altitude,
+                          speed_kmh, bearing, gps_accuracy, accel_magnitude, counts_base)
+SELECT DISTINCT ON (device_id)
+    device_id, time, operator_id, latitude, longitude, altitude,
+    speed_kmh, bearing, gps_accuracy, accel_magnitude, date_trunc('minute', time)
+FROM telemetry
+WHERE time > NOW() - INTERVAL '24 hours'
+ORDER BY device_id, time DESC
+ON CONFLICT (device_id) DO NOTHING;
+
+WITH per_minute AS (
+    SELECT device_id, time_bucket('1 minute', time) AS minute, COUNT(*)::int AS n
+    FROM telemetry
+    WHERE time > NOW() - INTERVAL '1 hour'
+    GROUP BY 1, 2
+)
+UPDATE device_state s
+SET minute_counts = (
+    SELECT array_agg(COALESCE(p.n, 0) ORDER BY i)
+    FROM generate_series(1, 60) AS i
+    LEFT JOIN per_minute p
+      ON p.device_id = s.device_id AND p.minute = s.counts_base - (60 - i) * INTERVAL '1 minute'
+)
+WHERE s.device_id IN (SELECT device_id FROM per_minute);
+
+-- Views com as mesmas colunas de antes
+CREATE OR REPLACE VIEW device_last_position AS
+SELECT
+    device_id,
+    time,
+    operator_id,
+    latitude,
+    longitude,
+    altitude,
+    speed_kmh,
+    bearing,
+    gps_accuracy,
+    accel_magnitude
+FROM device_state
+WHERE time > NOW() - INTERVAL '24 hours';
+
+CREATE OR REPLACE VIEW device_status AS
+SELECT
+    d.device_id,
+    d.device_model,
+    d.is_active,
+    d.last_seen,
+    EXTRACT(EPOCH FROM (NOW() - d.last_seen)) AS seconds_since_last,
+    CASE
+        WHEN d.last_seen > NOW() - INTERVAL '1 minute' THEN 'ONLINE'
+        WHEN d.last_seen > NOW() - INTERVAL '5 minutes' THEN 'IDLE'
+        WHEN d.last_seen > NOW() - INTERVAL '1 hour' THEN 'AWAY'
+        ELSE 'OFFLINE'
+    END AS status,
+    COALESCE(device_state_samples_last_hour(s.minute_counts, s.counts_base), 0) AS samples_last_hour
+FROM devices d
+LEFT JOIN device_state s ON s.device_id = d.device_id;